@@ -1,12 +1,22 @@
 import streamlit as st
 import os
-import time
+import tempfile
 import pandas as pd
 from dotenv import load_dotenv
 from langchain_openai import ChatOpenAI
 from langchain_community.utilities import SQLDatabase
 from src.txt2sql_agent import Txt2SqlAgent
-from src.db_utils import test_connection, get_db_info, execute_sample_query
+from src.db_utils import test_connection, fetch_sample_frame
+from src.db_pool import create_database, pool_metrics, pool_settings_from_env, warm_up_pool
+from src.schema_cache import SchemaCache
+from src.translation_cache import TranslationCache
+from src.example_store import ExampleStore
+from src.value_index import ColumnValueIndex
+from src.schema_renderer import SchemaRenderer
+from src.result_cache import ResultCache
+from src.cost_guard import CostGuard
+from src.cancellation import CancelToken
+from src.export import export_query
 import polars as pl
 
 # Load environment variables
@@ -89,15 +99,105 @@ def initialize_agent():
         
         # Connect to the database
         db_uri = f"postgresql://{env_vars['DB_USER']}:{env_vars['DB_PASSWORD']}@{env_vars['DB_HOST']}:{env_vars['DB_PORT']}/{env_vars['DB_NAME']}"
-        db = SQLDatabase.from_uri(db_uri)
+        db = create_database(db_uri, lazy_table_reflection=True, **pool_settings_from_env())
         
         # Test database connection
         if not test_connection(db):
             st.error("Could not connect to the database. Please check your connection settings.")
             return None
         
+        # The agent (and its pool) is shared by all sessions; open the
+        # connections before the first query
+        warmup = os.getenv("DB_POOL_WARMUP")
+        warm_up_pool(db, int(warmup) if warmup else None)
+        
         # Create the agent
-        agent = Txt2SqlAgent(db, model, verbose=False)
+        schema_cache = SchemaCache(
+            db,
+            path=os.getenv("SCHEMA_CACHE_PATH"),
+            max_staleness=float(os.getenv("SCHEMA_CACHE_MAX_STALENESS", "300"))
+        )
+        translation_cache = None
+        if os.getenv("TRANSLATION_CACHE", "1") != "0":
+            translation_cache = TranslationCache(
+                path=os.getenv("TRANSLATION_CACHE_PATH"),
+                max_entries=int(os.getenv("TRANSLATION_CACHE_MAX_ENTRIES", "10000")),
+                ttl=float(os.getenv("TRANSLATION_CACHE_TTL", "0")) or None,
+                fuzzy_threshold=float(os.getenv("TRANSLATION_CACHE_FUZZY_THRESHOLD", "0"))
+            )
+        result_cache = None
+        result_cache_mb = float(os.getenv("RESULT_CACHE_MAX_MB", "256"))
+        if result_cache_mb > 0:
+            result_cache = ResultCache(
+                db,
+                max_bytes=int(result_cache_mb * 1024 * 1024),
+                ttl=float(os.getenv("RESULT_CACHE_TTL", "0")) or None
+            )
+        cost_guard = None
+        cost_guard_action = os.getenv("COST_GUARD_ACTION", "rewrite")
+        if cost_guard_action != "off":
+            cost_guard = CostGuard(
+                db,
+                max_cost=float(os.getenv("COST_GUARD_MAX_COST", "1000000")) or None,
+                max_rows=float(os.getenv("COST_GUARD_MAX_ROWS", "1000000")) or None,
+                action=cost_guard_action,
+                limit=int(os.getenv("COST_GUARD_LIMIT", "1000"))
+            )
+        example_store = None
+        few_shot_k = int(os.getenv("FEW_SHOT_EXAMPLES", "3"))
+        if few_shot_k > 0:
+            example_store = ExampleStore(
+                path=os.getenv("EXAMPLE_STORE_PATH"),
+                max_examples=int(os.getenv("EXAMPLE_STORE_MAX_EXAMPLES", "100000"))
+            )
+            if os.getenv("EXAMPLES_FILE"):
+                example_store.load_file(os.getenv("EXAMPLES_FILE"))
+        value_index = None
+        if os.getenv("VALUE_INDEX", "1") != "0":
+            # Collected in a background thread; questions asked before it is
+            # ready are answered without value hints.
+            value_index = ColumnValueIndex(
+                db,
+                schema_cache=schema_cache,
+                max_values=int(os.getenv("VALUE_INDEX_MAX_VALUES", "100")),
+                sample_rows=int(os.getenv("VALUE_INDEX_SAMPLE_ROWS", "10000")),
+                max_staleness=float(os.getenv("VALUE_INDEX_MAX_STALENESS", "300"))
+            ).start()
+        schema_renderer = None
+        schema_token_budget = int(os.getenv("SCHEMA_TOKEN_BUDGET", "4000"))
+        if schema_token_budget > 0:
+            schema_renderer = SchemaRenderer(
+                db,
+                schema_cache=schema_cache,
+                token_budget=schema_token_budget,
+                sample_rows=int(os.getenv("SCHEMA_SAMPLE_ROWS", "3"))
+            )
+        agent = Txt2SqlAgent(
+            db,
+            model,
+            verbose=False,
+            schema_cache=schema_cache,
+            table_retrieval_k=int(os.getenv("TABLE_RETRIEVAL_K", "0")),
+            mode=os.getenv("QUERY_MODE", "agent"),
+            translation_cache=translation_cache,
+            result_cache=result_cache,
+            cost_guard=cost_guard,
+            max_result_rows=int(os.getenv("FETCH_MAX_ROWS", "10000")) or None,
+            max_result_bytes=int(float(os.getenv("FETCH_MAX_MB", "64")) * 1024 * 1024) or None,
+            fetch_batch_size=int(os.getenv("FETCH_BATCH_SIZE", "1000")),
+            # Every browser session shares this agent; identical in-flight questions share one run.
+            coalesce=os.getenv("QUERY_COALESCING", "1") != "0",
+            schema_validation=os.getenv("SCHEMA_VALIDATION", "1") != "0",
+            example_store=example_store,
+            few_shot_k=few_shot_k,
+            learn_examples=os.getenv("EXAMPLE_LEARNING", "1") != "0",
+            value_index=value_index,
+            schema_renderer=schema_renderer,
+            sql_candidates=int(os.getenv("SQL_CANDIDATES", "1")),
+            candidate_temperature=float(os.getenv("SQL_CANDIDATE_TEMPERATURE", "0.7")),
+            query_timeout=float(os.getenv("QUERY_TIMEOUT", "0")) or None,
+            result_data_rows=int(os.getenv("RESULT_DATA_ROWS", "1000"))
+        )
         return agent, db
         
     except Exception as e:
@@ -122,7 +222,10 @@ def main():
         
         # Get database information
         try:
-            db_info = get_db_info(db)
+            if st.button("🔄 Refresh Schema"):
+                agent.schema_cache.refresh()
+            
+            db_info = agent.schema_cache.get_db_info()
             st.metric("Tables", len(db_info["tables"]))
             
             st.subheader("Available Tables")
@@ -134,14 +237,64 @@ def main():
                 st.info(f"Selected: {st.session_state.selected_table}")
                 if st.button("Show Sample Data"):
                     try:
-                        sample_data = execute_sample_query(db, st.session_state.selected_table)
-                        df = pl.DataFrame(sample_data)
-                        st.dataframe(df.to_pandas(), use_container_width=True)
+                        sample_data = fetch_sample_frame(db, st.session_state.selected_table, result_cache=agent.result_cache)
+                        st.dataframe(sample_data, use_container_width=True)
                     except Exception as e:
                         st.error(f"Error retrieving sample data: {e}")
                         
         except Exception as e:
             st.error(f"Error getting database info: {e}")
+        
+        if agent.translation_cache is not None:
+            st.subheader("Translation Cache")
+            stats = agent.translation_cache.stats()
+            cache_col1, cache_col2 = st.columns(2)
+            cache_col1.metric("Hits", stats["hits"] + stats["fuzzy_hits"])
+            cache_col2.metric("Misses", stats["misses"])
+            st.caption(f"{stats['entries']} entries, {stats['hit_rate']:.0%} hit rate")
+            if st.button("Clear Cache"):
+                agent.translation_cache.invalidate()
+        
+        metrics = pool_metrics(db)
+        if metrics is not None:
+            st.caption(
+                f"Connection pool: {metrics['checked_out']}/{metrics['size']} in use "
+                f"(+{metrics['overflow']} overflow), wait {metrics['wait_avg'] * 1000:.1f} ms avg / "
+                f"{metrics['wait_max'] * 1000:.1f} ms max, {metrics['timeouts']} timeouts"
+            )
+        
+        if agent.result_cache is not None:
+            stats = agent.result_cache.stats()
+            st.caption(
+                f"Result cache: {stats['hits']} hits, {stats['misses']} misses, "
+                f"{stats['entries']} entries ({stats['bytes'] / 1024 / 1024:.1f} MB)"
+            )
+        
+        if agent.example_store is not None:
+            stats = agent.example_store.stats()
+            st.caption(
+                f"Few-shot examples: {stats['examples']} ({stats['learned']} learned), "
+                f"{stats['hits']} of {stats['searches']} searches found examples"
+            )
+        
+        if agent.value_index is not None:
+            stats = agent.value_index.stats()
+            if stats["ready"]:
+                st.caption(
+                    f"Column values: {stats['values']} in {stats['columns']} columns, "
+                    f"{stats['hits']} of {stats['searches']} questions matched values"
+                )
+            else:
+                st.caption("Column values: collecting...")
+        
+        if agent.sql_candidates > 1:
+            stats = agent.candidate_stats.stats()
+            if stats["runs"]:
+                wins = ", ".join(f"#{rank} {rate:.0%}" for rank, rate in enumerate(stats["win_rate"]))
+                st.caption(
+                    f"SQL candidates: {agent.sql_candidates} per question, {stats['rescued']} of "
+                    f"{stats['runs']} answers rescued; wins by rank: {wins}"
+                )
     
     # Main content area
     col1, col2 = st.columns([2, 1])
@@ -157,7 +310,7 @@ def main():
         )
         
         # Query options
-        col1_1, col1_2, col1_3 = st.columns(3)
+        col1_1, col1_2, col1_3, col1_4 = st.columns(4)
         
         with col1_1:
             execute_query = st.button("🚀 Execute Query", type="primary", use_container_width=True)
@@ -167,12 +320,27 @@ def main():
         
         with col1_3:
             explain_mode = st.button("📖 Explain Query", use_container_width=True)
+        
+        with col1_4:
+            cancel_query = st.button("⏹️ Cancel", use_container_width=True)
+        
+        # Clicking Cancel reruns the script, which also closes the running
+        # query's stream; cancelling its token stops it right away.
+        if cancel_query and "cancel_token" in st.session_state:
+            st.session_state.pop("cancel_token").cancel()
+            st.info("Query cancelled")
     
     with col2:
         st.header("⚙️ Options")
         
         # Advanced options
         st.subheader("Query Settings")
+        query_mode = st.radio(
+            "Query mode",
+            options=["agent", "direct"],
+            index=0 if agent.mode == "agent" else 1,
+            help="Direct mode answers with a single SQL generation and falls back to the agent on errors"
+        )
         show_sql = st.checkbox("Show generated SQL", value=True)
         show_execution_time = st.checkbox("Show execution time", value=True)
         
@@ -197,33 +365,101 @@ def main():
     # Process queries
     if query:
         if execute_query:
-            with st.spinner("Processing your query..."):
-                try:
-                    start_time = time.time()
-                    result = agent.query(query)
-                    execution_time = time.time() - start_time
+            try:
+                status = st.status("Processing your query...", expanded=True)
+                sql_placeholder = st.empty()
+                answer_placeholder = st.empty()
+                answer = ""
+                result = None
+                token = CancelToken(agent.query_timeout)
+                st.session_state.cancel_token = token
+                
+                for event in agent.stream_query(query, mode=query_mode, cancel_token=token):
+                    if event["type"] == "step":
+                        status.write(f"Running `{event['tool']}`")
+                    elif event["type"] == "sql":
+                        status.write("Running SQL")
+                        if show_sql:
+                            sql_placeholder.code(event["sql"], language="sql")
+                    elif event["type"] == "rows":
+                        status.write("Rows received")
+                    elif event["type"] == "fallback":
+                        status.write(f"Direct attempt failed, falling back to the agent: {event['reason']}")
+                    elif event["type"] == "token":
+                        answer += event["text"]
+                        answer_placeholder.markdown(answer)
+                    elif event["type"] == "result":
+                        result = event["result"]
+                
+                if result["success"]:
+                    status.update(label="Query complete", state="complete", expanded=False)
+                    st.session_state.export_sql = result["sql"]
+                    st.session_state.export_question = query
+                    st.markdown('<div class="success-message">✅ Query executed successfully!</div>', unsafe_allow_html=True)
                     
-                    if result["success"]:
-                        st.markdown('<div class="success-message">✅ Query executed successfully!</div>', unsafe_allow_html=True)
-                        
-                        # Display results
-                        st.subheader("📊 Results")
-                        st.write(result["output"])
-                        
-                        if show_execution_time:
-                            st.metric("Execution Time", f"{execution_time:.2f}s")
-                            
-                    else:
-                        st.markdown('<div class="error-message">❌ Query failed</div>', unsafe_allow_html=True)
-                        st.error(f"Error: {result['error']}")
+                    # Display results
+                    st.subheader("📊 Results")
+                    answer_placeholder.empty()
+                    st.write(result["output"])
+                    
+                    # Rows of the same execution the answer is based on
+                    data = result["data"]
+                    if data is not None:
+                        st.dataframe(data, use_container_width=True)
+                        caption = f"{result['row_count']:,} rows"
+                        if data.height < result["row_count"]:
+                            caption = f"First {data.height:,} of {caption}"
+                        if result["truncated"]:
+                            caption += " (more were not fetched)"
+                        st.caption(caption)
+                    
+                    if show_sql and result["sql"]:
+                        sql_placeholder.code(result["sql"], language="sql")
+                    
+                    if result["fallback_reason"]:
+                        st.info(f"Direct attempt failed, answered by the agent: {result['fallback_reason']}")
+                    
+                    if show_execution_time:
+                        st.metric("Execution Time", f"{result['execution_time']:.2f}s")
+                        if result["time_to_first_event"] is not None:
+                            st.caption(f"First output after {result['time_to_first_event']:.2f}s")
+                        st.caption(f"Path: {result['path']}")
+                        budget = result["budget"]
+                        if budget and budget["timeout"] is not None:
+                            st.caption(f"Time budget: {budget['elapsed']:.1f}s of {budget['timeout']:.0f}s")
+                        guard = result["cost_guard"]
+                        if guard and guard["cost"] is not None:
+                            st.caption(
+                                f"Cost guard: {guard['action']} (estimated cost {guard['cost']:,.0f}, "
+                                f"{guard['rows']:,.0f} rows)"
+                            )
+                        timings = result["timings"]
+                        if timings is not None:
+                            col1, col2, col3 = st.columns(3)
+                            col1.metric("LLM", f"{timings['llm']:.2f}s", f"{timings['llm_calls']} calls", delta_color="off")
+                            col2.metric("Database", f"{timings['db']:.2f}s", f"{timings['db_queries']} queries", delta_color="off")
+                            col3.metric("Tokens", f"{timings['prompt_tokens'] + timings['completion_tokens']:,}",
+                                        f"{timings['completion_tokens']:,} completion", delta_color="off")
+                            with st.expander("⏱️ Timeline"):
+                                st.dataframe(pd.DataFrame(timings["spans"]), use_container_width=True)
                         
-                except Exception as e:
-                    st.error(f"Error processing query: {e}")
+                elif result["cancelled"]:
+                    status.update(label="Query cancelled", state="error")
+                    st.warning(f"{result['error']} after {result['budget']['elapsed']:.1f}s")
+                else:
+                    status.update(label="Query failed", state="error")
+                    st.markdown('<div class="error-message">❌ Query failed</div>', unsafe_allow_html=True)
+                    st.error(f"Error: {result['error']}")
+                    
+            except Exception as e:
+                st.error(f"Error processing query: {e}")
         
         elif generate_sql_only:
             with st.spinner("Generating SQL..."):
                 try:
                     sql = agent.generate_sql_only(query)
+                    st.session_state.export_sql = sql
+                    st.session_state.export_question = query
                     
                     st.markdown('<div class="info-message">🔧 SQL Generated Successfully</div>', unsafe_allow_html=True)
                     st.subheader("Generated SQL")
@@ -255,6 +491,42 @@ def main():
                 except Exception as e:
                     st.error(f"Error explaining query: {e}")
     
+    # Export the full result of the last query
+    if "export_question" in st.session_state:
+        st.subheader("📥 Export Full Result")
+        export_col1, export_col2 = st.columns([1, 2])
+        with export_col1:
+            export_format = st.radio("Format", options=["csv", "parquet"], horizontal=True)
+        with export_col2:
+            prepare_export = st.button("Prepare Export", help=st.session_state.export_question)
+        
+        if prepare_export:
+            with st.spinner("Exporting..."):
+                try:
+                    sql = st.session_state.export_sql or agent.generate_sql_only(st.session_state.export_question)
+                    previous = st.session_state.pop("export_stats", None)
+                    if previous and os.path.exists(previous["path"]):
+                        os.remove(previous["path"])
+                    fd, path = tempfile.mkstemp(prefix="txt2sql_", suffix=f".{export_format}")
+                    os.close(fd)
+                    st.session_state.export_stats = export_query(db, sql, path)
+                except Exception as e:
+                    st.error(f"Error exporting query: {e}")
+        
+        if "export_stats" in st.session_state:
+            stats = st.session_state.export_stats
+            st.caption(
+                f"{stats['rows']:,} rows, {stats['bytes'] / 1024 / 1024:.1f} MB in {stats['seconds']:.2f}s "
+                f"({stats['rows_per_sec']:,.0f} rows/s)"
+            )
+            with open(stats["path"], "rb") as f:
+                st.download_button(
+                    "⬇️ Download",
+                    data=f,
+                    file_name=f"query_result.{stats['format']}",
+                    mime="text/csv" if stats["format"] == "csv" else "application/octet-stream"
+                )
+    
     # Footer
     st.markdown("---")
     st.markdown(
@@ -0,0 +1,75 @@
+"""
+Benchmark batched question answering with Txt2SqlAgent.abatch.
+
+Runs direct-mode questions (one SQL generation call and one summary call each)
+against a local SQLite database with a fake chat model that sleeps for a fixed
+latency, so throughput reflects how well LLM waits overlap rather than model
+speed. The translation cache is disabled so every question calls the model.
+
+Usage:
+    python -m benchmarks.bench_batch --questions 200 --latency 0.2 --concurrency 1 8 32
+"""
+
+import argparse
+import asyncio
+import os
+import tempfile
+import time
+from typing import Any, List, Optional
+from langchain_community.utilities import SQLDatabase
+from langchain_core.language_models.fake_chat_models import FakeListChatModel
+from langchain_core.messages import AIMessage, BaseMessage
+from langchain_core.outputs import ChatGeneration, ChatResult
+from sqlalchemy import create_engine, text
+from src.rate_limiter import RateLimiter
+from src.txt2sql_agent import Txt2SqlAgent
+
+
+class SlowFakeChatModel(FakeListChatModel):
+    """Fake chat model that waits a fixed time per call, like a remote API"""
+
+    latency: float = 0.2
+
+    async def _agenerate(self, messages: List[BaseMessage], stop: Optional[List[str]] = None,
+                         run_manager: Any = None, **kwargs: Any) -> ChatResult:
+        await asyncio.sleep(self.latency)
+        prompt = messages[-1].content
+        reply = "SELECT name, region FROM customer LIMIT 10" if "PostgreSQL query:" in prompt else "Ann and Bob."
+        return ChatResult(generations=[ChatGeneration(message=AIMessage(content=reply))])
+
+
+def make_db(path: str) -> SQLDatabase:
+    with create_engine(f"sqlite:///{path}").begin() as conn:
+        conn.execute(text("CREATE TABLE customer (id INTEGER PRIMARY KEY, name TEXT, region TEXT)"))
+        conn.execute(text("INSERT INTO customer VALUES (1, 'Ann', 'Ontario'), (2, 'Bob', 'Quebec')"))
+    return SQLDatabase.from_uri(f"sqlite:///{path}", lazy_table_reflection=True)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--questions", type=int, default=200, help="Number of questions per run")
+    parser.add_argument("--latency", type=float, default=0.2, help="Simulated seconds per LLM call")
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 8, 32], help="max_concurrency values")
+    parser.add_argument("--rpm", type=float, default=None, help="Optional requests-per-minute limit")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        db = make_db(os.path.join(directory, "bench.db"))
+        model = SlowFakeChatModel(responses=[""], latency=args.latency)
+        agent = Txt2SqlAgent(db, model, mode="direct")
+        questions = [f"which customers are in region {i}?" for i in range(args.questions)]
+
+        print(f"questions: {args.questions}  LLM latency: {args.latency * 1000:.0f} ms  "
+              f"LLM calls / question: 2  rpm limit: {args.rpm or 'none'}")
+        for concurrency in args.concurrency:
+            limiter = RateLimiter(requests_per_minute=args.rpm) if args.rpm else None
+            start = time.perf_counter()
+            results = asyncio.run(agent.abatch(questions, max_concurrency=concurrency, rate_limiter=limiter))
+            elapsed = time.perf_counter() - start
+            failed = sum(not r["success"] for r in results)
+            print(f"max_concurrency {concurrency:4d}: {elapsed:7.2f} s  "
+                  f"{len(questions) / elapsed:8.1f} questions/s  failed: {failed}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,135 @@
+"""
+Measure speculative SQL candidates against sequential retries in direct mode.
+
+Runs the bench_e2e question set over a seeded SQLite database with the
+scripted model, which takes --latency seconds per reply. For --mistake-rate
+of the questions the model's usual (rank 0) query is wrong in one of two
+ways:
+
+    column:    it names a column that does not exist, which the local schema
+               check catches; sequentially this costs a repair call
+    function:  it calls a function the database does not have, which only the
+               database notices; sequentially the query fails when it runs
+               and direct mode falls back to the agent
+
+Sampled candidates (ranks 1 and up) are right, except that for a third of
+the wrong questions the rank 1 sample repeats the mistake. Every question is
+answered with --candidates candidates each (1 is the sequential baseline),
+and the run reports per setting:
+
+    llm_calls:   chat model calls, candidates included
+    seconds:     mean and p95 wall time per question
+    fallbacks:   answers that fell back to the agent
+    wins:        answers per candidate rank
+
+SQLite reports no plan costs, so valid candidates are tried in rank order;
+on PostgreSQL the cheapest plan goes first.
+
+Usage:
+    python -m benchmarks.bench_candidates --questions 30 --candidates 1 2 3 5
+    python -m benchmarks.bench_candidates --latency 0.5 --mistake-rate 0.3
+"""
+
+import argparse
+import json
+import os
+import random
+import tempfile
+import time
+from typing import Any, Dict, List
+from benchmarks.bench_e2e import QueryMeter, make_cases
+from benchmarks.bench_validation import make_mistakes
+from benchmarks.local_db import seed_database
+from benchmarks.replay_model import ScriptedChatModel
+from src.batch_runner import percentile
+from src.schema_cache import SchemaCache
+from src.txt2sql_agent import Txt2SqlAgent
+
+
+def make_candidate_mistakes(cases: Dict[str, Dict[str, Any]], db_info: dict, rate: float,
+                            seed: int, max_candidates: int) -> Dict[str, str]:
+    """Wrong rank 0 queries for a share of the questions, and the scripts' sampled alternates"""
+    rng = random.Random(seed)
+    columns = make_mistakes(cases, db_info, 1.0, seed)
+    mistakes = {}
+    for question, case in cases.items():
+        case["alternates"] = [case["sql"]] * (max_candidates - 1)
+        if rng.random() >= rate:
+            continue
+        if rng.random() < 0.5:
+            mistakes[question] = columns[question]
+        else:
+            mistakes[question] = case["sql"].replace("SELECT ", "SELECT median_value(1) AS m, ", 1)
+        if rng.random() < 1 / 3 and case["alternates"]:
+            case["alternates"][0] = mistakes[question]
+    return mistakes
+
+
+def run(db, db_info: dict, cases, mistakes, candidates: int, latency: float, directory: str) -> Dict[str, Any]:
+    """Answer every question once in direct mode and total the work and wall time"""
+    model = ScriptedChatModel(queries=cases, mistakes=mistakes, latency=latency)
+    schema_cache = SchemaCache(db, path=os.path.join(directory, f"schema-{candidates}.json"))
+    agent = Txt2SqlAgent(db, model, mode="direct", schema_cache=schema_cache, summarize=False,
+                         sql_candidates=candidates)
+    # Read the schema outside the measurement, the same way for every setting.
+    schema_cache.get_db_info()
+    schema_cache.get_table_info(list(db_info["tables"]))
+    agent.check_sql("SELECT 1")
+
+    totals = {"questions": len(cases), "failed": 0, "fallbacks": 0, "llm_calls": 0}
+    times: List[float] = []
+    for question in cases:
+        meter = QueryMeter()
+        start = time.perf_counter()
+        result = agent.query(question, config={"callbacks": [meter]})
+        times.append(time.perf_counter() - start)
+        totals["llm_calls"] += meter.llm_calls
+        totals["failed"] += not result["success"]
+        totals["fallbacks"] += result["path"] == "direct_fallback"
+    times.sort()
+    totals["mean_seconds"] = sum(times) / len(times)
+    totals["p95_seconds"] = percentile(times, 95)
+    totals["candidates"] = agent.candidate_stats.stats() if candidates > 1 else None
+    return totals
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--questions", type=int, default=30, help="Benchmark questions")
+    parser.add_argument("--candidates", type=int, nargs="+", default=[1, 2, 3, 5],
+                        help="Candidates per question to compare; 1 is sequential")
+    parser.add_argument("--mistake-rate", type=float, default=0.5, help="Share of questions with a wrong rank 0 query")
+    parser.add_argument("--latency", type=float, default=0.1, help="Seconds each model reply takes")
+    parser.add_argument("--tables", type=int, default=20, help="Tables in the seeded database")
+    parser.add_argument("--seed", type=int, default=0, help="Seed of the schema, questions and mistakes")
+    parser.add_argument("--out", default=None, help="Optional JSON results file")
+    args = parser.parse_args()
+
+    results = {}
+    with tempfile.TemporaryDirectory() as directory:
+        db, db_info = seed_database(f"sqlite:///{os.path.join(directory, 'candidates.db')}", args.tables, 100, args.seed)
+        cases = make_cases(db_info, args.questions, args.seed)
+        mistakes = make_candidate_mistakes(cases, db_info, args.mistake_rate, args.seed, max(args.candidates))
+        print(f"{len(cases)} questions, {len(mistakes)} with a wrong rank 0 query, "
+              f"{args.latency * 1000:.0f} ms per model reply")
+        print(f"{'candidates':>10} {'llm_calls':>9} {'mean_s':>7} {'p95_s':>7} {'fallbacks':>9} {'failed':>6}  wins by rank")
+        for candidates in args.candidates:
+            totals = run(db, db_info, cases, mistakes, candidates, args.latency, directory)
+            results[f"candidates_{candidates}"] = totals
+            wins = totals["candidates"]["wins"] if totals["candidates"] else "-"
+            print(f"{candidates:>10} {totals['llm_calls']:>9} {totals['mean_seconds']:>7.3f} "
+                  f"{totals['p95_seconds']:>7.3f} {totals['fallbacks']:>9} {totals['failed']:>6}  {wins}")
+
+    for candidates in args.candidates:
+        stats = results[f"candidates_{candidates}"]["candidates"]
+        if stats:
+            print(f"{candidates} candidates: {stats['rescued']} of {stats['runs']} answers rescued by a sampled "
+                  f"candidate, {stats['valid']} of {stats['candidates']} candidates valid, "
+                  f"{stats['distinct']} distinct")
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
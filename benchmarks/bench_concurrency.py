@@ -0,0 +1,153 @@
+"""
+Stress test one shared Txt2SqlAgent from many threads.
+
+Like the Streamlit app, which caches a single agent for every browser
+session, all threads use the same Txt2SqlAgent. Half of the calls go through
+query() and half through stream_query(). The scripted chat model sleeps a
+fixed latency per call and counts its calls. Two scenarios run, with
+coalescing on and off:
+
+    same:  every thread asks the same question at the same moment; with
+           coalescing the model runs once per API, however many threads ask
+    mixed: every thread asks several distinct questions in random order
+
+Every result is checked against its own question: it must succeed, and every
+SQL statement the call reports (the result's "sql" in direct mode and the
+stream's "sql" events) must be that question's SQL. Any mismatch means state
+leaked between concurrent calls and makes the exit status 1.
+
+Usage:
+    python -m benchmarks.bench_concurrency --threads 32 --questions 8 --mode agent
+"""
+
+import argparse
+import os
+import random
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List, Optional
+from langchain_core.messages import BaseMessage
+from langchain_core.outputs import ChatResult
+from pydantic import PrivateAttr
+from benchmarks.local_db import seed_database
+from benchmarks.replay_model import ScriptedChatModel
+from src.txt2sql_agent import Txt2SqlAgent
+
+
+class CountingScriptedModel(ScriptedChatModel):
+    """ScriptedChatModel that waits a fixed time per call and counts its calls"""
+
+    latency: float = 0.05
+    _calls: int = PrivateAttr(default=0)
+    _lock: Any = PrivateAttr(default_factory=threading.Lock)
+
+    def _generate(self, messages: List[BaseMessage], stop: Optional[List[str]] = None,
+                  run_manager: Any = None, **kwargs: Any) -> ChatResult:
+        with self._lock:
+            self._calls += 1
+        time.sleep(self.latency)
+        return super()._generate(messages, stop, run_manager, **kwargs)
+
+    def take_calls(self) -> int:
+        """Calls since the last take_calls"""
+        with self._lock:
+            calls, self._calls = self._calls, 0
+        return calls
+
+
+def ask(agent: Txt2SqlAgent, question: str, expected_sql: str, stream: bool, mode: str) -> Optional[str]:
+    """Answer one question; return a description of what is wrong with the answer, or None"""
+    if stream:
+        events = list(agent.stream_query(question, mode=mode))
+        result = events[-1]["result"]
+        reported = [event["sql"] for event in events if event["type"] == "sql"]
+    else:
+        result = agent.query(question, mode=mode)
+        reported = []
+    if result["sql"] is not None:
+        reported.append(result["sql"])
+    if not result["success"]:
+        return f"{question!r} failed: {result['error']}"
+    wrong = [sql for sql in reported if sql.strip() != expected_sql]
+    if wrong:
+        return f"{question!r} reported another question's SQL: {wrong[0]!r}"
+    return None
+
+
+def run_scenario(agent: Txt2SqlAgent,
+                 model: CountingScriptedModel,
+                 work: List[List[str]],
+                 cases: Dict[str, Dict[str, Any]],
+                 mode: str) -> Dict[str, Any]:
+    """Run each thread's questions concurrently, starting all threads together"""
+    barrier = threading.Barrier(len(work))
+
+    def worker(index: int) -> List[Optional[str]]:
+        barrier.wait()
+        return [ask(agent, question, cases[question]["sql"], (index + i) % 2 == 1, mode)
+                for i, question in enumerate(work[index])]
+
+    model.take_calls()
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=len(work)) as pool:
+        problems = [p for problems in pool.map(worker, range(len(work))) for p in problems if p]
+    elapsed = time.perf_counter() - start
+    calls = sum(len(questions) for questions in work)
+    return {
+        "calls": calls,
+        "llm_calls": model.take_calls(),
+        "seconds": elapsed,
+        "calls_per_sec": calls / elapsed,
+        "problems": problems,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--threads", type=int, default=32, help="Concurrent threads sharing the agent")
+    parser.add_argument("--questions", type=int, default=8, help="Distinct questions in the mixed scenario")
+    parser.add_argument("--per-thread", type=int, default=4, help="Questions each thread asks in the mixed scenario")
+    parser.add_argument("--latency", type=float, default=0.05, help="Simulated seconds per LLM call")
+    parser.add_argument("--mode", choices=["agent", "direct"], default="agent", help="Query mode")
+    parser.add_argument("--seed", type=int, default=0, help="Seed of the database and the question order")
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    with tempfile.TemporaryDirectory() as directory:
+        db, db_info = seed_database(f"sqlite:///{os.path.join(directory, 'concurrency.db')}",
+                                    max(args.questions, 2), 50, seed=args.seed)
+        cases = {
+            f"How many rows does {table} have?": {"sql": f"SELECT COUNT(*) FROM {table}", "tables": [table]}
+            for table in list(db_info["tables"])[:args.questions]
+        }
+        questions = list(cases)
+        same = [[questions[0]] for _ in range(args.threads)]
+        mixed = [[rng.choice(questions) for _ in range(args.per_thread)] for _ in range(args.threads)]
+
+        failed = False
+        for coalesce in (True, False):
+            model = CountingScriptedModel(queries=cases, latency=args.latency)
+            agent = Txt2SqlAgent(db, model, mode=args.mode, coalesce=coalesce)
+            # Build the shared agents before timing anything.
+            for stream in (False, True):
+                ask(agent, questions[0], cases[questions[0]]["sql"], stream, args.mode)
+            for name, work in (("same", same), ("mixed", mixed)):
+                stats = run_scenario(agent, model, work, cases, args.mode)
+                print(f"coalesce={'on ' if coalesce else 'off'} {name:<5}  {stats['calls']:4d} calls  "
+                      f"{stats['llm_calls']:5d} LLM calls  {stats['seconds']:6.2f} s  "
+                      f"{stats['calls_per_sec']:7.1f} calls/s  {len(stats['problems'])} problem(s)")
+                for problem in stats["problems"][:5]:
+                    print(f"  {problem}")
+                failed = failed or bool(stats["problems"])
+
+    if failed:
+        print("FAIL: some answers were wrong or failed")
+        sys.exit(1)
+    print("OK: every answer matched its question")
+
+
+if __name__ == "__main__":
+    main()
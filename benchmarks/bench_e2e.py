@@ -0,0 +1,345 @@
+"""
+Offline end-to-end benchmark of Txt2SqlAgent and db_utils.
+
+Seeds a local database (a SQLite file by default, or a local PostgreSQL via
+--db-uri) with synthetic tables, then measures:
+
+    query:       query() latency per mode, split into LLM time (model calls,
+                 from callbacks), DB time (time connections are checked out of
+                 the pool) and the rest, plus LLM calls and agent steps
+    get_db_info: introspection time against the number of tables
+    fetch:       fetch_dataframe throughput for several batch sizes
+
+The chat model never touches the network. By default it replays a recording
+(--recording) when one exists and otherwise uses a scripted model that follows
+the agent's usual tool trajectory. ``--llm record`` answers with the real
+model from OPENAI_MODEL/OPENAI_API_KEY and saves its replies for later runs.
+
+Results are written as JSON (--out) for comparison across commits with
+``python -m benchmarks.compare``.
+
+Usage:
+    python -m benchmarks.bench_e2e --tables 20 --rows 10000 --questions 20
+    python -m benchmarks.bench_e2e --llm record
+    python -m benchmarks.compare base.json head.json
+"""
+
+import argparse
+import json
+import os
+import platform
+import random
+import subprocess
+import tempfile
+import threading
+import time
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Optional
+from dotenv import load_dotenv
+from langchain_core.callbacks import BaseCallbackHandler
+from sqlalchemy import event
+from langchain_community.utilities import SQLDatabase
+from benchmarks.local_db import drop_database, seed_database
+from benchmarks.replay_model import ReplayChatModel, ScriptedChatModel
+from src.batch_runner import PERCENTILES, percentile
+from src.db_utils import fetch_dataframe, get_db_info
+from src.txt2sql_agent import QUERY_MODES, Txt2SqlAgent
+
+DEFAULT_RECORDING = os.path.join("benchmarks", "recordings", "e2e.json")
+
+# Columns a question can group by, in order of preference.
+_GROUP_COLUMNS = ("status", "code", "is_active", "name")
+
+
+class QueryMeter(BaseCallbackHandler):
+    """Collects LLM time, LLM calls, agent steps and DB time for one query"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.llm_seconds = 0.0
+        self.llm_calls = 0
+        self.agent_steps = 0
+        self.db_seconds = 0.0
+        self.db_checkouts = 0
+        self._starts = {}
+
+    def on_chat_model_start(self, serialized, messages, *, run_id, **kwargs):
+        self._starts[run_id] = time.perf_counter()
+
+    def on_llm_start(self, serialized, prompts, *, run_id, **kwargs):
+        self._starts[run_id] = time.perf_counter()
+
+    def on_llm_end(self, response, *, run_id, **kwargs):
+        self._llm_done(run_id)
+
+    def on_llm_error(self, error, *, run_id, **kwargs):
+        self._llm_done(run_id)
+
+    def on_agent_action(self, action, **kwargs):
+        with self.lock:
+            self.agent_steps += 1
+
+    def add_db_time(self, seconds: float):
+        with self.lock:
+            self.db_seconds += seconds
+            self.db_checkouts += 1
+
+    def _llm_done(self, run_id):
+        start = self._starts.pop(run_id, None)
+        if start is not None:
+            with self.lock:
+                self.llm_seconds += time.perf_counter() - start
+                self.llm_calls += 1
+
+
+class PoolTimer:
+    """Attributes the time each connection is checked out of the pool to the current QueryMeter"""
+
+    def __init__(self, db: SQLDatabase):
+        self.meter: Optional[QueryMeter] = None
+        event.listen(db._engine, "checkout", self._checkout)
+        event.listen(db._engine, "checkin", self._checkin)
+
+    def _checkout(self, dbapi_connection, connection_record, connection_proxy):
+        connection_record.info["bench_checkout"] = time.perf_counter()
+
+    def _checkin(self, dbapi_connection, connection_record):
+        start = connection_record.info.pop("bench_checkout", None)
+        if start is not None and self.meter is not None:
+            self.meter.add_db_time(time.perf_counter() - start)
+
+
+def make_cases(db_info: dict, n_questions: int, seed: int = 0) -> Dict[str, Dict[str, Any]]:
+    """
+    Generate benchmark questions with their SQL and tables.
+
+    Even questions count the rows of one table per category; odd questions
+    join a table to the one its foreign key references.
+
+    Returns:
+        Dict of question -> {"sql": ..., "tables": [...]}
+    """
+    rng = random.Random(seed)
+    tables = list(db_info["tables"])
+    relationships = db_info["relationships"]
+    cases = {}
+    for i in range(n_questions):
+        if i % 2 == 0 or not relationships:
+            table = rng.choice(tables)
+            columns = [c["name"] for c in db_info["tables"][table]["columns"]]
+            group = next((c for c in _GROUP_COLUMNS if c in columns), "id")
+            question = f"How many {table.replace('_', ' ')} records are there per {group}?"
+            sql = f"SELECT {group}, COUNT(*) AS n FROM {table} GROUP BY {group} ORDER BY n DESC LIMIT 10"
+            cases[question] = {"sql": sql, "tables": [table]}
+        else:
+            rel = rng.choice(relationships)
+            child, parent, column = rel["table"], rel["references_table"], rel["columns"][0]
+            question = f"List {child.replace('_', ' ')} records with their {parent.replace('_', ' ')}."
+            sql = (f"SELECT c.id, p.id AS parent_id FROM {child} c JOIN {parent} p "
+                   f"ON c.{column} = p.id ORDER BY c.id LIMIT 10")
+            cases[question] = {"sql": sql, "tables": [child, parent]}
+    return cases
+
+
+def make_model(args, cases: Dict[str, Dict[str, Any]]):
+    """Return (model, source) for the --llm option"""
+    source = args.llm
+    if source == "auto":
+        source = "replay" if os.path.exists(args.recording) else "scripted"
+    if source == "scripted":
+        return ScriptedChatModel(queries=cases), source
+    if source == "replay":
+        return ReplayChatModel.load(args.recording, latency_scale=args.latency_scale), source
+
+    from langchain_openai import ChatOpenAI
+    load_dotenv()
+    real_model = ChatOpenAI(temperature=0, model=os.environ["OPENAI_MODEL"], api_key=os.environ["OPENAI_API_KEY"])
+    return ReplayChatModel.load(args.recording, model=real_model), source
+
+
+def summarize(values: List[float]) -> Dict[str, float]:
+    """Mean and percentiles of a list of seconds"""
+    ordered = sorted(values)
+    stats = {"mean": sum(ordered) / len(ordered) if ordered else 0.0}
+    for p in PERCENTILES:
+        stats[f"p{p}"] = percentile(ordered, p)
+    return stats
+
+
+def bench_queries(agent: Txt2SqlAgent, timer: PoolTimer, questions: List[str], mode: str, warmup: int) -> Dict[str, Any]:
+    """Run every question through query() and aggregate latency and its LLM/DB split"""
+    for question in questions[:warmup]:
+        agent.query(question, mode=mode)
+
+    latencies, llm, db, other = [], [], [], []
+    llm_calls = agent_steps = db_checkouts = failed = 0
+    errors = []
+    for question in questions:
+        meter = QueryMeter()
+        timer.meter = meter
+        start = time.perf_counter()
+        result = agent.query(question, mode=mode, config={"callbacks": [meter]})
+        elapsed = time.perf_counter() - start
+        timer.meter = None
+
+        latencies.append(elapsed)
+        llm.append(meter.llm_seconds)
+        db.append(meter.db_seconds)
+        other.append(max(elapsed - meter.llm_seconds - meter.db_seconds, 0.0))
+        llm_calls += meter.llm_calls
+        agent_steps += meter.agent_steps
+        db_checkouts += meter.db_checkouts
+        if not result["success"]:
+            failed += 1
+            errors.append(result["error"])
+
+    n = len(questions)
+    return {
+        "questions": n,
+        "failed": failed,
+        "errors": errors[:5],
+        "latency": summarize(latencies),
+        "llm_seconds": summarize(llm),
+        "db_seconds": summarize(db),
+        "other_seconds": summarize(other),
+        "llm_calls": llm_calls / n,
+        "agent_steps": agent_steps / n,
+        "db_checkouts": db_checkouts / n,
+    }
+
+
+def best_of(fn, repeat: int) -> tuple:
+    """Run fn repeat times and return (best seconds, last result)"""
+    timings = []
+    result = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = fn()
+        timings.append(time.perf_counter() - start)
+    return min(timings), result
+
+
+def bench_fetch(db: SQLDatabase, table: str, batch_sizes: List[int], repeat: int) -> List[Dict[str, Any]]:
+    """Time fetch_dataframe over a whole table for each batch size"""
+    results = []
+    for batch_size in batch_sizes:
+        seconds, frame = best_of(lambda: fetch_dataframe(db, f"SELECT * FROM {table}", batch_size=batch_size), repeat)
+        results.append({
+            "batch_size": batch_size,
+            "rows": frame.height,
+            "seconds": seconds,
+            "rows_per_sec": frame.height / seconds if seconds > 0 else 0.0,
+            "mb_per_sec": frame.estimated_size("mb") / seconds if seconds > 0 else 0.0,
+        })
+    return results
+
+
+def bench_db_info(uri_for, table_counts: List[int], repeat: int, seed: int) -> List[Dict[str, Any]]:
+    """Time get_db_info on databases of increasing table counts"""
+    results = []
+    for n_tables in table_counts:
+        db, _ = seed_database(uri_for(n_tables), n_tables, 0, seed, lazy_table_reflection=True)
+        try:
+            seconds, info = best_of(lambda: get_db_info(db), repeat)
+        finally:
+            drop_database(db)
+        results.append({
+            "tables": n_tables,
+            "seconds": seconds,
+            "ms_per_table": seconds * 1000 / max(len(info["tables"]), 1),
+        })
+    return results
+
+
+def git_revision() -> Dict[str, Any]:
+    """Commit of the working tree and whether it has uncommitted changes"""
+    try:
+        commit = subprocess.run(["git", "rev-parse", "HEAD"], capture_output=True, text=True, check=True).stdout.strip()
+        status = subprocess.run(["git", "status", "--porcelain", "--untracked-files=no"],
+                                capture_output=True, text=True, check=True).stdout
+        return {"commit": commit, "dirty": bool(status.strip())}
+    except (OSError, subprocess.CalledProcessError):
+        return {"commit": None, "dirty": None}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--db-uri", default=None, help="Local PostgreSQL URI (default: a temporary SQLite file)")
+    parser.add_argument("--tables", type=int, default=20, help="Tables in the query benchmark database")
+    parser.add_argument("--rows", type=int, default=10000, help="Rows per table")
+    parser.add_argument("--questions", type=int, default=20, help="Questions per mode")
+    parser.add_argument("--modes", nargs="+", default=list(QUERY_MODES), choices=QUERY_MODES, help="Query modes")
+    parser.add_argument("--warmup", type=int, default=2, help="Unmeasured questions run first in each mode")
+    parser.add_argument("--db-info-tables", type=int, nargs="+", default=[10, 100, 500],
+                        help="Table counts for the get_db_info benchmark")
+    parser.add_argument("--fetch-batch-sizes", type=int, nargs="+", default=[100, 1000, 10000],
+                        help="Batch sizes for the fetch benchmark")
+    parser.add_argument("--repeat", type=int, default=3, help="Runs per get_db_info/fetch measurement (best is reported)")
+    parser.add_argument("--llm", choices=["auto", "replay", "record", "scripted"], default="auto",
+                        help="Chat model: replay a recording, record one, or the scripted model")
+    parser.add_argument("--recording", default=DEFAULT_RECORDING, help="Recorded LLM replies")
+    parser.add_argument("--latency-scale", type=float, default=0.0,
+                        help="When replaying, sleep this fraction of each reply's recorded latency")
+    parser.add_argument("--seed", type=int, default=0, help="Seed of the schema, data and questions")
+    parser.add_argument("--out", default=None, help="JSON results file (default: bench_e2e-<commit>.json)")
+    args = parser.parse_args()
+
+    revision = git_revision()
+    out = args.out or f"bench_e2e-{(revision['commit'] or 'local')[:12]}.json"
+
+    with tempfile.TemporaryDirectory() as directory:
+        def uri_for(n_tables: int) -> str:
+            return args.db_uri or f"sqlite:///{os.path.join(directory, f'bench_{n_tables}.db')}"
+
+        print(f"Seeding {args.tables} tables x {args.rows} rows...")
+        db, db_info = seed_database(uri_for(args.tables), args.tables, args.rows, args.seed,
+                                    lazy_table_reflection=True)
+        cases = make_cases(db_info, args.questions, args.seed)
+        model, source = make_model(args, cases)
+        timer = PoolTimer(db)
+        agent = Txt2SqlAgent(db, model, mode=args.modes[0])
+        questions = list(cases)
+
+        results = {
+            "meta": dict(
+                revision,
+                timestamp=datetime.now(timezone.utc).isoformat(timespec="seconds"),
+                python=platform.python_version(),
+                platform=platform.platform(),
+                dialect=db.dialect,
+                llm=source,
+                args=vars(args),
+            ),
+            "query": {},
+        }
+        try:
+            for mode in args.modes:
+                print(f"query() in {mode} mode...")
+                results["query"][mode] = bench_queries(agent, timer, questions, mode, args.warmup)
+            print("fetch_dataframe...")
+            results["fetch"] = bench_fetch(db, next(iter(db_info["tables"])), args.fetch_batch_sizes, args.repeat)
+        finally:
+            if source == "record":
+                model.save(args.recording)
+                print(f"Recorded {model.misses} new replies to {args.recording}")
+            drop_database(db)
+
+        print("get_db_info...")
+        results["get_db_info"] = bench_db_info(uri_for, args.db_info_tables, args.repeat, args.seed)
+
+    with open(out, "w", encoding="utf-8") as f:
+        json.dump(results, f, indent=2)
+
+    for mode, stats in results["query"].items():
+        print(f"{mode:>8}: p50 {stats['latency']['p50'] * 1000:8.1f} ms  p95 {stats['latency']['p95'] * 1000:8.1f} ms  "
+              f"llm {stats['llm_seconds']['mean'] * 1000:7.1f} ms  db {stats['db_seconds']['mean'] * 1000:7.1f} ms  "
+              f"steps {stats['agent_steps']:4.1f}  failed {stats['failed']}")
+    for row in results["fetch"]:
+        print(f"fetch batch {row['batch_size']:6d}: {row['rows_per_sec']:12,.0f} rows/s  {row['mb_per_sec']:8.1f} MB/s")
+    for row in results["get_db_info"]:
+        print(f"get_db_info {row['tables']:5d} tables: {row['seconds'] * 1000:9.1f} ms")
+    print(f"Results written to {out}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,205 @@
+"""
+Measure what few-shot examples save, and how fast the example store is.
+
+Runs the bench_e2e question set over a seeded SQLite database with the
+scripted model, asking every question twice: first as generated, later
+rephrased. For --mistake-rate of the questions the model's first query names
+a column that does not exist (see bench_validation). The scripted model
+treats a few-shot example that queries all of a question's tables as that
+schema: the agent skips the schema lookup and makes no mistake.
+
+Every question is answered in agent and direct mode with:
+
+    off:      no example store
+    curated:  a store seeded with curated examples for --curated-share of the
+              tables, which query the same tables as the questions with
+              different SQL
+    learned:  the curated store, plus the SQL of every successful answer, so
+              the rephrased questions find their first form
+
+and the run reports LLM calls, agent steps, database errors and failures per
+configuration. It then fills a store with --store-size synthetic questions
+and reports add and search latency percentiles.
+
+Usage:
+    python -m benchmarks.bench_examples --questions 40 --mistake-rate 0.5
+    python -m benchmarks.bench_examples --store-size 100000
+"""
+
+import argparse
+import json
+import os
+import random
+import tempfile
+import time
+from typing import Any, Dict, List, Tuple
+from sqlalchemy import event
+from benchmarks.bench_e2e import QueryMeter, make_cases
+from benchmarks.bench_validation import StatementCounter, make_mistakes
+from benchmarks.local_db import seed_database
+from benchmarks.replay_model import ScriptedChatModel
+from src.batch_runner import PERCENTILES, percentile
+from src.example_store import ExampleStore
+from src.schema_cache import SchemaCache
+from src.txt2sql_agent import Txt2SqlAgent
+
+# Templates of the synthetic questions used for the latency measurement.
+_SYNTHETIC_TEMPLATES = (
+    "How many {table} have {column} above {number}?",
+    "What is the average {column} of {table} by {other}?",
+    "List the top {number} {table} by {column}",
+    "Show {table} where {column} is {value} in {year}",
+    "Total {column} per {other} for {table} in the last {number} days",
+    "Which {other} has the highest {column} among {table}?",
+)
+_SYNTHETIC_VALUES = ("active", "pending", "closed", "germany", "france", "premium", "basic")
+
+
+def rephrase(question: str) -> str:
+    """Second wording of a make_cases question"""
+    if question.startswith("How many "):
+        table, group = question[len("How many "):-1].split(" records are there per ")
+        return f"Count the {table} records for each {group}."
+    child, parent = question[len("List "):-1].split(" records with their ")
+    return f"Show every {child} record together with its {parent}."
+
+
+def curated_examples(cases: Dict[str, Dict[str, Any]], db_info: dict, share: float, seed: int) -> List[Dict[str, str]]:
+    """Examples over the tables of a share of the questions, with different SQL than theirs"""
+    rng = random.Random(seed)
+    references = {(rel["table"], rel["references_table"]): rel["columns"][0] for rel in db_info["relationships"]}
+    examples = []
+    for case in cases.values():
+        if rng.random() >= share:
+            continue
+        if len(case["tables"]) == 1:
+            table = case["tables"][0]
+            examples.append({"question": f"How many {table.replace('_', ' ')} records are there in total?",
+                             "sql": f"SELECT COUNT(*) FROM {table}"})
+        else:
+            child, parent = case["tables"]
+            examples.append({
+                "question": f"How many {child.replace('_', ' ')} records have a {parent.replace('_', ' ')}?",
+                "sql": f"SELECT COUNT(*) FROM {child} c JOIN {parent} p ON c.{references[(child, parent)]} = p.id"
+            })
+    return examples
+
+
+def run(db, db_info: dict, cases, mistakes, questions: List[str], examples: List[Dict[str, str]],
+        mode: str, config: str, directory: str) -> Dict[str, Any]:
+    """Answer the questions once and total the model and database work"""
+    model = ScriptedChatModel(queries=cases, mistakes=mistakes)
+    schema_cache = SchemaCache(db, path=os.path.join(directory, f"schema-{mode}-{config}.json"))
+    store = None
+    if config != "off":
+        store = ExampleStore(":memory:")
+        for example in examples:
+            store.add(example["question"], example["sql"], source="curated")
+    agent = Txt2SqlAgent(db, model, mode=mode, schema_cache=schema_cache, example_store=store,
+                         learn_examples=config == "learned")
+    # Read the schema outside the measurement, the same way for every configuration.
+    schema_cache.get_db_info()
+    schema_cache.get_table_info(list(db_info["tables"]))
+    agent.check_sql("SELECT 1")
+    counter = StatementCounter(db._engine)
+
+    totals = {"questions": len(questions), "failed": 0, "llm_calls": 0, "agent_steps": 0, "with_examples": 0}
+    for question in questions:
+        totals["with_examples"] += bool(agent.similar_examples(question))
+        meter = QueryMeter()
+        result = agent.query(question, config={"callbacks": [meter]})
+        totals["llm_calls"] += meter.llm_calls
+        totals["agent_steps"] += meter.agent_steps
+        totals["failed"] += not result["success"]
+    totals.update(counter.take())
+    event.remove(db._engine, "before_cursor_execute", counter._execute)
+    event.remove(db._engine, "handle_error", counter._error)
+    return totals
+
+
+def store_latency(db_info: dict, size: int, searches: int, seed: int) -> Dict[str, Any]:
+    """Add and search latency of a store filled with synthetic questions"""
+    rng = random.Random(seed)
+    tables = [table.replace("_", " ") for table in db_info["tables"]]
+    columns = sorted({c["name"].replace("_", " ") for info in db_info["tables"].values() for c in info["columns"]})
+
+    def question() -> str:
+        return rng.choice(_SYNTHETIC_TEMPLATES).format(
+            table=rng.choice(tables), column=rng.choice(columns), other=rng.choice(columns),
+            number=rng.randint(1, 500), value=rng.choice(_SYNTHETIC_VALUES), year=rng.randint(2015, 2025)
+        )
+
+    store = ExampleStore(":memory:", max_examples=size)
+    add_times = []
+    for i in range(size):
+        start = time.perf_counter()
+        store.add(question(), f"SELECT {i}")
+        add_times.append(time.perf_counter() - start)
+    search_times, hits = [], 0
+    for _ in range(searches):
+        text = question()
+        start = time.perf_counter()
+        hits += bool(store.search(text))
+        search_times.append(time.perf_counter() - start)
+    add_times.sort()
+    search_times.sort()
+    return {
+        "examples": len(store),
+        "add": {f"p{p}": percentile(add_times, p) for p in PERCENTILES},
+        "search": {f"p{p}": percentile(search_times, p) for p in PERCENTILES},
+        "search_hit_rate": hits / searches,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--questions", type=int, default=40, help="Benchmark questions (each asked twice)")
+    parser.add_argument("--mistake-rate", type=float, default=0.5, help="Share of questions with a wrong first query")
+    parser.add_argument("--curated-share", type=float, default=0.5, help="Share of questions with a curated example")
+    parser.add_argument("--tables", type=int, default=20, help="Tables in the seeded database")
+    parser.add_argument("--store-size", type=int, default=100000, help="Synthetic examples for the latency run")
+    parser.add_argument("--searches", type=int, default=2000, help="Searches timed in the latency run")
+    parser.add_argument("--seed", type=int, default=0, help="Seed of the schema, questions and mistakes")
+    parser.add_argument("--out", default=None, help="Optional JSON results file")
+    args = parser.parse_args()
+
+    results = {}
+    with tempfile.TemporaryDirectory() as directory:
+        db, db_info = seed_database(f"sqlite:///{os.path.join(directory, 'examples.db')}", args.tables, 100, args.seed)
+        cases = make_cases(db_info, args.questions, args.seed)
+        rephrased = {rephrase(question): case for question, case in cases.items()}
+        questions = list(cases) + list(rephrased)
+        cases = dict(cases, **rephrased)
+        mistakes = make_mistakes(cases, db_info, args.mistake_rate, args.seed)
+        examples = curated_examples(cases, db_info, args.curated_share, args.seed)
+        print(f"{len(questions)} questions, {len(mistakes)} with an invented column in the first query, "
+              f"{len(examples)} curated examples")
+        print(f"{'mode':<7} {'examples':<9} {'with_examples':>13} {'llm_calls':>9} {'agent_steps':>11} "
+              f"{'db_errors':>9} {'failed':>6}")
+        for mode in ("agent", "direct"):
+            for config in ("off", "curated", "learned"):
+                totals = run(db, db_info, cases, mistakes, questions, examples, mode, config, directory)
+                results[f"{mode}.{config}"] = totals
+                print(f"{mode:<7} {config:<9} {totals['with_examples']:>13} {totals['llm_calls']:>9} "
+                      f"{totals['agent_steps']:>11} {totals['db_errors']:>9} {totals['failed']:>6}")
+
+        if args.store_size > 0:
+            latency = store_latency(db_info, args.store_size, args.searches, args.seed)
+            results["store"] = latency
+            print(f"store of {latency['examples']} examples, search hit rate {latency['search_hit_rate']:.0%}")
+            for name in ("add", "search"):
+                print(f"{name + ':':<8}" + ", ".join(f"{p} {seconds * 1000:.3f} ms"
+                                                    for p, seconds in latency[name].items()))
+
+    for mode in ("agent", "direct"):
+        off, learned = results[f"{mode}.off"], results[f"{mode}.learned"]
+        print(f"{mode}: examples saved {off['llm_calls'] - learned['llm_calls']} LLM calls, "
+              f"{off['agent_steps'] - learned['agent_steps']} agent steps and "
+              f"{off['db_errors'] - learned['db_errors']} failed statements over {len(questions)} questions")
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
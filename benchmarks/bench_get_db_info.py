@@ -0,0 +1,112 @@
+"""
+Benchmark bulk pg_catalog introspection against the per-table inspector.
+
+Creates a scratch schema with N synthetic tables (columns, a secondary index and
+a foreign key each), then times ``get_db_info`` (bulk catalog queries) and the
+legacy inspector implementation on the same schema and checks they agree.
+Column types are compared after reflecting the catalog's ``format_type()``
+spelling to the SQLAlchemy type the inspector reports.
+
+Usage:
+    python -m benchmarks.bench_get_db_info --tables 500
+"""
+
+import argparse
+import os
+import time
+from dotenv import load_dotenv
+from sqlalchemy import text
+from langchain_community.utilities import SQLDatabase
+from src.db_utils import get_db_info, _get_db_info_inspector
+
+SCHEMA = "txt2sql_bench"
+
+
+def get_bench_uri() -> str:
+    """Return the benchmark database URI from BENCH_DB_URI or the regular DB_* settings"""
+    load_dotenv()
+    if os.getenv("BENCH_DB_URI"):
+        return os.getenv("BENCH_DB_URI")
+    return (f"postgresql://{os.getenv('DB_USER')}:{os.getenv('DB_PASSWORD')}"
+            f"@{os.getenv('DB_HOST')}:{os.getenv('DB_PORT')}/{os.getenv('DB_NAME')}")
+
+
+def create_schema(db: SQLDatabase, n_tables: int):
+    """Create N synthetic tables in the scratch schema"""
+    with db._engine.begin() as conn:
+        conn.execute(text(f"DROP SCHEMA IF EXISTS {SCHEMA} CASCADE"))
+        conn.execute(text(f"CREATE SCHEMA {SCHEMA}"))
+        for i in range(n_tables):
+            parent = f", parent_id integer REFERENCES {SCHEMA}.t{i - 1}(id)" if i else ""
+            conn.execute(text(
+                f"CREATE TABLE {SCHEMA}.t{i} ("
+                f"id serial PRIMARY KEY, name varchar(64) NOT NULL, "
+                f"amount numeric(12, 2) DEFAULT 0, created_at timestamp{parent})"
+            ))
+            conn.execute(text(f"CREATE INDEX t{i}_name_idx ON {SCHEMA}.t{i} (name, created_at)"))
+
+
+def drop_schema(db: SQLDatabase):
+    """Remove the scratch schema"""
+    with db._engine.begin() as conn:
+        conn.execute(text(f"DROP SCHEMA IF EXISTS {SCHEMA} CASCADE"))
+
+
+def best_of(fn, repeat: int) -> tuple:
+    """Run fn repeat times and return (best seconds, last result)"""
+    timings = []
+    result = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = fn()
+        timings.append(time.perf_counter() - start)
+    return min(timings), result
+
+
+def inspector_type(db: SQLDatabase, column_type: str) -> str:
+    """The inspector's spelling of a format_type() column type, e.g. VARCHAR(64) for character varying(64)"""
+    return str(db._engine.dialect._reflect_type(column_type, {}, {}, type_description=column_type))
+
+
+def summarize(db_info: dict, column_type=str) -> dict:
+    """Reduce get_db_info output to what both implementations must agree on"""
+    return {
+        "tables": {
+            name: ([(c["name"], column_type(c["type"])) for c in t["columns"]], t["primary_keys"],
+                   sorted(i["name"] for i in t["indexes"]))
+            for name, t in db_info["tables"].items()
+        },
+        "relationships": sorted((r["table"], r["references_table"], tuple(r["columns"])) for r in db_info["relationships"]),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--tables", type=int, default=500, help="Number of synthetic tables")
+    parser.add_argument("--repeat", type=int, default=3, help="Runs per implementation (best is reported)")
+    parser.add_argument("--keep", action="store_true", help="Keep the scratch schema afterwards")
+    args = parser.parse_args()
+
+    db = SQLDatabase.from_uri(get_bench_uri(), lazy_table_reflection=True)
+    if db.dialect != "postgresql":
+        raise SystemExit("This benchmark needs a PostgreSQL database")
+
+    print(f"Creating {args.tables} tables in schema {SCHEMA}...")
+    create_schema(db, args.tables)
+    try:
+        bulk_time, bulk_info = best_of(lambda: get_db_info(db, schemas=[SCHEMA]), args.repeat)
+        legacy_time, legacy_info = best_of(lambda: _get_db_info_inspector(db, schemas=[SCHEMA]), args.repeat)
+
+        print(f"tables:               {len(bulk_info['tables'])}")
+        print(f"inspector (per-table): {legacy_time:8.3f}s")
+        print(f"pg_catalog (bulk):     {bulk_time:8.3f}s")
+        print(f"speedup:               {legacy_time / bulk_time:8.1f}x")
+        bulk_summary = summarize(bulk_info, lambda column_type: inspector_type(db, column_type))
+        print(f"results match:         {bulk_summary == summarize(legacy_info)}")
+    finally:
+        if not args.keep:
+            drop_schema(db)
+
+
+if __name__ == "__main__":
+    main()
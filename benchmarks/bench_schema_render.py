@@ -0,0 +1,94 @@
+"""
+Measure the schema text sent to the model: tokens and render time vs schema size.
+
+For every size in --tables, seeds a SQLite database with that many synthetic
+tables and renders the whole schema three ways:
+
+    table_info:  SQLDatabase.get_table_info, what the agent's schema tool
+                 returns without a renderer (DDL and three sample rows)
+    compact:     SchemaRenderer without a budget (compact DDL, sample rows)
+    no_samples:  SchemaRenderer without a budget or sample rows
+    budgeted:    SchemaRenderer within --budget tokens
+
+reporting tokens (estimate_tokens) and render time. The renderer is timed
+cold (reading sample rows) and warm (memoized tables), and the budgeted
+rendering reports how far it had to degrade.
+
+Usage:
+    python -m benchmarks.bench_schema_render --tables 10 50 200 1000 --budget 4000
+"""
+
+import argparse
+import json
+import os
+import tempfile
+import time
+from typing import Any, Dict
+from benchmarks.local_db import seed_database
+from src.schema_renderer import SchemaRenderer, estimate_tokens
+
+# A budget no schema of the benchmark reaches.
+_UNLIMITED = 10 ** 9
+
+
+def measure(n_tables: int, rows: int, budget: int, repeat: int, directory: str) -> Dict[str, Any]:
+    """Tokens and render times of one schema size"""
+    db, db_info = seed_database(f"sqlite:///{os.path.join(directory, f'schema_{n_tables}.db')}", n_tables, rows)
+    tables = list(db_info["tables"])
+    result = {"tables": n_tables}
+
+    start = time.perf_counter()
+    table_info = db.get_table_info(tables)
+    result["table_info"] = {"tokens": estimate_tokens(table_info), "seconds": time.perf_counter() - start}
+
+    renderer = SchemaRenderer(db, token_budget=_UNLIMITED)
+    start = time.perf_counter()
+    compact = renderer.render(tables)
+    cold = time.perf_counter() - start
+    start = time.perf_counter()
+    for _ in range(repeat):
+        renderer.render(tables)
+    result["compact"] = {"tokens": estimate_tokens(compact), "cold_seconds": cold,
+                         "seconds": (time.perf_counter() - start) / repeat}
+    no_samples = SchemaRenderer(db, token_budget=_UNLIMITED, sample_rows=0).render(tables)
+    result["no_samples"] = {"tokens": estimate_tokens(no_samples)}
+
+    before = renderer.stats()["levels"]
+    start = time.perf_counter()
+    for _ in range(repeat):
+        budgeted = renderer.render(tables, "total amount per status", token_budget=budget)
+    seconds = (time.perf_counter() - start) / repeat
+    levels = {name: count - before[name] for name, count in renderer.stats()["levels"].items()}
+    result["budgeted"] = {"tokens": estimate_tokens(budgeted), "seconds": seconds, "level": max(levels, key=levels.get)}
+    db._engine.dispose()
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--tables", type=int, nargs="+", default=[10, 50, 200, 1000], help="Schema sizes")
+    parser.add_argument("--rows", type=int, default=20, help="Rows per table")
+    parser.add_argument("--budget", type=int, default=4000, help="Token budget of the budgeted rendering")
+    parser.add_argument("--repeat", type=int, default=20, help="Warm renders timed per size")
+    parser.add_argument("--out", default=None, help="Optional JSON results file")
+    args = parser.parse_args()
+
+    results = []
+    print(f"{'tables':>6} {'table_info':>19} {'compact':>19} {'cold':>9} {'no_samples':>10} {'budgeted':>19} {'level':<15}")
+    with tempfile.TemporaryDirectory() as directory:
+        for n_tables in args.tables:
+            result = measure(n_tables, args.rows, args.budget, args.repeat, directory)
+            results.append(result)
+            info, compact, budgeted = result["table_info"], result["compact"], result["budgeted"]
+            print(f"{n_tables:>6} {info['tokens']:>8} / {info['seconds'] * 1000:>6.1f} ms "
+                  f"{compact['tokens']:>8} / {compact['seconds'] * 1000:>6.2f} ms "
+                  f"{compact['cold_seconds'] * 1000:>6.1f} ms {result['no_samples']['tokens']:>10} "
+                  f"{budgeted['tokens']:>8} / {budgeted['seconds'] * 1000:>6.2f} ms {budgeted['level']:<15}")
+    print("(tokens / render time; cold is the renderer's first render, which reads the sample rows)")
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,145 @@
+"""
+Load-test the HTTP query service locally.
+
+Starts the service (src.query_service) in-process on a free port, over a
+seeded SQLite database and a scripted chat model that sleeps a fixed latency
+per call, then lets --clients threads post questions over keep-alive
+connections for --duration seconds. A share of the requests (--stream-share)
+asks for the streamed response and reads it to the end.
+
+Reports sustained requests/sec (successful answers per second), latency
+percentiles of successful answers, the responses by status (429 when the
+pool pushed back, 504 when a deadline passed) and the pool counters. Raise
+--clients above --workers + --max-queue to see backpressure.
+
+Usage:
+    python -m benchmarks.bench_service --clients 32 --workers 8 --max-queue 16 --duration 10
+"""
+
+import argparse
+import http.client
+import json
+import os
+import random
+import tempfile
+import threading
+import time
+from collections import Counter
+from typing import Any, Dict, List, Optional, Tuple
+from benchmarks.bench_concurrency import CountingScriptedModel
+from benchmarks.local_db import seed_database
+from src.batch_runner import PERCENTILES, percentile
+from src.query_service import QueryService
+from src.schema_cache import SchemaCache
+from src.txt2sql_agent import Txt2SqlAgent
+
+
+def post(conn: http.client.HTTPConnection, path: str, body: Dict[str, Any]) -> Tuple[int, Optional[str]]:
+    """Post a JSON body, read the whole response and return its status and Retry-After header"""
+    conn.request("POST", path, json.dumps(body), {"Content-Type": "application/json"})
+    response = conn.getresponse()
+    response.read()
+    return response.status, response.getheader("Retry-After")
+
+
+def client(port: int, questions: List[str], args: argparse.Namespace, stop_at: float,
+           seed: int, statuses: Counter, latencies: List[float], lock: threading.Lock):
+    """Post questions until stop_at, recording every status and successful latency"""
+    rng = random.Random(seed)
+    conn = http.client.HTTPConnection("127.0.0.1", port, timeout=args.timeout + 10)
+    while time.monotonic() < stop_at:
+        body = {"question": rng.choice(questions), "mode": args.mode, "timeout": args.timeout}
+        if rng.random() < args.stream_share:
+            body["stream"] = True
+        start = time.perf_counter()
+        retry_after = None
+        try:
+            status, retry_after = post(conn, "/query", body)
+        except (OSError, http.client.HTTPException):
+            conn.close()
+            conn = http.client.HTTPConnection("127.0.0.1", port, timeout=args.timeout + 10)
+            status = 0
+        elapsed = time.perf_counter() - start
+        with lock:
+            statuses[status] += 1
+            if status == 200:
+                latencies.append(elapsed)
+        if status == 429:
+            backoff = args.backoff if args.backoff is not None else float(retry_after or 1)
+            # Jitter keeps rejected clients from retrying in lockstep.
+            time.sleep(backoff * rng.uniform(0.5, 1.5))
+    conn.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--clients", type=int, default=32, help="Concurrent client threads")
+    parser.add_argument("--duration", type=float, default=10.0, help="Seconds of load")
+    parser.add_argument("--workers", type=int, default=8, help="Service worker threads")
+    parser.add_argument("--max-queue", type=int, default=16, help="Requests queued before 429")
+    parser.add_argument("--timeout", type=float, default=10.0, help="Deadline of every request in seconds")
+    parser.add_argument("--latency", type=float, default=0.05, help="Simulated seconds per LLM call")
+    parser.add_argument("--mode", choices=["agent", "direct"], default="direct", help="Query mode")
+    parser.add_argument("--questions", type=int, default=50, help="Distinct questions (one per table)")
+    parser.add_argument("--stream-share", type=float, default=0.25, help="Share of requests that stream")
+    parser.add_argument("--backoff", type=float, default=None,
+                        help="Client pause after a 429 in seconds (default: the Retry-After header)")
+    parser.add_argument("--out", default=None, help="Optional JSON results file")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        db, db_info = seed_database(f"sqlite:///{os.path.join(directory, 'service.db')}", args.questions, 100)
+        cases = {
+            f"How many rows does {table} have?": {"sql": f"SELECT COUNT(*) FROM {table}", "tables": [table]}
+            for table in db_info["tables"]
+        }
+        model = CountingScriptedModel(queries=cases, latency=args.latency)
+        # Like serve.py, serve table DDL from the schema cache rather than reflecting it per request.
+        schema_cache = SchemaCache(db, path=os.path.join(directory, "schema.json"))
+        agent = Txt2SqlAgent(db, model, mode=args.mode, schema_cache=schema_cache)
+        service = QueryService(agent, workers=args.workers, max_queue=args.max_queue, timeout=args.timeout)
+        server = service.make_server("127.0.0.1", 0)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        port = server.server_address[1]
+
+        statuses, latencies, lock = Counter(), [], threading.Lock()
+        questions = list(cases)
+        stop_at = time.monotonic() + args.duration
+        start = time.perf_counter()
+        clients = [
+            threading.Thread(target=client, args=(port, questions, args, stop_at, seed, statuses, latencies, lock))
+            for seed in range(args.clients)
+        ]
+        for thread in clients:
+            thread.start()
+        for thread in clients:
+            thread.join()
+        elapsed = time.perf_counter() - start
+        server.shutdown()
+        server.server_close()
+        service.pool.shutdown()
+
+    ordered = sorted(latencies)
+    results = {
+        "seconds": elapsed,
+        "requests": sum(statuses.values()),
+        "requests_per_sec": statuses[200] / elapsed,
+        "statuses": {str(status): count for status, count in sorted(statuses.items())},
+        "latency": {f"p{p}": percentile(ordered, p) for p in PERCENTILES},
+        "llm_calls": model.take_calls(),
+        "pool": service.pool.stats(),
+    }
+
+    print(f"{results['requests']} requests in {elapsed:.1f} s with {args.clients} clients, "
+          f"{args.workers} workers, queue {args.max_queue}")
+    print(f"sustained:  {results['requests_per_sec']:.1f} answered requests/sec")
+    print("statuses:   " + ", ".join(f"{status}: {count}" for status, count in results["statuses"].items()))
+    print("latency:    " + ", ".join(f"{name} {seconds * 1000:.0f} ms" for name, seconds in results["latency"].items()))
+    print(f"LLM calls:  {results['llm_calls']}")
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
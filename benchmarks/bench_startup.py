@@ -0,0 +1,151 @@
+"""
+Benchmark CLI cold start against a time budget.
+
+Every measurement runs in a fresh interpreter:
+
+    interpreter: python -c pass, the floor nothing can go below
+    import:      process start until import main (the CLI's module-level
+                 imports) is done
+    ready:       process start until the CLI would show its prompt: imports,
+                 connecting to the database, warming the pool and creating
+                 the caches, against a seeded SQLite file
+    first query: building the agent (importing the agent framework) and
+                 answering one direct-mode question with the scripted model
+
+The first run starts without a schema snapshot; later runs load the snapshot
+it persisted, like a restarted worker. The slowest imports of main are listed
+from ``python -X importtime``. The exit status is 1 when the median time to
+ready exceeds --budget-ms.
+
+Usage:
+    python -m benchmarks.bench_startup --repeat 5 --budget-ms 1000
+"""
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from typing import Dict, List, Tuple
+from benchmarks.local_db import seed_database
+
+# Runs in the child process; prints one JSON line of wall-clock timestamps.
+STARTUP_SCRIPT = """
+import json, sys, time
+import main
+imported = time.time()
+db = main.create_database(sys.argv[1], lazy_table_reflection=True)
+main.test_connection(db)
+main.warm_up_pool(db)
+schema_cache = main.create_schema_cache(db)
+translation_cache = main.create_translation_cache()
+result_cache = main.create_result_cache(db)
+metrics = main.create_metrics()
+ready = time.time()
+
+from benchmarks.replay_model import ScriptedChatModel
+from src.txt2sql_agent import Txt2SqlAgent
+cases = json.loads(sys.argv[2])
+agent = Txt2SqlAgent(db, ScriptedChatModel(queries=cases), schema_cache=schema_cache,
+                     result_cache=result_cache, metrics=metrics, mode="direct")
+result = agent.query(next(iter(cases)))
+print(json.dumps({"imported": imported, "ready": ready, "done": time.time(), "success": result["success"]}))
+"""
+
+
+def run_python(args: List[str], env: Dict[str, str]) -> Tuple[float, float, str]:
+    """Run a fresh interpreter and return (launch timestamp, wall seconds, stdout)"""
+    launched = time.time()
+    start = time.perf_counter()
+    completed = subprocess.run([sys.executable] + args, capture_output=True, text=True, env=env, check=True)
+    return launched, time.perf_counter() - start, completed.stdout
+
+
+def slowest_imports(env: Dict[str, str], top: int) -> List[Tuple[str, float]]:
+    """Cumulative time of main's direct imports, slowest first"""
+    completed = subprocess.run([sys.executable, "-X", "importtime", "-c", "import main"],
+                               capture_output=True, text=True, env=env, check=True)
+    imports = []
+    for line in completed.stderr.splitlines():
+        if not line.startswith("import time:") or "|" not in line:
+            continue
+        _, cumulative, name = line.split("|", 2)
+        depth = (len(name) - len(name.lstrip()) - 1) // 2
+        if depth == 1 and cumulative.strip().isdigit():
+            imports.append((name.strip(), int(cumulative) / 1e6))
+    return sorted(imports, key=lambda item: -item[1])[:top]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--repeat", type=int, default=5, help="Fresh processes per measurement")
+    parser.add_argument("--tables", type=int, default=50, help="Tables in the seeded database")
+    parser.add_argument("--budget-ms", type=float, default=1000.0, help="Budget for the median time to ready")
+    parser.add_argument("--top", type=int, default=10, help="Slowest imports of main to list")
+    parser.add_argument("--out", default=None, help="Optional JSON results file")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        uri = f"sqlite:///{os.path.join(directory, 'startup.db')}"
+        _, db_info = seed_database(uri, args.tables, 100)
+        table = next(iter(db_info["tables"]))
+        cases = {f"How many {table} rows are there?": {"sql": f"SELECT COUNT(*) FROM {table}", "tables": [table]}}
+        env = dict(
+            os.environ,
+            PYTHONPATH=os.getcwd(),
+            SCHEMA_CACHE_PATH=os.path.join(directory, "schema.json"),
+            TRANSLATION_CACHE="0",
+        )
+
+        interpreter = [run_python(["-c", "pass"], env)[1] for _ in range(args.repeat)]
+        runs = []
+        for _ in range(args.repeat):
+            launched, _, stdout = run_python(["-c", STARTUP_SCRIPT, uri, json.dumps(cases)], env)
+            stamps = json.loads(stdout.strip().splitlines()[-1])
+            # Measured from the launch, so interpreter start-up is included.
+            runs.append({
+                "import": stamps["imported"] - launched,
+                "ready": stamps["ready"] - launched,
+                "first_query": stamps["done"] - stamps["ready"],
+                "success": stamps["success"],
+            })
+        imports = slowest_imports(env, args.top)
+
+    def median(key: str) -> float:
+        return statistics.median(run[key] for run in runs)
+
+    ready_ms = median("ready") * 1000
+    results = {
+        "interpreter": statistics.median(interpreter),
+        "import": median("import"),
+        "ready": median("ready"),
+        "first_query_cold_snapshot": runs[0]["first_query"],
+        "first_query": median("first_query"),
+        "failed": sum(not run["success"] for run in runs),
+        "budget_ms": args.budget_ms,
+        "slowest_imports": dict(imports),
+    }
+
+    print(f"interpreter start:   {results['interpreter'] * 1000:8.1f} ms")
+    print(f"import main:         {results['import'] * 1000:8.1f} ms")
+    print(f"ready for input:     {ready_ms:8.1f} ms  (budget {args.budget_ms:.0f} ms)")
+    print(f"first query:         {results['first_query'] * 1000:8.1f} ms  "
+          f"({results['first_query_cold_snapshot'] * 1000:.1f} ms without a schema snapshot)")
+    print("slowest imports of main:")
+    for name, seconds in imports:
+        print(f"  {name:<40} {seconds * 1000:8.1f} ms")
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+
+    if ready_ms > args.budget_ms:
+        print(f"FAIL: ready for input took {ready_ms:.0f} ms, over the {args.budget_ms:.0f} ms budget")
+        sys.exit(1)
+    print("OK: within budget")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,87 @@
+"""
+Benchmark relevant-table retrieval on a synthetic wide schema.
+
+Compares a full-schema agent run with a retrieval-pruned one over the same
+simulated tool trajectory:
+
+    full:   sql_db_list_tables -> sql_db_schema -> sql_db_query_checker -> sql_db_query
+    pruned: sql_db_schema -> sql_db_query_checker -> sql_db_query
+            (the relevant tables are named in the system prompt instead)
+
+Every tool observation stays in the agent scratchpad, so the prompt tokens of
+each LLM call are accumulated. The trajectories are fixed, so agent steps are
+not measured here; bench_e2e counts them on real agent runs. Recall reports how often all gold tables are in
+the retrieved set.
+
+Usage:
+    python -m benchmarks.bench_table_retrieval --tables 1000 --k 5
+"""
+
+import argparse
+import statistics
+import time
+from benchmarks.synthetic import make_schema, make_questions, render_ddl, count_tokens
+from src.table_index import TableIndex
+from src.txt2sql_agent import RELEVANT_TABLES_PROMPT, load_system_prompt
+
+# Stand-ins for the checker and query observations; identical in both runs.
+CHECKER_OUTPUT = "SELECT status, SUM(amount) FROM t GROUP BY status LIMIT 10;"
+QUERY_OUTPUT = "[('active', 1234.5), ('closed', 99.0)]"
+
+
+def trajectory_tokens(system: str, question: str, observations: list) -> int:
+    """Total prompt tokens over the LLM calls of a trajectory (one call per step, plus the answer)"""
+    base = count_tokens(system) + count_tokens(question)
+    total = 0
+    scratchpad = 0
+    for observation in observations + [None]:
+        total += base + scratchpad
+        if observation is not None:
+            scratchpad += count_tokens(observation)
+    return total
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--tables", type=int, default=1000, help="Number of synthetic tables")
+    parser.add_argument("--questions", type=int, default=200, help="Number of synthetic questions")
+    parser.add_argument("--k", type=int, default=5, help="Top-k tables to retrieve")
+    args = parser.parse_args()
+
+    db_info, _ = make_schema(args.tables)
+    questions = make_questions(db_info, args.questions)
+
+    start = time.perf_counter()
+    index = TableIndex(db_info)
+    build_time = time.perf_counter() - start
+
+    list_output = ", ".join(sorted(db_info["tables"]))
+    full_tokens, pruned_tokens, latencies = [], [], []
+    hits = 0
+    for question, gold in questions:
+        start = time.perf_counter()
+        tables = index.relevant_tables(question, args.k)
+        latencies.append(time.perf_counter() - start)
+        hits += set(gold) <= set(tables)
+
+        schema_output = render_ddl(db_info, gold)
+        full_tokens.append(trajectory_tokens(
+            load_system_prompt(), question, [list_output, schema_output, CHECKER_OUTPUT, QUERY_OUTPUT]
+        ))
+        pruned_tokens.append(trajectory_tokens(
+            load_system_prompt() + RELEVANT_TABLES_PROMPT.format(tables=", ".join(tables)),
+            question, [schema_output, CHECKER_OUTPUT, QUERY_OUTPUT]
+        ))
+
+    full_mean = statistics.mean(full_tokens)
+    pruned_mean = statistics.mean(pruned_tokens)
+    print(f"tables: {args.tables}  questions: {len(questions)}  k: {args.k}")
+    print(f"index build:             {build_time * 1000:8.1f} ms")
+    print(f"retrieval p50 / max:     {statistics.median(latencies) * 1000:8.3f} / {max(latencies) * 1000:.3f} ms")
+    print(f"recall (all gold tables): {hits / len(questions):8.1%}")
+    print(f"prompt tokens / question: {full_mean:8.0f} full, {pruned_mean:.0f} pruned "
+          f"({1 - pruned_mean / full_mean:.1%} fewer)")
+
+
+if __name__ == "__main__":
+    main()
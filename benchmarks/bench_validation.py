@@ -0,0 +1,138 @@
+"""
+Measure what local schema validation saves when the model invents columns.
+
+Runs the bench_e2e question set over a seeded SQLite database with the
+scripted model. For --mistake-rate of the questions the model's first query
+names a column that does not exist and it only writes the right query after
+seeing an error, like a model that hallucinated a column and corrects
+itself. Every question is answered in agent and direct mode, with schema
+validation off and on, and the run reports per configuration:
+
+    llm_calls:      chat model calls, including the agent's query checker
+    db_statements:  statements sent to the database while answering
+    db_errors:      statements the database rejected
+    fallbacks:      direct-mode answers that fell back to the agent
+
+followed by the LLM calls and database round trips validation saved.
+
+Usage:
+    python -m benchmarks.bench_validation --questions 40 --mistake-rate 0.5
+"""
+
+import argparse
+import json
+import os
+import random
+import tempfile
+import threading
+from typing import Any, Dict
+from sqlalchemy import event
+from benchmarks.bench_e2e import QueryMeter, make_cases
+from benchmarks.local_db import seed_database
+from benchmarks.replay_model import ScriptedChatModel
+from src.schema_cache import SchemaCache
+from src.txt2sql_agent import Txt2SqlAgent
+
+# Plausible names for the invented column; the first one no table of the question has is used.
+_INVENTED_COLUMNS = ("total_revenue", "customer_name", "created_by", "order_total_usd")
+
+
+class StatementCounter:
+    """Counts statements sent to and rejected by the database"""
+
+    def __init__(self, engine):
+        self.lock = threading.Lock()
+        self.statements = 0
+        self.errors = 0
+        event.listen(engine, "before_cursor_execute", self._execute)
+        event.listen(engine, "handle_error", self._error)
+
+    def _execute(self, conn, cursor, statement, parameters, context, executemany):
+        with self.lock:
+            self.statements += 1
+
+    def _error(self, context):
+        with self.lock:
+            self.errors += 1
+
+    def take(self) -> Dict[str, int]:
+        with self.lock:
+            counts = {"db_statements": self.statements, "db_errors": self.errors}
+            self.statements = self.errors = 0
+        return counts
+
+
+def make_mistakes(cases: Dict[str, Dict[str, Any]], db_info: dict, rate: float, seed: int) -> Dict[str, str]:
+    """Wrong first queries for a share of the questions: the right query plus an invented column"""
+    rng = random.Random(seed)
+    mistakes = {}
+    for question, case in cases.items():
+        if rng.random() >= rate:
+            continue
+        columns = {c["name"] for table in case["tables"] for c in db_info["tables"][table]["columns"]}
+        invented = next(name for name in _INVENTED_COLUMNS if name not in columns)
+        mistakes[question] = case["sql"].replace("SELECT ", f"SELECT {invented}, ", 1)
+    return mistakes
+
+
+def run(db, db_info: dict, cases, mistakes, mode: str, validation: bool, directory: str) -> Dict[str, Any]:
+    """Answer every question once and total the model and database work"""
+    model = ScriptedChatModel(queries=cases, mistakes=mistakes)
+    schema_cache = SchemaCache(db, path=os.path.join(directory, f"schema-{mode}-{validation}.json"))
+    agent = Txt2SqlAgent(db, model, mode=mode, schema_cache=schema_cache, schema_validation=validation)
+    # Read the schema outside the measurement, the same way for every configuration.
+    schema_cache.get_db_info()
+    schema_cache.get_table_info(list(db_info["tables"]))
+    agent.check_sql("SELECT 1")
+    counter = StatementCounter(db._engine)
+
+    totals = {"questions": len(cases), "failed": 0, "fallbacks": 0, "llm_calls": 0}
+    for question in cases:
+        meter = QueryMeter()
+        result = agent.query(question, config={"callbacks": [meter]})
+        totals["llm_calls"] += meter.llm_calls
+        totals["failed"] += not result["success"]
+        totals["fallbacks"] += result["path"] == "direct_fallback"
+    totals.update(counter.take())
+    event.remove(db._engine, "before_cursor_execute", counter._execute)
+    event.remove(db._engine, "handle_error", counter._error)
+    return totals
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--questions", type=int, default=40, help="Benchmark questions")
+    parser.add_argument("--mistake-rate", type=float, default=0.5, help="Share of questions with a wrong first query")
+    parser.add_argument("--tables", type=int, default=20, help="Tables in the seeded database")
+    parser.add_argument("--seed", type=int, default=0, help="Seed of the schema, questions and mistakes")
+    parser.add_argument("--out", default=None, help="Optional JSON results file")
+    args = parser.parse_args()
+
+    results = {}
+    with tempfile.TemporaryDirectory() as directory:
+        db, db_info = seed_database(f"sqlite:///{os.path.join(directory, 'validation.db')}", args.tables, 100, args.seed)
+        cases = make_cases(db_info, args.questions, args.seed)
+        mistakes = make_mistakes(cases, db_info, args.mistake_rate, args.seed)
+        print(f"{len(cases)} questions, {len(mistakes)} with an invented column in the first query")
+        print(f"{'mode':<7} {'validation':<11} {'llm_calls':>9} {'db_statements':>13} {'db_errors':>9} "
+              f"{'fallbacks':>9} {'failed':>6}")
+        for mode in ("agent", "direct"):
+            for validation in (False, True):
+                totals = run(db, db_info, cases, mistakes, mode, validation, directory)
+                results[f"{mode}.validation_{'on' if validation else 'off'}"] = totals
+                print(f"{mode:<7} {'on' if validation else 'off':<11} {totals['llm_calls']:>9} "
+                      f"{totals['db_statements']:>13} {totals['db_errors']:>9} {totals['fallbacks']:>9} "
+                      f"{totals['failed']:>6}")
+
+    for mode in ("agent", "direct"):
+        off, on = results[f"{mode}.validation_off"], results[f"{mode}.validation_on"]
+        print(f"{mode}: validation saved {off['llm_calls'] - on['llm_calls']} LLM calls, "
+              f"{off['db_statements'] - on['db_statements']} database statements and "
+              f"{off['db_errors'] - on['db_errors']} failed ones over {len(cases)} questions")
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
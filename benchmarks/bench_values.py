@@ -0,0 +1,164 @@
+"""
+Measure what the column value index saves on questions that name a stored value.
+
+Seeds a SQLite database and asks, for the tables with a status column,
+questions like "How many sales order records have status Pendng?": the
+value is spelled as stored, capitalized, or with a letter missing. The
+scripted model (see replay_model) needs the stored spelling: unless the
+prompt lists the value, the agent first runs a SELECT DISTINCT on the column,
+and direct mode filters on the question's spelling, which matches no rows.
+
+Every question is answered in agent and direct mode with the value index off
+and on, and the run reports LLM calls, agent steps, database statements and
+direct-mode answers that filtered on a wrong literal. It then reports the
+index's build time and search latency percentiles.
+
+Usage:
+    python -m benchmarks.bench_values --questions 40
+    python -m benchmarks.bench_values --tables 200 --rows 2000
+"""
+
+import argparse
+import json
+import os
+import random
+import tempfile
+import time
+from typing import Any, Dict, List
+from sqlalchemy import event
+from benchmarks.bench_e2e import QueryMeter
+from benchmarks.bench_validation import StatementCounter
+from benchmarks.local_db import seed_database
+from benchmarks.replay_model import ScriptedChatModel
+from src.batch_runner import PERCENTILES, percentile
+from src.schema_cache import SchemaCache
+from src.txt2sql_agent import Txt2SqlAgent
+from src.value_index import ColumnValueIndex
+
+_SPELLINGS = ("stored", "capitalized", "typo")
+
+
+def spell(value: str, spelling: str, rng: random.Random) -> str:
+    """The value as the question spells it"""
+    if spelling == "capitalized":
+        return value.capitalize()
+    if spelling == "typo":
+        position = rng.randrange(1, len(value) - 1)
+        return value[:position] + value[position + 1:]
+    return value
+
+
+def make_value_cases(db_info: dict, n_questions: int, seed: int) -> Dict[str, Dict[str, Any]]:
+    """Questions filtering a status column on a value, with the scripted model's SQL"""
+    rng = random.Random(seed)
+    tables = sorted(table for table, info in db_info["tables"].items()
+                    if any(column["name"] == "status" for column in info["columns"]))
+    if not tables:
+        raise ValueError("The seeded schema has no status column; try more --tables")
+    values = ["active", "pending", "closed", "cancelled", "archived"]
+    cases = {}
+    for i in range(n_questions):
+        table, value = tables[i % len(tables)], rng.choice(values)
+        spoken = spell(value, _SPELLINGS[i % len(_SPELLINGS)], rng)
+        question = f"How many {table.replace('_', ' ')} records have status {spoken}?"
+        cases[question] = {
+            "sql": f"SELECT COUNT(*) FROM {table} WHERE status = '{value}'",
+            "tables": [table],
+            "literal": value,
+            "lookup": f"SELECT DISTINCT status FROM {table}",
+            "guess": f"SELECT COUNT(*) FROM {table} WHERE status = '{spoken}'",
+        }
+    return cases
+
+
+def run(db, db_info: dict, cases, mode: str, index: bool, directory: str) -> Dict[str, Any]:
+    """Answer every question once and total the model and database work"""
+    model = ScriptedChatModel(queries=cases)
+    schema_cache = SchemaCache(db, path=os.path.join(directory, f"schema-{mode}-{index}.json"))
+    value_index = ColumnValueIndex(db, schema_cache=schema_cache) if index else None
+    agent = Txt2SqlAgent(db, model, mode=mode, schema_cache=schema_cache, value_index=value_index)
+    # Read the schema and collect the values outside the measurement.
+    schema_cache.get_db_info()
+    schema_cache.get_table_info(list(db_info["tables"]))
+    agent.check_sql("SELECT 1")
+    if value_index is not None:
+        value_index.refresh()
+    counter = StatementCounter(db._engine)
+
+    totals = {"questions": len(cases), "failed": 0, "llm_calls": 0, "agent_steps": 0, "wrong_literal": 0}
+    for question, case in cases.items():
+        meter = QueryMeter()
+        result = agent.query(question, config={"callbacks": [meter]})
+        totals["llm_calls"] += meter.llm_calls
+        totals["agent_steps"] += meter.agent_steps
+        totals["failed"] += not result["success"]
+        totals["wrong_literal"] += result["sql"] is not None and result["sql"] != case["sql"]
+    totals.update(counter.take())
+    event.remove(db._engine, "before_cursor_execute", counter._execute)
+    event.remove(db._engine, "handle_error", counter._error)
+    return totals
+
+
+def index_latency(db, questions: List[str], repeat: int) -> Dict[str, Any]:
+    """Build time of an index over the database and search latency on the questions"""
+    value_index = ColumnValueIndex(db)
+    start = time.perf_counter()
+    value_index.refresh()
+    build = time.perf_counter() - start
+    times = []
+    for _ in range(repeat):
+        for question in questions:
+            start = time.perf_counter()
+            value_index.search(question)
+            times.append(time.perf_counter() - start)
+    times.sort()
+    return dict(
+        value_index.stats(),
+        build_seconds=build,
+        search={f"p{p}": percentile(times, p) for p in PERCENTILES},
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--questions", type=int, default=30, help="Benchmark questions")
+    parser.add_argument("--tables", type=int, default=20, help="Tables in the seeded database")
+    parser.add_argument("--rows", type=int, default=1000, help="Rows per table")
+    parser.add_argument("--repeat", type=int, default=20, help="Times each question is searched for latency")
+    parser.add_argument("--seed", type=int, default=0, help="Seed of the schema and questions")
+    parser.add_argument("--out", default=None, help="Optional JSON results file")
+    args = parser.parse_args()
+
+    results = {}
+    with tempfile.TemporaryDirectory() as directory:
+        db, db_info = seed_database(f"sqlite:///{os.path.join(directory, 'values.db')}", args.tables, args.rows,
+                                    args.seed)
+        cases = make_value_cases(db_info, args.questions, args.seed)
+        print(f"{len(cases)} questions over {len({c['tables'][0] for c in cases.values()})} tables")
+        print(f"{'mode':<7} {'index':<6} {'llm_calls':>9} {'agent_steps':>11} {'db_statements':>13} "
+              f"{'wrong_literal':>13} {'failed':>6}")
+        for mode in ("agent", "direct"):
+            for index in (False, True):
+                totals = run(db, db_info, cases, mode, index, directory)
+                results[f"{mode}.index_{'on' if index else 'off'}"] = totals
+                print(f"{mode:<7} {'on' if index else 'off':<6} {totals['llm_calls']:>9} {totals['agent_steps']:>11} "
+                      f"{totals['db_statements']:>13} {totals['wrong_literal']:>13} {totals['failed']:>6}")
+
+        latency = index_latency(db, list(cases), args.repeat)
+        results["index"] = latency
+        print(f"index of {latency['values']} values in {latency['columns']} columns of {latency['tables']} tables, "
+              f"built in {latency['build_seconds'] * 1000:.0f} ms")
+        print("search: " + ", ".join(f"{p} {seconds * 1000:.3f} ms" for p, seconds in latency["search"].items()))
+
+    for mode in ("agent", "direct"):
+        off, on = results[f"{mode}.index_off"], results[f"{mode}.index_on"]
+        print(f"{mode}: the index saved {off['llm_calls'] - on['llm_calls']} LLM calls, "
+              f"{off['db_statements'] - on['db_statements']} database statements and "
+              f"{off['wrong_literal'] - on['wrong_literal']} wrong literals over {len(cases)} questions")
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
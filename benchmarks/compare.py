@@ -0,0 +1,69 @@
+"""
+Compare two JSON result files of benchmarks.bench_e2e.
+
+Prints every numeric measurement of both runs with the relative change.
+Timings are better when lower and throughputs (``*_per_sec``) when higher;
+changes beyond --threshold in the wrong direction are flagged.
+
+Usage:
+    python -m benchmarks.compare base.json head.json --threshold 10
+"""
+
+import argparse
+import json
+from typing import Any, Dict
+
+# Keys that identify list entries and whose values are not measurements.
+_LABEL_KEYS = ("batch_size", "tables")
+_SKIP = ("meta", "errors")
+
+
+def flatten(results: Any, prefix: str = "") -> Dict[str, float]:
+    """Flatten nested results to {"query.agent.latency.p50": 1.2, ...}"""
+    values = {}
+    if isinstance(results, dict):
+        for key, value in results.items():
+            if key in _SKIP:
+                continue
+            values.update(flatten(value, f"{prefix}{key}."))
+    elif isinstance(results, list):
+        for item in results:
+            label = next((f"{k}={item[k]}" for k in _LABEL_KEYS if isinstance(item, dict) and k in item), None)
+            if label is None:
+                continue
+            values.update(flatten({k: v for k, v in item.items() if k != label.split("=")[0]}, f"{prefix}{label}."))
+    elif isinstance(results, (int, float)) and not isinstance(results, bool):
+        values[prefix.rstrip(".")] = float(results)
+    return values
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("base", help="Results of the baseline commit")
+    parser.add_argument("head", help="Results of the commit under test")
+    parser.add_argument("--threshold", type=float, default=10.0, help="Percent change flagged as a regression")
+    args = parser.parse_args()
+
+    with open(args.base, "r", encoding="utf-8") as f:
+        base_results = json.load(f)
+    with open(args.head, "r", encoding="utf-8") as f:
+        head_results = json.load(f)
+    for name, results in (("base", base_results), ("head", head_results)):
+        meta = results.get("meta", {})
+        print(f"{name}: {(meta.get('commit') or '?')[:12]}{' (dirty)' if meta.get('dirty') else ''}  "
+              f"llm={meta.get('llm')}  dialect={meta.get('dialect')}")
+
+    base, head = flatten(base_results), flatten(head_results)
+    regressions = 0
+    for key in sorted(base.keys() & head.keys()):
+        old, new = base[key], head[key]
+        change = (new - old) / old * 100 if old else 0.0
+        higher_is_better = key.endswith("_per_sec")
+        worse = change < -args.threshold if higher_is_better else change > args.threshold
+        regressions += worse
+        print(f"{key:<45} {old:14.4f} {new:14.4f} {change:+8.1f}%{'  <-- worse' if worse else ''}")
+    print(f"{regressions} measurement(s) worse by more than {args.threshold:.0f}%")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,106 @@
+"""
+Seeded local databases for the offline benchmarks.
+
+Tables come from benchmarks.synthetic.make_schema and are filled with
+deterministic rows, so the same arguments always produce the same data (and
+the same prompts, which recorded LLM replies depend on). SQLite files work
+out of the box; a local PostgreSQL database is used through a scratch schema.
+"""
+
+import datetime
+import random
+from typing import Any, Tuple
+from sqlalchemy import create_engine, text
+from langchain_community.utilities import SQLDatabase
+from benchmarks.synthetic import make_schema
+
+PG_SCHEMA = "txt2sql_bench_e2e"
+
+# Rows per INSERT round trip while seeding.
+_INSERT_BATCH = 5000
+
+_EPOCH = datetime.datetime(2024, 1, 1)
+_STATUSES = ["active", "pending", "closed", "cancelled", "archived"]
+
+
+def _value(rng: random.Random, column: str, column_type: str, n_rows: int, row_id: int) -> Any:
+    if column == "id":
+        return row_id
+    if column.endswith("_id"):
+        return rng.randint(1, n_rows)
+    if column == "status":
+        return rng.choice(_STATUSES)
+    if column_type.startswith("varchar") or column_type == "text":
+        return f"{column}_{rng.randint(1, max(n_rows // 10, 1))}"
+    if column_type.startswith("numeric") or column_type == "double precision":
+        return round(rng.uniform(0, 10000), 2)
+    if column_type == "integer":
+        return rng.randint(0, 1000)
+    if column_type == "timestamp":
+        return _EPOCH + datetime.timedelta(seconds=rng.randint(0, 365 * 86400))
+    if column_type == "boolean":
+        return rng.random() < 0.5
+    return None
+
+
+def seed_database(uri: str,
+                  n_tables: int,
+                  n_rows: int,
+                  seed: int = 0,
+                  **kwargs) -> Tuple[SQLDatabase, dict]:
+    """
+    Create and fill the synthetic tables.
+
+    Args:
+        uri: SQLAlchemy URI of a SQLite file or a PostgreSQL database. On
+            PostgreSQL the tables are (re)created in the PG_SCHEMA schema.
+        n_tables: Number of tables
+        n_rows: Rows per table
+        seed: Seed of the schema and the data
+        **kwargs: Passed to SQLDatabase.from_uri
+
+    Returns:
+        (db, db_info): the database and its make_schema description
+    """
+    db_info, specs = make_schema(n_tables, seed)
+    parents = {(r["table"], r["columns"][0]): r["references_table"] for r in db_info["relationships"]}
+    engine = create_engine(uri)
+    schema = PG_SCHEMA if engine.dialect.name == "postgresql" else None
+    prefix = f"{schema}." if schema else ""
+    rng = random.Random(seed)
+
+    with engine.begin() as conn:
+        if schema:
+            conn.execute(text(f"DROP SCHEMA IF EXISTS {schema} CASCADE"))
+            conn.execute(text(f"CREATE SCHEMA {schema}"))
+        for table, columns in specs.items():
+            definitions = []
+            for column, column_type in columns:
+                definition = f"{column} {column_type}"
+                if column == "id":
+                    definition += " PRIMARY KEY"
+                elif column.endswith("_id"):
+                    definition += f" REFERENCES {prefix}{parents[(table, column)]}(id)"
+                definitions.append(definition)
+            conn.execute(text(f"DROP TABLE IF EXISTS {prefix}{table}"))
+            conn.execute(text(f"CREATE TABLE {prefix}{table} ({', '.join(definitions)})"))
+
+            names = [column for column, _ in columns]
+            insert = text(f"INSERT INTO {prefix}{table} ({', '.join(names)}) "
+                          f"VALUES ({', '.join(':' + name for name in names)})")
+            for start in range(0, n_rows, _INSERT_BATCH):
+                rows = [
+                    {column: _value(rng, column, column_type, n_rows, row_id) for column, column_type in columns}
+                    for row_id in range(start + 1, min(start + _INSERT_BATCH, n_rows) + 1)
+                ]
+                conn.execute(insert, rows)
+    engine.dispose()
+    return SQLDatabase.from_uri(uri, schema=schema, **kwargs), db_info
+
+
+def drop_database(db: SQLDatabase):
+    """Remove the PostgreSQL scratch schema; SQLite files are left to the caller"""
+    if db.dialect == "postgresql":
+        with db._engine.begin() as conn:
+            conn.execute(text(f"DROP SCHEMA IF EXISTS {PG_SCHEMA} CASCADE"))
+
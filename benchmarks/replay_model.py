@@ -0,0 +1,199 @@
+"""
+Record/replay and scripted chat models for deterministic, offline benchmarks.
+
+ReplayChatModel answers each prompt from a recording keyed by a hash of the
+input messages and the request options (e.g. the agent's function
+definitions). With a wrapped model it records: prompts missing from the
+recording are sent to the real model and its reply, with the time it took, is
+stored. Recordings are only valid for the prompts they were captured with, so
+re-record after changing a prompt, the system prompt or the benchmark schema.
+
+ScriptedChatModel plays the same role when no recording is available: it
+follows the agent's usual tool trajectory for a fixed question -> SQL mapping.
+"""
+
+import hashlib
+import json
+import os
+import re
+import time
+from typing import Any, Dict, List, Optional
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import (
+    AIMessage, BaseMessage, FunctionMessage, message_to_dict, messages_from_dict
+)
+from langchain_core.outputs import ChatGeneration, ChatResult
+
+# Request options that change how a reply is delivered but not what it says.
+_IGNORED_OPTIONS = ("stream", "callbacks", "run_manager")
+
+
+def prompt_key(messages: List[BaseMessage], options: Dict[str, Any]) -> str:
+    """Return the recording key of a chat request"""
+    payload = {
+        "messages": [
+            [message.type, message.content, message.additional_kwargs.get("function_call"),
+             getattr(message, "name", None)]
+            for message in messages
+        ],
+        "options": {k: v for k, v in options.items() if k not in _IGNORED_OPTIONS},
+    }
+    encoded = json.dumps(payload, sort_keys=True, default=str).encode("utf-8")
+    return hashlib.sha256(encoded).hexdigest()
+
+
+class ReplayChatModel(BaseChatModel):
+    """Chat model that replays recorded replies and, with a wrapped model, records new ones"""
+
+    recordings: Dict[str, Dict[str, Any]] = {}
+    model: Optional[BaseChatModel] = None
+    latency_scale: float = 0.0
+    misses: int = 0
+
+    @property
+    def _llm_type(self) -> str:
+        return "replay"
+
+    def _generate(self, messages: List[BaseMessage], stop: Optional[List[str]] = None,
+                  run_manager: Any = None, **kwargs: Any) -> ChatResult:
+        key = prompt_key(messages, dict(kwargs, stop=stop))
+        entry = self.recordings.get(key)
+        if entry is None:
+            if self.model is None:
+                raise KeyError(
+                    f"No recorded reply for prompt {key[:12]}; re-record with --llm record"
+                )
+            self.misses += 1
+            start = time.perf_counter()
+            message = self.model.invoke(messages, stop=stop, **kwargs)
+            entry = {"message": message_to_dict(message), "seconds": time.perf_counter() - start}
+            self.recordings[key] = entry
+        elif self.latency_scale > 0:
+            time.sleep(entry["seconds"] * self.latency_scale)
+        message = messages_from_dict([entry["message"]])[0]
+        return ChatResult(generations=[ChatGeneration(message=message)])
+
+    @classmethod
+    def load(cls, path: str, **kwargs) -> "ReplayChatModel":
+        """Create a model from a recording file, which need not exist when recording"""
+        recordings = {}
+        if os.path.exists(path):
+            with open(path, "r", encoding="utf-8") as f:
+                recordings = json.load(f)
+        return cls(recordings=recordings, **kwargs)
+
+    def save(self, path: str):
+        """Write the recordings to a file"""
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(self.recordings, f, indent=1, sort_keys=True)
+
+
+class ScriptedChatModel(BaseChatModel):
+    """
+    Deterministic stand-in for a chat model over known questions.
+
+    Direct mode gets the question's SQL. The agent looks up the schema of the
+    question's tables, checks the query, runs it and answers, one function
+    call per step. The query checker gets the SQL back unchanged and summaries
+    get a fixed answer.
+
+    Questions in mistakes first get the wrong SQL given there, like a model
+    inventing a column; once an error comes back (from the query checker, the
+    database or a repair prompt) the correct SQL follows.
+
+    Few-shot examples ("SQL: ..." lines before the question) that use all of
+    the question's tables stand in for their schema: the agent skips the
+    schema lookup and no mistake is made.
+
+    A question whose script has a "literal" (a value it filters on, spelled
+    differently in the question) needs that value listed before the question
+    ("- 'value' in ..."). Otherwise the agent first runs the script's
+    "lookup" query (a SELECT DISTINCT) to find the spelling, and direct mode
+    writes the script's "guess", which filters on the question's spelling.
+
+    A SQL generation request with a seed (a sampled candidate, see
+    Txt2SqlAgent's sql_candidates) gets the script's "alternates"[seed - 1]
+    when there is one. Every reply takes latency seconds.
+    """
+
+    queries: Dict[str, Dict[str, Any]] = {}
+    mistakes: Dict[str, str] = {}
+    answer: str = "Here are the results."
+    latency: float = 0.0
+
+    @property
+    def _llm_type(self) -> str:
+        return "scripted"
+
+    def _generate(self, messages: List[BaseMessage], stop: Optional[List[str]] = None,
+                  run_manager: Any = None, **kwargs: Any) -> ChatResult:
+        if self.latency > 0:
+            time.sleep(self.latency)
+        prompt = "\n".join(str(message.content) for message in messages)
+        if "Double check" in prompt:
+            # Longest first: a wrong query may contain the right one.
+            known = sorted([s["sql"] for s in self.queries.values()] + list(self.mistakes.values()), key=len, reverse=True)
+            sql = next((sql for sql in known if sql in prompt), None)
+            if sql is not None:
+                return ChatResult(generations=[ChatGeneration(message=AIMessage(content=sql))])
+        # The asked question comes last; few-shot examples before it may name others.
+        positions = [(prompt.rfind(q), len(q), q) for q in self.queries if q in prompt]
+        if not positions:
+            raise KeyError("The scripted model only knows the benchmark questions")
+        question = max(positions)[2]
+        script = self.queries[question]
+        shown = self._shown_schema(prompt[:max(positions)[0]], script["tables"])
+        wrong = None if shown else self.mistakes.get(question)
+        known_literal = self._shown_literal(prompt[:max(positions)[0]], script.get("literal"))
+
+        if "functions" in kwargs:
+            lookup = None if known_literal else script.get("lookup")
+            message = self._agent_step(messages, script, wrong, shown, lookup)
+        elif "PostgreSQL query:" in prompt:
+            sql = script["sql"] if known_literal else script.get("guess", script["sql"])
+            alternates = script.get("alternates", [])
+            if kwargs.get("seed") and kwargs["seed"] <= len(alternates):
+                sql = alternates[kwargs["seed"] - 1]
+            elif wrong and "Error:" not in prompt:
+                sql = wrong
+            message = AIMessage(content=sql)
+        else:
+            message = AIMessage(content=self.answer)
+        return ChatResult(generations=[ChatGeneration(message=message)])
+
+    @staticmethod
+    def _shown_schema(text: str, tables: List[str]) -> bool:
+        """Whether a few-shot example in the text queries all of the tables"""
+        examples = [line for line in text.splitlines() if line.startswith("SQL: ")]
+        return any(all(re.search(rf"\b{re.escape(table)}\b", line) for table in tables) for line in examples)
+
+    @staticmethod
+    def _shown_literal(text: str, literal: Optional[str]) -> bool:
+        """Whether the text lists the value (or the script has none)"""
+        if literal is None:
+            return True
+        return any(line.startswith(f"- '{literal}' in ") for line in text.splitlines())
+
+    def _agent_step(self, messages: List[BaseMessage], script: Dict[str, Any], wrong: Optional[str],
+                    shown: bool = False, lookup: Optional[str] = None) -> AIMessage:
+        """Next function call of the agent trajectory, given the tool results so far"""
+        results = [message for message in messages if isinstance(message, FunctionMessage)]
+        failed = [str(message.content).startswith("Error") for message in results]
+        sql = script["sql"] if wrong is None or any(failed) else wrong
+        queries = sum(1 for message, error in zip(results, failed) if message.name == "sql_db_query" and not error)
+        if not results and not shown:
+            name, arguments = "sql_db_schema", {"table_names": ", ".join(script["tables"])}
+        elif lookup and not queries:
+            # Find the value's spelling before writing the query.
+            name, arguments = "sql_db_query", {"query": lookup}
+        elif results and results[-1].name == "sql_db_query" and not failed[-1] and queries > bool(lookup):
+            return AIMessage(content=self.answer)
+        elif results and results[-1].name == "sql_db_query_checker" and not failed[-1]:
+            name, arguments = "sql_db_query", {"query": sql}
+        else:
+            # After the schema (or examples), or after an error: check the (fixed) query.
+            name, arguments = "sql_db_query_checker", {"query": sql}
+        return AIMessage(content="", additional_kwargs={
+            "function_call": {"name": name, "arguments": json.dumps(arguments)}
+        })
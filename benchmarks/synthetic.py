@@ -0,0 +1,145 @@
+"""
+Deterministic synthetic schemas and questions shared by the benchmarks.
+"""
+
+import functools
+import random
+from typing import Dict, List, Tuple
+
+DOMAINS = [
+    "sales", "hr", "inventory", "finance", "marketing", "support", "shipping",
+    "billing", "crm", "analytics", "procurement", "payroll", "legal", "it",
+    "logistics", "retail", "manufacturing", "quality", "research", "training",
+]
+
+ENTITIES = [
+    "customer", "order", "product", "invoice", "shipment", "employee", "supplier",
+    "payment", "refund", "ticket", "campaign", "lead", "contract", "asset",
+    "warehouse", "store", "region", "department", "project", "vendor", "account",
+    "budget", "expense", "timesheet", "review", "survey", "coupon", "subscription",
+    "device", "license", "course", "enrollment", "claim", "policy", "vehicle",
+    "route", "driver", "batch", "defect", "experiment", "sample", "carrier",
+    "promotion", "category", "brand", "return", "quote", "opportunity", "partner",
+    "team",
+]
+
+COLUMN_TEMPLATES = [
+    ("name", "varchar(100)"),
+    ("status", "varchar(20)"),
+    ("amount", "numeric(12, 2)"),
+    ("quantity", "integer"),
+    ("created_at", "timestamp"),
+    ("updated_at", "timestamp"),
+    ("description", "text"),
+    ("code", "varchar(20)"),
+    ("is_active", "boolean"),
+    ("score", "double precision"),
+]
+
+
+def table_names(n_tables: int) -> List[str]:
+    """Return n deterministic table names of the form <domain>_<entity>[_<n>]"""
+    names = []
+    suffix = 0
+    while len(names) < n_tables:
+        for domain in DOMAINS:
+            for entity in ENTITIES:
+                name = f"{domain}_{entity}" + (f"_{suffix}" if suffix else "")
+                names.append(name)
+                if len(names) == n_tables:
+                    return names
+        suffix += 1
+    return names
+
+
+def make_schema(n_tables: int, seed: int = 0) -> Tuple[dict, Dict[str, List[Tuple[str, str]]]]:
+    """
+    Build a synthetic schema.
+
+    Returns:
+        (db_info, column_specs): a get_db_info-shaped dict and, per table, the
+        (column, type) list used to create it. Every table after the first in a
+        domain references an earlier table in the same domain.
+    """
+    rng = random.Random(seed)
+    db_info = {"tables": {}, "relationships": []}
+    specs = {}
+    by_domain: Dict[str, List[str]] = {}
+    for name in table_names(n_tables):
+        domain = name.split("_", 1)[0]
+        columns = [("id", "integer")] + rng.sample(COLUMN_TEMPLATES, 5)
+        parents = by_domain.setdefault(domain, [])
+        if parents:
+            parent = rng.choice(parents[-10:])
+            fk_column = f"{parent.split('_', 1)[1]}_id"
+            columns.append((fk_column, "integer"))
+            db_info["relationships"].append({
+                "table": name,
+                "columns": [fk_column],
+                "references_table": parent,
+                "references_columns": ["id"],
+                "name": f"{name}_{fk_column}_fkey",
+            })
+        parents.append(name)
+        specs[name] = columns
+        db_info["tables"][name] = {
+            "columns": [
+                {"name": col, "type": typ, "nullable": col != "id", "default": None, "comment": None}
+                for col, typ in columns
+            ],
+            "primary_keys": ["id"],
+            "indexes": [],
+            "comment": f"{name.replace('_', ' ')} records",
+        }
+    return db_info, specs
+
+
+def make_questions(db_info: dict, n_questions: int, seed: int = 0) -> List[Tuple[str, List[str]]]:
+    """
+    Generate questions with their gold tables.
+
+    Half the questions target a single table, half a table and the table it
+    references through a foreign key.
+    """
+    rng = random.Random(seed)
+    tables = list(db_info["tables"])
+    relationships = db_info["relationships"]
+    questions = []
+    for i in range(n_questions):
+        if i % 2 == 0 or not relationships:
+            table = rng.choice(tables)
+            domain, entity = table.split("_", 1)
+            entity = entity.rsplit("_", 1)[0] if entity[-1].isdigit() else entity
+            questions.append((f"What is the total amount of {domain} {entity}s by status?", [table]))
+        else:
+            rel = rng.choice(relationships)
+            domain, child = rel["table"].split("_", 1)
+            parent = rel["references_table"].split("_", 1)[1]
+            questions.append((f"List {domain} {child}s with their {parent} name", [rel["table"], rel["references_table"]]))
+    return questions
+
+
+def render_ddl(db_info: dict, tables: List[str]) -> str:
+    """Render plain CREATE TABLE statements for the given tables"""
+    statements = []
+    for table in tables:
+        columns = ",\n".join(f"\t{c['name']} {c['type']}" for c in db_info["tables"][table]["columns"])
+        statements.append(f"CREATE TABLE {table} (\n{columns}\n)")
+    return "\n\n".join(statements)
+
+
+@functools.lru_cache(maxsize=1)
+def _encoder():
+    try:
+        import tiktoken
+        return tiktoken.get_encoding("cl100k_base")
+    except Exception:
+        return None
+
+
+def count_tokens(text: str) -> int:
+    """Count tokens with tiktoken when its encoding is available, else estimate chars / 4"""
+    encoder = _encoder()
+    if encoder is None:
+        return max(1, len(text) // 4)
+    return len(encoder.encode(text))
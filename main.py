@@ -1,11 +1,13 @@
+import argparse
 import os
-import time
 from dotenv import load_dotenv
-from langchain_openai import ChatOpenAI
-from langchain_community.utilities import SQLDatabase
-from src.txt2sql_agent import Txt2SqlAgent
-from src.db_utils import test_connection, get_db_info, execute_sample_query
-import polars as pl
+from src.db_utils import test_connection, fetch_sample_frame
+from src.db_pool import create_database, pool_metrics, pool_settings_from_env, warm_up_pool
+from src.schema_cache import SchemaCache
+from src.translation_cache import TranslationCache
+from src.result_cache import ResultCache
+from src.cost_guard import CostGuard
+from src.tracing import QueryMetrics
 load_dotenv()
 
 def load_environment():
@@ -23,47 +25,329 @@ def get_db_connection_string(env_vars):
     return f"postgresql://{env_vars['DB_USER']}:{env_vars['DB_PASSWORD']}@{env_vars['DB_HOST']}:{env_vars['DB_PORT']}/{env_vars['DB_NAME']}"
 
 
+def create_schema_cache(db):
+    """Create the persistent schema cache from optional environment settings"""
+    return SchemaCache(
+        db,
+        path=os.getenv("SCHEMA_CACHE_PATH"),
+        max_staleness=float(os.getenv("SCHEMA_CACHE_MAX_STALENESS", "300"))
+    )
+
+
+def create_result_cache(db):
+    """Create the query result cache from optional environment settings, or None if disabled"""
+    max_mb = float(os.getenv("RESULT_CACHE_MAX_MB", "256"))
+    if max_mb <= 0:
+        return None
+    return ResultCache(
+        db,
+        max_bytes=int(max_mb * 1024 * 1024),
+        ttl=float(os.getenv("RESULT_CACHE_TTL", "0")) or None
+    )
+
+
+def create_translation_cache():
+    """Create the question-to-SQL cache from optional environment settings, or None if disabled"""
+    if os.getenv("TRANSLATION_CACHE", "1") == "0":
+        return None
+    ttl = float(os.getenv("TRANSLATION_CACHE_TTL", "0"))
+    return TranslationCache(
+        path=os.getenv("TRANSLATION_CACHE_PATH"),
+        max_entries=int(os.getenv("TRANSLATION_CACHE_MAX_ENTRIES", "10000")),
+        ttl=ttl or None,
+        fuzzy_threshold=float(os.getenv("TRANSLATION_CACHE_FUZZY_THRESHOLD", "0"))
+    )
+
+
+def create_cost_guard(db):
+    """Create the EXPLAIN cost guard from optional environment settings, or None if disabled"""
+    action = os.getenv("COST_GUARD_ACTION", "rewrite")
+    if action == "off":
+        return None
+    return CostGuard(
+        db,
+        max_cost=float(os.getenv("COST_GUARD_MAX_COST", "1000000")) or None,
+        max_rows=float(os.getenv("COST_GUARD_MAX_ROWS", "1000000")) or None,
+        action=action,
+        limit=int(os.getenv("COST_GUARD_LIMIT", "1000"))
+    )
+
+
+def fetch_limits():
+    """Row/byte caps and batch size for query results from optional environment settings"""
+    max_rows = int(os.getenv("FETCH_MAX_ROWS", "10000"))
+    max_mb = float(os.getenv("FETCH_MAX_MB", "64"))
+    return {
+        "max_result_rows": max_rows or None,
+        "max_result_bytes": int(max_mb * 1024 * 1024) or None,
+        "fetch_batch_size": int(os.getenv("FETCH_BATCH_SIZE", "1000"))
+    }
+
+
+def create_example_store():
+    """
+    Create the few-shot example store, or None if few-shot prompting is disabled.
+    
+    Called when the agent is built, since the store imports numpy and indexes
+    every stored example.
+    """
+    if int(os.getenv("FEW_SHOT_EXAMPLES", "3")) <= 0:
+        return None
+    from src.example_store import ExampleStore
+    
+    store = ExampleStore(
+        path=os.getenv("EXAMPLE_STORE_PATH"),
+        max_examples=int(os.getenv("EXAMPLE_STORE_MAX_EXAMPLES", "100000"))
+    )
+    examples_file = os.getenv("EXAMPLES_FILE")
+    if examples_file:
+        store.load_file(examples_file)
+    return store
+
+
+def create_value_index(db, schema_cache):
+    """
+    Start collecting the column value index in the background, or return None if it is disabled.
+    
+    Values are read from the database's statistics (or sampled rows) in a
+    background thread, so this returns immediately.
+    """
+    if os.getenv("VALUE_INDEX", "1") == "0":
+        return None
+    from src.value_index import ColumnValueIndex
+    
+    return ColumnValueIndex(
+        db,
+        schema_cache=schema_cache,
+        max_values=int(os.getenv("VALUE_INDEX_MAX_VALUES", "100")),
+        sample_rows=int(os.getenv("VALUE_INDEX_SAMPLE_ROWS", "10000")),
+        max_staleness=float(os.getenv("VALUE_INDEX_MAX_STALENESS", "300"))
+    ).start()
+
+
+def create_schema_renderer(db, schema_cache):
+    """Create the token-budgeted schema renderer, or None to send SQLDatabase's table info"""
+    token_budget = int(os.getenv("SCHEMA_TOKEN_BUDGET", "4000"))
+    if token_budget <= 0:
+        return None
+    from src.schema_renderer import SchemaRenderer
+    
+    return SchemaRenderer(
+        db,
+        schema_cache=schema_cache,
+        token_budget=token_budget,
+        sample_rows=int(os.getenv("SCHEMA_SAMPLE_ROWS", "3"))
+    )
+
+
+def create_agent(env_vars, db, schema_cache, translation_cache, result_cache, metrics, value_index=None):
+    """
+    Create the OpenAI model and the agent.
+    
+    The model client and the agent framework take seconds to import, so they
+    are imported here, when the agent is first needed, rather than at startup.
+    A value index started earlier can be passed in; otherwise one is started here.
+    """
+    from langchain_openai import ChatOpenAI
+    from src.txt2sql_agent import Txt2SqlAgent
+    
+    model = ChatOpenAI(
+        temperature=0,
+        model=env_vars["OPENAI_MODEL"],
+        api_key=env_vars["OPENAI_API_KEY"]
+    )
+    return Txt2SqlAgent(
+        db,
+        model,
+        verbose=False,
+        schema_cache=schema_cache,
+        table_retrieval_k=int(os.getenv("TABLE_RETRIEVAL_K", "0")),
+        mode=os.getenv("QUERY_MODE", "agent"),
+        translation_cache=translation_cache,
+        result_cache=result_cache,
+        cost_guard=create_cost_guard(db),
+        trace=metrics is not None,
+        metrics=metrics,
+        coalesce=os.getenv("QUERY_COALESCING", "1") != "0",
+        schema_validation=os.getenv("SCHEMA_VALIDATION", "1") != "0",
+        example_store=create_example_store(),
+        few_shot_k=int(os.getenv("FEW_SHOT_EXAMPLES", "3")),
+        learn_examples=os.getenv("EXAMPLE_LEARNING", "1") != "0",
+        value_index=value_index if value_index is not None else create_value_index(db, schema_cache),
+        schema_renderer=create_schema_renderer(db, schema_cache),
+        sql_candidates=int(os.getenv("SQL_CANDIDATES", "1")),
+        candidate_temperature=float(os.getenv("SQL_CANDIDATE_TEMPERATURE", "0.7")),
+        query_timeout=float(os.getenv("QUERY_TIMEOUT", "0")) or None,
+        result_data_rows=int(os.getenv("RESULT_DATA_ROWS", "1000")),
+        **fetch_limits()
+    )
+
+
+def create_metrics():
+    """Create the query metrics aggregator, or None if tracing is disabled"""
+    if os.getenv("QUERY_TRACING", "1") == "0":
+        return None
+    return QueryMetrics()
+
+
+def write_metrics(metrics):
+    """Write the metrics to METRICS_FILE when it is set"""
+    path = os.getenv("METRICS_FILE")
+    if metrics is not None and path:
+        metrics.write(path)
+
+
+def format_timings(timings):
+    """One-line breakdown of a query's time into LLM, database and tool work"""
+    line = (f"LLM {timings['llm']:.2f}s in {timings['llm_calls']} calls "
+            f"({timings['prompt_tokens']} prompt + {timings['completion_tokens']} completion tokens), "
+            f"database {timings['db']:.2f}s in {timings['db_queries']} queries")
+    if timings["tools"]:
+        line += ", tools: " + ", ".join(f"{name} {seconds:.2f}s" for name, seconds in timings["tools"].items())
+    return line
+
+
+def format_data(result, max_rows=20):
+    """Render a query result's rows as a table of at most max_rows rows, with the row count"""
+    import polars as pl
+    with pl.Config(tbl_rows=max_rows, tbl_hide_dataframe_shape=True, fmt_str_lengths=40):
+        table = str(result["data"])
+    count = f"{result['row_count']} rows"
+    if result["truncated"]:
+        count += ", more were not fetched"
+    return f"{table}\n({count})"
+
+
 def display_commands():
     """Display available commands for the CLI"""
     print("\nAvailable commands:")
     print("  /help           - Display this help message")
     print("  /exit           - Exit the application")
     print("  /tables         - List database tables")
+    print("  /refresh        - Re-check the database schema for changes")
+    print("  /cache [clear]  - Show cache statistics, or clear the caches")
+    print("  /pool           - Show connection pool utilization")
+    print("  /metrics [FILE] - Show query metrics (Prometheus format), or write them to FILE (.prom or .jsonl)")
     print("  /sample TABLE   - Show sample data from a table")
     print("  /sql            - Generate SQL without executing it")
+    print("  /direct QUERY   - Answer with a single SQL generation (falls back to the agent)")
     print("  /explain QUERY  - Explain what a SQL query does")
+    print("  /export FILE [QUERY] - Export the full result of QUERY (default: the last query) to .csv or .parquet")
     print("  Any other input will be treated as a natural language query to the database")
+    print("  Press Ctrl+C while a query runs to cancel it")
+
+
+def print_query_events(events):
+    """
+    Print stream_query events as they arrive.
+    
+    Returns:
+        Tuple of (result, streamed) where streamed is True if the answer was
+        printed token by token
+    """
+    streamed = False
+    for event in events:
+        if event["type"] == "step":
+            print(f"\n[{event['elapsed']:.1f}s] Running {event['tool']}: {event['input']}")
+        elif event["type"] == "sql":
+            print(f"\n[{event['elapsed']:.1f}s] SQL:\n{event['sql']}")
+        elif event["type"] == "rows":
+            rows = event["rows"]
+            print(f"\n[{event['elapsed']:.1f}s] Rows: {rows[:300] + '...' if len(rows) > 300 else rows}")
+        elif event["type"] == "fallback":
+            print(f"\n[{event['elapsed']:.1f}s] Direct attempt failed, falling back to the agent: {event['reason']}")
+        elif event["type"] == "token":
+            if not streamed:
+                print(f"\n[{event['elapsed']:.1f}s] Answer:")
+                streamed = True
+            print(event["text"], end="", flush=True)
+        elif event["type"] == "result":
+            return event["result"], streamed
+
+
+def parse_args():
+    """Parse command line arguments"""
+    parser = argparse.ArgumentParser(description="Natural language to SQL agent")
+    parser.add_argument("--batch", metavar="QUESTIONS_JSONL",
+                        help="Answer the questions in a JSONL file instead of starting the interactive loop")
+    parser.add_argument("--out", metavar="RESULTS_JSONL", help="Output file for --batch (default: results.jsonl)",
+                        default="results.jsonl")
+    parser.add_argument("--workers", type=int, default=4, help="Worker threads for --batch (default: 4)")
+    parser.add_argument("--sql-only", action="store_true", help="With --batch, only generate SQL without running it")
+    parser.add_argument("--mode", choices=["agent", "direct"], help="Query mode for --batch (default: QUERY_MODE)")
+    return parser.parse_args()
+
+
+def run_batch_mode(agent, args):
+    """Run --batch and print throughput and latency statistics"""
+    from src.batch_runner import PERCENTILES, run_batch
+    
+    print(f"Answering questions from {args.batch} with {args.workers} workers -> {args.out}")
+    
+    def progress(count):
+        if count % 100 == 0:
+            print(f"  {count} done")
+    
+    stats = run_batch(agent, args.batch, args.out, workers=args.workers,
+                      sql_only=args.sql_only, mode=args.mode, progress=progress)
+    
+    print(f"\nProcessed {stats['processed']} questions in {stats['elapsed']:.1f} seconds "
+          f"({stats['skipped']} already done, {stats['failed']} failed)")
+    print(f"Throughput: {stats['throughput']:.2f} questions/s")
+    print("Latency:    " + "  ".join(f"p{p} {stats[f'p{p}']:.2f}s" for p in PERCENTILES))
+    write_metrics(agent.metrics)
 
 
 def main():
+    args = parse_args()
     print("Starting txt2sql agent...")
     
     try:
         # Load environment variables
         env_vars = load_environment()
         
-        # Initialize OpenAI model
-        model = ChatOpenAI(
-            temperature=0,
-            model=env_vars["OPENAI_MODEL"],
-            api_key=env_vars["OPENAI_API_KEY"]
-        )
-        
         # Connect to the database
         db_uri = get_db_connection_string(env_vars)
-        db = SQLDatabase.from_uri(db_uri)
+        db = create_database(db_uri, lazy_table_reflection=True, **pool_settings_from_env())
         
         # Test database connection
         if not test_connection(db):
             print("Error: Could not connect to the database. Please check your connection settings.")
             return
         
-        # Create the agent
-        agent = Txt2SqlAgent(db, model, verbose=True)
+        # Open the pool's connections before the first query
+        warmup = os.getenv("DB_POOL_WARMUP")
+        warm_up_pool(db, int(warmup) if warmup else None)
+        
+        # Caches and metrics are created now; the agent that uses them is only
+        # built when the first question (or /sql, /explain, /export) needs it.
+        schema_cache = create_schema_cache(db)
+        # Column values are collected in the background while the user types.
+        value_index = create_value_index(db, schema_cache)
+        translation_cache = create_translation_cache()
+        result_cache = create_result_cache(db)
+        metrics = create_metrics()
+        agent = None
+        
+        def get_agent():
+            nonlocal agent
+            if agent is None:
+                agent = create_agent(env_vars, db, schema_cache, translation_cache, result_cache, metrics,
+                                     value_index)
+            return agent
         
         print("Database connected successfully.")
+        
+        if args.batch:
+            run_batch_mode(get_agent(), args)
+            return
+        
         display_commands()
         
+        # SQL and question of the last answered query, for /export
+        last_sql = None
+        last_question = None
+        
         # Interactive query loop
         while True:
             query = input("\nEnter query or command: ")
@@ -81,18 +365,102 @@ def main():
             # Handle tables command
             elif query.lower() == "/tables":
                 print("\nDatabase Tables:")
-                db_info = get_db_info(db)
+                db_info = schema_cache.get_db_info()
                 for table in db_info["tables"]:
                     print(f"- {table}")
                 continue
             
+            # Handle schema refresh command
+            elif query.lower() == "/refresh":
+                changed = schema_cache.refresh()
+                if value_index is not None:
+                    value_index.start()
+                if changed:
+                    print(f"\nSchema changes detected in: {', '.join(changed)}")
+                else:
+                    print("\nSchema is up to date.")
+                continue
+            
+            # Handle translation cache command
+            elif query.lower() in ("/cache", "/cache clear"):
+                if query.lower() == "/cache clear":
+                    if translation_cache is not None:
+                        translation_cache.invalidate()
+                    if result_cache is not None:
+                        result_cache.invalidate()
+                    print("\nCaches cleared.")
+                    continue
+                if translation_cache is None:
+                    print("\nTranslation cache is disabled.")
+                else:
+                    stats = translation_cache.stats()
+                    print("\nTranslation cache:")
+                    print(f"  entries:    {stats['entries']}")
+                    print(f"  hits:       {stats['hits']} exact, {stats['fuzzy_hits']} fuzzy")
+                    print(f"  misses:     {stats['misses']}")
+                    print(f"  hit rate:   {stats['hit_rate']:.1%}")
+                if result_cache is None:
+                    print("\nResult cache is disabled.")
+                else:
+                    stats = result_cache.stats()
+                    print("\nResult cache:")
+                    print(f"  entries:    {stats['entries']} ({stats['bytes'] / 1024 / 1024:.1f} MB)")
+                    print(f"  hits:       {stats['hits']}")
+                    print(f"  misses:     {stats['misses']} ({stats['invalidations']} after table changes)")
+                if agent is not None and agent.example_store is not None:
+                    stats = agent.example_store.stats()
+                    print("\nFew-shot examples:")
+                    print(f"  examples:   {stats['examples']} ({stats['learned']} learned)")
+                    print(f"  searches:   {stats['searches']} ({stats['hits']} with examples)")
+                if value_index is not None:
+                    stats = value_index.stats()
+                    print("\nColumn value index:")
+                    if stats["ready"]:
+                        print(f"  values:     {stats['values']} in {stats['columns']} columns of {stats['tables']} tables")
+                        print(f"  searches:   {stats['searches']} ({stats['hits']} with matches)")
+                    else:
+                        print(f"  collecting values... {stats['last_error'] or ''}".rstrip())
+                if agent is not None and agent.sql_candidates > 1:
+                    stats = agent.candidate_stats.stats()
+                    print(f"\nSQL candidates ({agent.sql_candidates} per question):")
+                    print(f"  answers:    {stats['runs']} ({stats['rescued']} rescued, {stats['no_winner']} without a valid candidate)")
+                    print(f"  valid:      {stats['valid']} of {stats['candidates']} ({stats['distinct']} distinct)")
+                    print("  wins:       " + ", ".join(f"rank {rank}: {wins}" for rank, wins in enumerate(stats["wins"])))
+                continue
+            
+            # Handle pool metrics command
+            elif query.lower() == "/pool":
+                pool_stats = pool_metrics(db)
+                if pool_stats is None:
+                    print("\nPool metrics are not available.")
+                else:
+                    print("\nConnection pool:")
+                    print(f"  checked out: {pool_stats['checked_out']} of {pool_stats['size']} "
+                          f"(+{pool_stats['overflow']} overflow, max {pool_stats['max_overflow']})")
+                    print(f"  idle:        {pool_stats['idle']}")
+                    print(f"  checkouts:   {pool_stats['checkouts']} ({pool_stats['timeouts']} timed out)")
+                    print(f"  wait:        {pool_stats['wait_avg'] * 1000:.1f} ms avg, {pool_stats['wait_max'] * 1000:.1f} ms max")
+                continue
+            
+            # Handle metrics command
+            elif query.lower() == "/metrics" or query.lower().startswith("/metrics "):
+                if metrics is None:
+                    print("\nQuery tracing is disabled.")
+                elif query[8:].strip():
+                    metrics.write(query[8:].strip())
+                    print(f"\nMetrics written to {query[8:].strip()}")
+                else:
+                    print()
+                    print(metrics.to_prometheus(), end="")
+                continue
+            
             # Handle sample command
             elif query.lower().startswith("/sample "):
                 table = query[8:].strip()
                 try:
-                    sample_data = execute_sample_query(db, table)
+                    sample_data = fetch_sample_frame(db, table, result_cache=result_cache)
                     print(f"\nSample data from {table}:")
-                    print(pl.DataFrame(sample_data))
+                    print(sample_data)
                     # for row in sample_data:
                     #     print(row)
                 except Exception as e:
@@ -103,7 +471,8 @@ def main():
             elif query.lower().startswith("/sql "):
                 nl_query = query[5:].strip()
                 try:
-                    sql = agent.generate_sql_only(nl_query)
+                    sql = get_agent().generate_sql_only(nl_query)
+                    last_sql, last_question = sql, nl_query
                     print("\nGenerated SQL:")
                     print(sql)
                 except Exception as e:
@@ -114,29 +483,80 @@ def main():
             elif query.lower().startswith("/explain "):
                 sql_query = query[9:].strip()
                 try:
-                    explanation = agent.explain_query(sql_query)
+                    explanation = get_agent().explain_query(sql_query)
                     print("\nExplanation:")
                     print(explanation)
                 except Exception as e:
                     print(f"Error explaining query: {e}")
                 continue
             
+            # Handle export command
+            elif query.lower().startswith("/export "):
+                parts = query[8:].strip().split(maxsplit=1)
+                try:
+                    if len(parts) == 2:
+                        sql = get_agent().generate_sql_only(parts[1])
+                    elif last_sql is not None:
+                        sql = last_sql
+                    elif last_question is not None:
+                        # The agent answered without reporting its SQL; generate it.
+                        sql = get_agent().generate_sql_only(last_question)
+                    else:
+                        print("Nothing to export yet. Use /export FILE QUERY.")
+                        continue
+                    print(f"\nExporting:\n{sql}")
+                    from src.export import export_query
+                    stats = export_query(db, sql, parts[0])
+                    print(f"\nWrote {stats['rows']} rows ({stats['bytes'] / 1024 / 1024:.1f} MB) to {stats['path']} "
+                          f"in {stats['seconds']:.2f} seconds ({stats['rows_per_sec']:,.0f} rows/s)")
+                except Exception as e:
+                    print(f"Error exporting query: {e}")
+                continue
+            
             # Process natural language query
             else:
+                mode = None
+                if query.lower().startswith("/direct "):
+                    query = query[8:].strip()
+                    mode = "direct"
                 try:
-                    start_time = time.time()
-                    result = agent.query(query)
-                    duration = time.time() - start_time
+                    result, streamed = print_query_events(get_agent().stream_query(query, mode=mode))
+                    write_metrics(metrics)
+                    if result["success"]:
+                        last_sql, last_question = result["sql"], query
                     
-                    print("\nResult:")
+                    print(f"\n\nResult ({result['path']}):")
+                    if result["fallback_reason"]:
+                        print(f"(direct attempt failed: {result['fallback_reason']})")
+                    if result["tables"]:
+                        print(f"(searched tables: {', '.join(result['tables'])})")
+                    guard = result["cost_guard"]
+                    if guard and guard["cost"] is not None:
+                        print(f"(cost guard: {guard['action']}, estimated cost {guard['cost']:,.0f}, "
+                              f"{guard['rows']:,.0f} rows)")
                     if result["success"]:
-                        print(result["output"])
+                        # Without a summary, direct and cached answers are the rows themselves.
+                        rows_only = result["path"] in ("direct", "cache") and not get_agent().summarize
+                        if not streamed and not (rows_only and result["data"] is not None):
+                            print(result["output"])
+                        if result["data"] is not None:
+                            print(f"\n{format_data(result)}")
                     else:
                         print(f"Error: {result['error']}")
                     
-                    print(f"\nQuery completed in {duration:.2f} seconds")
+                    print(f"\nQuery completed in {result['execution_time']:.2f} seconds")
+                    if result["timings"] is not None:
+                        print(f"({format_timings(result['timings'])})")
+                    if result["time_to_first_event"] is not None:
+                        print(f"First output after {result['time_to_first_event']:.2f} seconds")
+                    budget = result["budget"]
+                    if budget and budget["timeout"] is not None:
+                        print(f"(time budget: {budget['elapsed']:.1f} of {budget['timeout']:.0f} seconds)")
                     print("-----------")
                     print("/help  - Display this help message")
+                except KeyboardInterrupt:
+                    # Leaving the event stream cancels the query, including its running statement.
+                    print("\nQuery cancelled.")
                 except Exception as e:
                     print(f"Error processing query: {e}")
     
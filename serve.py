@@ -0,0 +1,72 @@
+#!/usr/bin/env python3
+"""
+Run the Text-to-SQL Agent as a headless JSON-over-HTTP service.
+
+Endpoints: POST /query, POST /sql, POST /explain, GET /health, GET /metrics
+(see src.query_service.QueryService). Uses the same environment settings as
+main.py, plus the SERVICE_* settings for the worker pool.
+"""
+
+import argparse
+import os
+import sys
+from main import (
+    create_agent,
+    create_metrics,
+    create_result_cache,
+    create_schema_cache,
+    create_translation_cache,
+    get_db_connection_string,
+    load_environment,
+)
+from src.db_pool import create_database, pool_settings_from_env, warm_up_pool
+from src.db_utils import test_connection
+from src.query_service import QueryService
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Text-to-SQL HTTP service")
+    parser.add_argument("--host", default=os.getenv("SERVICE_HOST", "127.0.0.1"), help="Interface to listen on")
+    parser.add_argument("--port", type=int, default=int(os.getenv("SERVICE_PORT", "8000")), help="Port to listen on")
+    parser.add_argument("--log-requests", action="store_true", help="Log every request")
+    return parser.parse_args()
+
+
+def main():
+    """Connect to the database, build the agent and serve until interrupted"""
+    args = parse_args()
+    try:
+        env_vars = load_environment()
+        db = create_database(get_db_connection_string(env_vars), lazy_table_reflection=True, **pool_settings_from_env())
+        if not test_connection(db):
+            print("❌ Could not connect to the database. Please check your connection settings.")
+            sys.exit(1)
+        warmup = os.getenv("DB_POOL_WARMUP")
+        warm_up_pool(db, int(warmup) if warmup else None)
+
+        agent = create_agent(env_vars, db, create_schema_cache(db), create_translation_cache(),
+                             create_result_cache(db), create_metrics())
+        service = QueryService(
+            agent,
+            workers=int(os.getenv("SERVICE_WORKERS", "8")),
+            max_queue=int(os.getenv("SERVICE_MAX_QUEUE", "32")),
+            timeout=float(os.getenv("SERVICE_TIMEOUT", "60")),
+            max_timeout=float(os.getenv("SERVICE_MAX_TIMEOUT", "300"))
+        )
+        server = service.make_server(args.host, args.port, log_requests=args.log_requests)
+    except Exception as e:
+        print(f"❌ Error starting the service: {e}")
+        sys.exit(1)
+
+    print(f"🚀 Text-to-SQL service listening on http://{args.host}:{server.server_address[1]}")
+    print("⏹️  Press Ctrl+C to stop the server")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        print("\n👋 Service stopped by user")
+    finally:
+        server.server_close()
+        service.pool.shutdown()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,158 @@
+import json
+import math
+import os
+import time
+from array import array
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from typing import Dict, Any, Iterator, Optional, Set
+from src.query_results import jsonable_result
+from src.txt2sql_agent import Txt2SqlAgent
+
+PERCENTILES = (50, 90, 95, 99)
+
+
+def iter_questions(path: str) -> Iterator[Dict[str, Any]]:
+    """
+    Read questions from a JSONL file one line at a time.
+
+    Each line is an object with a "question" and an optional "id"; lines
+    without an id are numbered from 1. Blank lines are skipped.
+
+    Args:
+        path: Input JSONL file
+
+    Yields:
+        Dict with "id" and "question"
+    """
+    with open(path, "r", encoding="utf-8") as f:
+        for line_number, line in enumerate(f, 1):
+            if not line.strip():
+                continue
+            item = json.loads(line)
+            yield {"id": item.get("id", line_number), "question": item["question"]}
+
+
+def completed_ids(path: str) -> Set[str]:
+    """
+    Return the ids already written to an output file, so a run can resume.
+
+    A partially written last line (from an interrupted run) is ignored and the
+    file is terminated with a newline so new results start on their own line.
+
+    Args:
+        path: Output JSONL file, which need not exist
+
+    Returns:
+        Set[str]: Completed ids, as strings
+    """
+    if not os.path.exists(path):
+        return set()
+    done = set()
+    with open(path, "rb+") as f:
+        for line in f:
+            try:
+                done.add(str(json.loads(line)["id"]))
+            except (ValueError, KeyError):
+                continue
+        if f.tell() > 0:
+            f.seek(-1, os.SEEK_END)
+            if f.read(1) != b"\n":
+                f.write(b"\n")
+    return done
+
+
+def percentile(sorted_values, p: float) -> float:
+    """Nearest-rank percentile of an already sorted sequence"""
+    if not sorted_values:
+        return 0.0
+    rank = math.ceil(p / 100 * len(sorted_values))
+    return sorted_values[max(rank, 1) - 1]
+
+
+def _answer(agent: Txt2SqlAgent, item: Dict[str, Any], sql_only: bool, mode: Optional[str]) -> Dict[str, Any]:
+    start_time = time.time()
+    if not sql_only:
+        result = agent.query(item["question"], mode=mode)
+    else:
+        try:
+            result = {"success": True, "sql": agent.generate_sql_only(item["question"]), "error": None}
+        except Exception as e:
+            result = {"success": False, "sql": None, "error": str(e)}
+        result["execution_time"] = time.time() - start_time
+    return dict(item, **jsonable_result(result))
+
+
+def run_batch(agent: Txt2SqlAgent,
+              input_path: str,
+              output_path: str,
+              workers: int = 4,
+              sql_only: bool = False,
+              mode: Optional[str] = None,
+              progress=None) -> Dict[str, Any]:
+    """
+    Answer every question in a JSONL file with a pool of worker threads.
+
+    Each result is appended to the output file as soon as it finishes, as the
+    input record merged with the query() result (or the generated SQL in
+    sql_only mode). Ids already in the output file are skipped, so an
+    interrupted run can be restarted with the same arguments. Input is read
+    lazily and at most 2 x workers questions are in flight, so memory does not
+    grow with the size of the input.
+
+    Args:
+        agent: Txt2SqlAgent used by all workers
+        input_path: JSONL file of questions (see iter_questions)
+        output_path: JSONL file results are appended to
+        workers: Number of worker threads
+        sql_only: Only generate SQL with generate_sql_only instead of running query
+        mode: Query mode passed to query, see Txt2SqlAgent.query
+        progress: Optional callable taking the number of results written so far
+
+    Returns:
+        Dict with processed, skipped, failed, elapsed, throughput (questions/s)
+        and latency percentiles p50/p90/p95/p99 in seconds
+    """
+    if workers < 1:
+        raise ValueError("workers must be at least 1")
+    done = completed_ids(output_path)
+    latencies = array("d")
+    failed = 0
+    skipped = 0
+    start = time.perf_counter()
+
+    with open(output_path, "a", encoding="utf-8") as out, ThreadPoolExecutor(max_workers=workers) as pool:
+        pending = set()
+
+        def write(futures):
+            nonlocal failed
+            for future in futures:
+                record = future.result()
+                out.write(json.dumps(record, default=str) + "\n")
+                out.flush()
+                latencies.append(record["execution_time"])
+                failed += not record["success"]
+                if progress is not None:
+                    progress(len(latencies))
+
+        for item in iter_questions(input_path):
+            if str(item["id"]) in done:
+                skipped += 1
+                continue
+            if len(pending) >= 2 * workers:
+                finished, pending = wait(pending, return_when=FIRST_COMPLETED)
+                write(finished)
+            pending.add(pool.submit(_answer, agent, item, sql_only, mode))
+        write(wait(pending).done)
+
+    elapsed = time.perf_counter() - start
+    ordered = sorted(latencies)
+    stats = {
+        "processed": len(latencies),
+        "skipped": skipped,
+        "failed": failed,
+        "elapsed": elapsed,
+        "throughput": len(latencies) / elapsed if elapsed > 0 else 0.0,
+    }
+    for p in PERCENTILES:
+        stats[f"p{p}"] = percentile(ordered, p)
+    return stats
@@ -0,0 +1,256 @@
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Callable, Dict, Iterator, List, Optional
+from uuid import UUID
+from langchain_core.agents import AgentAction
+from langchain_core.callbacks import BaseCallbackHandler
+
+# Token of the query running in this context, see activate_cancel_token.
+_active_token: ContextVar[Optional["CancelToken"]] = ContextVar("cancel_token", default=None)
+
+_MESSAGES = {
+    "cancelled": "The query was cancelled",
+    "deadline": "The query did not finish before its deadline",
+}
+
+
+class QueryCancelled(Exception):
+    """Raised inside a query once its CancelToken is cancelled or its deadline passes"""
+
+
+class CancelToken:
+    """
+    Cancellation state of one request: an optional deadline and cancel().
+
+    A query checks its token before every LLM call, agent step, tool call and
+    statement, and stops with QueryCancelled once it is cancelled or past its
+    deadline. A statement already running is interrupted (see watch). Times
+    are time.monotonic() values. Thread-safe: cancel() is meant to be called
+    from another thread than the one running the query.
+    """
+
+    def __init__(self, timeout: Optional[float] = None, deadline: Optional[float] = None):
+        """
+        Args:
+            timeout: Seconds from now until the deadline. None for no timeout.
+            deadline: time.monotonic() deadline; with timeout, the earlier applies
+        """
+        self.started = time.monotonic()
+        if timeout is not None:
+            deadline = self.started + timeout if deadline is None else min(deadline, self.started + timeout)
+        self.deadline = deadline
+        self.reason: Optional[str] = None
+        self._lock = threading.Lock()
+        self._callbacks: List[Callable[[], None]] = []
+
+    @property
+    def cancelled(self) -> bool:
+        """Whether the token was cancelled or its deadline has passed"""
+        if self.reason is None and self.deadline is not None and time.monotonic() >= self.deadline:
+            self.cancel("deadline")
+        return self.reason is not None
+
+    @property
+    def message(self) -> Optional[str]:
+        """Why the query stopped, or None while it may continue"""
+        return _MESSAGES.get(self.reason, self.reason) if self.cancelled else None
+
+    def cancel(self, reason: str = "cancelled"):
+        """
+        Cancel the request and interrupt its running statement.
+
+        Args:
+            reason: "cancelled" or "deadline"; the first reason given is kept
+        """
+        with self._lock:
+            if self.reason is not None:
+                return
+            self.reason = reason
+            callbacks = list(self._callbacks)
+        for callback in callbacks:
+            try:
+                callback()
+            except Exception:
+                # Interrupting is best effort; the next checkpoint stops the query anyway.
+                pass
+
+    def check(self):
+        """
+        Raises:
+            QueryCancelled: If the token was cancelled or its deadline has passed
+        """
+        if self.cancelled:
+            raise QueryCancelled(self.message)
+
+    def remaining(self) -> Optional[float]:
+        """Seconds until the deadline (0 once passed), or None without one"""
+        if self.deadline is None:
+            return None
+        return max(self.deadline - time.monotonic(), 0.0)
+
+    def on_cancel(self, callback: Callable[[], None]) -> Callable[[], None]:
+        """
+        Call callback when the token is cancelled, right away if it already is.
+
+        Returns:
+            Callable: Unregisters the callback
+        """
+        with self._lock:
+            if self.reason is None:
+                self._callbacks.append(callback)
+                return lambda: self._unregister(callback)
+        callback()
+        return lambda: None
+
+    @contextmanager
+    def watch(self, interrupt: Optional[Callable[[], None]]) -> Iterator[None]:
+        """
+        Call interrupt if the token is cancelled, or its deadline passes, inside the block.
+
+        Args:
+            interrupt: Stops the work in progress, e.g. a DB-API connection's
+                cancel(). None only checks the token on entry.
+
+        Raises:
+            QueryCancelled: If the token is already cancelled on entry
+        """
+        self.check()
+        if interrupt is None:
+            yield
+            return
+        unregister = self.on_cancel(interrupt)
+        remaining = self.remaining()
+        timer = None
+        if remaining is not None:
+            timer = threading.Timer(remaining, self.cancel, ("deadline",))
+            timer.daemon = True
+            timer.start()
+        try:
+            yield
+        finally:
+            if timer is not None:
+                timer.cancel()
+            unregister()
+
+    def budget(self) -> Dict[str, Optional[float]]:
+        """
+        Time spent and left.
+
+        Returns:
+            Dict with timeout (seconds from start to deadline, None without
+            one), elapsed and remaining (None without a deadline) seconds
+        """
+        return {
+            "timeout": self.deadline - self.started if self.deadline is not None else None,
+            "elapsed": time.monotonic() - self.started,
+            "remaining": self.remaining(),
+        }
+
+    def _unregister(self, callback: Callable[[], None]):
+        with self._lock:
+            if callback in self._callbacks:
+                self._callbacks.remove(callback)
+
+
+class SharedCancelToken(CancelToken):
+    """
+    Token of a run shared by several callers (see SingleFlight).
+
+    The run is only cancelled once every caller's token is, so one caller
+    giving up never stops another's answer; a caller without a token keeps it
+    running. Its deadline is the latest of the callers' deadlines, and a
+    caller without a deadline lifts it.
+    """
+
+    def __init__(self):
+        super().__init__()
+        self._callers = 0
+        self._detached = False
+        self._unbounded = False
+        self._deadlines: List[float] = []
+
+    def join(self, token: Optional[CancelToken]):
+        """Add a caller, with its own token or None"""
+        with self._lock:
+            if token is None:
+                self._detached = True
+                self._unbounded = True
+            else:
+                self._callers += 1
+                if token.deadline is None:
+                    self._unbounded = True
+                else:
+                    self._deadlines.append(token.deadline)
+            self.deadline = None if self._unbounded or not self._deadlines else max(self._deadlines)
+        if token is not None:
+            token.on_cancel(self._leave)
+
+    def _leave(self):
+        with self._lock:
+            self._callers -= 1
+            abandoned = self._callers <= 0 and not self._detached
+        if abandoned:
+            self.cancel()
+
+
+def current_cancel_token() -> Optional[CancelToken]:
+    """The token of the query running in this context, if any"""
+    return _active_token.get()
+
+
+def check_cancelled():
+    """
+    Raises:
+        QueryCancelled: If the current query's token is cancelled
+    """
+    token = _active_token.get()
+    if token is not None:
+        token.check()
+
+
+@contextmanager
+def activate_cancel_token(token: Optional[CancelToken]) -> Iterator[None]:
+    """
+    Make a token current for database work done inside the block.
+
+    Like activate_tracer, threads that inherit the context (LangChain's tool
+    threads, asyncio.to_thread) see it too.
+    """
+    reset = _active_token.set(token)
+    try:
+        yield
+    finally:
+        _active_token.reset(reset)
+
+
+class CancellationCallbackHandler(BaseCallbackHandler):
+    """
+    Callback that stops a run once its token is cancelled.
+
+    Raises QueryCancelled before each LLM call, agent step and tool call, and
+    between the tokens of a streamed reply. An LLM request already sent
+    without streaming finishes first.
+    """
+
+    raise_error = True
+
+    def __init__(self, token: CancelToken):
+        self.token = token
+
+    def on_llm_start(self, serialized: Dict[str, Any], prompts: List[str], *, run_id: UUID, **kwargs: Any) -> Any:
+        self.token.check()
+
+    def on_chat_model_start(self, serialized: Dict[str, Any], messages: List[Any], *, run_id: UUID,
+                            **kwargs: Any) -> Any:
+        self.token.check()
+
+    def on_llm_new_token(self, token: str, **kwargs: Any) -> Any:
+        self.token.check()
+
+    def on_agent_action(self, action: AgentAction, **kwargs: Any) -> Any:
+        self.token.check()
+
+    def on_tool_start(self, serialized: Dict[str, Any], input_str: str, **kwargs: Any) -> Any:
+        self.token.check()
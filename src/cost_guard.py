@@ -0,0 +1,223 @@
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import asdict, dataclass
+from typing import Dict, Any, Iterator, List, Optional
+from sqlalchemy.exc import SQLAlchemyError
+from langchain_community.utilities import SQLDatabase
+from src.db_utils import explain_sql
+from src.sql_validator import normalize_sql, validate_sql
+
+GUARD_ACTIONS = ("reject", "limit", "rewrite")
+
+# Decisions made while a query() call is running, see collect_guard_decisions.
+_decisions: ContextVar[Optional[List["GuardDecision"]]] = ContextVar("cost_guard_decisions", default=None)
+
+
+class QueryRejected(Exception):
+    """Raised when the cost guard rejects a statement outright."""
+
+
+@dataclass
+class GuardDecision:
+    """
+    Outcome of a cost check.
+
+    action is "allow", "limit" (a LIMIT was added), "reject", "rewrite" (the
+    model is asked for a cheaper query) or "unchecked" (no plan available).
+    """
+    action: str
+    sql: str
+    cost: Optional[float] = None
+    rows: Optional[float] = None
+    message: Optional[str] = None
+
+    @property
+    def blocked(self) -> bool:
+        """Whether the statement must not be run"""
+        return self.action in ("reject", "rewrite")
+
+    def to_dict(self) -> Dict[str, Any]:
+        return asdict(self)
+
+
+@contextmanager
+def collect_guard_decisions() -> Iterator[List[GuardDecision]]:
+    """
+    Collect the decisions of every CostGuard check made inside the block.
+
+    Works across the threads LangChain runs tools in, since they inherit the
+    caller's context.
+
+    Yields:
+        List[GuardDecision]: Filled in as checks happen
+    """
+    decisions = []
+    token = _decisions.set(decisions)
+    try:
+        yield decisions
+    finally:
+        _decisions.reset(token)
+
+
+class CostGuard:
+    """
+    Checks generated SQL with EXPLAIN before it runs.
+
+    The planner's total cost and row estimate for the statement are compared
+    with configurable limits. Over the limit, the statement is rejected, capped
+    with a LIMIT, or sent back to the model for a rewrite. Plans are cached
+    per normalized SQL, so repeated statements are checked without a round trip.
+    Only PostgreSQL reports costs; on other databases every check is "unchecked".
+    """
+
+    def __init__(self,
+                 db: SQLDatabase,
+                 max_cost: Optional[float] = 1e6,
+                 max_rows: Optional[float] = 1e6,
+                 action: str = "rewrite",
+                 limit: int = 1000,
+                 cache_size: int = 1024,
+                 cache_ttl: Optional[float] = 300.0):
+        """
+        Args:
+            db: SQLDatabase the statements run against
+            max_cost: Highest allowed planner total cost. None for no limit.
+            max_rows: Highest allowed estimated row count. None for no limit.
+            action: What to do over the limit: "reject", "limit" or "rewrite".
+                "limit" falls back to "rewrite" if the capped query is still
+                over the limit.
+            limit: Row limit added by the "limit" action
+            cache_size: Plans kept in the cache
+            cache_ttl: Seconds a cached plan is trusted (table statistics change).
+                None keeps plans until evicted.
+        """
+        if action not in GUARD_ACTIONS:
+            raise ValueError(f"Unknown cost guard action {action!r}; expected one of {GUARD_ACTIONS}")
+        self.db = db
+        self.max_cost = max_cost
+        self.max_rows = max_rows
+        self.action = action
+        self.limit = limit
+        self.cache_size = cache_size
+        self.cache_ttl = cache_ttl
+        self._plans: "OrderedDict[str, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._counters = {"checks": 0, "plan_hits": 0, "plan_misses": 0, "blocked": 0, "limited": 0}
+
+    def check(self, sql: str) -> GuardDecision:
+        """
+        Decide whether a statement may run.
+
+        Args:
+            sql: SQL statement
+
+        Returns:
+            GuardDecision: The decision; decision.sql is the statement to run
+        """
+        decision = self._decide(sql)
+        with self._lock:
+            self._counters["checks"] += 1
+            self._counters["blocked"] += decision.blocked
+            self._counters["limited"] += decision.action == "limit"
+        decisions = _decisions.get()
+        if decisions is not None:
+            decisions.append(decision)
+        return decision
+
+    def explain(self, sql: str) -> Optional[Dict[str, float]]:
+        """
+        Return the planner's estimates for a read-only statement.
+
+        Args:
+            sql: SQL statement
+
+        Returns:
+            Optional[Dict]: {"cost": total cost, "rows": estimated rows}, or None
+            if the statement is not a read-only query, the database is not
+            PostgreSQL, or EXPLAIN fails
+        """
+        if self.db.dialect != "postgresql":
+            return None
+        try:
+            return self.plan(sql)
+        except SQLAlchemyError:
+            return None
+
+    def plan(self, sql: str) -> Optional[Dict[str, float]]:
+        """
+        Plan a read-only statement with EXPLAIN on any dialect, raising its error.
+
+        Unlike explain, a statement the database cannot plan (an unknown
+        column, a type error) raises instead of returning None, so callers
+        can tell a bad statement from a database without estimates. Plans
+        are cached like explain's.
+
+        Args:
+            sql: SQL statement
+
+        Returns:
+            Optional[Dict]: {"cost": total cost, "rows": estimated rows}, or None
+            if the statement is not a read-only query or the database is not
+            PostgreSQL
+
+        Raises:
+            SQLAlchemyError: If EXPLAIN fails
+        """
+        if validate_sql(sql) is not None:
+            return None
+        key = normalize_sql(sql)
+        now = time.time()
+        with self._lock:
+            cached = self._plans.get(key)
+            if cached is not None and (self.cache_ttl is None or now - cached[0] < self.cache_ttl):
+                self._plans.move_to_end(key)
+                self._counters["plan_hits"] += 1
+                return cached[1]
+            self._counters["plan_misses"] += 1
+
+        estimate = explain_sql(self.db, sql)
+
+        with self._lock:
+            self._plans[key] = (now, estimate)
+            self._plans.move_to_end(key)
+            while len(self._plans) > self.cache_size:
+                self._plans.popitem(last=False)
+        return estimate
+
+    def stats(self) -> Dict[str, Any]:
+        """Return check/plan cache counters and the number of cached plans"""
+        with self._lock:
+            return dict(self._counters, plans=len(self._plans))
+
+    def _decide(self, sql: str) -> GuardDecision:
+        estimate = self.explain(sql)
+        if estimate is None:
+            return GuardDecision("unchecked", sql)
+        if not self._over_limit(estimate):
+            return GuardDecision("allow", sql, estimate["cost"], estimate["rows"])
+
+        if self.action == "limit":
+            limited = f"SELECT * FROM ({sql}) AS guarded_query LIMIT {int(self.limit)}"
+            limited_estimate = self.explain(limited)
+            if limited_estimate is not None and not self._over_limit(limited_estimate):
+                return GuardDecision("limit", limited, limited_estimate["cost"], limited_estimate["rows"],
+                                     f"Only the first {self.limit} rows were returned.")
+            return GuardDecision("rewrite", sql, estimate["cost"], estimate["rows"], self._message("rewrite", estimate))
+        return GuardDecision(self.action, sql, estimate["cost"], estimate["rows"], self._message(self.action, estimate))
+
+    def _over_limit(self, estimate: Dict[str, float]) -> bool:
+        return ((self.max_cost is not None and estimate["cost"] > self.max_cost)
+                or (self.max_rows is not None and estimate["rows"] > self.max_rows))
+
+    def _message(self, action: str, estimate: Dict[str, float]) -> str:
+        max_cost = f"{self.max_cost:,.0f}" if self.max_cost is not None else "none"
+        max_rows = f"{self.max_rows:,.0f}" if self.max_rows is not None else "none"
+        over = (f"estimated cost {estimate['cost']:,.0f} and {estimate['rows']:,.0f} rows "
+                f"(limits: cost {max_cost}, rows {max_rows})")
+        if action == "reject":
+            return f"Error: the query was rejected as too expensive: {over}."
+        return (f"Error: the query is too expensive to run: {over}. Rewrite it to read fewer rows, "
+                f"e.g. with more selective filters, aggregation or a LIMIT, and check the join conditions.")
@@ -0,0 +1,167 @@
+import os
+import threading
+import time
+from contextlib import ExitStack
+from typing import Dict, Any, Optional
+from sqlalchemy import exc, text
+from sqlalchemy.engine import make_url
+from sqlalchemy.pool import QueuePool
+from langchain_community.utilities import SQLDatabase
+
+
+class MeteredQueuePool(QueuePool):
+    """
+    QueuePool that records checkouts and how long they took.
+
+    The time measured for a checkout covers waiting for a free connection plus
+    opening a new one or pre-pinging a pooled one, i.e. everything a caller
+    waits for before it can run a statement.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._metrics_lock = threading.Lock()
+        self._checkouts = 0
+        self._timeouts = 0
+        self._wait_total = 0.0
+        self._wait_max = 0.0
+
+    def connect(self):
+        start = time.perf_counter()
+        try:
+            return super().connect()
+        except exc.TimeoutError:
+            with self._metrics_lock:
+                self._timeouts += 1
+            raise
+        finally:
+            waited = time.perf_counter() - start
+            with self._metrics_lock:
+                self._checkouts += 1
+                self._wait_total += waited
+                self._wait_max = max(self._wait_max, waited)
+
+    def metrics(self) -> Dict[str, Any]:
+        """
+        Return current utilization and cumulative checkout statistics.
+
+        Returns:
+            Dict with size, max_overflow, checked_out, idle, overflow, checkouts
+            (attempts, including timeouts), timeouts, wait_avg and wait_max (seconds)
+        """
+        with self._metrics_lock:
+            checkouts, timeouts = self._checkouts, self._timeouts
+            wait_total, wait_max = self._wait_total, self._wait_max
+        return {
+            "size": self.size(),
+            "max_overflow": self._max_overflow,
+            "checked_out": self.checkedout(),
+            "idle": self.checkedin(),
+            "overflow": max(self.overflow(), 0),
+            "checkouts": checkouts,
+            "timeouts": timeouts,
+            "wait_avg": wait_total / checkouts if checkouts else 0.0,
+            "wait_max": wait_max
+        }
+
+
+def create_database(db_uri: str,
+                    pool_size: int = 5,
+                    max_overflow: int = 10,
+                    pool_timeout: float = 30.0,
+                    pool_pre_ping: bool = True,
+                    pool_recycle: int = 1800,
+                    statement_timeout_ms: Optional[int] = None,
+                    application_name: Optional[str] = "txt2sql",
+                    **kwargs) -> SQLDatabase:
+    """
+    Create a SQLDatabase on a configured, metered connection pool.
+
+    Args:
+        db_uri: SQLAlchemy database URI
+        pool_size: Connections kept open in the pool
+        max_overflow: Extra connections allowed above pool_size under load
+        pool_timeout: Seconds to wait for a free connection before failing
+        pool_pre_ping: Test connections on checkout and replace dead ones
+        pool_recycle: Seconds after which a connection is replaced (-1 never)
+        statement_timeout_ms: PostgreSQL statement_timeout for every connection.
+            None or 0 keeps the server default.
+        application_name: PostgreSQL application_name shown in pg_stat_activity
+        **kwargs: Passed to SQLDatabase.from_uri (e.g. lazy_table_reflection)
+
+    Returns:
+        SQLDatabase: Database whose engine uses a MeteredQueuePool
+    """
+    engine_args = {
+        "poolclass": MeteredQueuePool,
+        "pool_size": pool_size,
+        "max_overflow": max_overflow,
+        "pool_timeout": pool_timeout,
+        "pool_pre_ping": pool_pre_ping,
+        "pool_recycle": pool_recycle,
+    }
+    if make_url(db_uri).get_backend_name() == "postgresql":
+        connect_args = {}
+        if application_name:
+            connect_args["application_name"] = application_name
+        if statement_timeout_ms:
+            connect_args["options"] = f"-c statement_timeout={int(statement_timeout_ms)}"
+        engine_args["connect_args"] = connect_args
+    return SQLDatabase.from_uri(db_uri, engine_args=engine_args, **kwargs)
+
+
+def pool_settings_from_env() -> Dict[str, Any]:
+    """
+    Read create_database pool settings from environment variables.
+
+    Returns:
+        Dict of keyword arguments for create_database
+    """
+    return {
+        "pool_size": int(os.getenv("DB_POOL_SIZE", "5")),
+        "max_overflow": int(os.getenv("DB_MAX_OVERFLOW", "10")),
+        "pool_timeout": float(os.getenv("DB_POOL_TIMEOUT", "30")),
+        "pool_pre_ping": os.getenv("DB_POOL_PRE_PING", "1") != "0",
+        "pool_recycle": int(os.getenv("DB_POOL_RECYCLE", "1800")),
+        "statement_timeout_ms": int(os.getenv("DB_STATEMENT_TIMEOUT_MS", "0")) or None,
+        "application_name": os.getenv("DB_APPLICATION_NAME", "txt2sql"),
+    }
+
+
+def warm_up_pool(db: SQLDatabase, connections: Optional[int] = None) -> float:
+    """
+    Open pool connections ahead of the first request.
+
+    Connections are checked out together, so each one is distinct, and
+    returned to the pool after a trivial query.
+
+    Args:
+        db: SQLDatabase instance
+        connections: Number of connections to open. Defaults to the pool size.
+
+    Returns:
+        float: Seconds the warm-up took
+    """
+    start = time.perf_counter()
+    pool = db._engine.pool
+    count = connections if connections is not None else (pool.size() if isinstance(pool, QueuePool) else 1)
+    with ExitStack() as stack:
+        for _ in range(count):
+            conn = stack.enter_context(db._engine.connect())
+            conn.execute(text("SELECT 1"))
+    return time.perf_counter() - start
+
+
+def pool_metrics(db: SQLDatabase) -> Optional[Dict[str, Any]]:
+    """
+    Return utilization metrics of the database's connection pool.
+
+    Args:
+        db: SQLDatabase instance
+
+    Returns:
+        Optional[Dict]: MeteredQueuePool.metrics(), or None if the engine was
+        not created by create_database
+    """
+    pool = db._engine.pool
+    return pool.metrics() if isinstance(pool, MeteredQueuePool) else None
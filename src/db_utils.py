@@ -1,18 +1,298 @@
+import copy
+import hashlib
+import json
+import re
+import time
+from contextlib import contextmanager
+from typing import TYPE_CHECKING, Dict, Iterator, List, Optional, Tuple
 from sqlalchemy import inspect, text
+from sqlalchemy.engine import Connection
+from sqlalchemy.exc import SQLAlchemyError
 from langchain_community.utilities import SQLDatabase
+from langchain_community.utilities.sql_database import truncate_word
+from src.cancellation import QueryCancelled, current_cancel_token
+from src.sql_validator import validate_sql
+from src.tracing import current_tracer
 
-def get_db_info(db: SQLDatabase) -> dict:
+# Polars is imported where frames are built, so importing this module (and
+# starting the CLI) does not pay for it.
+if TYPE_CHECKING:
+    import polars as pl
+
+# Rows per fetchmany() round trip (and per frame) when reading query results.
+DEFAULT_FETCH_BATCH_SIZE = 1000
+
+# Bulk catalog queries used by get_db_info on PostgreSQL. Each one covers every
+# table in the requested schemas, so introspection costs three round trips
+# (plus one to look up current_schema() when no schema is given) regardless of
+# how many tables there are.
+_PG_COLUMNS_QUERY = """
+SELECT n.nspname AS schema_name,
+       c.relname AS table_name,
+       a.attname AS column_name,
+       pg_catalog.format_type(a.atttypid, a.atttypmod) AS column_type,
+       NOT a.attnotnull AS nullable,
+       pg_catalog.pg_get_expr(d.adbin, d.adrelid) AS column_default,
+       pg_catalog.col_description(c.oid, a.attnum) AS column_comment,
+       pg_catalog.obj_description(c.oid, 'pg_class') AS table_comment
+FROM pg_catalog.pg_class c
+JOIN pg_catalog.pg_namespace n ON n.oid = c.relnamespace
+LEFT JOIN pg_catalog.pg_attribute a
+       ON a.attrelid = c.oid AND a.attnum > 0 AND NOT a.attisdropped
+LEFT JOIN pg_catalog.pg_attrdef d
+       ON d.adrelid = a.attrelid AND d.adnum = a.attnum
+WHERE c.relkind IN ('r', 'p')
+  AND n.nspname = ANY(:schemas){table_filter}
+ORDER BY n.nspname, c.relname, a.attnum
+"""
+
+_PG_INDEXES_QUERY = """
+SELECT n.nspname AS schema_name,
+       c.relname AS table_name,
+       i.relname AS index_name,
+       ix.indisunique AS is_unique,
+       ix.indisprimary AS is_primary,
+       array_agg(a.attname ORDER BY k.ord) AS column_names
+FROM pg_catalog.pg_index ix
+JOIN pg_catalog.pg_class c ON c.oid = ix.indrelid
+JOIN pg_catalog.pg_class i ON i.oid = ix.indexrelid
+JOIN pg_catalog.pg_namespace n ON n.oid = c.relnamespace
+CROSS JOIN LATERAL unnest(ix.indkey::int2[]) WITH ORDINALITY AS k(attnum, ord)
+LEFT JOIN pg_catalog.pg_attribute a
+       ON a.attrelid = c.oid AND a.attnum = k.attnum
+WHERE c.relkind IN ('r', 'p')
+  AND n.nspname = ANY(:schemas){table_filter}
+  AND k.ord <= ix.indnkeyatts
+GROUP BY n.nspname, c.relname, i.relname, ix.indisunique, ix.indisprimary
+ORDER BY n.nspname, c.relname, i.relname
+"""
+
+_PG_FOREIGN_KEYS_QUERY = """
+SELECT n.nspname AS schema_name,
+       c.relname AS table_name,
+       con.conname AS constraint_name,
+       rn.nspname AS referred_schema,
+       rc.relname AS referred_table,
+       array_agg(a.attname ORDER BY k.ord) AS column_names,
+       array_agg(ra.attname ORDER BY k.ord) AS referred_columns
+FROM pg_catalog.pg_constraint con
+JOIN pg_catalog.pg_class c ON c.oid = con.conrelid
+JOIN pg_catalog.pg_namespace n ON n.oid = c.relnamespace
+JOIN pg_catalog.pg_class rc ON rc.oid = con.confrelid
+JOIN pg_catalog.pg_namespace rn ON rn.oid = rc.relnamespace
+CROSS JOIN LATERAL unnest(con.conkey, con.confkey) WITH ORDINALITY AS k(attnum, refnum, ord)
+JOIN pg_catalog.pg_attribute a
+  ON a.attrelid = con.conrelid AND a.attnum = k.attnum
+JOIN pg_catalog.pg_attribute ra
+  ON ra.attrelid = con.confrelid AND ra.attnum = k.refnum
+WHERE con.contype = 'f'
+  AND n.nspname = ANY(:schemas){table_filter}
+GROUP BY n.nspname, c.relname, con.conname, rn.nspname, rc.relname
+ORDER BY n.nspname, c.relname, con.conname
+"""
+
+_PG_TABLE_FILTER = "\n  AND c.relname = ANY(:tables)"
+
+# Distinct values of low-cardinality text columns, from the planner statistics
+# that ANALYZE keeps: one round trip for every table.
+_PG_COLUMN_STATS_QUERY = """
+SELECT s.schemaname AS schema_name,
+       s.tablename AS table_name,
+       s.attname AS column_name,
+       s.n_distinct,
+       s.most_common_vals::text::text[] AS common_values
+FROM pg_catalog.pg_stats s
+WHERE s.schemaname = ANY(:schemas)
+  AND s.tablename = ANY(:tables)
+  AND NOT s.inherited
+"""
+
+_PG_ENUM_QUERY = """
+SELECT t.typname AS type_name,
+       array_agg(e.enumlabel ORDER BY e.enumsortorder) AS labels
+FROM pg_catalog.pg_enum e
+JOIN pg_catalog.pg_type t ON t.oid = e.enumtypid
+GROUP BY t.typname
+"""
+
+# Column types whose values are worth offering to the model as literals.
+_TEXT_TYPE = re.compile(r"char|text|string|enum|citext", re.IGNORECASE)
+
+# Longer values are free text rather than names or codes.
+MAX_COLUMN_VALUE_LENGTH = 100
+
+# Cheap per-table fingerprint: changes whenever a table is rewritten, gains or
+# loses columns, has a column redefined, or gains or loses an index or key.
+_PG_FINGERPRINT_QUERY = """
+SELECT n.nspname AS schema_name,
+       c.relname AS table_name,
+       md5(concat_ws(':',
+           c.relfilenode, c.relnatts,
+           (SELECT string_agg(concat_ws(' ', a.attname, a.atttypid, a.atttypmod, a.attnotnull, a.atthasdef), ',' ORDER BY a.attnum)
+              FROM pg_catalog.pg_attribute a
+             WHERE a.attrelid = c.oid AND a.attnum > 0 AND NOT a.attisdropped),
+           (SELECT string_agg(i.indexrelid::text, ',' ORDER BY i.indexrelid)
+              FROM pg_catalog.pg_index i
+             WHERE i.indrelid = c.oid),
+           (SELECT string_agg(con.oid::text, ',' ORDER BY con.oid)
+              FROM pg_catalog.pg_constraint con
+             WHERE con.conrelid = c.oid AND con.contype IN ('p', 'f', 'u')))) AS fingerprint
+FROM pg_catalog.pg_class c
+JOIN pg_catalog.pg_namespace n ON n.oid = c.relnamespace
+WHERE c.relkind IN ('r', 'p')
+  AND n.nspname = ANY(:schemas)
+"""
+
+
+def _resolve_schemas(db: SQLDatabase, schemas: Optional[List[str]]) -> List[str]:
+    """Return the schemas to introspect, defaulting to the database's own schema."""
+    if schemas:
+        return list(schemas)
+    if db._schema:
+        return [db._schema]
+    with db._engine.connect() as conn:
+        return [conn.execute(text("SELECT current_schema()")).scalar()]
+
+
+def _table_key(schema: str, table: str, schemas: List[str]) -> str:
+    """Key tables by bare name for a single schema, and schema-qualified otherwise."""
+    if len(schemas) == 1 and schema == schemas[0]:
+        return table
+    return f"{schema}.{table}"
+
+
+def get_db_info(db: SQLDatabase,
+                schemas: Optional[List[str]] = None,
+                tables: Optional[List[str]] = None) -> dict:
     """
     Get detailed information about the database including tables, columns, and relationships.
     
+    On PostgreSQL the whole schema is read with a handful of bulk ``pg_catalog``
+    queries; other dialects fall back to the per-table SQLAlchemy inspector.
+    
+    Column types are reported as the database spells them: ``format_type()`` on
+    PostgreSQL (``integer``, ``character varying(64)``, ``timestamp with time
+    zone``, enum and domain names), ``str()`` of the reflected SQLAlchemy type
+    elsewhere (``INTEGER``, ``VARCHAR(64)``). The PostgreSQL form keeps time
+    zones, array element types and enum names that the SQLAlchemy one drops.
+    
     Args:
         db: SQLDatabase instance connected to a PostgreSQL database
+        schemas: Schemas to introspect. Defaults to the database's current schema.
+            Table names are schema-qualified when more than one schema is given.
+        tables: Only introspect these tables (as keyed in the result). Defaults to all.
+        
+    Returns:
+        dict: Dictionary containing database schema information
+    """
+    if db._engine.dialect.name == "postgresql":
+        return _get_db_info_pg_catalog(db, schemas, tables)
+    return _get_db_info_inspector(db, schemas, tables)
+
+
+def _get_db_info_pg_catalog(db: SQLDatabase,
+                            schemas: Optional[List[str]] = None,
+                            tables: Optional[List[str]] = None) -> dict:
+    """
+    Build the get_db_info structure from bulk pg_catalog queries.
+    
+    Args:
+        db: SQLDatabase instance connected to a PostgreSQL database
+        schemas: Schemas to introspect
+        tables: Only introspect these tables. Defaults to all.
+        
+    Returns:
+        dict: Dictionary containing database schema information
+    """
+    schemas = _resolve_schemas(db, schemas)
+    params = {"schemas": schemas}
+    table_filter = ""
+    if tables is not None:
+        params["tables"] = sorted({name.rsplit(".", 1)[-1] for name in tables})
+        table_filter = _PG_TABLE_FILTER
+    wanted = set(tables) if tables is not None else None
+    
+    db_info = {
+        "tables": {},
+        "relationships": []
+    }
+    
+    with db._engine.connect() as conn:
+        column_rows = conn.execute(text(_PG_COLUMNS_QUERY.format(table_filter=table_filter)), params).fetchall()
+        index_rows = conn.execute(text(_PG_INDEXES_QUERY.format(table_filter=table_filter)), params).fetchall()
+        fk_rows = conn.execute(text(_PG_FOREIGN_KEYS_QUERY.format(table_filter=table_filter)), params).fetchall()
+    
+    for row in column_rows:
+        key = _table_key(row.schema_name, row.table_name, schemas)
+        if wanted is not None and key not in wanted:
+            continue
+        table = db_info["tables"].setdefault(key, {
+            "columns": [],
+            "primary_keys": [],
+            "indexes": [],
+            "comment": row.table_comment
+        })
+        if row.column_name is None:
+            continue
+        table["columns"].append({
+            "name": row.column_name,
+            "type": row.column_type,
+            "nullable": row.nullable,
+            "default": row.column_default,
+            "comment": row.column_comment,
+        })
+    
+    for row in index_rows:
+        table = db_info["tables"].get(_table_key(row.schema_name, row.table_name, schemas))
+        if table is None:
+            continue
+        if row.is_primary:
+            table["primary_keys"] = list(row.column_names)
+        else:
+            table["indexes"].append({
+                "name": row.index_name,
+                "columns": list(row.column_names),
+                "unique": row.is_unique
+            })
+    
+    for row in fk_rows:
+        key = _table_key(row.schema_name, row.table_name, schemas)
+        if key not in db_info["tables"]:
+            continue
+        db_info["relationships"].append({
+            "table": key,
+            "columns": list(row.column_names),
+            "references_table": _table_key(row.referred_schema, row.referred_table, schemas),
+            "references_columns": list(row.referred_columns),
+            "name": row.constraint_name
+        })
+    
+    return db_info
+
+
+def _get_db_info_inspector(db: SQLDatabase,
+                           schemas: Optional[List[str]] = None,
+                           tables: Optional[List[str]] = None) -> dict:
+    """
+    Build the get_db_info structure with the SQLAlchemy inspector, one table at a time.
+    
+    Args:
+        db: SQLDatabase instance
+        schemas: Schemas to introspect. Defaults to the inspector's default schema.
+        tables: Only introspect these tables. Defaults to all.
         
     Returns:
         dict: Dictionary containing database schema information
     """
     inspector = inspect(db._engine)
-    tables = inspector.get_table_names()
+    schemas = list(schemas) if schemas else [db._schema]
+    wanted = set(tables) if tables is not None else None
+    tables = [
+        (schema, table)
+        for schema in schemas
+        for table in inspector.get_table_names(schema=schema)
+        if wanted is None or _table_key(schema, table, schemas) in wanted
+    ]
     
     db_info = {
         "tables": {},
@@ -20,38 +300,45 @@ def get_db_info(db: SQLDatabase) -> dict:
     }
     
     # Get table information including columns and primary keys
-    for table in tables:
+    for schema, table in tables:
         columns = []
-        for column in inspector.get_columns(table):
+        for column in inspector.get_columns(table, schema=schema):
             columns.append({
                 "name": column["name"],
                 "type": str(column["type"]),
                 "nullable": column.get("nullable", True),
                 "default": str(column.get("default", "")) if column.get("default") else None,
+                "comment": column.get("comment"),
             })
         
-        primary_keys = inspector.get_pk_constraint(table).get("constrained_columns", [])
+        primary_keys = inspector.get_pk_constraint(table, schema=schema).get("constrained_columns", [])
         indexes = []
-        for index in inspector.get_indexes(table):
+        for index in inspector.get_indexes(table, schema=schema):
             indexes.append({
                 "name": index["name"],
                 "columns": index["column_names"],
                 "unique": index["unique"]
             })
         
-        db_info["tables"][table] = {
+        try:
+            comment = inspector.get_table_comment(table, schema=schema).get("text")
+        except NotImplementedError:
+            comment = None
+        
+        db_info["tables"][_table_key(schema, table, schemas)] = {
             "columns": columns,
             "primary_keys": primary_keys,
-            "indexes": indexes
+            "indexes": indexes,
+            "comment": comment
         }
     
     # Get foreign key relationships
-    for table in tables:
-        for fk in inspector.get_foreign_keys(table):
+    for schema, table in tables:
+        for fk in inspector.get_foreign_keys(table, schema=schema):
             relationship = {
-                "table": table,
+                "table": _table_key(schema, table, schemas),
                 "columns": fk["constrained_columns"],
-                "references_table": fk["referred_table"],
+                "references_table": _table_key(fk.get("referred_schema") or schema, fk["referred_table"], schemas),
                 "references_columns": fk["referred_columns"],
                 "name": fk.get("name")
             }
@@ -60,7 +347,91 @@ def get_db_info(db: SQLDatabase) -> dict:
     return db_info
 
 
-def execute_sample_query(db: SQLDatabase, table_name: str, limit: int = 5) -> list:
+def get_schema_fingerprints(db: SQLDatabase, schemas: Optional[List[str]] = None) -> Dict[str, str]:
+    """
+    Compute a cheap per-table fingerprint of the schema definition.
+    
+    A table's fingerprint changes when its columns, indexes or keys change, so
+    comparing two fingerprint maps tells which tables need re-introspection.
+    PostgreSQL and SQLite use a single catalog query; other dialects fall back
+    to hashing the inspector's column list.
+    
+    Args:
+        db: SQLDatabase instance
+        schemas: Schemas to fingerprint. Defaults to the database's current schema.
+        
+    Returns:
+        Dict[str, str]: Fingerprint per table, keyed like get_db_info tables
+    """
+    dialect = db._engine.dialect.name
+    if dialect == "postgresql":
+        schemas = _resolve_schemas(db, schemas)
+        with db._engine.connect() as conn:
+            rows = conn.execute(text(_PG_FINGERPRINT_QUERY), {"schemas": schemas}).fetchall()
+        return {_table_key(row.schema_name, row.table_name, schemas): row.fingerprint for row in rows}
+    
+    if dialect == "sqlite" and not schemas:
+        definitions = {}
+        with db._engine.connect() as conn:
+            rows = conn.execute(text(
+                "SELECT tbl_name, type, name, sql FROM sqlite_master "
+                "WHERE type IN ('table', 'index') AND tbl_name NOT LIKE 'sqlite_%' "
+                "ORDER BY tbl_name, type DESC, name"
+            )).fetchall()
+        for tbl_name, _, name, sql in rows:
+            definitions.setdefault(tbl_name, []).append(f"{name}:{sql}")
+        return {table: _hash_text("\n".join(parts)) for table, parts in definitions.items()}
+    
+    inspector = inspect(db._engine)
+    schemas = list(schemas) if schemas else [db._schema]
+    fingerprints = {}
+    for schema in schemas:
+        for table in inspector.get_table_names(schema=schema):
+            columns = inspector.get_columns(table, schema=schema)
+            definition = ",".join(f"{c['name']} {c['type']} {c.get('nullable')}" for c in columns)
+            fingerprints[_table_key(schema, table, schemas)] = _hash_text(definition)
+    return fingerprints
+
+
+def schema_fingerprint(table_fingerprints: Dict[str, str]) -> str:
+    """
+    Combine per-table fingerprints into a single fingerprint for the whole schema.
+    
+    Args:
+        table_fingerprints: Output of get_schema_fingerprints
+        
+    Returns:
+        str: Hex digest identifying the schema
+    """
+    return _hash_text("\n".join(f"{table}={fp}" for table, fp in sorted(table_fingerprints.items())))
+
+
+def restrict_tables(db: SQLDatabase, tables: List[str]) -> SQLDatabase:
+    """
+    Return a view of the database limited to the given tables.
+    
+    The view is a shallow copy that shares the engine and reflected metadata
+    with the original, so it is cheap enough to create for every query, unlike
+    constructing a new SQLDatabase with include_tables.
+    
+    Args:
+        db: SQLDatabase instance
+        tables: Tables the view exposes; unknown names are ignored
+        
+    Returns:
+        SQLDatabase: Restricted view of db
+    """
+    view = copy.copy(db)
+    view._include_tables = set(tables) & set(db.get_usable_table_names())
+    view._usable_tables = set(view._include_tables)
+    return view
+
+
+def _hash_text(value: str) -> str:
+    return hashlib.sha256(value.encode("utf-8")).hexdigest()
+
+
+def execute_sample_query(db: SQLDatabase, table_name: str, limit: int = 5, result_cache=None) -> list:
     """
     Execute a sample query to show a few rows from a specific table.
     
@@ -68,16 +439,419 @@ def execute_sample_query(db: SQLDatabase, table_name: str, limit: int = 5) -> li
         db: SQLDatabase instance
         table_name: Name of the table to query
         limit: Maximum number of rows to return
+        result_cache: Optional ResultCache to serve repeated samples from
         
     Returns:
-        list: Sample data from the specified table
+        list: Sample data from the specified table, one dict per row
+    """
+    return fetch_sample_frame(db, table_name, limit, result_cache).to_dicts()
+
+
+def fetch_sample_frame(db: SQLDatabase, table_name: str, limit: int = 5, result_cache=None) -> "pl.DataFrame":
+    """
+    Fetch a few rows from a specific table as a Polars DataFrame.
+    
+    Args:
+        db: SQLDatabase instance
+        table_name: Name of the table to query
+        limit: Maximum number of rows to return
+        result_cache: Optional ResultCache to serve repeated samples from
+        
+    Returns:
+        pl.DataFrame: Sample data from the specified table
     """
     query = f"SELECT * FROM {table_name} LIMIT {limit}"
+    if result_cache is not None:
+        return result_cache.execute(query)
+    return fetch_dataframe(db, query, max_rows=limit)
+
+
+def iter_frames(db: SQLDatabase, query: str, batch_size: int = DEFAULT_FETCH_BATCH_SIZE) -> Iterator["pl.DataFrame"]:
+    """
+    Execute a query and yield its rows as Polars DataFrames of at most batch_size rows.
+    
+    Read-only queries use a server-side cursor (a named cursor on PostgreSQL),
+    so only one batch is held in Python at a time. At least one frame is
+    yielded; it is empty if the query returns no rows. Closing the generator
+    early closes the cursor. Duplicate column names (e.g. two joined ``id``
+    columns) are suffixed so the frames can be built.
+    
+    Args:
+        db: SQLDatabase instance
+        query: SQL query returning rows
+        batch_size: Rows fetched per round trip and per frame
+        
+    Yields:
+        pl.DataFrame: Consecutive batches of the result
+    """
+    import polars as pl
+    
+    # Server-side cursors only accept queries; anything else runs normally.
+    options = {"stream_results": True, "max_row_buffer": batch_size} if validate_sql(query) is None else {}
+    with db._engine.connect() as conn, _cancellable(conn):
+        if db._schema and db.dialect == "postgresql":
+            conn.exec_driver_sql("SET search_path TO %s", (db._schema,))
+        result = conn.execute(text(query), execution_options=options)
+        if not result.returns_rows:
+            yield pl.DataFrame()
+            return
+        columns = _unique_names(list(result.keys()))
+        empty = True
+        while True:
+            rows = result.fetchmany(batch_size)
+            if not rows:
+                break
+            empty = False
+            yield pl.DataFrame([tuple(row) for row in rows], schema=columns, orient="row",
+                               strict=False, infer_schema_length=None)
+        if empty:
+            yield pl.DataFrame([], schema=columns, orient="row")
+
+
+def fetch_dataframe(db: SQLDatabase,
+                    query: str,
+                    max_rows: Optional[int] = None,
+                    max_bytes: Optional[int] = None,
+                    batch_size: int = DEFAULT_FETCH_BATCH_SIZE) -> "pl.DataFrame":
+    """
+    Execute a query and return its rows as a Polars DataFrame, optionally capped.
+    
+    Rows are read in batches through iter_frames and reading stops as soon as
+    a cap is reached, so a huge result never has to fit in memory. Use
+    fetch_capped to also learn whether a cap cut the result.
+    
+    Args:
+        db: SQLDatabase instance
+        query: SQL query returning rows
+        max_rows: Keep at most this many rows. None for no limit.
+        max_bytes: Stop reading once the frame's estimated size reaches this
+            (checked per batch, so it can be exceeded by up to one batch).
+            None for no limit.
+        batch_size: Rows fetched per round trip
+        
+    Returns:
+        pl.DataFrame: Query result, truncated to the caps
+    """
+    return fetch_capped(db, query, max_rows, max_bytes, batch_size)[0]
+
+
+def fetch_capped(db: SQLDatabase,
+                 query: str,
+                 max_rows: Optional[int] = None,
+                 max_bytes: Optional[int] = None,
+                 batch_size: int = DEFAULT_FETCH_BATCH_SIZE) -> Tuple["pl.DataFrame", bool]:
+    """
+    fetch_dataframe, also reporting whether a cap cut the result short.
+    
+    When a cap is reached exactly at the end of a batch, the next batch is
+    read to tell a complete result from a cut one.
+    
+    Args:
+        db: SQLDatabase instance
+        query: SQL query returning rows
+        max_rows: Keep at most this many rows. None for no limit.
+        max_bytes: Stop reading once the frame's estimated size reaches this.
+            None for no limit.
+        batch_size: Rows fetched per round trip
+        
+    Returns:
+        Tuple of (frame, truncated). truncated is True only if the query had
+        rows beyond the ones returned.
+    """
+    import polars as pl
+    
+    tracer = current_tracer()
+    start = time.perf_counter() if tracer is not None else None
+    frames = []
+    rows = 0
+    size = 0
+    capped = False
+    truncated = False
+    for frame in iter_frames(db, query, batch_size):
+        if capped:
+            # Anything left after a cap was reached means the result was cut.
+            truncated = frame.height > 0
+            break
+        if max_rows is not None and rows + frame.height > max_rows:
+            frame = frame.head(max_rows - rows)
+            truncated = True
+        frames.append(frame)
+        rows += frame.height
+        size += frame.estimated_size()
+        if truncated:
+            break
+        capped = (max_rows is not None and rows >= max_rows) or (max_bytes is not None and size >= max_bytes)
+    if len(frames) == 1:
+        result = frames[0]
+    else:
+        # Batches infer their dtypes separately (e.g. a column that is all NULL
+        # in the first batch), so let concat widen them to a common type.
+        result = pl.concat(frames, how="vertical_relaxed")
+    if tracer is not None:
+        tracer.record_db(query, time.perf_counter() - start, result.height)
+    return result, truncated
+
+
+def format_rows(df: "pl.DataFrame", max_string_length: int = 300) -> str:
+    """
+    Render a result frame the way SQLDatabase.run formats rows for the agent.
+    
+    Args:
+        df: Query result
+        max_string_length: Values longer than this are truncated
+        
+    Returns:
+        str: String form of the list of row tuples, or "" if there are no rows
+    """
+    if df.is_empty():
+        return ""
+    rows = [
+        tuple(truncate_word(value, length=max_string_length) for value in row)
+        for row in df.iter_rows()
+    ]
+    return str(rows)
+
+
+@contextmanager
+def _cancellable(conn: Connection) -> Iterator[None]:
+    """
+    Stop the statements run inside the block when the current query is cancelled.
+
+    Cancelling interrupts the connection from another thread: psycopg's
+    cancel() sends PostgreSQL a cancel request (what pg_cancel_backend does
+    for the backend), sqlite3's interrupt() aborts the running statement. On
+    PostgreSQL the deadline also lowers the transaction's statement_timeout,
+    so the server stops the statement even if the client cannot reach it.
+    Errors of an interrupted statement are raised as QueryCancelled.
+    """
+    token = current_cancel_token()
+    if token is None:
+        yield
+        return
+    dbapi_connection = conn.connection.dbapi_connection
+    interrupt = getattr(dbapi_connection, "cancel", None) or getattr(dbapi_connection, "interrupt", None)
+    with token.watch(interrupt):
+        remaining = token.remaining()
+        if remaining is not None and conn.dialect.name == "postgresql":
+            # Like SET LOCAL, this ends with the transaction, before the connection returns
+            # to the pool; a lower statement_timeout configured for the pool is kept.
+            conn.exec_driver_sql(
+                "SELECT set_config('statement_timeout', LEAST(NULLIF(EXTRACT(EPOCH FROM "
+                "current_setting('statement_timeout')::interval) * 1000, 0), "
+                f"{max(int(remaining * 1000), 1)})::bigint::text, true)"
+            )
+        try:
+            yield
+        except SQLAlchemyError as e:
+            if token.cancelled:
+                raise QueryCancelled(token.message) from e
+            raise
+
+
+def explain_sql(db: SQLDatabase, query: str) -> Optional[Dict[str, float]]:
+    """
+    Plan a query without running it.
+
+    Planning resolves every table, column and function, so a query the
+    database would reject fails here without reading any rows. PostgreSQL
+    uses EXPLAIN (FORMAT JSON) and reports the planner's estimates; SQLite
+    uses EXPLAIN QUERY PLAN and other dialects plain EXPLAIN, which only
+    validate the query.
+
+    Args:
+        db: SQLDatabase instance
+        query: SQL query
+
+    Returns:
+        Optional[Dict[str, float]]: {"cost": total cost, "rows": estimated rows}
+        on PostgreSQL, otherwise None
+
+    Raises:
+        SQLAlchemyError: If the database cannot plan the query
+    """
+    if db.dialect == "postgresql":
+        explain_query = f"EXPLAIN (FORMAT JSON) {query}"
+    elif db.dialect == "sqlite":
+        explain_query = f"EXPLAIN QUERY PLAN {query}"
+    else:
+        explain_query = f"EXPLAIN {query}"
+    start = time.perf_counter()
+    with db._engine.connect() as conn, _cancellable(conn):
+        if db._schema and db.dialect == "postgresql":
+            conn.exec_driver_sql("SET search_path TO %s", (db._schema,))
+        result = conn.execute(text(explain_query))
+        plan = result.scalar() if db.dialect == "postgresql" else result.fetchall()
+    tracer = current_tracer()
+    if tracer is not None:
+        tracer.record_db(explain_query, time.perf_counter() - start)
+    if db.dialect != "postgresql":
+        return None
+    if isinstance(plan, str):
+        plan = json.loads(plan)
+    top = plan[0]["Plan"]
+    return {"cost": float(top["Total Cost"]), "rows": float(top["Plan Rows"])}
+
+
+def get_table_versions(db: SQLDatabase,
+                       tables: List[str],
+                       schemas: Optional[List[str]] = None) -> Optional[Dict[str, str]]:
+    """
+    Return a version token per table that changes whenever the table's data changes.
+    
+    On PostgreSQL the token combines the ``pg_stat_user_tables`` insert, update
+    and delete counters with the table's relfilenode (which changes on
+    TRUNCATE). Statistics are flushed asynchronously, so a write becomes
+    visible here within about a second. Tables without statistics (views,
+    tables of other schemas) are left out of the result.
+    
+    Args:
+        db: SQLDatabase instance
+        tables: Table names
+        schemas: Schemas the tables are in. Defaults to the database's schema,
+            or its current schema when none is configured.
+        
+    Returns:
+        Optional[Dict[str, str]]: Version per table, or None if the dialect
+        offers no cheap way to detect changes
+    """
+    if db.dialect != "postgresql":
+        return None
+    if not tables:
+        return {}
+    if not schemas and db._schema:
+        schemas = [db._schema]
+    schema_filter = "ANY(:schemas)" if schemas else "current_schema()"
+    params = {"tables": list(tables), "schemas": list(schemas or [])}
     with db._engine.connect() as conn:
-        result = conn.execute(text(query))
-        columns = result.keys()
-        data = [dict(zip(columns, row)) for row in result.fetchall()]
-    return data
+        rows = conn.execute(text(
+            "SELECT s.relname, concat_ws(':', s.n_tup_ins, s.n_tup_upd, s.n_tup_del, c.relfilenode) AS version "
+            "FROM pg_catalog.pg_stat_user_tables s "
+            "JOIN pg_catalog.pg_class c ON c.oid = s.relid "
+            f"WHERE s.relname = ANY(:tables) AND s.schemaname = {schema_filter}"
+        ), params).fetchall()
+    return {relname: version for relname, version in rows}
+
+
+def get_column_values(db: SQLDatabase,
+                      db_info: dict,
+                      tables: Optional[List[str]] = None,
+                      max_values: int = 100,
+                      sample_rows: int = 10000,
+                      schemas: Optional[List[str]] = None) -> Dict[str, Dict[str, List[str]]]:
+    """
+    Collect the distinct values of the low-cardinality text columns.
+    
+    These are the literals a question refers to by name (statuses, regions,
+    categories). On PostgreSQL the values come from the planner statistics
+    (``pg_stats.most_common_vals``, which lists every value of a column that
+    has few enough) and enum labels, in two queries for all tables; columns
+    without statistics, and every column on other dialects, are read from the
+    first sample_rows rows of their table, one query per table. A column with
+    more than max_values distinct values is left out.
+    
+    Args:
+        db: SQLDatabase instance
+        db_info: Schema description from get_db_info
+        tables: Tables to collect. Defaults to every table of db_info.
+        max_values: Most distinct values a column may have to be collected
+        sample_rows: Rows read per table when sampling
+        schemas: Schemas db_info was read from. Defaults to the database's current schema.
+        
+    Returns:
+        Dict[str, Dict[str, List[str]]]: Values per column per table, for the
+        tables that have such columns
+    """
+    tables = [t for t in (tables if tables is not None else db_info["tables"]) if t in db_info["tables"]]
+    enums: Dict[str, List[str]] = {}
+    if db.dialect == "postgresql" and tables:
+        with db._engine.connect() as conn:
+            enums = dict(conn.execute(text(_PG_ENUM_QUERY)).fetchall())
+    
+    def enum_labels(column_type: str) -> Optional[List[str]]:
+        return enums.get(column_type.split(".")[-1].strip('"'))
+    
+    text_columns = {
+        table: {c["name"]: c["type"] for c in db_info["tables"][table]["columns"]
+                if _TEXT_TYPE.search(c["type"]) or enum_labels(c["type"])}
+        for table in tables
+    }
+    text_columns = {table: columns for table, columns in text_columns.items() if columns}
+    values: Dict[str, Dict[str, List[str]]] = {}
+    pending = {table: set(columns) for table, columns in text_columns.items()}
+    
+    if db.dialect == "postgresql" and text_columns:
+        schemas = _resolve_schemas(db, schemas)
+        for table, columns in text_columns.items():
+            for column, column_type in columns.items():
+                labels = enum_labels(column_type)
+                if labels:
+                    values.setdefault(table, {})[column] = _clean_values(labels)[:max_values]
+                    pending[table].discard(column)
+        names = sorted({table.split(".")[-1] for table in text_columns})
+        with db._engine.connect() as conn:
+            stats = conn.execute(text(_PG_COLUMN_STATS_QUERY), {"schemas": schemas, "tables": names}).fetchall()
+        for row in stats:
+            table = _table_key(row.schema_name, row.table_name, schemas)
+            if row.column_name not in pending.get(table, ()):
+                continue
+            # n_distinct is negative when it is a fraction of the row count,
+            # and most_common_vals is only complete when it lists them all.
+            if 0 < row.n_distinct <= max_values and row.common_values and len(row.common_values) >= row.n_distinct:
+                values.setdefault(table, {})[row.column_name] = _clean_values(row.common_values)
+            # Columns that have statistics but too many values are not sampled.
+            pending[table].discard(row.column_name)
+    
+    preparer = db._engine.dialect.identifier_preparer
+    for table, columns in pending.items():
+        if not columns:
+            continue
+        columns = [column for column in text_columns[table] if column in columns]
+        select = ", ".join(preparer.quote(column) for column in columns)
+        with db._engine.connect() as conn:
+            rows = conn.execute(text(
+                f"SELECT {select} FROM {quote_table(db, table, schemas)} LIMIT {int(sample_rows)}"
+            )).fetchall()
+        for position, column in enumerate(columns):
+            distinct = {row[position] for row in rows if row[position] is not None}
+            if 0 < len(distinct) <= max_values:
+                values.setdefault(table, {})[column] = _clean_values(sorted(map(str, distinct)))
+    return {table: columns for table, columns in values.items() if any(columns.values())}
+
+
+def quote_table(db: SQLDatabase, table: str, schemas: Optional[List[str]] = None) -> str:
+    """
+    Return a get_db_info table key as a quoted, schema-qualified SQL name.
+    
+    Args:
+        db: SQLDatabase instance
+        table: Table key, "table" or "schema.table"
+        schemas: Schemas the key was read from. Defaults to the database's current schema.
+        
+    Returns:
+        str: The table name to use in a FROM clause
+    """
+    preparer = db._engine.dialect.identifier_preparer
+    if "." in table:
+        schema, name = table.split(".", 1)
+    elif db.dialect == "postgresql" and schemas and len(schemas) == 1:
+        schema, name = schemas[0], table
+    else:
+        schema, name = db._schema, table
+    return f"{preparer.quote_schema(schema)}.{preparer.quote(name)}" if schema else preparer.quote(name)
+
+
+def _clean_values(values: List[str]) -> List[str]:
+    return [value for value in values if value and len(value) <= MAX_COLUMN_VALUE_LENGTH]
+
+
+def _unique_names(names: List[str]) -> List[str]:
+    seen = {}
+    unique = []
+    for name in names:
+        count = seen.get(name, 0)
+        seen[name] = count + 1
+        unique.append(name if count == 0 else f"{name}_{count}")
+    return unique
 
 
 def test_connection(db: SQLDatabase) -> bool:
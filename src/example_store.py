@@ -0,0 +1,365 @@
+import json
+import math
+import os
+import sqlite3
+import threading
+import time
+from array import array
+from collections import Counter
+from dataclasses import dataclass, asdict
+from typing import Any, Dict, List, Optional, Tuple
+import numpy as np
+from src.similarity import normalize_question
+from src.table_index import tokenize
+
+DEFAULT_EXAMPLES_PATH = os.path.join(".cache", "examples.sqlite3")
+
+FEW_SHOT_PROMPT = """Verified examples of similar questions and the SQL that answered them:
+
+{examples}
+"""
+
+# Candidates rescored with the terms beyond the postings budget of a search.
+_RESCORED_CANDIDATES = 32
+
+
+@dataclass
+class Example:
+    """
+    A verified question and the SQL that answered it.
+
+    source is "curated" for examples loaded from a file and "query" for
+    examples learned from successful queries.
+    """
+    question: str
+    sql: str
+    source: str = "query"
+
+    def to_dict(self) -> Dict[str, Any]:
+        return asdict(self)
+
+
+def example_terms(question: str) -> List[str]:
+    """
+    Return the index terms of a question: its words and adjacent word pairs.
+
+    Args:
+        question: Natural language question
+
+    Returns:
+        List[str]: Unigrams and bigrams of the tokenized question
+    """
+    words = tokenize(question)
+    return words + [f"{a} {b}" for a, b in zip(words, words[1:])]
+
+
+def format_examples(examples: List[Example]) -> str:
+    """
+    Render examples as the few-shot block added to a prompt.
+
+    Args:
+        examples: Examples, most similar first
+
+    Returns:
+        str: The prompt block, or "" when there are no examples
+    """
+    if not examples:
+        return ""
+    blocks = [f"Question: {example.question}\nSQL: {example.sql}" for example in examples]
+    return FEW_SHOT_PROMPT.format(examples="\n\n".join(blocks))
+
+
+class ExampleStore:
+    """
+    Verified question-to-SQL examples, retrieved by similarity to a new question.
+
+    Examples come from a curated file (load_file) and from queries that
+    succeeded (add). They are indexed in memory with TF-IDF over word unigrams
+    and bigrams, so retrieval needs no network and stays under a millisecond
+    at 100k examples: a search scores the examples containing its rarest
+    terms with numpy, reading at most max_postings postings, and the more
+    common terms only rescore the best of those candidates. Adding or
+    replacing an example updates the index in place; IDF weights are read at
+    search time and each example's vector norm is fixed when it is added.
+
+    Learned examples are persisted in a SQLite file and evicted oldest first
+    above max_examples; curated examples are reloaded from their file and
+    never evicted.
+    """
+
+    def __init__(self,
+                 path: Optional[str] = None,
+                 max_examples: int = 100000,
+                 max_postings: int = 2000):
+        """
+        Open (or create) the store and index the persisted examples.
+
+        Args:
+            path: SQLite file for learned examples. Defaults to
+                .cache/examples.sqlite3; use ":memory:" for a process-local store.
+            max_examples: Maximum number of learned examples kept
+            max_postings: Postings a search reads to find candidates, which
+                bounds its work; at least the rarest term is always read
+        """
+        self.path = path or DEFAULT_EXAMPLES_PATH
+        self.max_examples = max_examples
+        self.max_postings = max_postings
+        self._lock = threading.Lock()
+        # Examples, their term weights and vector norms by slot; a removed
+        # example leaves a free slot for the next one.
+        self._examples: List[Optional[Example]] = []
+        self._terms: List[Optional[Dict[str, float]]] = []
+        self._norms = array("d")
+        self._free: List[int] = []
+        self._keys: Dict[str, int] = {}
+        # Term -> (slots, term weights) of the examples containing it
+        self._postings: Dict[str, Tuple[array, array]] = {}
+        self._learned = 0
+        self._counters = {"searches": 0, "hits": 0, "added": 0, "evictions": 0}
+
+        directory = os.path.dirname(self.path)
+        if directory and self.path != ":memory:":
+            os.makedirs(directory, exist_ok=True)
+        self._conn = sqlite3.connect(self.path, check_same_thread=False, timeout=30)
+        self._conn.executescript("""
+            CREATE TABLE IF NOT EXISTS examples (
+                question TEXT PRIMARY KEY,
+                original TEXT NOT NULL,
+                sql TEXT NOT NULL,
+                created_at REAL NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS examples_created ON examples (created_at);
+        """)
+        with self._lock:
+            for original, sql in self._conn.execute("SELECT original, sql FROM examples ORDER BY created_at"):
+                self._index(Example(original, sql, "query"))
+
+    def __len__(self) -> int:
+        return len(self._keys)
+
+    def add(self, question: str, sql: str, source: str = "query") -> bool:
+        """
+        Add a verified example, replacing any example for the same question.
+
+        A learned example never replaces a curated one.
+
+        Args:
+            question: Natural language question
+            sql: SQL that answered it
+            source: "query" for a learned example (persisted) or "curated"
+
+        Returns:
+            bool: Whether the example was added
+        """
+        key = normalize_question(question)
+        if not key or not sql.strip():
+            return False
+        with self._lock:
+            doc_id = self._keys.get(key)
+            if doc_id is not None:
+                current = self._examples[doc_id]
+                if source == "query" and current.source == "curated":
+                    return False
+                if current.sql == sql and current.source == source:
+                    return False
+            self._index(Example(question, sql, source))
+            self._counters["added"] += 1
+            if source == "query":
+                self._conn.execute(
+                    "INSERT OR REPLACE INTO examples (question, original, sql, created_at) VALUES (?, ?, ?, ?)",
+                    (key, question, sql, time.time())
+                )
+                self._evict()
+                self._conn.commit()
+        return True
+
+    def load_file(self, path: str) -> int:
+        """
+        Load curated examples from a JSON list or a JSON Lines file.
+
+        Each item is an object with "question" and "sql".
+
+        Args:
+            path: File of curated examples
+
+        Returns:
+            int: Number of examples loaded
+        """
+        with open(path, "r", encoding="utf-8") as f:
+            text = f.read()
+        if text.lstrip().startswith("["):
+            items = json.loads(text)
+        else:
+            items = [json.loads(line) for line in text.splitlines() if line.strip()]
+        return sum(self.add(item["question"], item["sql"], source="curated") for item in items)
+
+    def remove(self, question: str) -> bool:
+        """
+        Remove the example for a question, e.g. after its SQL turned out wrong.
+
+        Args:
+            question: Natural language question
+
+        Returns:
+            bool: Whether an example was removed
+        """
+        key = normalize_question(question)
+        with self._lock:
+            doc_id = self._keys.get(key)
+            if doc_id is None:
+                return False
+            self._unindex(doc_id)
+            self._conn.execute("DELETE FROM examples WHERE question = ?", (key,))
+            self._conn.commit()
+        return True
+
+    def search(self, question: str, k: int = 3, min_score: float = 0.2) -> List[Tuple[Example, float]]:
+        """
+        Find the examples most similar to a question.
+
+        Args:
+            question: Natural language question
+            k: Maximum number of examples
+            min_score: Minimum cosine similarity (0-1) of a returned example
+
+        Returns:
+            List[Tuple[Example, float]]: (example, score) pairs, best first
+        """
+        weights = self._weights(example_terms(question))
+        with self._lock:
+            self._counters["searches"] += 1
+            n_docs = len(self._keys)
+            # (query weight * IDF^2, postings) of the known terms, rarest first
+            terms = []
+            query_norm = 0.0
+            for term, weight in weights.items():
+                postings = self._postings.get(term)
+                # A term no example has still lowers the similarity, at the highest IDF.
+                idf = self._idf(len(postings[0]) if postings else 1, n_docs)
+                query_norm += (weight * idf) ** 2
+                if postings is not None:
+                    terms.append((term, weight * idf * idf, postings))
+            if not terms:
+                return []
+            terms.sort(key=lambda item: len(item[2][0]))
+
+            # Score every example containing the rarer terms at once, up to the
+            # postings budget; the remaining common terms only rescore the best
+            # candidates.
+            doc_ids, doc_weights, read = [], [], 0
+            while terms and (not doc_ids or read + len(terms[0][2][0]) <= self.max_postings):
+                _, factor, (ids, term_weights) = terms.pop(0)
+                doc_ids.append(np.frombuffer(ids, dtype=np.int32))
+                doc_weights.append(np.frombuffer(term_weights, dtype=np.float32) * factor)
+                read += len(ids)
+            ids = np.concatenate(doc_ids)
+            # Release the buffer views: an array.array cannot grow while they exist.
+            del doc_ids
+            candidates, positions = np.unique(ids, return_inverse=True)
+            norms = np.frombuffer(self._norms, dtype=np.float64)[candidates] * math.sqrt(query_norm)
+            scores = np.bincount(positions, np.concatenate(doc_weights), len(candidates)) / norms
+
+            best = self._top(scores, max(k, _RESCORED_CANDIDATES) if terms else k)
+            candidates, norms, scores = candidates[best].tolist(), norms[best].tolist(), scores[best].tolist()
+            if terms:
+                factors = {term: factor for term, factor, _ in terms}
+                for i, doc_id in enumerate(candidates):
+                    doc_terms = self._terms[doc_id]
+                    shared = factors.keys() & doc_terms.keys()
+                    if shared:
+                        scores[i] += sum(factors[term] * doc_terms[term] for term in shared) / norms[i]
+                order = sorted(range(len(candidates)), key=lambda i: -scores[i])[:k]
+                candidates, scores = [candidates[i] for i in order], [scores[i] for i in order]
+            results = [(self._examples[doc_id], min(score, 1.0))
+                       for doc_id, score in zip(candidates, scores) if score >= min_score]
+            if results:
+                self._counters["hits"] += 1
+            return results
+
+    def stats(self) -> Dict[str, Any]:
+        """
+        Return the store's size and counters for this process.
+
+        Returns:
+            Dict with examples, learned, searches, hits, added and evictions
+        """
+        with self._lock:
+            return dict(self._counters, examples=len(self._keys), learned=self._learned)
+
+    @staticmethod
+    def _top(scores: np.ndarray, k: int) -> np.ndarray:
+        """Indexes of the k highest scores, best first"""
+        if len(scores) > k:
+            best = np.argpartition(scores, -k)[-k:]
+        else:
+            best = np.arange(len(scores))
+        return best[np.argsort(-scores[best], kind="stable")]
+
+    @staticmethod
+    def _weights(terms: List[str]) -> Dict[str, float]:
+        return {term: 1 + math.log(count) for term, count in Counter(terms).items()}
+
+    @staticmethod
+    def _idf(doc_freq: int, n_docs: int) -> float:
+        return math.log(1 + n_docs / doc_freq)
+
+    def _index(self, example: Example):
+        key = normalize_question(example.question)
+        doc_id = self._keys.get(key)
+        if doc_id is not None:
+            # Same question, same terms: only the example changes.
+            self._learned += (example.source == "query") - (self._examples[doc_id].source == "query")
+            self._examples[doc_id] = example
+            return
+        weights = self._weights(example_terms(example.question))
+        if self._free:
+            doc_id = self._free.pop()
+        else:
+            doc_id = len(self._examples)
+            self._examples.append(None)
+            self._terms.append(None)
+            self._norms.append(0.0)
+        n_docs = len(self._keys) + 1
+        norm = 0.0
+        for term, weight in weights.items():
+            postings = self._postings.get(term)
+            if postings is None:
+                postings = self._postings[term] = (array("i"), array("f"))
+            postings[0].append(doc_id)
+            postings[1].append(weight)
+            norm += (weight * self._idf(len(postings[0]), n_docs)) ** 2
+        self._examples[doc_id] = example
+        self._terms[doc_id] = weights
+        self._norms[doc_id] = math.sqrt(norm) or 1.0
+        self._keys[key] = doc_id
+        self._learned += example.source == "query"
+
+    def _unindex(self, doc_id: int):
+        example = self._examples[doc_id]
+        del self._keys[normalize_question(example.question)]
+        for term in self._terms[doc_id]:
+            ids, weights = self._postings[term]
+            position = ids.index(doc_id)
+            del ids[position]
+            del weights[position]
+            if not ids:
+                del self._postings[term]
+        self._examples[doc_id] = None
+        self._terms[doc_id] = None
+        self._free.append(doc_id)
+        self._learned -= example.source == "query"
+
+    def _evict(self):
+        overflow = self._learned - self.max_examples
+        if overflow <= 0:
+            return
+        rows = self._conn.execute("SELECT question FROM examples ORDER BY created_at LIMIT ?", (overflow,)).fetchall()
+        for (key,) in rows:
+            doc_id = self._keys.get(key)
+            if doc_id is not None and self._examples[doc_id].source == "query":
+                self._unindex(doc_id)
+        self._conn.execute(
+            "DELETE FROM examples WHERE rowid IN (SELECT rowid FROM examples ORDER BY created_at LIMIT ?)",
+            (overflow,)
+        )
+        self._counters["evictions"] += len(rows)
@@ -0,0 +1,174 @@
+import os
+import time
+from typing import Dict, Any, Optional, Tuple
+import polars as pl
+from langchain_community.utilities import SQLDatabase
+from src.db_utils import DEFAULT_FETCH_BATCH_SIZE, _unique_names, iter_frames
+from src.sql_validator import validate_sql
+
+EXPORT_FORMATS = ("csv", "parquet")
+
+# Bytes per read/write when streaming COPY output to disk.
+COPY_CHUNK_SIZE = 1024 * 1024
+
+# Polars types for PostgreSQL type OIDs; columns of other types stay strings.
+_PG_TYPE_DTYPES = {
+    16: pl.Boolean,      # bool
+    20: pl.Int64,        # int8
+    21: pl.Int16,        # int2
+    23: pl.Int32,        # int4
+    700: pl.Float32,     # float4
+    701: pl.Float64,     # float8
+    1082: pl.Date,       # date
+    1114: pl.Datetime,   # timestamp
+    1184: pl.Datetime,   # timestamptz, exported in UTC
+}
+
+# numeric becomes an exact Decimal when its precision fits one; unconstrained
+# numeric (no fixed scale) stays a string rather than lose digits as a float.
+_PG_NUMERIC = 1700
+_MAX_DECIMAL_PRECISION = 38
+
+
+def export_query(db: SQLDatabase,
+                 sql: str,
+                 path: str,
+                 export_format: Optional[str] = None,
+                 batch_size: int = DEFAULT_FETCH_BATCH_SIZE) -> Dict[str, Any]:
+    """
+    Write the full result of a read-only query to a CSV or Parquet file.
+
+    On PostgreSQL the rows are streamed with ``COPY (...) TO STDOUT`` straight
+    into the file in fixed-size chunks. Parquet is written from that CSV
+    stream with a streaming Polars plan, using the query's column types;
+    numeric columns are written as exact decimals (or text), never floats.
+    Other databases are read in batches through a server-side cursor. Memory
+    use does not depend on the size of the result.
+
+    Args:
+        db: SQLDatabase instance
+        sql: SQL query, e.g. from generate_sql_only or a query() result
+        path: Output file
+        export_format: "csv" or "parquet". Defaults to the file extension.
+        batch_size: Rows per batch when COPY is not available
+
+    Returns:
+        Dict with path, format, rows, bytes, seconds and rows_per_sec
+
+    Raises:
+        ValueError: If the query is not a single read-only query, the format is
+            unknown, or a value does not fit its Parquet column type (e.g. an
+            "infinity" timestamp)
+        SQLAlchemyError: If the query fails
+    """
+    export_format = (export_format or os.path.splitext(path)[1].lstrip(".")).lower()
+    if export_format not in EXPORT_FORMATS:
+        raise ValueError(f"Unknown export format {export_format!r}; expected one of {EXPORT_FORMATS}")
+    sql = sql.strip().rstrip(";").strip()
+    error = validate_sql(sql)
+    if error:
+        raise ValueError(error)
+
+    start = time.perf_counter()
+    if export_format == "csv":
+        rows, _ = _write_csv(db, sql, path, batch_size)
+    else:
+        csv_path = path + ".csv.tmp"
+        try:
+            rows, dtypes = _write_csv(db, sql, csv_path, batch_size)
+            _csv_to_parquet(csv_path, path, dtypes)
+        finally:
+            if os.path.exists(csv_path):
+                os.remove(csv_path)
+    seconds = time.perf_counter() - start
+
+    return {
+        "path": path,
+        "format": export_format,
+        "rows": rows,
+        "bytes": os.path.getsize(path),
+        "seconds": seconds,
+        "rows_per_sec": rows / seconds if seconds > 0 else 0.0
+    }
+
+
+def _write_csv(db: SQLDatabase, sql: str, path: str, batch_size: int) -> Tuple[int, Optional[Dict[str, Any]]]:
+    """
+    Stream a query result to a CSV file with a header row.
+
+    Returns:
+        Tuple of (row count, column dtypes). The dtypes are known on PostgreSQL
+        (from the result's type OIDs) and None elsewhere.
+    """
+    if db.dialect == "postgresql":
+        return _copy_csv(db, sql, path)
+
+    rows = 0
+    with open(path, "wb") as f:
+        for i, frame in enumerate(iter_frames(db, sql, batch_size)):
+            frame.write_csv(f, include_header=i == 0)
+            rows += frame.height
+    return rows, None
+
+
+def _copy_csv(db: SQLDatabase, sql: str, path: str) -> Tuple[int, Dict[str, Any]]:
+    """Run COPY (sql) TO STDOUT into a file and return the row count and column dtypes"""
+    connection = db._engine.raw_connection()
+    try:
+        cursor = connection.cursor()
+        # SET LOCAL only lasts for this transaction, which is rolled back below,
+        # so the pooled connection keeps its settings.
+        if db._schema:
+            cursor.execute("SET LOCAL search_path TO %s", (db._schema,))
+        cursor.execute("SET LOCAL TIME ZONE 'UTC'")
+        cursor.execute("SET LOCAL DateStyle TO ISO")
+        cursor.execute(f"SELECT * FROM ({sql}) AS export_query LIMIT 0")
+        names = _unique_names([column[0] for column in cursor.description])
+        dtypes = {name: _pg_dtype(column) for name, column in zip(names, cursor.description)}
+        with open(path, "wb") as f:
+            cursor.copy_expert(f"COPY ({sql}) TO STDOUT WITH (FORMAT csv, HEADER true)", f, size=COPY_CHUNK_SIZE)
+        return cursor.rowcount, dtypes
+    finally:
+        connection.rollback()
+        connection.close()
+
+
+def _pg_dtype(column) -> Any:
+    """Polars type of a result column from its psycopg2 description"""
+    if column[1] == _PG_NUMERIC:
+        precision, scale = column[4], column[5]
+        if precision and precision <= _MAX_DECIMAL_PRECISION:
+            return pl.Decimal(precision, scale or 0)
+        return pl.String
+    return _PG_TYPE_DTYPES.get(column[1], pl.String)
+
+
+def _csv_to_parquet(csv_path: str, path: str, dtypes: Optional[Dict[str, Any]]):
+    """Convert an exported CSV file to Parquet with a streaming Polars plan"""
+    if dtypes is None:
+        frame = pl.scan_csv(csv_path, infer_schema_length=None, try_parse_dates=True)
+    else:
+        # Read everything as text and convert explicitly: PostgreSQL writes
+        # booleans as t/f and time zones as +00, which the CSV reader won't parse.
+        frame = pl.scan_csv(csv_path, schema={name: pl.String for name in dtypes})
+        frame = frame.with_columns(_cast_column(name, dtype) for name, dtype in dtypes.items())
+    try:
+        frame.sink_parquet(path)
+    except pl.exceptions.InvalidOperationError as e:
+        # Casts are strict: a value the column type cannot hold fails the
+        # export instead of silently becoming null.
+        if os.path.exists(path):
+            os.remove(path)
+        raise ValueError(f"Could not convert the result to Parquet column types ({e}); "
+                         "export to CSV to keep the values as text") from e
+
+
+def _cast_column(name: str, dtype) -> pl.Expr:
+    column = pl.col(name)
+    if dtype == pl.Boolean:
+        return column == "t"
+    if dtype == pl.Date:
+        return column.str.to_date("%Y-%m-%d")
+    if dtype == pl.Datetime:
+        return column.str.replace(r"\+00$", "").str.to_datetime("%Y-%m-%d %H:%M:%S%.f")
+    return column.cast(dtype)
@@ -0,0 +1,64 @@
+from typing import Any, Callable, Dict, Optional
+from langchain_core.agents import AgentAction
+from langchain_core.callbacks import BaseCallbackHandler
+
+# Name of the toolkit's query tool (QuerySQLDatabaseTool and its cached variant)
+QUERY_TOOL_NAME = "sql_db_query"
+
+
+class QueryEventHandler(BaseCallbackHandler):
+    """
+    Callback that turns agent activity into Txt2SqlAgent.stream_query events.
+
+    Agent actions become "step" events, calls to the query tool become "sql"
+    and "rows" events, and streamed answer tokens become "token" events.
+    """
+
+    def __init__(self, emit: Callable[..., None]):
+        """
+        Args:
+            emit: Called as emit(event_type, **data) for every event
+        """
+        self.emit = emit
+
+    def on_agent_action(self, action: AgentAction, **kwargs: Any) -> Any:
+        self.emit("step", tool=action.tool, input=action.tool_input)
+
+    def on_tool_start(self,
+                      serialized: Dict[str, Any],
+                      input_str: str,
+                      inputs: Optional[Dict[str, Any]] = None,
+                      **kwargs: Any) -> Any:
+        if serialized.get("name") == QUERY_TOOL_NAME:
+            self.emit("sql", sql=(inputs or {}).get("query", input_str))
+
+    def on_tool_end(self, output: Any, name: Optional[str] = None, **kwargs: Any) -> Any:
+        if name == QUERY_TOOL_NAME:
+            self.emit("rows", rows=str(output))
+
+    def on_llm_new_token(self, token: str, **kwargs: Any) -> Any:
+        if token:
+            self.emit("token", text=token)
+
+
+class ExecutedQueryRecorder(QueryEventHandler):
+    """
+    Callback that remembers the SQL the agent's query tool ran successfully.
+
+    last_sql is the last statement the query tool answered without an error
+    (results the validator, cost guard or database refused start with
+    "Error"), i.e. the query the agent's answer is based on.
+    """
+
+    def __init__(self):
+        super().__init__(self._record)
+        self.last_sql: Optional[str] = None
+        self._pending: Optional[str] = None
+
+    def _record(self, event_type: str, **data: Any):
+        if event_type == "sql":
+            self._pending = data["sql"]
+        elif event_type == "rows" and self._pending is not None:
+            if not data["rows"].startswith("Error"):
+                self.last_sql = self._pending
+            self._pending = None
@@ -0,0 +1,68 @@
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass
+from typing import TYPE_CHECKING, Any, Dict, Iterator, List, Optional
+
+if TYPE_CHECKING:
+    import polars as pl
+
+# Statements executed while a query() call is running, see collect_executed_queries.
+_executed: ContextVar[Optional[List["ExecutedQuery"]]] = ContextVar("executed_queries", default=None)
+
+
+@dataclass
+class ExecutedQuery:
+    """
+    A statement that ran successfully, with the rows it returned.
+
+    sql is the statement as executed (after any cost guard LIMIT). truncated
+    is True when reading stopped at the row or byte cap, so data is not the
+    complete result.
+    """
+    sql: str
+    data: "pl.DataFrame"
+    truncated: bool = False
+
+
+@contextmanager
+def collect_executed_queries() -> Iterator[List[ExecutedQuery]]:
+    """
+    Collect every statement executed successfully inside the block.
+
+    Works across the threads LangChain runs tools in, since they inherit the
+    caller's context.
+
+    Yields:
+        List[ExecutedQuery]: Filled in as statements run
+    """
+    executed = []
+    token = _executed.set(executed)
+    try:
+        yield executed
+    finally:
+        _executed.reset(token)
+
+
+def record_executed_query(sql: str, data: "pl.DataFrame", truncated: bool = False):
+    """Record a statement's rows for the query running in this context, if any"""
+    executed = _executed.get()
+    if executed is not None:
+        executed.append(ExecutedQuery(sql, data, truncated))
+
+
+def jsonable_result(result: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Copy of a query() result that json.dumps can write.
+
+    The "data" DataFrame becomes {"columns": [...], "rows": [[...], ...]};
+    values JSON has no type for (dates, decimals) are left to json.dumps'
+    default, as elsewhere.
+    """
+    data = result.get("data")
+    if data is None:
+        return result
+    import polars as pl
+
+    if not isinstance(data, pl.DataFrame):
+        return result
+    return dict(result, data={"columns": data.columns, "rows": [list(row) for row in data.iter_rows()]})
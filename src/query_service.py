@@ -0,0 +1,403 @@
+import json
+import queue
+import threading
+import time
+from collections import Counter
+from concurrent.futures import Future, ThreadPoolExecutor, TimeoutError as FutureTimeoutError
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import TYPE_CHECKING, Any, Callable, Dict, Iterator, Optional, Tuple
+from src.cancellation import CancelToken
+from src.query_results import jsonable_result
+
+if TYPE_CHECKING:
+    from src.txt2sql_agent import Txt2SqlAgent
+
+
+class ServiceBusy(Exception):
+    """Raised when every worker is busy and the request queue is full"""
+
+
+class DeadlineExceeded(Exception):
+    """Raised when a request's deadline passes before it finishes"""
+
+
+class WorkerPool:
+    """
+    Fixed set of worker threads with a bounded request queue.
+
+    At most workers requests run at once and at most max_queue more wait for a
+    worker; submit() refuses anything beyond that with ServiceBusy instead of
+    letting the backlog grow. A request whose deadline passes while it waits
+    is dropped without running.
+    """
+
+    def __init__(self, workers: int = 8, max_queue: int = 32):
+        """
+        Args:
+            workers: Requests run concurrently
+            max_queue: Requests that may wait for a free worker
+        """
+        if workers < 1:
+            raise ValueError("workers must be at least 1")
+        if max_queue < 0:
+            raise ValueError("max_queue must not be negative")
+        self.workers = workers
+        self.max_queue = max_queue
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="txt2sql-worker")
+        self._lock = threading.Lock()
+        self._pending = 0
+        self._active = 0
+        self.completed = 0
+        self.rejected = 0
+        self.expired = 0
+
+    def submit(self, fn: Callable[..., Any], *args: Any, deadline: Optional[float] = None) -> Future:
+        """
+        Queue fn(*args) for a worker.
+
+        Args:
+            fn: Function to run
+            *args: Its arguments
+            deadline: time.monotonic() value after which the request is not
+                started any more. None for no deadline.
+
+        Returns:
+            Future: Resolves to fn's result, or raises its exception or
+            DeadlineExceeded
+
+        Raises:
+            ServiceBusy: If the queue is full
+        """
+        with self._lock:
+            if self._pending >= self.workers + self.max_queue:
+                self.rejected += 1
+                raise ServiceBusy(f"All {self.workers} workers are busy and {self.max_queue} requests are queued")
+            self._pending += 1
+        future = self._executor.submit(self._run, fn, args, deadline)
+        future.add_done_callback(self._release)
+        return future
+
+    def _run(self, fn: Callable[..., Any], args: Tuple[Any, ...], deadline: Optional[float]) -> Any:
+        with self._lock:
+            if deadline is not None and time.monotonic() >= deadline:
+                self.expired += 1
+                raise DeadlineExceeded("The deadline passed while the request was queued")
+            self._active += 1
+        try:
+            return fn(*args)
+        finally:
+            with self._lock:
+                self._active -= 1
+                self.completed += 1
+
+    def _release(self, future: Future):
+        with self._lock:
+            self._pending -= 1
+
+    def stats(self) -> Dict[str, int]:
+        """Pool size and current load"""
+        with self._lock:
+            return {
+                "workers": self.workers,
+                "max_queue": self.max_queue,
+                "active": self._active,
+                "queued": self._pending - self._active,
+                "completed": self.completed,
+                "rejected": self.rejected,
+                "expired": self.expired,
+            }
+
+    def shutdown(self):
+        """Stop accepting work and wait for running requests"""
+        self._executor.shutdown(wait=True)
+
+
+class QueryService:
+    """
+    JSON-over-HTTP front end for a shared Txt2SqlAgent.
+
+    Endpoints (request and response bodies are JSON):
+
+        POST /query    {"question", "mode"?, "stream"?, "timeout"?} -> query() result,
+                       its "data" as {"columns", "rows"}; with "stream": true
+                       the response is newline-delimited JSON, one
+                       stream_query() event per line
+        POST /sql      {"question", "timeout"?} -> {"sql"}
+        POST /explain  {"sql", "timeout"?} -> {"explanation"}
+        GET  /health   -> {"status": "ok", "pool": {...}}
+        GET  /metrics  -> request and pool counters and the agent's query
+                          metrics in the Prometheus text format
+
+    Every request runs on the WorkerPool. When it is full the service answers
+    429 with a Retry-After header. "timeout" (seconds, capped at max_timeout)
+    sets the request's deadline; a request that misses it gets 504, or a final
+    "error" event when streaming. A /query request carries its deadline into
+    the agent, which stops the query and its running statement once it
+    passes, or once a streaming client disconnects, and frees the worker.
+    /sql and /explain finish their LLM call even after the deadline.
+    """
+
+    def __init__(self,
+                 agent: "Txt2SqlAgent",
+                 workers: int = 8,
+                 max_queue: int = 32,
+                 timeout: float = 60.0,
+                 max_timeout: float = 300.0):
+        """
+        Args:
+            agent: Agent shared by all requests
+            workers: Requests answered concurrently
+            max_queue: Requests that may wait for a worker before 429 is returned
+            timeout: Default deadline of a request in seconds
+            max_timeout: Largest deadline a request may ask for
+        """
+        self.agent = agent
+        self.pool = WorkerPool(workers, max_queue)
+        self.timeout = timeout
+        self.max_timeout = max_timeout
+        self._lock = threading.Lock()
+        self._responses: Counter = Counter()
+
+    def deadline(self, body: Dict[str, Any]) -> float:
+        """time.monotonic() deadline of a request from its optional "timeout" field"""
+        timeout = body.get("timeout", self.timeout)
+        if not isinstance(timeout, (int, float)) or isinstance(timeout, bool) or timeout <= 0:
+            raise ValueError('"timeout" must be a positive number of seconds')
+        return time.monotonic() + min(float(timeout), self.max_timeout)
+
+    def call(self,
+             fn: Callable[..., Any],
+             *args: Any,
+             deadline: float,
+             cancel_token: Optional[CancelToken] = None) -> Any:
+        """
+        Run fn(*args) on the pool and wait for it until the deadline.
+
+        Args:
+            fn: Function to run
+            *args: Its arguments
+            deadline: time.monotonic() deadline
+            cancel_token: Token fn stops on, cancelled when the deadline passes
+        """
+        future = self.pool.submit(fn, *args, deadline=deadline)
+        try:
+            return future.result(timeout=max(deadline - time.monotonic(), 0.0))
+        except FutureTimeoutError:
+            if cancel_token is not None:
+                cancel_token.cancel("deadline")
+            raise DeadlineExceeded("The request did not finish before its deadline") from None
+
+    def stream(self, question: str, mode: Optional[str], deadline: float) -> Iterator[Dict[str, Any]]:
+        """
+        Run stream_query on the pool.
+
+        Returns:
+            Iterator[Dict]: The query's events until the deadline; an "error"
+            event ends the stream when it fails or misses the deadline
+
+        Raises:
+            ServiceBusy: If the pool is full
+        """
+        events = queue.Queue()
+        done = object()
+        token = CancelToken(deadline=deadline)
+
+        def run():
+            for event in self.agent.stream_query(question, mode=mode, cancel_token=token):
+                if event["type"] == "result":
+                    event = dict(event, result=jsonable_result(event["result"]))
+                events.put(event)
+
+        future = self.pool.submit(run, deadline=deadline)
+        future.add_done_callback(lambda _: events.put(done))
+        return self._relay(events, done, future, deadline, token)
+
+    @staticmethod
+    def _relay(events: queue.Queue,
+               done: object,
+               future: Future,
+               deadline: float,
+               token: CancelToken) -> Iterator[Dict[str, Any]]:
+        finished = False
+        try:
+            while True:
+                try:
+                    event = events.get(timeout=max(deadline - time.monotonic(), 0.0))
+                except queue.Empty:
+                    yield {"type": "error", "error": "The request did not finish before its deadline"}
+                    return
+                if event is done:
+                    finished = True
+                    error = future.exception()
+                    if error is not None:
+                        yield {"type": "error", "error": str(error)}
+                    return
+                yield event
+        finally:
+            if not finished:
+                # Past the deadline, or the client went away mid-stream.
+                token.cancel("deadline" if time.monotonic() >= deadline else "cancelled")
+
+    def record(self, path: str, status: int):
+        with self._lock:
+            self._responses[(path, status)] += 1
+
+    def to_prometheus(self) -> str:
+        """Service counters, followed by the agent's query metrics when it has them"""
+        lines = [
+            "# HELP txt2sql_http_responses_total HTTP responses by path and status.",
+            "# TYPE txt2sql_http_responses_total counter",
+        ]
+        with self._lock:
+            for (path, status), count in sorted(self._responses.items()):
+                lines.append(f'txt2sql_http_responses_total{{path="{path}",status="{status}"}} {count}')
+        for name, value in self.pool.stats().items():
+            kind = "counter" if name in ("completed", "rejected", "expired") else "gauge"
+            metric = f"txt2sql_pool_{name}_total" if kind == "counter" else f"txt2sql_pool_{name}"
+            lines.append(f"# TYPE {metric} {kind}")
+            lines.append(f"{metric} {value}")
+        text = "\n".join(lines) + "\n"
+        if self.agent.metrics is not None:
+            text += self.agent.metrics.to_prometheus()
+        return text
+
+    def make_server(self, host: str = "127.0.0.1", port: int = 8000, log_requests: bool = False) -> ThreadingHTTPServer:
+        """
+        Create the HTTP server; call serve_forever() on it to start serving.
+
+        Args:
+            host: Interface to listen on
+            port: Port to listen on, 0 for any free port
+            log_requests: Log every request to stderr
+
+        Returns:
+            ThreadingHTTPServer: Server with one thread per connection
+        """
+        service = self
+
+        class Handler(_QueryRequestHandler):
+            pass
+
+        Handler.service = service
+        Handler.log_requests = log_requests
+        return _QueryServer((host, port), Handler)
+
+
+class _QueryServer(ThreadingHTTPServer):
+    daemon_threads = True
+    # Many clients connect at once under load; the default backlog of 5 resets them.
+    request_queue_size = 128
+
+
+class _QueryRequestHandler(BaseHTTPRequestHandler):
+    """Routes requests to the QueryService set on the subclass"""
+
+    protocol_version = "HTTP/1.1"
+    service: QueryService
+    log_requests = False
+
+    def do_GET(self):
+        if self.path == "/health":
+            self._send_json(200, {"status": "ok", "pool": self.service.pool.stats()})
+        elif self.path == "/metrics":
+            self._send(200, self.service.to_prometheus().encode("utf-8"), "text/plain; version=0.0.4")
+        else:
+            self._send_json(404, {"error": f"Unknown path {self.path}"})
+
+    def do_POST(self):
+        routes = {"/query": self._query, "/sql": self._sql, "/explain": self._explain}
+        route = routes.get(self.path)
+        if route is None:
+            self._send_json(404, {"error": f"Unknown path {self.path}"})
+            return
+        try:
+            body = self._read_json()
+            route(body, self.service.deadline(body))
+        except (BrokenPipeError, ConnectionResetError):
+            # The client went away; there is nobody to answer.
+            self.close_connection = True
+        except ValueError as e:
+            self._send_json(400, {"error": str(e)})
+        except ServiceBusy as e:
+            self._send_json(429, {"error": str(e)}, {"Retry-After": "1"})
+        except DeadlineExceeded as e:
+            self._send_json(504, {"error": str(e)})
+        except Exception as e:
+            self._send_json(500, {"error": str(e)})
+
+    def _query(self, body: Dict[str, Any], deadline: float):
+        question = self._field(body, "question")
+        mode = body.get("mode")
+        if body.get("stream"):
+            events = self.service.stream(question, mode, deadline)
+            try:
+                self._start_stream()
+                for event in events:
+                    self._write_chunk(event)
+                self._end_stream()
+            finally:
+                # Cancels the query if writing failed before it finished.
+                events.close()
+            return
+        token = CancelToken(deadline=deadline)
+        result = self.service.call(self.service.agent.query, question, mode, None, token,
+                                   deadline=deadline, cancel_token=token)
+        self._send_json(200, jsonable_result(result))
+
+    def _sql(self, body: Dict[str, Any], deadline: float):
+        sql = self.service.call(self.service.agent.generate_sql_only, self._field(body, "question"), deadline=deadline)
+        self._send_json(200, {"sql": sql})
+
+    def _explain(self, body: Dict[str, Any], deadline: float):
+        explanation = self.service.call(self.service.agent.explain_query, self._field(body, "sql"), deadline=deadline)
+        self._send_json(200, {"explanation": explanation})
+
+    def _read_json(self) -> Dict[str, Any]:
+        length = int(self.headers.get("Content-Length") or 0)
+        try:
+            body = json.loads(self.rfile.read(length) or b"{}")
+        except json.JSONDecodeError as e:
+            raise ValueError(f"Request body is not valid JSON: {e}") from None
+        if not isinstance(body, dict):
+            raise ValueError("Request body must be a JSON object")
+        return body
+
+    @staticmethod
+    def _field(body: Dict[str, Any], name: str) -> str:
+        value = body.get(name)
+        if not isinstance(value, str) or not value.strip():
+            raise ValueError(f'"{name}" must be a non-empty string')
+        return value
+
+    def _send_json(self, status: int, payload: Any, headers: Optional[Dict[str, str]] = None):
+        self._send(status, json.dumps(payload, default=str).encode("utf-8"), "application/json", headers)
+
+    def _send(self, status: int, data: bytes, content_type: str, headers: Optional[Dict[str, str]] = None):
+        self.service.record(self.path, status)
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(data)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(data)
+
+    def _start_stream(self):
+        self.service.record(self.path, 200)
+        self.send_response(200)
+        self.send_header("Content-Type", "application/x-ndjson")
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+
+    def _write_chunk(self, event: Dict[str, Any]):
+        data = (json.dumps(event, default=str) + "\n").encode("utf-8")
+        self.wfile.write(f"{len(data):X}\r\n".encode("ascii") + data + b"\r\n")
+        self.wfile.flush()
+
+    def _end_stream(self):
+        self.wfile.write(b"0\r\n\r\n")
+        self.wfile.flush()
+
+    def log_message(self, format: str, *args: Any):
+        if self.log_requests:
+            super().log_message(format, *args)
@@ -0,0 +1,125 @@
+import asyncio
+import threading
+import time
+from typing import Any, Dict, List, Optional
+from uuid import UUID
+from langchain_core.callbacks import AsyncCallbackHandler
+from langchain_core.messages import BaseMessage
+from langchain_core.outputs import LLMResult
+
+
+class _TokenBucket:
+    """Bucket holding up to one minute of capacity, refilled continuously"""
+
+    def __init__(self, per_minute: float):
+        self.capacity = float(per_minute)
+        self.rate = per_minute / 60.0
+        self.level = self.capacity
+        self.updated = time.monotonic()
+
+    def refill(self, now: float):
+        self.level = min(self.capacity, self.level + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def wait_time(self, amount: float) -> float:
+        """Seconds until amount is available (0 if it is now)"""
+        return max(0.0, (min(amount, self.capacity) - self.level) / self.rate)
+
+
+class RateLimiter:
+    """
+    Client-side limiter for LLM requests and tokens per minute.
+
+    Both limits are token buckets that hold a minute's worth of capacity, which
+    matches how API providers meter usage. Callers await acquire() with an
+    estimate of the tokens a request will use and report the difference once
+    the real usage is known with record(). The limiter does not belong to an
+    event loop, so one instance can be shared across asyncio.run() calls.
+    """
+
+    def __init__(self, requests_per_minute: Optional[float] = None, tokens_per_minute: Optional[float] = None):
+        """
+        Args:
+            requests_per_minute: Maximum LLM requests per minute. None for no limit.
+            tokens_per_minute: Maximum LLM tokens (prompt + completion) per minute.
+                None for no limit.
+        """
+        self._requests = _TokenBucket(requests_per_minute) if requests_per_minute else None
+        self._tokens = _TokenBucket(tokens_per_minute) if tokens_per_minute else None
+        self._lock = threading.Lock()
+
+    async def acquire(self, tokens: int = 0):
+        """
+        Wait until one request and the given number of tokens are available.
+
+        Args:
+            tokens: Estimated tokens the request will use
+        """
+        while True:
+            wait = self._try_acquire(tokens)
+            if wait <= 0:
+                return
+            await asyncio.sleep(wait)
+
+    def record(self, tokens: int):
+        """
+        Charge tokens used beyond the estimate passed to acquire().
+
+        Args:
+            tokens: Actual minus estimated tokens; negative values refund the difference
+        """
+        if self._tokens is None or not tokens:
+            return
+        with self._lock:
+            self._tokens.refill(time.monotonic())
+            self._tokens.level = min(self._tokens.capacity, self._tokens.level - tokens)
+
+    def _try_acquire(self, tokens: int) -> float:
+        """Take capacity from both buckets, or return the seconds to wait"""
+        with self._lock:
+            now = time.monotonic()
+            wait = 0.0
+            for bucket, amount in ((self._requests, 1), (self._tokens, tokens)):
+                if bucket is not None:
+                    bucket.refill(now)
+                    wait = max(wait, bucket.wait_time(amount))
+            if wait > 0:
+                return wait
+            if self._requests is not None:
+                self._requests.level -= 1
+            if self._tokens is not None:
+                self._tokens.level -= min(tokens, self._tokens.capacity)
+            return 0.0
+
+
+class RateLimitCallbackHandler(AsyncCallbackHandler):
+    """
+    Callback that applies a RateLimiter to every chat model call in a run.
+
+    Passed in the run config, it limits the agent's intermediate LLM calls as
+    well as single-call chains. Prompt tokens are estimated at four characters
+    per token and corrected from the provider's token_usage when reported.
+    """
+
+    def __init__(self, limiter: RateLimiter):
+        self.limiter = limiter
+        self._estimates: Dict[UUID, int] = {}
+
+    async def on_chat_model_start(self,
+                                  serialized: Dict[str, Any],
+                                  messages: List[List[BaseMessage]],
+                                  *,
+                                  run_id: UUID,
+                                  **kwargs: Any) -> None:
+        estimate = sum(len(str(m.content)) for batch in messages for m in batch) // 4
+        self._estimates[run_id] = estimate
+        await self.limiter.acquire(estimate)
+
+    async def on_llm_end(self, response: LLMResult, *, run_id: UUID, **kwargs: Any) -> None:
+        estimate = self._estimates.pop(run_id, 0)
+        usage = (response.llm_output or {}).get("token_usage") or {}
+        if usage.get("total_tokens"):
+            self.limiter.record(usage["total_tokens"] - estimate)
+
+    async def on_llm_error(self, error: BaseException, *, run_id: UUID, **kwargs: Any) -> None:
+        self._estimates.pop(run_id, None)
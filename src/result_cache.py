@@ -0,0 +1,202 @@
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import TYPE_CHECKING, Dict, Any, List, Optional, Tuple
+from langchain_community.utilities import SQLDatabase
+from src.db_utils import DEFAULT_FETCH_BATCH_SIZE, fetch_capped, get_table_versions
+from src.sql_validator import normalize_sql, referenced_tables, validate_sql
+
+if TYPE_CHECKING:
+    import polars as pl
+
+
+@dataclass
+class _Entry:
+    frame: "pl.DataFrame"
+    truncated: bool
+    versions: Optional[Dict[str, str]]
+    size: int
+    created_at: float
+
+
+class ResultCache:
+    """
+    In-memory cache of query results, invalidated when a referenced table changes.
+
+    Results are keyed by normalized SQL text (and the fetch caps) and stored as
+    Polars DataFrames.
+    Each entry records a version token for every table the query references
+    (see get_table_versions); a lookup whose current versions differ is a miss,
+    so cached results stay correct after writes. Entries are evicted least
+    recently used first once the total size exceeds the memory budget.
+
+    Statements whose tables have no version (every statement on dialects
+    without table versions such as SQLite, statements that name no known
+    table like ``SELECT now()``, and queries on views) are only cached when a
+    TTL is set, and then expire after it.
+    """
+
+    def __init__(self,
+                 db: SQLDatabase,
+                 max_bytes: int = 256 * 1024 * 1024,
+                 max_entry_bytes: Optional[int] = None,
+                 ttl: Optional[float] = None,
+                 version_check_interval: float = 1.0):
+        """
+        Args:
+            db: SQLDatabase the queries run against
+            max_bytes: Memory budget for all cached frames
+            max_entry_bytes: Results larger than this are not cached. Defaults to
+                a quarter of the budget.
+            ttl: Seconds an entry stays valid regardless of table versions
+            version_check_interval: Seconds a table's version is reused before it
+                is read from the database again
+        """
+        self.db = db
+        self.max_bytes = max_bytes
+        self.max_entry_bytes = max_entry_bytes if max_entry_bytes is not None else max_bytes // 4
+        self.ttl = ttl
+        self.version_check_interval = version_check_interval
+        self._entries: "OrderedDict[tuple, _Entry]" = OrderedDict()
+        self._versions: Dict[str, tuple] = {}
+        self._size = 0
+        self._lock = threading.Lock()
+        self._counters = {"hits": 0, "misses": 0, "invalidations": 0, "evictions": 0}
+
+    def execute(self,
+                sql: str,
+                max_rows: Optional[int] = None,
+                max_bytes: Optional[int] = None,
+                batch_size: int = DEFAULT_FETCH_BATCH_SIZE) -> "pl.DataFrame":
+        """
+        Return the result of a read-only query, from the cache when still valid.
+
+        Statements that are not single read-only queries are executed without
+        caching.
+
+        Args:
+            sql: SQL query
+            max_rows: Row cap passed to fetch_dataframe
+            max_bytes: Byte cap passed to fetch_dataframe
+            batch_size: Rows fetched per round trip on a miss
+
+        Returns:
+            pl.DataFrame: Query result
+
+        Raises:
+            SQLAlchemyError: If the query fails
+        """
+        return self.execute_capped(sql, max_rows, max_bytes, batch_size)[0]
+
+    def execute_capped(self,
+                       sql: str,
+                       max_rows: Optional[int] = None,
+                       max_bytes: Optional[int] = None,
+                       batch_size: int = DEFAULT_FETCH_BATCH_SIZE) -> Tuple["pl.DataFrame", bool]:
+        """
+        execute, also reporting whether a cap cut the result short (see fetch_capped).
+
+        Returns:
+            Tuple of (frame, truncated)
+
+        Raises:
+            SQLAlchemyError: If the query fails
+        """
+        if validate_sql(sql) is not None:
+            return fetch_capped(self.db, sql, max_rows, max_bytes, batch_size)
+
+        key = (normalize_sql(sql), max_rows, max_bytes)
+        tables = sorted(referenced_tables(sql, self.db.get_usable_table_names()))
+        # Without tables to version, nothing tells when the result changes.
+        versions = self._current_versions(tables) if tables else None
+        now = time.time()
+
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                if entry.versions == versions and not self._expired(entry, now):
+                    self._entries.move_to_end(key)
+                    self._counters["hits"] += 1
+                    return entry.frame, entry.truncated
+                self._remove(key)
+                self._counters["invalidations"] += 1
+            self._counters["misses"] += 1
+
+        frame, truncated = fetch_capped(self.db, sql, max_rows, max_bytes, batch_size)
+        if versions is not None or self.ttl is not None:
+            self._store(key, frame, truncated, versions, now)
+        return frame, truncated
+
+    def invalidate(self, tables: Optional[List[str]] = None):
+        """
+        Drop cached results.
+
+        Args:
+            tables: Drop only results that reference these tables. Defaults to all.
+        """
+        with self._lock:
+            if tables is None:
+                self._entries.clear()
+                self._versions.clear()
+                self._size = 0
+                return
+            tables = set(tables)
+            for table in tables:
+                self._versions.pop(table, None)
+            for key in [k for k, e in self._entries.items() if e.versions is None or tables & set(e.versions)]:
+                self._remove(key)
+
+    def stats(self) -> Dict[str, Any]:
+        """Return hit/miss counters, entry count and bytes used"""
+        with self._lock:
+            return dict(self._counters, entries=len(self._entries), bytes=self._size)
+
+    def _current_versions(self, tables: List[str]) -> Optional[Dict[str, str]]:
+        """
+        Return table versions, re-reading those older than version_check_interval.
+
+        None when a table has no version (or the dialect has none).
+        """
+        now = time.time()
+        with self._lock:
+            fresh = {
+                table: self._versions[table][1]
+                for table in tables
+                if table in self._versions and now - self._versions[table][0] < self.version_check_interval
+            }
+        stale = [table for table in tables if table not in fresh]
+        if stale:
+            versions = get_table_versions(self.db, stale)
+            if versions is None or any(table not in versions for table in stale):
+                return None
+            with self._lock:
+                for table in stale:
+                    fresh[table] = versions[table]
+                    self._versions[table] = (now, fresh[table])
+        return fresh
+
+    def _expired(self, entry: _Entry, now: float) -> bool:
+        return self.ttl is not None and now - entry.created_at > self.ttl
+
+    def _store(self,
+               key: tuple,
+               frame: "pl.DataFrame",
+               truncated: bool,
+               versions: Optional[Dict[str, str]],
+               now: float):
+        size = frame.estimated_size()
+        if size > self.max_entry_bytes:
+            return
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+            self._entries[key] = _Entry(frame, truncated, versions, size, now)
+            self._size += size
+            while self._size > self.max_bytes and self._entries:
+                self._remove(next(iter(self._entries)))
+                self._counters["evictions"] += 1
+
+    def _remove(self, key: tuple):
+        entry = self._entries.pop(key)
+        self._size -= entry.size
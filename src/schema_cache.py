@@ -0,0 +1,248 @@
+import hashlib
+import json
+import os
+import threading
+import time
+from typing import Dict, List, Optional
+from langchain_community.utilities import SQLDatabase
+from src.db_utils import get_db_info, get_schema_fingerprints, schema_fingerprint
+
+DEFAULT_CACHE_DIR = ".cache"
+CACHE_FORMAT_VERSION = 2
+
+
+class SchemaCache:
+    """
+    Fingerprint-keyed cache of database schema information.
+
+    Holds the ``get_db_info`` structure and the per-table DDL text the agent's
+    schema tool returns. Staleness is detected with a cheap per-table catalog
+    fingerprint, and only tables whose fingerprint changed are re-introspected.
+    The cache is persisted to a JSON file so a restart against an unchanged
+    schema does not pay the reflection cost again.
+
+    Cached table info includes the sample rows SQLDatabase appends to each table;
+    those are refreshed only when the table's definition changes.
+    """
+
+    def __init__(self,
+                 db: SQLDatabase,
+                 path: Optional[str] = None,
+                 max_staleness: float = 300.0,
+                 schemas: Optional[List[str]] = None):
+        """
+        Initialize the cache and load any persisted snapshot.
+
+        Args:
+            db: SQLDatabase instance to cache schema information for
+            path: JSON file to persist the cache to. Defaults to a file under
+                .cache/ derived from the database URL and schemas; pass "" to
+                keep the cache in memory only.
+            max_staleness: Seconds a snapshot is trusted before the fingerprint
+                is checked again. 0 checks on every access.
+            schemas: Schemas to cache. Defaults to the database's current schema.
+        """
+        self.db = db
+        self.schemas = list(schemas) if schemas else None
+        self.max_staleness = max_staleness
+        self.path = self._default_path() if path is None else path
+        self._lock = threading.RLock()
+        # Serializes reflection of new tables and writes of the cache file,
+        # which run without holding _lock.
+        self._describe_lock = threading.Lock()
+        self._save_lock = threading.Lock()
+        self._fingerprints: Dict[str, str] = {}
+        self._db_info: Optional[dict] = None
+        self._table_info: Dict[str, str] = {}
+        self._checked_at = 0.0
+        self._load()
+
+    def _default_path(self) -> str:
+        """Derive a cache file name from the database identity (without password)"""
+        identity = self.db._engine.url.render_as_string(hide_password=True)
+        identity += "|" + ",".join(self.schemas or [])
+        digest = hashlib.sha256(identity.encode("utf-8")).hexdigest()[:16]
+        return os.path.join(DEFAULT_CACHE_DIR, f"schema_{digest}.json")
+
+    @property
+    def fingerprint(self) -> str:
+        """Fingerprint of the whole cached schema, refreshed if stale"""
+        with self._lock:
+            self._refresh_if_stale()
+            return schema_fingerprint(self._fingerprints)
+
+    def table_fingerprints(self) -> Dict[str, str]:
+        """Per-table schema fingerprints (see get_schema_fingerprints), refreshed if stale"""
+        with self._lock:
+            self._refresh_if_stale()
+            return dict(self._fingerprints)
+
+    def get_db_info(self) -> dict:
+        """
+        Return the cached get_db_info structure, re-introspecting changed tables if stale.
+
+        A refresh replaces the structure instead of changing it, so callers may
+        read the returned dict without locking; they must not modify it.
+
+        Returns:
+            dict: Dictionary containing database schema information
+        """
+        with self._lock:
+            self._refresh_if_stale()
+            return self._db_info
+
+    def get_table_info(self, table_names: Optional[List[str]] = None) -> str:
+        """
+        Return SQLDatabase-style table info (DDL and sample rows) from the cache.
+
+        Args:
+            table_names: Tables to describe. Defaults to all usable tables.
+
+        Returns:
+            str: Table descriptions in the format of SQLDatabase.get_table_info
+
+        Raises:
+            ValueError: If a table does not exist
+        """
+        with self._lock:
+            self._refresh_if_stale()
+            if table_names is None:
+                table_names = list(self.db.get_usable_table_names())
+            fingerprints = self._fingerprints
+            infos = {table: self._table_info[table] for table in table_names if table in self._table_info}
+        missing = [table for table in table_names if table not in infos]
+        if missing:
+            # Described without the lock, so other callers are not held up by the database.
+            described = self._describe_tables(missing)
+            infos.update(described)
+            with self._lock:
+                # A refresh in the meantime may have made the descriptions stale.
+                if self._fingerprints is fingerprints:
+                    self._table_info.update(described)
+            self._save()
+        return "\n\n".join(sorted(infos[table] for table in table_names))
+
+    def refresh(self) -> List[str]:
+        """
+        Check the fingerprint now and re-introspect any changed tables.
+
+        Returns:
+            List[str]: Tables that were added, changed or removed
+        """
+        with self._lock:
+            current = get_schema_fingerprints(self.db, self.schemas)
+            changed = sorted(
+                table for table in set(current) | set(self._fingerprints)
+                if current.get(table) != self._fingerprints.get(table)
+            )
+            updated = bool(changed) or self._db_info is None
+            if updated:
+                self._apply_changes(current, changed)
+                self._fingerprints = current
+            self._checked_at = time.time()
+            if updated:
+                self._save()
+            return changed
+
+    def invalidate(self, tables: Optional[List[str]] = None):
+        """
+        Drop cached entries so they are re-introspected on next access.
+
+        Args:
+            tables: Tables to invalidate. Defaults to the whole cache.
+        """
+        with self._lock:
+            if tables is None:
+                self._fingerprints = {}
+                self._db_info = None
+                self._table_info = {}
+            else:
+                self._fingerprints = {t: f for t, f in self._fingerprints.items() if t not in tables}
+                for table in tables:
+                    self._table_info.pop(table, None)
+            self._checked_at = 0.0
+            self._save()
+
+    def _refresh_if_stale(self):
+        if self._db_info is None or time.time() - self._checked_at >= self.max_staleness:
+            self.refresh()
+
+    def _describe_tables(self, tables: List[str]) -> Dict[str, str]:
+        """
+        SQLDatabase table info of each table.
+
+        Tables SQLDatabase has not reflected yet are reflected together in one
+        pass first, so describing many tables does not reflect them one by one.
+
+        Raises:
+            ValueError: If a table does not exist
+        """
+        unknown = set(tables) - set(self.db.get_usable_table_names())
+        if unknown:
+            raise ValueError(f"table_names {unknown} not found in database")
+        with self._describe_lock:
+            reflected = {table.name for table in self.db._metadata.sorted_tables}
+            to_reflect = [table for table in tables if table not in reflected]
+            if to_reflect:
+                self.db._metadata.reflect(views=self.db._view_support, bind=self.db._engine,
+                                          only=to_reflect, schema=self.db._schema)
+            return {table: self.db.get_table_info([table]) for table in tables}
+
+    def _apply_changes(self, current: Dict[str, str], changed: List[str]):
+        """Re-introspect changed tables and swap in an updated copy of the cached structure"""
+        if self._db_info is None:
+            self._db_info = get_db_info(self.db, self.schemas)
+            self._table_info = {}
+            return
+
+        changed_set = set(changed)
+        refreshed = get_db_info(self.db, self.schemas, tables=[t for t in changed if t in current])
+        for table in changed:
+            self._table_info.pop(table, None)
+            # Drop the stale reflected Table so SQLDatabase re-reflects it on demand.
+            if table in self.db._metadata.tables:
+                self.db._metadata.remove(self.db._metadata.tables[table])
+        # Readers may hold the previous structure, so build a new one rather than change it.
+        tables = {table: info for table, info in self._db_info["tables"].items() if table not in changed_set}
+        tables.update(refreshed["tables"])
+        self._db_info = {
+            "tables": tables,
+            "relationships": [
+                rel for rel in self._db_info["relationships"] if rel["table"] not in changed_set
+            ] + refreshed["relationships"],
+        }
+
+    def _load(self):
+        if not self.path or not os.path.exists(self.path):
+            return
+        try:
+            with open(self.path, "r") as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            return
+        if data.get("version") != CACHE_FORMAT_VERSION:
+            return
+        self._fingerprints = data["fingerprints"]
+        self._db_info = data["db_info"]
+        self._table_info = data["table_info"]
+        # Always verify a loaded snapshot once; unchanged tables are kept.
+        self._checked_at = 0.0
+
+    def _save(self):
+        if not self.path:
+            return
+        with self._lock:
+            data = {
+                "version": CACHE_FORMAT_VERSION,
+                "fingerprints": dict(self._fingerprints),
+                "db_info": self._db_info,
+                "table_info": dict(self._table_info),
+            }
+        with self._save_lock:
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            tmp_path = f"{self.path}.tmp"
+            with open(tmp_path, "w") as f:
+                json.dump(data, f)
+            os.replace(tmp_path, self.path)
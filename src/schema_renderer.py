@@ -0,0 +1,403 @@
+import re
+import threading
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, List, Optional, Set, Tuple
+from sqlalchemy import text
+from langchain_community.utilities import SQLDatabase
+from src.db_utils import get_db_info, quote_table
+from src.table_index import tokenize
+
+# Pieces an approximate BPE tokenizer splits DDL into: short letter runs,
+# short digit runs and single punctuation characters.
+_TOKEN_RE = re.compile(r"[A-Za-z]{1,4}|\d{1,3}|[^\sA-Za-z\d]")
+
+# Long type names and the short forms the model reads just as well.
+_TYPE_ABBREVIATIONS = (
+    (re.compile(r"\s+collate\s+.*$"), ""),
+    (re.compile(r"character varying"), "varchar"),
+    (re.compile(r"^character\b"), "char"),
+    (re.compile(r"timestamp\s*(\(\d+\))?\s+without time zone"), r"timestamp\1"),
+    (re.compile(r"timestamp\s*(\(\d+\))?\s+with time zone"), r"timestamptz\1"),
+    (re.compile(r"time\s*(\(\d+\))?\s+without time zone"), r"time\1"),
+    (re.compile(r"time\s*(\(\d+\))?\s+with time zone"), r"timetz\1"),
+    (re.compile(r"double precision"), "float8"),
+    (re.compile(r"^integer\b"), "int"),
+    (re.compile(r"^boolean\b"), "bool"),
+    (re.compile(r"\s*,\s*"), ","),
+)
+
+# Longest table or column comment kept, in characters.
+_MAX_COMMENT_LENGTH = 80
+
+# Ways of rendering a whole table, from the most to the least detailed:
+# (name, with sample rows, with comments).
+_LEVELS = (("full", True, True), ("no_samples", False, True), ("no_comments", False, False))
+
+
+def estimate_tokens(value: str) -> int:
+    """
+    Estimate the number of tokens an OpenAI tokenizer makes of a text.
+
+    Counts runs of up to four letters, up to three digits and every
+    punctuation character, plus one token per line break. This errs on the
+    high side for DDL and prose, and adding the counts of two texts gives the
+    count of the texts joined by a line break, minus one.
+
+    Args:
+        value: Text to count
+
+    Returns:
+        int: Estimated token count
+    """
+    return len(_TOKEN_RE.findall(value)) + value.count("\n")
+
+
+def abbreviate_type(column_type: str) -> str:
+    """
+    Shorten a column type for the prompt, e.g. "character varying(255)" to "varchar(255)".
+
+    Args:
+        column_type: Type as reported by get_db_info
+
+    Returns:
+        str: Lowercase short form of the type
+    """
+    short = column_type.strip().lower()
+    for pattern, replacement in _TYPE_ABBREVIATIONS:
+        short = pattern.sub(replacement, short)
+    return short
+
+
+@dataclass
+class _TableParts:
+    """Pre-rendered lines of one table and their token counts"""
+    header: str
+    comment: str
+    columns: List[str]
+    column_comments: List[str]
+    keys: List[bool]
+    terms: List[Set[str]]
+    footer: List[str]
+    samples: str
+    tokens: Dict[Any, Any] = field(default_factory=dict)
+    texts: Dict[Tuple[bool, bool], str] = field(default_factory=dict)
+
+
+class SchemaRenderer:
+    """
+    Render table schemas as compact DDL under a hard token budget.
+
+    Works from the get_db_info structure: one line per column with an
+    abbreviated type and inline PK/FK annotations, the table and column
+    comments, and optionally a few sample rows with every value truncated.
+    When the tables do not fit the budget the rendering degrades step by
+    step: sample rows are dropped, then comments, then the columns least
+    relevant to the question (keys and columns whose names match question
+    words are kept longest), and finally the last tables, which are only
+    named. Tables are expected most relevant first.
+
+    Every table's lines, sample rows and token counts are computed once per
+    schema fingerprint of the table, so repeated renders only assemble them.
+    """
+
+    def __init__(self,
+                 db: SQLDatabase,
+                 schema_cache=None,
+                 token_budget: int = 4000,
+                 sample_rows: int = 3,
+                 max_value_length: int = 20,
+                 token_counter: Optional[Callable[[str], int]] = None,
+                 schemas: Optional[List[str]] = None):
+        """
+        Args:
+            db: SQLDatabase instance
+            schema_cache: Optional SchemaCache the schema and per-table
+                fingerprints are read from; without it the schema is read once
+            token_budget: Most tokens a rendering may take
+            sample_rows: Sample rows shown per table when they fit. 0 disables them.
+            max_value_length: Characters kept of each sample value
+            token_counter: Function counting the tokens of a text, e.g. the chat
+                model's get_num_tokens. Defaults to estimate_tokens, which needs
+                no tokenizer download.
+            schemas: Schemas to render. Defaults to the database's current schema.
+        """
+        self.db = db
+        self.schema_cache = schema_cache
+        self.token_budget = token_budget
+        self.sample_rows = sample_rows
+        self.max_value_length = max_value_length
+        self.count_tokens = token_counter or estimate_tokens
+        self.schemas = list(schemas) if schemas else (schema_cache.schemas if schema_cache else None)
+        self._lock = threading.Lock()
+        self._db_info: Optional[dict] = None
+        self._parts: Dict[str, Tuple[Optional[str], _TableParts]] = {}
+        self._counters = {"renders": 0, "tables_rendered": 0, "table_misses": 0}
+        self._levels = {name: 0 for name, _, _ in _LEVELS}
+        self._levels.update(columns_pruned=0, tables_dropped=0)
+
+    def render(self,
+               tables: Optional[List[str]] = None,
+               question: Optional[str] = None,
+               token_budget: Optional[int] = None) -> str:
+        """
+        Render the tables within the token budget.
+
+        Args:
+            tables: Tables to render, most relevant first. Defaults to every table.
+            question: Question the schema is for; columns matching its words
+                are the last to be dropped
+            token_budget: Budget for this rendering. Defaults to token_budget.
+
+        Returns:
+            str: Compact DDL of the tables
+
+        Raises:
+            ValueError: If a table does not exist
+        """
+        budget = token_budget or self.token_budget
+        db_info, fingerprints = self._schema()
+        tables = list(dict.fromkeys(tables)) if tables else list(db_info["tables"])
+        missing = [table for table in tables if table not in db_info["tables"]]
+        if missing:
+            raise ValueError(f"table_names {set(missing)} not found in database")
+        parts = [self._table_parts(table, db_info, fingerprints.get(table)) for table in tables]
+        terms = set(tokenize(question)) if question else set()
+
+        # A custom counter need not add up exactly, so check the result and
+        # retry with a smaller budget when it does not fit.
+        target = budget
+        for _ in range(5):
+            rendered, level = self._assemble(tables, parts, terms, target)
+            # estimate_tokens adds up exactly, so its result needs no recount.
+            tokens = 0 if self.count_tokens is estimate_tokens else self.count_tokens(rendered)
+            if tokens <= budget:
+                break
+            target = max(1, int(target * budget / tokens) - 1)
+        with self._lock:
+            self._counters["renders"] += 1
+            self._counters["tables_rendered"] += len(tables)
+            self._levels[level] += 1
+        return rendered
+
+    def stats(self) -> Dict[str, Any]:
+        """
+        Return the renderer's counters for this process.
+
+        Returns:
+            Dict with renders, tables_rendered, table_misses (tables rendered
+            from scratch) and levels, the renders per degradation step
+        """
+        with self._lock:
+            return dict(self._counters, tables_cached=len(self._parts), levels=dict(self._levels))
+
+    def _schema(self) -> Tuple[dict, Dict[str, str]]:
+        if self.schema_cache is not None:
+            return self.schema_cache.get_db_info(), self.schema_cache.table_fingerprints()
+        with self._lock:
+            if self._db_info is None:
+                self._db_info = get_db_info(self.db, self.schemas)
+        return self._db_info, {}
+
+    def _assemble(self, tables: List[str], parts: List[_TableParts], terms: Set[str], budget: int) -> Tuple[str, str]:
+        """Render the tables at the most detailed level that fits the budget"""
+        # The parts of a rendering are joined by line breaks: one token each.
+        for name, samples, comments in _LEVELS:
+            if samples and not self.sample_rows:
+                continue
+            if sum(self._table_tokens(p, samples, comments) for p in parts) + len(parts) - 1 <= budget:
+                return "\n".join(p.texts[(samples, comments)] for p in parts), name
+
+        # Keep key and question columns, dropping whole tables from the end
+        # until those fit, then add back the other columns while they fit.
+        kept, minimal = [], []
+        for p in parts:
+            kept.append([i for i, (key, column_terms) in enumerate(zip(p.keys, p.terms))
+                         if key or column_terms & terms])
+            minimal.append(self._pruned_tokens(p, kept[-1]) + 1)
+            # Tables past the budget are dropped whatever the others need.
+            if sum(minimal) > budget:
+                break
+        count = len(kept)
+        while count and sum(minimal[:count]) + self._note_tokens(tables[count:], False) > budget:
+            count -= 1
+        dropped = tables[count:]
+        if not count:
+            return self._first_columns(parts[0], kept[0], dropped, budget), "tables_dropped"
+        parts, kept = parts[:count], kept[:count]
+        used = sum(minimal[:count]) + self._note_tokens(dropped, False)
+
+        others = [[i for i in range(len(p.columns)) if i not in set(k)] for p, k in zip(parts, kept)]
+        added = True
+        while added:
+            added = False
+            for p, k, rest in zip(parts, kept, others):
+                if not rest:
+                    continue
+                cost = p.tokens["columns"][rest[0]] + 1
+                if len(rest) == 1:
+                    # The last column replaces the marker with the table's footer.
+                    cost += p.tokens["footer"] - p.tokens["marker"] - 1
+                if used + cost <= budget:
+                    used += cost
+                    k.append(rest.pop(0))
+                    added = True
+        blocks = [self._table_text(p, sorted(k), False, False) for p, k in zip(parts, kept)]
+        if dropped:
+            # Name the dropped tables when the budget allows, else only count them.
+            named = used - self._note_tokens(dropped, False) + self._note_tokens(dropped, True) <= budget
+            blocks.append(self._dropped_note(dropped, named))
+        return "\n".join(blocks), "tables_dropped" if dropped else "columns_pruned"
+
+    def _first_columns(self, part: _TableParts, kept: List[int], dropped: List[str], budget: int) -> str:
+        """As many key columns of the first table as fit, when not even all of them do"""
+        used = part.tokens["header"] + part.tokens["close"] + 1
+        if used > budget:
+            return ""
+        lines = [part.header]
+        for i in kept:
+            cost = part.tokens["columns"][i] + 1
+            if used + cost > budget:
+                break
+            lines.append(part.columns[i])
+            used += cost
+        lines[-1] = lines[-1].rstrip(",")
+        lines.append(")")
+        if self._note_tokens(dropped[1:], False) + used <= budget and dropped[1:]:
+            lines.append(self._dropped_note(dropped[1:], False))
+        return "\n".join(lines)
+
+    def _table_tokens(self, part: _TableParts, samples: bool, comments: bool) -> int:
+        key = (samples, comments)
+        if key not in part.tokens:
+            part.texts[key] = self._table_text(part, range(len(part.columns)), samples, comments)
+            part.tokens[key] = self.count_tokens(part.texts[key])
+        return part.tokens[key]
+
+    def _pruned_tokens(self, part: _TableParts, kept: List[int]) -> int:
+        """Tokens of a table without comments or samples, with only the kept columns"""
+        tokens = part.tokens["header"] + part.tokens["close"] + 1 + sum(part.tokens["columns"][i] + 1 for i in kept)
+        if len(kept) < len(part.columns):
+            tokens += part.tokens["marker"] + 1
+        else:
+            tokens += part.tokens["footer"]
+        return tokens
+
+    def _note_tokens(self, dropped: List[str], named: bool) -> int:
+        return self.count_tokens(self._dropped_note(dropped, named)) + 1 if dropped else 0
+
+    @staticmethod
+    def _dropped_note(dropped: List[str], named: bool) -> str:
+        if named:
+            return f"/* {len(dropped)} more tables: {', '.join(dropped)} */"
+        return f"/* {len(dropped)} more tables */"
+
+    @staticmethod
+    def _table_text(part: _TableParts, columns, samples: bool, comments: bool) -> str:
+        columns = list(columns)
+        lines = [part.header + (f" -- {part.comment}" if comments and part.comment else "")]
+        for i in columns:
+            line = part.columns[i]
+            if comments and part.column_comments[i]:
+                line += f" -- {part.column_comments[i]}"
+            lines.append(line)
+        if len(columns) < len(part.columns):
+            hidden = len(part.columns) - len(columns)
+            lines.append(f"  /* {hidden} more column{'s' if hidden > 1 else ''} */")
+        else:
+            lines.extend(part.footer)
+        lines.append(")")
+        if samples and part.samples:
+            lines.append(part.samples)
+        return "\n".join(lines)
+
+    def _table_parts(self, table: str, db_info: dict, fingerprint: Optional[str]) -> _TableParts:
+        with self._lock:
+            cached = self._parts.get(table)
+            if cached is not None and fingerprint is not None and cached[0] == fingerprint:
+                return cached[1]
+            if cached is not None and fingerprint is None and self.schema_cache is None:
+                return cached[1]
+        info = db_info["tables"][table]
+        primary_keys = set(info.get("primary_keys") or [])
+        references = {}
+        footer = []
+        for rel in db_info["relationships"]:
+            if rel["table"] != table:
+                continue
+            if len(rel["columns"]) == 1:
+                references[rel["columns"][0]] = f"{rel['references_table']}.{rel['references_columns'][0]}"
+            else:
+                footer.append(f"  FK ({', '.join(rel['columns'])}) -> "
+                              f"{rel['references_table']}({', '.join(rel['references_columns'])})")
+
+        columns, comments, keys, terms = [], [], [], []
+        for column in info["columns"]:
+            name = column["name"]
+            line = f"  {name} {abbreviate_type(column['type'])}"
+            if name in primary_keys and len(primary_keys) == 1:
+                line += " PK"
+            if name in references:
+                line += f" FK {references[name]}"
+            columns.append(line + ",")
+            comments.append(self._short_comment(column.get("comment")))
+            keys.append(name in primary_keys or name in references)
+            terms.append(set(tokenize(f"{name} {column.get('comment') or ''}")))
+        if len(primary_keys) > 1:
+            footer.insert(0, f"  PK ({', '.join(info['primary_keys'])})")
+        if columns and not footer:
+            columns[-1] = columns[-1][:-1]
+        footer = [line + "," for line in footer[:-1]] + footer[-1:]
+
+        part = _TableParts(
+            header=f"CREATE TABLE {table} (",
+            comment=self._short_comment(info.get("comment")),
+            columns=columns,
+            column_comments=comments,
+            keys=keys,
+            terms=terms,
+            footer=footer,
+            samples=self._sample_text(table, [c["name"] for c in info["columns"]]) if self.sample_rows else "",
+        )
+        part.tokens = {
+            "header": self.count_tokens(part.header),
+            "close": self.count_tokens(")"),
+            "columns": [self.count_tokens(line) for line in columns],
+            "marker": self.count_tokens(f"  /* {len(columns)} more columns */"),
+            "footer": sum(self.count_tokens(line) + 1 for line in footer),
+        }
+        with self._lock:
+            self._parts[table] = (fingerprint, part)
+            self._counters["table_misses"] += 1
+        return part
+
+    def _sample_text(self, table: str, columns: List[str]) -> str:
+        if not columns:
+            return ""
+        preparer = self.db._engine.dialect.identifier_preparer
+        select = ", ".join(preparer.quote(column) for column in columns)
+        try:
+            with self.db._engine.connect() as conn:
+                rows = conn.execute(text(
+                    f"SELECT {select} FROM {quote_table(self.db, table, self.schemas)} LIMIT {int(self.sample_rows)}"
+                )).fetchall()
+        except Exception:
+            # Sample rows are optional; a table we may not read is still described.
+            return ""
+        if not rows:
+            return ""
+        lines = [f"/* {len(rows)} sample rows:", " | ".join(columns)]
+        lines += [" | ".join(self._short_value(value) for value in row) for row in rows]
+        return "\n".join(lines) + "\n*/"
+
+    def _short_value(self, value: Any) -> str:
+        value = "NULL" if value is None else " ".join(str(value).split())
+        if len(value) > self.max_value_length:
+            value = value[:self.max_value_length - 3] + "..."
+        return value
+
+    @staticmethod
+    def _short_comment(comment: Optional[str]) -> str:
+        comment = " ".join((comment or "").split())
+        if len(comment) > _MAX_COMMENT_LENGTH:
+            comment = comment[:_MAX_COMMENT_LENGTH - 3] + "..."
+        return comment
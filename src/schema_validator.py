@@ -0,0 +1,161 @@
+import difflib
+from typing import Any, Dict, List, Optional, Set
+import sqlglot
+from sqlglot import exp
+from sqlglot.errors import SqlglotError
+from sqlglot.optimizer.scope import Scope, traverse_scope
+from src.sql_validator import validate_sql
+
+# SQLAlchemy dialect names that sqlglot spells differently.
+_SQLGLOT_DIALECTS = {"postgresql": "postgres", "mssql": "tsql"}
+
+# Statements and clauses that write, lock or change the schema.
+_WRITE_EXPRESSIONS = (
+    exp.Insert, exp.Update, exp.Delete, exp.Merge, exp.Create, exp.Drop,
+    exp.Alter, exp.TruncateTable, exp.Into, exp.Lock, exp.Copy, exp.Grant,
+)
+
+# Columns listed in an error message, so the model can fix the query without the schema tool.
+_MAX_LISTED_COLUMNS = 40
+
+
+class SchemaValidator:
+    """
+    Check generated SQL against the database schema without running it.
+
+    The statement is parsed with sqlglot and every column it names is resolved
+    against the tables of a get_db_info() description, so a hallucinated
+    column is reported to the model with the table's real columns instead of
+    costing a database round trip. Writes are rejected from the parsed
+    statement as well as by validate_sql.
+
+    Only definite mistakes are reported. get_db_info describes tables only, so
+    a relation it does not list may be a view, a materialized view or a
+    foreign table: such relations, and their columns, are left for the
+    database to judge, as are statements sqlglot cannot parse and columns of
+    table functions or of subqueries that select *.
+    """
+
+    def __init__(self, db_info: dict, dialect: str = "postgresql"):
+        """
+        Args:
+            db_info: Schema description from get_db_info
+            dialect: SQLAlchemy dialect name of the database
+        """
+        self.dialect = _SQLGLOT_DIALECTS.get(dialect, dialect)
+        self.columns: Dict[str, List[str]] = {
+            table: [column["name"] for column in info["columns"]] for table, info in db_info["tables"].items()
+        }
+        self._tables = {table.lower(): table for table in self.columns}
+        self._column_sets: Dict[str, Set[str]] = {
+            table: {column.lower() for column in columns} for table, columns in self.columns.items()
+        }
+
+    def validate(self, sql: str) -> Optional[str]:
+        """
+        Check that a statement is a single read-only query over existing tables and columns.
+
+        Args:
+            sql: SQL statement
+
+        Returns:
+            Optional[str]: An error message for the model, naming every unknown
+            column of a known table, or None if the query is acceptable
+        """
+        error = validate_sql(sql)
+        if error:
+            return error
+        try:
+            statements = [s for s in sqlglot.parse(sql, read=self.dialect) if s is not None]
+        except SqlglotError:
+            return None
+        if len(statements) != 1:
+            return "Error: only a single SQL statement is allowed."
+        statement = statements[0]
+
+        write = next(statement.find_all(*_WRITE_EXPRESSIONS), None)
+        if write is not None:
+            return f"Error: {write.key.upper()} is not allowed; only read-only queries may be run."
+
+        try:
+            errors = self._column_errors(statement)
+        except SqlglotError:
+            return None
+        return "\n".join(errors) if errors else None
+
+    def resolve_table(self, table: exp.Table) -> Optional[str]:
+        """Return the get_db_info key of a table reference, or None if it is unknown"""
+        name, schema = table.name, table.db
+        quoted = table.this.quoted if isinstance(table.this, exp.Identifier) else False
+        for candidate in ([f"{schema}.{name}", name] if schema else [name]):
+            if quoted and candidate in self.columns:
+                return candidate
+            if not quoted and candidate.lower() in self._tables:
+                return self._tables[candidate.lower()]
+        return None
+
+    def _column_errors(self, statement: exp.Expression) -> List[str]:
+        scopes = traverse_scope(statement)
+        # Every column name the statement could see, for correlated subqueries:
+        # table columns, aliases, and the outputs of subqueries and CTEs.
+        visible = {column for key in map(self.resolve_table, statement.find_all(exp.Table)) if key
+                   for column in self._column_sets[key]}
+        visible.update(alias.alias.lower() for alias in statement.find_all(exp.Alias))
+        for scope in scopes:
+            for source in scope.sources.values():
+                if isinstance(source, Scope):
+                    visible.update(name.lower() for name in source.expression.named_selects)
+
+        errors = []
+        for scope in scopes:
+            # Columns of each source: a table's columns, a subquery's or CTE's
+            # output names, or None when they cannot be known.
+            sources: Dict[str, Optional[Set[str]]] = {}
+            for alias, source in scope.sources.items():
+                if isinstance(source, exp.Table):
+                    key = self.resolve_table(source)
+                    sources[alias.lower()] = self._column_sets[key] if key else None
+                elif isinstance(source, Scope) and not source.expression.is_star:
+                    sources[alias.lower()] = {name.lower() for name in source.expression.named_selects}
+                else:
+                    sources[alias.lower()] = None
+            aliases = {select.alias.lower() for select in getattr(scope.expression, "selects", [])
+                       if isinstance(select, exp.Alias)}
+
+            for column in scope.columns:
+                if isinstance(column.this, exp.Star):
+                    continue
+                name = column.name.lower()
+                if column.table:
+                    columns = sources.get(column.table.lower())
+                    if columns is None or name in columns:
+                        continue
+                    source = {a: s for a, s in scope.sources.items() if a.lower() == column.table.lower()}
+                    message = self._unknown_column(column.name, column.table, source)
+                else:
+                    if not sources or None in sources.values() or name in aliases:
+                        continue
+                    if any(name in columns for columns in sources.values()) or name in visible:
+                        continue
+                    message = self._unknown_column(column.name, None, scope.sources)
+                if message not in errors:
+                    errors.append(message)
+        return errors
+
+    def _unknown_column(self, name: str, qualifier: Optional[str], sources: Dict[str, Any]) -> str:
+        reference = f"{qualifier}.{name}" if qualifier else name
+        described = {}
+        for alias, source in sources.items():
+            if isinstance(source, exp.Table):
+                key = self.resolve_table(source)
+                described[f'table "{key}"'] = self.columns[key]
+            else:
+                described[f'subquery "{alias}"'] = list(source.expression.named_selects)
+        message = f'Error: column "{reference}" does not exist in {", ".join(described)}.'
+        suggestions = difflib.get_close_matches(name, [c for columns in described.values() for c in columns], n=3)
+        if suggestions:
+            message += f" Did you mean: {', '.join(suggestions)}?"
+        for label, columns in described.items():
+            listed = ", ".join(columns[:_MAX_LISTED_COLUMNS]) + (", ..." if len(columns) > _MAX_LISTED_COLUMNS else "")
+            message += f" Columns of {label}: {listed}."
+        return message
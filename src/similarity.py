@@ -0,0 +1,82 @@
+import random
+import re
+import zlib
+from typing import List, Set
+
+_PUNCTUATION_RE = re.compile(r"[^\w\s]")
+_WHITESPACE_RE = re.compile(r"\s+")
+
+# Mersenne prime used for the MinHash permutations.
+_PRIME = (1 << 61) - 1
+
+
+def normalize_question(text: str) -> str:
+    """
+    Normalize a question for exact-match lookups.
+
+    Lowercases, drops punctuation and collapses whitespace, so "Top 10
+    customers?" and "top 10 customers" share a key.
+
+    Args:
+        text: Natural language question
+
+    Returns:
+        str: Normalized question
+    """
+    text = _PUNCTUATION_RE.sub(" ", text.lower())
+    return _WHITESPACE_RE.sub(" ", text).strip()
+
+
+def char_ngrams(text: str, n: int = 3) -> Set[str]:
+    """
+    Return the set of character n-grams of the normalized text.
+
+    Args:
+        text: Input text
+        n: Gram length
+
+    Returns:
+        Set[str]: Character n-grams (the whole text if shorter than n)
+    """
+    text = f" {normalize_question(text)} "
+    if len(text) <= n:
+        return {text}
+    return {text[i:i + n] for i in range(len(text) - n + 1)}
+
+
+def jaccard(a: Set[str], b: Set[str]) -> float:
+    """Jaccard similarity of two sets"""
+    if not a and not b:
+        return 1.0
+    return len(a & b) / len(a | b)
+
+
+class MinHasher:
+    """
+    MinHash signatures over character n-grams.
+
+    The fraction of equal positions in two signatures estimates the Jaccard
+    similarity of the underlying n-gram sets. Hashes are seeded, so signatures
+    are stable across processes and can be persisted.
+    """
+
+    def __init__(self, num_perm: int = 64, ngram: int = 3, seed: int = 1):
+        """
+        Args:
+            num_perm: Signature length; more permutations give a tighter estimate
+            ngram: Character n-gram length
+            seed: Seed for the permutation coefficients
+        """
+        rng = random.Random(seed)
+        self.ngram = ngram
+        self._coefficients = [(rng.randrange(1, _PRIME), rng.randrange(0, _PRIME)) for _ in range(num_perm)]
+
+    def signature(self, text: str) -> List[int]:
+        """Compute the MinHash signature of a text"""
+        hashes = [zlib.crc32(gram.encode("utf-8")) for gram in char_ngrams(text, self.ngram)]
+        return [min((a * h + b) % _PRIME for h in hashes) for a, b in self._coefficients]
+
+    @staticmethod
+    def similarity(sig_a: List[int], sig_b: List[int]) -> float:
+        """Estimate Jaccard similarity from two signatures"""
+        return sum(x == y for x, y in zip(sig_a, sig_b)) / len(sig_a)
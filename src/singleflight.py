@@ -0,0 +1,172 @@
+import asyncio
+import threading
+from typing import Any, Awaitable, Callable, Dict, Hashable, List, Optional, Tuple
+from src.cancellation import CancelToken, SharedCancelToken
+
+
+class Flight:
+    """
+    One in-flight call shared by a leader and any number of followers.
+
+    Besides the eventual result, a flight relays progress events: the leader
+    publishes them and every subscriber receives all events published so far,
+    in order, followed by the new ones as they happen.
+
+    cancel_token is the shared run's token: it is cancelled once every
+    caller's own token is (see SharedCancelToken).
+    """
+
+    def __init__(self):
+        self.cancel_token = SharedCancelToken()
+        self.result = None
+        self.error: Optional[BaseException] = None
+        self._done = threading.Event()
+        self._lock = threading.Lock()
+        self._events: List[Tuple[str, Dict[str, Any]]] = []
+        self._listeners: List[Callable[..., None]] = []
+
+    def publish(self, event_type: str, **data):
+        """Record an event and pass it to every subscriber"""
+        with self._lock:
+            self._events.append((event_type, data))
+            for listener in self._listeners:
+                listener(event_type, **data)
+
+    def subscribe(self, listener: Callable[..., None]):
+        """Replay the events published so far to listener and pass it the later ones"""
+        with self._lock:
+            for event_type, data in self._events:
+                listener(event_type, **data)
+            self._listeners.append(listener)
+
+    def wait(self, cancel_token: Optional[CancelToken] = None) -> Any:
+        """
+        Block until the leader finishes and return its result, or raise its error.
+
+        Raises:
+            QueryCancelled: If cancel_token is cancelled first; the run goes
+                on for the other callers
+        """
+        while not self._done.wait(None if cancel_token is None else 0.1):
+            cancel_token.check()
+        if self.error is not None:
+            raise self.error
+        return self.result
+
+
+class SingleFlight:
+    """
+    Coalesces concurrent calls with the same key into one execution.
+
+    The first caller for a key (the leader) runs the function; callers that
+    arrive with the same key while it runs (followers) wait for and share its
+    result or exception. Once the call finishes the key is forgotten, so later
+    callers run the function again; nothing is cached. Threads and coroutines
+    are tracked separately, and coroutines only share calls within one event
+    loop.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._flights: Dict[Hashable, Flight] = {}
+        self._tasks: Dict[Tuple[asyncio.AbstractEventLoop, Hashable], Tuple[asyncio.Task, SharedCancelToken]] = {}
+        self.calls = 0
+        self.coalesced = 0
+
+    def do(self,
+           key: Hashable,
+           fn: Callable[[Flight], Any],
+           listener: Optional[Callable[..., None]] = None,
+           cancel_token: Optional[CancelToken] = None) -> Tuple[Any, bool]:
+        """
+        Run fn once for all concurrent callers with the same key.
+
+        Args:
+            key: Identifies equivalent calls
+            fn: Called with the Flight by the leader only; events it publishes
+                on the flight reach every caller's listener, and it should stop
+                when flight.cancel_token is cancelled
+            listener: Optional callback receiving the flight's events as
+                listener(event_type, **data)
+            cancel_token: This caller's token. A follower whose token is
+                cancelled stops waiting with QueryCancelled.
+
+        Returns:
+            (result, shared): fn's result and whether it came from another
+            caller's execution. The result object is the same for all callers,
+            so copy it before modifying it.
+        """
+        with self._lock:
+            flight = self._flights.get(key)
+            leader = flight is None
+            if leader:
+                flight = self._flights[key] = Flight()
+                self.calls += 1
+            else:
+                self.coalesced += 1
+            flight.cancel_token.join(cancel_token)
+        if listener is not None:
+            flight.subscribe(listener)
+        if not leader:
+            return flight.wait(cancel_token), True
+
+        try:
+            flight.result = fn(flight)
+        except BaseException as e:
+            flight.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._flights[key]
+            flight._done.set()
+        return flight.result, False
+
+    async def ado(self,
+                  key: Hashable,
+                  fn: Callable[[SharedCancelToken], Awaitable[Any]],
+                  cancel_token: Optional[CancelToken] = None) -> Tuple[Any, bool]:
+        """
+        Async version of do for coroutine functions.
+
+        The call runs as a task, so it completes for the remaining callers even
+        when the caller that started it is cancelled.
+
+        Args:
+            key: Identifies equivalent calls
+            fn: Coroutine function, awaited by the leader only, called with the
+                shared run's token (see Flight.cancel_token)
+            cancel_token: This caller's token
+
+        Returns:
+            (result, shared), see do
+        """
+        loop = asyncio.get_running_loop()
+        task_key = (loop, key)
+        with self._lock:
+            entry = self._tasks.get(task_key)
+            leader = entry is None
+            if leader:
+                shared = SharedCancelToken()
+                entry = self._tasks[task_key] = (loop.create_task(fn(shared)), shared)
+                entry[0].add_done_callback(lambda done: self._forget(task_key, done))
+                self.calls += 1
+            else:
+                self.coalesced += 1
+            entry[1].join(cancel_token)
+        return await asyncio.shield(entry[0]), not leader
+
+    def _forget(self, task_key: Tuple[asyncio.AbstractEventLoop, Hashable], task: asyncio.Task):
+        with self._lock:
+            self._tasks.pop(task_key, None)
+        # Mark the exception as retrieved; the callers that are still waiting re-raise it.
+        if not task.cancelled():
+            task.exception()
+
+    def stats(self) -> Dict[str, int]:
+        """Executions started, calls that joined one, and calls in flight"""
+        with self._lock:
+            return {
+                "calls": self.calls,
+                "coalesced": self.coalesced,
+                "in_flight": len(self._flights) + len(self._tasks),
+            }
@@ -0,0 +1,115 @@
+import threading
+from dataclasses import asdict, dataclass
+from typing import Any, Dict, Iterable, List, Optional
+from src.sql_validator import normalize_sql
+
+
+@dataclass
+class SqlCandidate:
+    """
+    One of several SQL statements generated for the same question.
+
+    rank is the order the candidate was requested in; rank 0 is the model's
+    usual answer and later ranks are sampled. error is set when the candidate
+    failed the local check or EXPLAIN. cost and rows are the planner's
+    estimates, None when the database reports none.
+    """
+    sql: str
+    rank: int
+    error: Optional[str] = None
+    cost: Optional[float] = None
+    rows: Optional[float] = None
+    seconds: float = 0.0
+
+    @property
+    def valid(self) -> bool:
+        """Whether the candidate passed validation"""
+        return self.error is None
+
+    def to_dict(self) -> Dict[str, Any]:
+        return asdict(self)
+
+
+def rank_candidates(candidates: List[SqlCandidate]) -> List[SqlCandidate]:
+    """
+    Order the valid candidates in which they should be tried.
+
+    The cheapest plan comes first; candidates without a cost estimate (every
+    candidate on databases other than PostgreSQL) follow in the order they
+    were requested. A statement generated more than once is kept at its
+    lowest rank.
+
+    Args:
+        candidates: Validated candidates
+
+    Returns:
+        List[SqlCandidate]: Distinct valid candidates, best first
+    """
+    distinct = {}
+    for candidate in sorted(candidates, key=lambda c: c.rank):
+        if candidate.valid:
+            distinct.setdefault(normalize_sql(candidate.sql), candidate)
+    return sorted(distinct.values(), key=lambda c: (c.cost is None, c.cost or 0.0, c.rank))
+
+
+class CandidateStats:
+    """
+    Counters of speculative SQL generation, to tune the number of candidates.
+
+    wins[rank] counts the runs answered by the candidate requested at that
+    rank, and rescued the runs whose rank-0 candidate was invalid or failed
+    to execute but another candidate answered: the retries speculation
+    saved. A run no candidate answered counts under no_winner.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._counters = {"runs": 0, "candidates": 0, "distinct": 0, "valid": 0,
+                          "execution_failures": 0, "no_winner": 0, "rescued": 0}
+        self._wins: List[int] = []
+
+    def observe(self,
+                candidates: List[SqlCandidate],
+                winner: Optional[SqlCandidate],
+                failed_ranks: Iterable[int] = ()):
+        """
+        Record one speculative generation.
+
+        Args:
+            candidates: Every candidate generated, validated
+            winner: The candidate that answered, or None
+            failed_ranks: Ranks of valid candidates that failed to execute
+        """
+        failed_ranks = set(failed_ranks)
+        first = min(candidates, key=lambda c: c.rank, default=None)
+        with self._lock:
+            self._counters["runs"] += 1
+            self._counters["candidates"] += len(candidates)
+            self._counters["distinct"] += len({normalize_sql(c.sql) for c in candidates})
+            self._counters["valid"] += sum(c.valid for c in candidates)
+            self._counters["execution_failures"] += len(failed_ranks)
+            if winner is None:
+                self._counters["no_winner"] += 1
+                return
+            while len(self._wins) <= winner.rank:
+                self._wins.append(0)
+            self._wins[winner.rank] += 1
+            if first is not None and winner.rank != first.rank:
+                self._counters["rescued"] += not first.valid or first.rank in failed_ranks
+
+    def stats(self) -> Dict[str, Any]:
+        """
+        Return the counters.
+
+        Returns:
+            Dict with runs, candidates, distinct, valid, execution_failures,
+            no_winner, rescued, wins (answers per rank) and win_rate (share of
+            the runs per rank)
+        """
+        with self._lock:
+            runs = self._counters["runs"]
+            return dict(
+                self._counters,
+                wins=list(self._wins),
+                win_rate=[wins / runs for wins in self._wins] if runs else [],
+            )
@@ -0,0 +1,188 @@
+from typing import Callable, List, Optional
+from pydantic import Field
+from sqlalchemy.exc import SQLAlchemyError
+from langchain_core.callbacks import CallbackManagerForToolRun
+from langchain_core.tools import BaseTool
+from langchain_community.agent_toolkits.sql.toolkit import SQLDatabaseToolkit
+from langchain_community.tools.sql_database.tool import (
+    InfoSQLDatabaseTool,
+    ListSQLDatabaseTool,
+    QuerySQLCheckerTool,
+    QuerySQLDatabaseTool,
+)
+from src.cost_guard import CostGuard
+from src.db_utils import DEFAULT_FETCH_BATCH_SIZE, fetch_capped, format_rows
+from src.query_results import record_executed_query
+from src.result_cache import ResultCache
+from src.schema_cache import SchemaCache
+from src.schema_renderer import SchemaRenderer
+
+
+class CachedInfoSQLDatabaseTool(InfoSQLDatabaseTool):
+    """Schema tool that serves table DDL from a SchemaCache instead of reflecting it."""
+
+    schema_cache: SchemaCache = Field(exclude=True)
+
+    def _run(
+        self,
+        table_names: str,
+        run_manager: Optional[CallbackManagerForToolRun] = None,
+    ) -> str:
+        """Get the schema for tables in a comma-separated list."""
+        try:
+            return self.schema_cache.get_table_info([t.strip() for t in table_names.split(",")])
+        except ValueError as e:
+            return f"Error: {e}"
+
+
+class RenderedInfoSQLDatabaseTool(InfoSQLDatabaseTool):
+    """Schema tool that returns compact DDL from a SchemaRenderer, within its token budget."""
+
+    schema_renderer: SchemaRenderer = Field(exclude=True)
+
+    def _run(
+        self,
+        table_names: str,
+        run_manager: Optional[CallbackManagerForToolRun] = None,
+    ) -> str:
+        """Get the schema for tables in a comma-separated list."""
+        try:
+            return self.schema_renderer.render([t.strip() for t in table_names.split(",") if t.strip()])
+        except ValueError as e:
+            return f"Error: {e}"
+
+
+class LocalQueryCheckerTool(BaseTool):
+    """
+    Query checker that validates SQL locally instead of asking the LLM.
+    
+    Takes the place of QuerySQLCheckerTool under the same name, so the agent
+    prompt is unchanged. A valid query is returned as is, like the stock
+    checker's answer; otherwise the agent gets the precise error.
+    """
+
+    name: str = "sql_db_query_checker"
+    description: str = QuerySQLCheckerTool.model_fields["description"].default
+    check_sql: Callable[[str], Optional[str]] = Field(exclude=True)
+
+    def _run(
+        self,
+        query: str,
+        run_manager: Optional[CallbackManagerForToolRun] = None,
+    ) -> str:
+        """Check the query and return it, or the problems found."""
+        error = self.check_sql(query)
+        if error:
+            return f"{error}\nFix the query and check it again."
+        return query
+
+
+class BatchedQuerySQLDatabaseTool(QuerySQLDatabaseTool):
+    """
+    Query tool that reads results in batches through a server-side cursor.
+
+    Rows go straight into Polars frames and reading stops at the row/byte caps,
+    so a large result cannot exhaust memory. Repeated queries are served from
+    a ResultCache when one is set, and a CostGuard can veto or cap expensive
+    queries before they run. With check_sql set, statements it rejects never
+    reach the database. The frame of every successful run is recorded (see
+    collect_executed_queries), so query() returns the rows the answer is
+    based on without running the statement again.
+    """
+
+    result_cache: Optional[ResultCache] = Field(default=None, exclude=True)
+    cost_guard: Optional[CostGuard] = Field(default=None, exclude=True)
+    check_sql: Optional[Callable[[str], Optional[str]]] = Field(default=None, exclude=True)
+    max_rows: Optional[int] = None
+    max_bytes: Optional[int] = None
+    batch_size: int = DEFAULT_FETCH_BATCH_SIZE
+
+    def _run(
+        self,
+        query: str,
+        run_manager: Optional[CallbackManagerForToolRun] = None,
+    ) -> str:
+        """Execute the query, return the results or an error message."""
+        note = None
+        if self.check_sql is not None:
+            error = self.check_sql(query)
+            if error:
+                return error
+        if self.cost_guard is not None:
+            decision = self.cost_guard.check(query)
+            if decision.blocked:
+                return decision.message
+            query, note = decision.sql, decision.message
+        try:
+            if self.result_cache is not None:
+                df, truncated = self.result_cache.execute_capped(query, self.max_rows, self.max_bytes, self.batch_size)
+            else:
+                df, truncated = fetch_capped(self.db, query, self.max_rows, self.max_bytes, self.batch_size)
+        except SQLAlchemyError as e:
+            return f"Error: {e}"
+        record_executed_query(query, df, truncated)
+        output = format_rows(df, self.db._max_string_length)
+        if truncated:
+            # Cut at the row or byte cap; without a note the model would count partial rows.
+            output += (f"\n(Only the first {df.height} rows are shown; the result has more. "
+                       f"Use SQL aggregates for counts and totals.)")
+        elif note:
+            output += f"\n({note})"
+        return output
+
+
+class Txt2SqlToolkit(SQLDatabaseToolkit):
+    """
+    SQLDatabaseToolkit with the project's replacements for the stock SQL tools.
+
+    The tools keep their names and descriptions, so the agent prompt is unchanged.
+    With check_sql set, the LLM query checker is replaced by LocalQueryCheckerTool,
+    and with schema_renderer set the schema tool returns compact DDL within its
+    token budget.
+    """
+
+    schema_cache: Optional[SchemaCache] = Field(default=None, exclude=True)
+    schema_renderer: Optional[SchemaRenderer] = Field(default=None, exclude=True)
+    result_cache: Optional[ResultCache] = Field(default=None, exclude=True)
+    cost_guard: Optional[CostGuard] = Field(default=None, exclude=True)
+    check_sql: Optional[Callable[[str], Optional[str]]] = Field(default=None, exclude=True)
+    include_list_tool: bool = True
+    max_rows: Optional[int] = None
+    max_bytes: Optional[int] = None
+    batch_size: int = DEFAULT_FETCH_BATCH_SIZE
+
+    def get_tools(self) -> List[BaseTool]:
+        """Get the tools in the toolkit."""
+        tools = []
+        for tool in super().get_tools():
+            if isinstance(tool, ListSQLDatabaseTool) and not self.include_list_tool:
+                continue
+            if isinstance(tool, InfoSQLDatabaseTool) and not self.include_list_tool:
+                tool.description = (
+                    "Input to this tool is a comma-separated list of tables, output is the "
+                    "schema and sample rows for those tables. Only use tables named in the "
+                    "instructions. Example Input: table1, table2, table3"
+                )
+            if isinstance(tool, InfoSQLDatabaseTool) and self.schema_renderer is not None:
+                tool = RenderedInfoSQLDatabaseTool(
+                    db=self.db, schema_renderer=self.schema_renderer, description=tool.description
+                )
+            elif isinstance(tool, InfoSQLDatabaseTool) and self.schema_cache is not None:
+                tool = CachedInfoSQLDatabaseTool(
+                    db=self.db, schema_cache=self.schema_cache, description=tool.description
+                )
+            if isinstance(tool, QuerySQLCheckerTool) and self.check_sql is not None:
+                tool = LocalQueryCheckerTool(check_sql=self.check_sql, description=tool.description)
+            if isinstance(tool, QuerySQLDatabaseTool):
+                tool = BatchedQuerySQLDatabaseTool(
+                    db=self.db,
+                    result_cache=self.result_cache,
+                    cost_guard=self.cost_guard,
+                    check_sql=self.check_sql,
+                    max_rows=self.max_rows,
+                    max_bytes=self.max_bytes,
+                    batch_size=self.batch_size,
+                    description=tool.description
+                )
+            tools.append(tool)
+        return tools
@@ -0,0 +1,112 @@
+import re
+from typing import Iterable, Optional, Set
+
+# Queries must start with SELECT/WITH/VALUES and be a single statement, so DDL
+# is already excluded; these keywords catch writes nested inside a query
+# (data-modifying CTEs, SELECT INTO, row locks). See system_prompt.txt.
+FORBIDDEN_KEYWORDS = ("insert", "update", "delete", "merge", "into")
+
+_FENCE_RE = re.compile(r"```(?:sql)?\s*(.*?)```", re.IGNORECASE | re.DOTALL)
+_STRING_OR_COMMENT_RE = re.compile(r"'(?:[^']|'')*'|\"(?:[^\"]|\"\")*\"|--[^\n]*|/\*.*?\*/", re.DOTALL)
+_FORBIDDEN_RE = re.compile(r"\b(" + "|".join(FORBIDDEN_KEYWORDS) + r")\b", re.IGNORECASE)
+_IDENTIFIER_RE = re.compile(r'"((?:[^"]|"")+)"|([A-Za-z_][A-Za-z0-9_$]*)')
+
+
+def extract_sql(text: str) -> str:
+    """
+    Pull the SQL statement out of an LLM response.
+
+    Strips markdown code fences, a leading "SQL query:" style label and
+    trailing semicolons.
+
+    Args:
+        text: Raw model output
+
+    Returns:
+        str: The SQL statement
+    """
+    match = _FENCE_RE.search(text)
+    sql = match.group(1) if match else text
+    sql = re.sub(r"^\s*(?:postgresql|sql)?\s*query\s*:\s*", "", sql, flags=re.IGNORECASE)
+    return sql.strip().rstrip(";").strip()
+
+
+def validate_sql(sql: str) -> Optional[str]:
+    """
+    Check that a generated statement is a single read-only query.
+
+    Args:
+        sql: SQL statement
+
+    Returns:
+        Optional[str]: An error message for the model, or None if the query is acceptable
+    """
+    code = _STRING_OR_COMMENT_RE.sub(" ", sql).strip().rstrip(";")
+    if not code:
+        return "Error: the query is empty."
+    if ";" in code:
+        return "Error: only a single SQL statement is allowed."
+    if not re.match(r"^\(?\s*(select|with|values)\b", code, re.IGNORECASE):
+        return "Error: only SELECT queries are allowed."
+    forbidden = _FORBIDDEN_RE.search(code)
+    if forbidden:
+        return f"Error: {forbidden.group(1).upper()} is not allowed; only read-only queries may be run."
+    return None
+
+
+def normalize_sql(sql: str) -> str:
+    """
+    Normalize SQL text for use as a cache key.
+
+    Comments are removed and whitespace is collapsed; keywords and unquoted
+    identifiers are lowercased (they are case-insensitive), while string
+    literals and quoted identifiers are kept verbatim.
+
+    Args:
+        sql: SQL statement
+
+    Returns:
+        str: Normalized statement
+    """
+    def code(segment: str) -> str:
+        return re.sub(r"\s+", " ", segment.lower())
+
+    parts = []
+    position = 0
+    for match in _STRING_OR_COMMENT_RE.finditer(sql):
+        parts.append(code(sql[position:match.start()]))
+        token = match.group(0)
+        parts.append(" " if token.startswith(("--", "/*")) else token)
+        position = match.end()
+    parts.append(code(sql[position:]))
+    return "".join(parts).strip().rstrip(";").strip()
+
+
+def referenced_tables(sql: str, known_tables: Iterable[str]) -> Set[str]:
+    """
+    Return the known tables a statement may read.
+
+    Every identifier outside string literals and comments is matched against
+    the known table names, so the result over-approximates the tables actually
+    read (a column sharing a table's name also counts), which is the safe
+    direction for cache invalidation.
+
+    Args:
+        sql: SQL statement
+        known_tables: Table names in the database
+
+    Returns:
+        Set[str]: Known tables named in the statement
+    """
+    known = set(known_tables)
+    lowered = {table.lower(): table for table in known}
+    code = _STRING_OR_COMMENT_RE.sub(lambda m: m.group(0) if m.group(0).startswith('"') else " ", sql)
+    found = set()
+    for quoted, bare in _IDENTIFIER_RE.findall(code):
+        if quoted:
+            name = quoted.replace('""', '"')
+            if name in known:
+                found.add(name)
+        elif bare.lower() in lowered:
+            found.add(lowered[bare.lower()])
+    return found
@@ -0,0 +1,139 @@
+import math
+import re
+from collections import Counter, defaultdict
+from typing import Dict, List, Optional, Tuple
+
+_WORD_RE = re.compile(r"[A-Z]+(?![a-z])|[A-Z]?[a-z]+|\d+")
+
+STOPWORDS = frozenset("""
+a an and are as at be by can do does for from get give how i in is it list me
+many much of on or show tell the their them there these this to was were what
+when where which who with find all each per top
+""".split())
+
+# Weight of each field when building a table's document.
+TABLE_NAME_WEIGHT = 3
+COLUMN_NAME_WEIGHT = 1
+COMMENT_WEIGHT = 1
+
+
+def tokenize(text: str) -> List[str]:
+    """
+    Split text or identifiers into normalized search terms.
+
+    Identifiers are split on underscores and camelCase, lowercased, stripped of
+    stopwords and given a light plural stem so "customers" matches "customer".
+
+    Args:
+        text: Question, identifier or comment text
+
+    Returns:
+        List[str]: Normalized terms
+    """
+    tokens = []
+    for word in _WORD_RE.findall(text or ""):
+        word = word.lower()
+        if word in STOPWORDS:
+            continue
+        if len(word) > 3 and word.endswith("ies"):
+            word = word[:-3] + "y"
+        elif len(word) > 3 and word.endswith("s") and not word.endswith("ss"):
+            word = word[:-1]
+        tokens.append(word)
+    return tokens
+
+
+class TableIndex:
+    """
+    BM25 index over the tables described by a get_db_info structure.
+
+    Each table is indexed as one document made of its name, column names and
+    comments. Searching scores tables for a question with no network access,
+    and foreign-key neighbours of the best matches can be pulled in so the
+    agent still sees the join paths it needs.
+    """
+
+    def __init__(self, db_info: dict, k1: float = 1.5, b: float = 0.75):
+        """
+        Build the inverted index.
+
+        Args:
+            db_info: Output of get_db_info
+            k1: BM25 term-frequency saturation
+            b: BM25 document-length normalization
+        """
+        self.k1 = k1
+        self.b = b
+        self.tables: List[str] = list(db_info["tables"])
+        self._postings: Dict[str, List[Tuple[int, int]]] = defaultdict(list)
+        self._doc_lengths: List[int] = []
+        self._neighbors: Dict[str, set] = defaultdict(set)
+
+        for doc_id, table in enumerate(self.tables):
+            terms = Counter(self._document_terms(table, db_info["tables"][table]))
+            self._doc_lengths.append(sum(terms.values()))
+            for term, freq in terms.items():
+                self._postings[term].append((doc_id, freq))
+
+        for rel in db_info["relationships"]:
+            self._neighbors[rel["table"]].add(rel["references_table"])
+            self._neighbors[rel["references_table"]].add(rel["table"])
+
+        n_docs = len(self.tables)
+        self._avg_length = (sum(self._doc_lengths) / n_docs) if n_docs else 0.0
+        self._idf = {
+            term: math.log(1 + (n_docs - len(postings) + 0.5) / (len(postings) + 0.5))
+            for term, postings in self._postings.items()
+        }
+
+    @staticmethod
+    def _document_terms(table: str, info: dict) -> List[str]:
+        terms = tokenize(table) * TABLE_NAME_WEIGHT
+        for column in info["columns"]:
+            terms += tokenize(column["name"]) * COLUMN_NAME_WEIGHT
+            terms += tokenize(column.get("comment") or "") * COMMENT_WEIGHT
+        terms += tokenize(info.get("comment") or "") * COMMENT_WEIGHT
+        return terms
+
+    def _scores(self, question: str) -> Dict[str, float]:
+        scores: Dict[int, float] = defaultdict(float)
+        for term in set(tokenize(question)):
+            idf = self._idf.get(term)
+            if idf is None:
+                continue
+            for doc_id, freq in self._postings[term]:
+                length_norm = 1 - self.b + self.b * self._doc_lengths[doc_id] / self._avg_length
+                scores[doc_id] += idf * freq * (self.k1 + 1) / (freq + self.k1 * length_norm)
+        return {self.tables[doc_id]: score for doc_id, score in scores.items()}
+
+    def search(self, question: str, k: int = 10) -> List[Tuple[str, float]]:
+        """
+        Score tables against a question.
+
+        Args:
+            question: Natural language question
+            k: Maximum number of tables to return
+
+        Returns:
+            List[Tuple[str, float]]: (table, score) pairs, best first, score > 0
+        """
+        return sorted(self._scores(question).items(), key=lambda item: (-item[1], item[0]))[:k]
+
+    def relevant_tables(self, question: str, k: int = 5, max_neighbors: Optional[int] = None) -> List[str]:
+        """
+        Return the top-k tables for a question plus their foreign-key neighbours.
+
+        Args:
+            question: Natural language question
+            k: Number of directly matching tables
+            max_neighbors: Cap on neighbour tables added. Defaults to k.
+
+        Returns:
+            List[str]: Table names, direct matches first; empty if nothing matched
+        """
+        scores = self._scores(question)
+        matches = [table for table, _ in sorted(scores.items(), key=lambda item: (-item[1], item[0]))[:k]]
+        max_neighbors = k if max_neighbors is None else max_neighbors
+        candidates = {n for table in matches for n in self._neighbors.get(table, ())} - set(matches)
+        neighbors = sorted(candidates, key=lambda t: (-scores.get(t, 0.0), t))[:max_neighbors]
+        return matches + neighbors
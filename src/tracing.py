@@ -0,0 +1,317 @@
+import json
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+from uuid import UUID
+from langchain_core.callbacks import BaseCallbackHandler, BaseCallbackManager
+from langchain_core.outputs import LLMResult
+from langchain_core.runnables import RunnableConfig
+
+# Longest tool input or SQL text kept in a span.
+MAX_SPAN_TEXT = 2000
+
+# Histogram bucket upper bounds in seconds.
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+# Tracer of the query() call running in this context, see activate_tracer.
+_active_tracer: ContextVar[Optional["QueryTracer"]] = ContextVar("query_tracer", default=None)
+
+
+def current_tracer() -> Optional["QueryTracer"]:
+    """Return the tracer of the running query, or None when tracing is off"""
+    return _active_tracer.get()
+
+
+@contextmanager
+def activate_tracer(tracer: Optional["QueryTracer"]) -> Iterator[None]:
+    """
+    Make a tracer current for database work done inside the block.
+
+    Threads that LangChain runs tools in, and asyncio.to_thread, inherit the
+    caller's context, so their database calls are recorded too.
+    """
+    token = _active_tracer.set(tracer)
+    try:
+        yield
+    finally:
+        _active_tracer.reset(token)
+
+
+def add_callback(config: Optional[RunnableConfig], handler: BaseCallbackHandler) -> RunnableConfig:
+    """Return a copy of config with handler added to its callbacks"""
+    config = dict(config or {})
+    callbacks = config.get("callbacks")
+    if callbacks is None:
+        config["callbacks"] = [handler]
+    elif isinstance(callbacks, BaseCallbackManager):
+        callbacks = callbacks.copy()
+        callbacks.add_handler(handler, inherit=True)
+        config["callbacks"] = callbacks
+    else:
+        config["callbacks"] = list(callbacks) + [handler]
+    return config
+
+
+def _clip(text: Any) -> str:
+    text = str(text)
+    return text if len(text) <= MAX_SPAN_TEXT else text[:MAX_SPAN_TEXT] + "..."
+
+
+class QueryTracer(BaseCallbackHandler):
+    """
+    Callback that records the LLM calls, tool calls and database queries of one query.
+
+    LLM and tool spans come from LangChain callbacks; database spans are added
+    by fetch_dataframe and the cost guard through current_tracer(). Every span
+    has a type, a start offset from the beginning of the query and a duration,
+    in seconds.
+    """
+
+    # Run on the calling thread, also for async runs, so timings are exact.
+    run_inline = True
+
+    def __init__(self):
+        self.start = time.perf_counter()
+        self.spans: List[Dict[str, Any]] = []
+        self._open: Dict[UUID, Tuple[float, Dict[str, Any]]] = {}
+        self._lock = threading.Lock()
+
+    def on_chat_model_start(self, serialized: Dict[str, Any], messages: Any, *, run_id: UUID, **kwargs: Any) -> Any:
+        self._open_span(run_id, {"type": "llm", "name": self._model_name(serialized, kwargs)})
+
+    def on_llm_start(self, serialized: Dict[str, Any], prompts: List[str], *, run_id: UUID, **kwargs: Any) -> Any:
+        self._open_span(run_id, {"type": "llm", "name": self._model_name(serialized, kwargs)})
+
+    def on_llm_end(self, response: LLMResult, *, run_id: UUID, **kwargs: Any) -> Any:
+        prompt_tokens, completion_tokens = self._token_usage(response)
+        self._close_span(run_id, prompt_tokens=prompt_tokens, completion_tokens=completion_tokens)
+
+    def on_llm_error(self, error: BaseException, *, run_id: UUID, **kwargs: Any) -> Any:
+        self._close_span(run_id, error=str(error))
+
+    def on_tool_start(self,
+                      serialized: Dict[str, Any],
+                      input_str: str,
+                      *,
+                      run_id: UUID,
+                      inputs: Optional[Dict[str, Any]] = None,
+                      **kwargs: Any) -> Any:
+        self._open_span(run_id, {"type": "tool", "name": serialized.get("name"), "input": _clip(input_str)})
+
+    def on_tool_end(self, output: Any, *, run_id: UUID, **kwargs: Any) -> Any:
+        self._close_span(run_id)
+
+    def on_tool_error(self, error: BaseException, *, run_id: UUID, **kwargs: Any) -> Any:
+        self._close_span(run_id, error=str(error))
+
+    def record_db(self, sql: str, seconds: float, rows: Optional[int] = None):
+        """Add a database span that ended now and took seconds"""
+        start = time.perf_counter() - seconds - self.start
+        with self._lock:
+            self.spans.append({"type": "db", "sql": _clip(sql), "start": start, "duration": seconds, "rows": rows})
+
+    def timings(self) -> Dict[str, Any]:
+        """
+        Summarize the recorded spans.
+
+        Returns:
+            Dict with total seconds, llm seconds/calls and prompt/completion
+            tokens, db seconds/queries, seconds per tool name, and the spans
+            ordered by start. Tool time includes the LLM and database work done
+            inside the tool (e.g. the query checker's LLM call).
+        """
+        with self._lock:
+            spans = sorted(self.spans, key=lambda span: span["start"])
+        llm = [span for span in spans if span["type"] == "llm"]
+        db = [span for span in spans if span["type"] == "db"]
+        tools: Dict[str, float] = {}
+        for span in spans:
+            if span["type"] == "tool":
+                tools[span["name"]] = tools.get(span["name"], 0.0) + span["duration"]
+        return {
+            "total": time.perf_counter() - self.start,
+            "llm": sum(span["duration"] for span in llm),
+            "llm_calls": len(llm),
+            "prompt_tokens": sum(span.get("prompt_tokens") or 0 for span in llm),
+            "completion_tokens": sum(span.get("completion_tokens") or 0 for span in llm),
+            "db": sum(span["duration"] for span in db),
+            "db_queries": len(db),
+            "tools": tools,
+            "spans": spans,
+        }
+
+    def _open_span(self, run_id: UUID, span: Dict[str, Any]):
+        now = time.perf_counter()
+        span["start"] = now - self.start
+        with self._lock:
+            self._open[run_id] = (now, span)
+
+    def _close_span(self, run_id: UUID, **data: Any):
+        with self._lock:
+            opened = self._open.pop(run_id, None)
+            if opened is None:
+                return
+            start, span = opened
+            span["duration"] = time.perf_counter() - start
+            span.update(data)
+            self.spans.append(span)
+
+    @staticmethod
+    def _model_name(serialized: Optional[Dict[str, Any]], kwargs: Dict[str, Any]) -> Optional[str]:
+        params = kwargs.get("invocation_params") or {}
+        name = params.get("model_name") or params.get("model")
+        if name is None and serialized:
+            name = (serialized.get("kwargs") or {}).get("model_name") or serialized.get("name")
+        return name
+
+    @staticmethod
+    def _token_usage(response: LLMResult) -> Tuple[Optional[int], Optional[int]]:
+        usage = (response.llm_output or {}).get("token_usage")
+        if usage:
+            return usage.get("prompt_tokens"), usage.get("completion_tokens")
+        for generations in response.generations:
+            for generation in generations:
+                metadata = getattr(getattr(generation, "message", None), "usage_metadata", None)
+                if metadata:
+                    return metadata.get("input_tokens"), metadata.get("output_tokens")
+        return None, None
+
+
+class _Histogram:
+    def __init__(self, buckets: Tuple[float, ...]):
+        self.buckets = buckets
+        self.counts = [0] * len(buckets)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float):
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                self.counts[i] += 1
+        self.sum += value
+        self.count += 1
+
+
+class QueryMetrics:
+    """
+    Counters and latency histograms aggregated over query() results.
+
+    Pass an instance to Txt2SqlAgent(metrics=...) and export it with
+    to_prometheus (Prometheus text exposition format) or to_json_lines.
+    """
+
+    _HELP = {
+        "txt2sql_queries_total": ("counter", "Queries answered, by path and status"),
+        "txt2sql_llm_calls_total": ("counter", "LLM calls"),
+        "txt2sql_llm_tokens_total": ("counter", "LLM tokens, by kind (prompt or completion)"),
+        "txt2sql_tool_calls_total": ("counter", "Agent tool calls, by tool"),
+        "txt2sql_db_queries_total": ("counter", "Database queries run for results"),
+        "txt2sql_query_duration_seconds": ("histogram", "End-to-end query latency, by path"),
+        "txt2sql_llm_call_duration_seconds": ("histogram", "LLM call latency"),
+        "txt2sql_tool_call_duration_seconds": ("histogram", "Agent tool call latency, by tool"),
+        "txt2sql_db_query_duration_seconds": ("histogram", "Database query latency"),
+    }
+
+    def __init__(self, buckets: Tuple[float, ...] = DEFAULT_BUCKETS):
+        """
+        Args:
+            buckets: Histogram bucket upper bounds in seconds
+        """
+        self.buckets = tuple(buckets)
+        self._counters: Dict[Tuple[str, Tuple[Tuple[str, str], ...]], float] = {}
+        self._histograms: Dict[Tuple[str, Tuple[Tuple[str, str], ...]], _Histogram] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, result: Dict[str, Any]):
+        """
+        Add a query() result to the metrics.
+
+        Args:
+            result: Result dict with "timings" from a traced query
+        """
+        timings = result.get("timings")
+        status = "success" if result["success"] else "error"
+        with self._lock:
+            self._inc("txt2sql_queries_total", path=result["path"], status=status)
+            self._observe("txt2sql_query_duration_seconds", result["execution_time"], path=result["path"])
+            if timings is None:
+                return
+            self._inc("txt2sql_llm_tokens_total", timings["prompt_tokens"], kind="prompt")
+            self._inc("txt2sql_llm_tokens_total", timings["completion_tokens"], kind="completion")
+            for span in timings["spans"]:
+                if span["type"] == "llm":
+                    self._inc("txt2sql_llm_calls_total")
+                    self._observe("txt2sql_llm_call_duration_seconds", span["duration"])
+                elif span["type"] == "tool":
+                    self._inc("txt2sql_tool_calls_total", tool=span["name"])
+                    self._observe("txt2sql_tool_call_duration_seconds", span["duration"], tool=span["name"])
+                elif span["type"] == "db":
+                    self._inc("txt2sql_db_queries_total")
+                    self._observe("txt2sql_db_query_duration_seconds", span["duration"])
+
+    def to_prometheus(self) -> str:
+        """Return the metrics in the Prometheus text exposition format"""
+        lines = []
+        described = set()
+        with self._lock:
+            series = sorted(self._counters.items()) + sorted(self._histograms.items(), key=lambda item: item[0])
+            for (name, labels), value in series:
+                if name not in described:
+                    kind, description = self._HELP[name]
+                    lines.append(f"# HELP {name} {description}")
+                    lines.append(f"# TYPE {name} {kind}")
+                    described.add(name)
+                if isinstance(value, _Histogram):
+                    for bound, count in zip(value.buckets, value.counts):
+                        lines.append(f"{name}_bucket{self._labels(labels, le=repr(bound))} {count}")
+                    lines.append(f"{name}_bucket{self._labels(labels, le='+Inf')} {value.count}")
+                    lines.append(f"{name}_sum{self._labels(labels)} {value.sum}")
+                    lines.append(f"{name}_count{self._labels(labels)} {value.count}")
+                else:
+                    lines.append(f"{name}{self._labels(labels)} {value:g}")
+        return "\n".join(lines) + "\n"
+
+    def to_json_lines(self) -> str:
+        """Return the metrics as JSON lines, one series per line"""
+        timestamp = time.time()
+        lines = []
+        with self._lock:
+            for (name, labels), value in sorted(self._counters.items()):
+                lines.append({"timestamp": timestamp, "name": name, "labels": dict(labels), "value": value})
+            for (name, labels), histogram in sorted(self._histograms.items(), key=lambda item: item[0]):
+                lines.append({
+                    "timestamp": timestamp,
+                    "name": name,
+                    "labels": dict(labels),
+                    "count": histogram.count,
+                    "sum": histogram.sum,
+                    "buckets": dict(zip((str(bound) for bound in histogram.buckets), histogram.counts)),
+                })
+        return "".join(json.dumps(line) + "\n" for line in lines)
+
+    def write(self, path: str):
+        """Write the metrics to a file: JSON lines for .jsonl/.json, Prometheus text otherwise"""
+        text = self.to_json_lines() if path.endswith((".jsonl", ".json")) else self.to_prometheus()
+        with open(path, "w", encoding="utf-8") as f:
+            f.write(text)
+
+    def _inc(self, name: str, amount: float = 1, **labels: str):
+        key = (name, tuple(sorted(labels.items())))
+        self._counters[key] = self._counters.get(key, 0) + amount
+
+    def _observe(self, name: str, value: float, **labels: str):
+        key = (name, tuple(sorted(labels.items())))
+        histogram = self._histograms.get(key)
+        if histogram is None:
+            histogram = self._histograms[key] = _Histogram(self.buckets)
+        histogram.observe(value)
+
+    @staticmethod
+    def _labels(labels: Tuple[Tuple[str, str], ...], **extra: str) -> str:
+        pairs = list(labels) + list(extra.items())
+        if not pairs:
+            return ""
+        escaped = (str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n") for _, value in pairs)
+        return "{" + ",".join(f'{key}="{value}"' for (key, _), value in zip(pairs, escaped)) + "}"
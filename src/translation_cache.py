@@ -0,0 +1,219 @@
+import os
+import sqlite3
+import threading
+import time
+from array import array
+from dataclasses import dataclass
+from typing import Dict, Any, Optional
+from src.similarity import MinHasher, normalize_question
+
+DEFAULT_CACHE_PATH = os.path.join(".cache", "translations.sqlite3")
+
+
+@dataclass(frozen=True)
+class CachedTranslation:
+    """
+    A cache hit: the SQL and the key of the entry it came from.
+
+    question is the normalized question stored with the entry, which differs
+    from the one looked up after a fuzzy match.
+    """
+    sql: str
+    question: str
+    model: str
+    schema_fingerprint: str
+
+
+class TranslationCache:
+    """
+    Persistent natural-language-to-SQL cache backed by a local SQLite file.
+
+    Entries are keyed by the normalized question, the model name and the
+    schema fingerprint, so a schema change or a model switch never serves SQL
+    generated for something else. Near-duplicate questions can optionally be
+    matched with MinHash similarity over character n-grams. Entries expire
+    after a TTL and the least recently used ones are evicted above a size cap.
+    """
+
+    def __init__(self,
+                 path: Optional[str] = None,
+                 max_entries: int = 10000,
+                 ttl: Optional[float] = None,
+                 fuzzy_threshold: float = 0.0,
+                 num_perm: int = 64):
+        """
+        Open (or create) the cache file.
+
+        Args:
+            path: SQLite file. Defaults to .cache/translations.sqlite3; use
+                ":memory:" for a process-local cache.
+            max_entries: Maximum number of entries before LRU eviction
+            ttl: Seconds an entry stays valid. None keeps entries until evicted.
+            fuzzy_threshold: Minimum estimated Jaccard similarity (0-1) for a
+                near-duplicate question to count as a hit. 0 disables fuzzy matching.
+            num_perm: MinHash signature length used for fuzzy matching
+        """
+        self.path = path or DEFAULT_CACHE_PATH
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.fuzzy_threshold = fuzzy_threshold
+        self._hasher = MinHasher(num_perm=num_perm)
+        self._lock = threading.Lock()
+        self._counters = {"hits": 0, "fuzzy_hits": 0, "misses": 0, "evictions": 0}
+
+        directory = os.path.dirname(self.path)
+        if directory and self.path != ":memory:":
+            os.makedirs(directory, exist_ok=True)
+        self._conn = sqlite3.connect(self.path, check_same_thread=False, timeout=30)
+        self._conn.executescript("""
+            CREATE TABLE IF NOT EXISTS translations (
+                question TEXT NOT NULL,
+                model TEXT NOT NULL,
+                schema_fingerprint TEXT NOT NULL,
+                sql TEXT NOT NULL,
+                signature BLOB NOT NULL,
+                created_at REAL NOT NULL,
+                last_used_at REAL NOT NULL,
+                hits INTEGER NOT NULL DEFAULT 0,
+                PRIMARY KEY (question, model, schema_fingerprint)
+            );
+            CREATE INDEX IF NOT EXISTS translations_last_used ON translations (last_used_at);
+        """)
+
+    def get(self, question: str, model: str, schema_fingerprint: str) -> Optional[CachedTranslation]:
+        """
+        Look up cached SQL for a question.
+
+        Args:
+            question: Natural language question
+            model: Name of the model that generated the SQL
+            schema_fingerprint: Fingerprint of the schema the SQL was generated for
+
+        Returns:
+            Optional[CachedTranslation]: The cached SQL with the key of the
+            entry that matched (pass it to discard if the SQL turns out
+            wrong), or None on a miss
+        """
+        key = normalize_question(question)
+        now = time.time()
+        with self._lock:
+            self._expire(now)
+            row = self._conn.execute(
+                "SELECT sql FROM translations WHERE question = ? AND model = ? AND schema_fingerprint = ?",
+                (key, model, schema_fingerprint)
+            ).fetchone()
+            kind = "hits"
+            if row is None and self.fuzzy_threshold > 0:
+                key, row = self._fuzzy_lookup(key, model, schema_fingerprint)
+                kind = "fuzzy_hits"
+            if row is None:
+                self._counters["misses"] += 1
+                return None
+            self._conn.execute(
+                "UPDATE translations SET last_used_at = ?, hits = hits + 1 "
+                "WHERE question = ? AND model = ? AND schema_fingerprint = ?",
+                (now, key, model, schema_fingerprint)
+            )
+            self._conn.commit()
+            self._counters[kind] += 1
+            return CachedTranslation(row[0], key, model, schema_fingerprint)
+
+    def put(self, question: str, model: str, schema_fingerprint: str, sql: str):
+        """
+        Store SQL for a question, evicting the least recently used entries if full.
+
+        Args:
+            question: Natural language question
+            model: Name of the model that generated the SQL
+            schema_fingerprint: Fingerprint of the schema the SQL was generated for
+            sql: Generated SQL
+        """
+        key = normalize_question(question)
+        signature = array("Q", self._hasher.signature(key)).tobytes()
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO translations "
+                "(question, model, schema_fingerprint, sql, signature, created_at, last_used_at) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (key, model, schema_fingerprint, sql, signature, now, now)
+            )
+            overflow = self._conn.execute("SELECT COUNT(*) FROM translations").fetchone()[0] - self.max_entries
+            if overflow > 0:
+                self._conn.execute(
+                    "DELETE FROM translations WHERE rowid IN "
+                    "(SELECT rowid FROM translations ORDER BY last_used_at LIMIT ?)",
+                    (overflow,)
+                )
+                self._counters["evictions"] += overflow
+            self._conn.commit()
+
+    def invalidate(self, question: Optional[str] = None):
+        """
+        Remove entries from the cache.
+
+        Args:
+            question: Remove entries for this question only. Defaults to everything.
+        """
+        with self._lock:
+            if question is None:
+                self._conn.execute("DELETE FROM translations")
+            else:
+                self._conn.execute("DELETE FROM translations WHERE question = ?", (normalize_question(question),))
+            self._conn.commit()
+
+    def discard(self, entry: CachedTranslation):
+        """
+        Remove the entry a lookup returned, e.g. because its SQL failed.
+
+        Only that entry goes: the same question cached for other models or
+        schemas is kept, and after a fuzzy hit it is the matched question's
+        entry that is removed.
+
+        Args:
+            entry: Result of get
+        """
+        with self._lock:
+            self._conn.execute(
+                "DELETE FROM translations WHERE question = ? AND model = ? AND schema_fingerprint = ?",
+                (entry.question, entry.model, entry.schema_fingerprint)
+            )
+            self._conn.commit()
+
+    def stats(self) -> Dict[str, Any]:
+        """
+        Return hit/miss counters for this process and the current cache size.
+
+        Returns:
+            Dict with hits, fuzzy_hits, misses, evictions, entries and hit_rate
+        """
+        with self._lock:
+            entries = self._conn.execute("SELECT COUNT(*) FROM translations").fetchone()[0]
+            stats = dict(self._counters, entries=entries)
+        lookups = stats["hits"] + stats["fuzzy_hits"] + stats["misses"]
+        stats["hit_rate"] = (stats["hits"] + stats["fuzzy_hits"]) / lookups if lookups else 0.0
+        return stats
+
+    def _expire(self, now: float):
+        if self.ttl is None:
+            return
+        cursor = self._conn.execute("DELETE FROM translations WHERE created_at < ?", (now - self.ttl,))
+        if cursor.rowcount:
+            self._counters["evictions"] += cursor.rowcount
+            self._conn.commit()
+
+    def _fuzzy_lookup(self, key: str, model: str, schema_fingerprint: str):
+        """Return (question, row) for the most similar cached question above the threshold"""
+        signature = self._hasher.signature(key)
+        best_question, best_sql, best_score = None, None, self.fuzzy_threshold
+        rows = self._conn.execute(
+            "SELECT question, sql, signature FROM translations WHERE model = ? AND schema_fingerprint = ?",
+            (model, schema_fingerprint)
+        )
+        for question, sql, blob in rows:
+            score = MinHasher.similarity(signature, array("Q", blob))
+            if score >= best_score:
+                best_question, best_sql, best_score = question, sql, score
+        if best_question is None:
+            return key, None
+        return best_question, (best_sql,)
@@ -1,25 +1,124 @@
-from typing import Dict, Any, List, Optional
+from typing import TYPE_CHECKING, Dict, Any, Callable, Iterator, List, Optional
+import asyncio
+import contextvars
+import functools
+import os
+import queue
+import threading
 import time
-from langchain_openai import ChatOpenAI
-from langchain_community.agent_toolkits.sql.base import create_sql_agent
-from langchain.agents.agent_types import AgentType
+from concurrent.futures import ThreadPoolExecutor
 from langchain_community.utilities import SQLDatabase
 from langchain_core.prompts import PromptTemplate
 from langchain_core.output_parsers import StrOutputParser
+from langchain_core.runnables import RunnableConfig
+from sqlalchemy.exc import SQLAlchemyError
+from src.cancellation import (
+    CancelToken,
+    CancellationCallbackHandler,
+    QueryCancelled,
+    activate_cancel_token,
+    check_cancelled,
+)
+from src.cost_guard import CostGuard, GuardDecision, QueryRejected, collect_guard_decisions
+from src.db_utils import (
+    DEFAULT_FETCH_BATCH_SIZE,
+    explain_sql,
+    fetch_capped,
+    format_rows,
+    get_db_info,
+    get_schema_fingerprints,
+    restrict_tables,
+    schema_fingerprint,
+)
+from src.example_store import Example, ExampleStore, format_examples
+from src.query_events import ExecutedQueryRecorder, QueryEventHandler
+from src.query_results import ExecutedQuery, collect_executed_queries, record_executed_query
+from src.rate_limiter import RateLimitCallbackHandler, RateLimiter
+from src.result_cache import ResultCache
+from src.schema_cache import SchemaCache
+from src.schema_renderer import SchemaRenderer
+from src.schema_validator import SchemaValidator
+from src.singleflight import SingleFlight
+from src.sql_candidates import CandidateStats, SqlCandidate, rank_candidates
+from src.sql_validator import extract_sql, validate_sql
+from src.table_index import TableIndex
+from src.tracing import QueryMetrics, QueryTracer, activate_tracer, add_callback
+from src.translation_cache import CachedTranslation, TranslationCache
+from src.value_index import ColumnValueIndex, ValueMatch, format_value_matches
+
+if TYPE_CHECKING:
+    import polars as pl
+    from langchain_openai import ChatOpenAI
+
+SYSTEM_PROMPT_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "system_prompt.txt")
+
+RELEVANT_TABLES_PROMPT = """
+The tables relevant to this question are: {tables}.
+Only query these tables. Use the schema tool to look up their columns before writing the query.
+"""
+
+QUERY_MODES = ("agent", "direct")
+
+
+@functools.lru_cache(maxsize=None)
+def load_system_prompt() -> str:
+    """Read the agent's system prompt (custom prompt for better SQL generation) on first use"""
+    with open(SYSTEM_PROMPT_PATH, "r", encoding="utf-8") as f:
+        return f.read()
+
+
+def __getattr__(name: str):
+    # SQL_PREFIX used to be read at import time; keep it importable.
+    if name == "SQL_PREFIX":
+        return load_system_prompt()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
 
-# Custom prompt template for better SQL generation
-SQL_PREFIX = open("src/system_prompt.txt", "r").read()
 
 class Txt2SqlAgent:
     """
     A class to create and manage a text-to-SQL agent that converts natural language
     to SQL queries and executes them against a PostgreSQL database.
+    
+    One instance can serve many threads (e.g. Streamlit sessions) at once. The
+    model client, prompts, schema and the agents built from them are shared and
+    built once under a lock; everything a query accumulates (tracing, cost
+    guard decisions, progress events) belongs to its own call. Identical
+    questions asked while one is already being answered wait for that answer
+    instead of starting another LLM run (see coalesce).
+    
+    Every query runs under a CancelToken with an optional deadline. Once it
+    is cancelled the query stops before its next LLM call, agent step or
+    statement, and the statement running is interrupted. A coalesced run
+    only stops when all of its callers have cancelled.
     """
     
     def __init__(self, 
                  db: SQLDatabase, 
-                 model: ChatOpenAI,
-                 verbose: bool = False):
+                 model: "ChatOpenAI",
+                 verbose: bool = False,
+                 schema_cache: Optional[SchemaCache] = None,
+                 table_retrieval_k: int = 0,
+                 mode: str = "agent",
+                 summarize: bool = True,
+                 translation_cache: Optional[TranslationCache] = None,
+                 result_cache: Optional[ResultCache] = None,
+                 max_result_rows: Optional[int] = None,
+                 max_result_bytes: Optional[int] = None,
+                 fetch_batch_size: int = DEFAULT_FETCH_BATCH_SIZE,
+                 cost_guard: Optional[CostGuard] = None,
+                 trace: bool = True,
+                 metrics: Optional[QueryMetrics] = None,
+                 coalesce: bool = True,
+                 schema_validation: bool = True,
+                 example_store: Optional[ExampleStore] = None,
+                 few_shot_k: int = 3,
+                 learn_examples: bool = True,
+                 value_index: Optional[ColumnValueIndex] = None,
+                 schema_renderer: Optional[SchemaRenderer] = None,
+                 sql_candidates: int = 1,
+                 candidate_temperature: float = 0.7,
+                 query_timeout: Optional[float] = None,
+                 result_data_rows: Optional[int] = 1000):
         """
         Initialize the Txt2SqlAgent with database connection and language model.
         
@@ -27,77 +126,1268 @@ class Txt2SqlAgent:
             db: SQLDatabase instance connected to a PostgreSQL database
             model: LangChain ChatOpenAI instance
             verbose: Whether to display verbose output from the agent
+            schema_cache: Optional SchemaCache serving table DDL to the agent
+            table_retrieval_k: When > 0, build the agent for each query over only
+                the k most relevant tables (plus their foreign-key neighbours)
+            mode: Default query mode, "agent" or "direct" (see query)
+            summarize: In direct mode, whether to make a second LLM call that turns
+                the rows into an answer; if False the raw rows are returned
+            translation_cache: Optional TranslationCache; cached SQL for a question
+                is reused without an LLM call for generation
+            result_cache: Optional ResultCache under the agent's query tool and
+                direct execution, so repeated queries skip the database
+            max_result_rows: Rows a query may return to the agent or direct mode;
+                further rows are never fetched. None for no limit.
+            max_result_bytes: Approximate in-memory size at which fetching a
+                result stops. None for no limit.
+            fetch_batch_size: Rows read per round trip from the server-side cursor
+            cost_guard: Optional CostGuard that checks every statement with EXPLAIN
+                before the query tool or direct mode runs it
+            trace: Record every LLM call, tool call and database query of a query
+                and report them as the result's "timings". When False no tracing
+                callback is installed at all.
+            metrics: Optional QueryMetrics every traced result is added to
+            coalesce: Let concurrent query, aquery and stream_query calls with the
+                same question and mode share one run. Calls passing their own
+                config are never coalesced, since their callbacks must see
+                their own run.
+            schema_validation: Check generated SQL against the schema before it
+                runs (see SchemaValidator). The agent's query checker becomes
+                this local check instead of an LLM call, the query tool refuses
+                invalid SQL without a database round trip, and SQL generated in
+                one call gets one repair attempt with the error.
+            example_store: Optional ExampleStore of verified question -> SQL
+                pairs; the few_shot_k most similar to a question are added to
+                the agent's input and the SQL generation prompt
+            few_shot_k: Examples added per question. 0 disables few-shot prompting.
+            learn_examples: Add the SQL of every successful direct or agent
+                answer to example_store
+            value_index: Optional ColumnValueIndex; stored values matching
+                words of the question (statuses, regions, names) are listed
+                in the agent's input and the SQL generation prompt with their
+                exact spelling and columns
+            schema_renderer: Optional SchemaRenderer; the schema in the SQL
+                generation prompts and from the agent's schema tool is then
+                compact DDL within its token budget instead of SQLDatabase's
+                table info. Without one, a SQL generation prompt for no
+                particular tables (retrieval off or without matches) still
+                gets the schema from a default SchemaRenderer, so it stays
+                within a token budget however many tables there are.
+            sql_candidates: When > 1, direct mode and generate_sql_only request
+                this many SQL candidates at once and validate each with the
+                local check and EXPLAIN as it arrives; the cheapest valid plan
+                runs first and the next one runs if it fails. Replaces the
+                one-shot repair call. See candidate_stats for how often each
+                rank wins.
+            candidate_temperature: Sampling temperature of every candidate but
+                the first, which uses the model's own settings
+            query_timeout: Deadline in seconds of query, aquery and stream_query
+                calls without their own cancel_token. None for no deadline.
+            result_data_rows: Rows of the executed query kept in a result's
+                "data". None keeps every fetched row (up to max_result_rows);
+                with 0 "data" is None.
         """
+        if mode not in QUERY_MODES:
+            raise ValueError(f"Unknown query mode {mode!r}; expected one of {QUERY_MODES}")
         self.db = db
         self.model = model
         self.verbose = verbose
-        self.agent = self._create_agent()
+        self.schema_cache = schema_cache
+        self.table_retrieval_k = table_retrieval_k
+        self.mode = mode
+        self.summarize = summarize
+        self.translation_cache = translation_cache
+        self.result_cache = result_cache
+        self.max_result_rows = max_result_rows
+        self.max_result_bytes = max_result_bytes
+        self.fetch_batch_size = fetch_batch_size
+        self.cost_guard = cost_guard
+        self.trace = trace
+        self.metrics = metrics
+        self._schema_fingerprint = None
+        self._table_index = None
+        self._table_index_fingerprint = None
+        self.schema_validation = schema_validation
+        self._schema_validator = None
+        self._schema_validator_fingerprint = None
+        self.example_store = example_store
+        self.few_shot_k = few_shot_k
+        self.learn_examples = learn_examples
+        self.value_index = value_index
+        self.schema_renderer = schema_renderer
+        self._full_schema_renderer = None
+        self.sql_candidates = sql_candidates
+        self.candidate_temperature = candidate_temperature
+        self.candidate_stats = CandidateStats()
+        self.query_timeout = query_timeout
+        self.result_data_rows = result_data_rows
+        self._agent = None
+        self._streaming_agent = None
+        self._lock = threading.Lock()
+        self._flights = SingleFlight() if coalesce else None
+    
+    @property
+    def agent(self):
+        """The full-schema LangChain agent, built on first use"""
+        if self._agent is None:
+            with self._lock:
+                if self._agent is None:
+                    self._agent = self._create_agent()
+        return self._agent
         
-    def _create_agent(self):
-        """Create the SQL agent using LangChain"""
-        return create_sql_agent(
+    def _create_agent(self, tables: Optional[List[str]] = None, streaming: bool = False):
+        """
+        Create the SQL agent using LangChain
+        
+        Args:
+            tables: Restrict the agent to these tables and name them in the prompt.
+                Defaults to the whole database.
+            streaming: Request token streaming from the model, so the final answer
+                reaches on_llm_new_token callbacks as it is generated
+        """
+        # The agent framework is slow to import, so load it only when an agent is built.
+        from langchain.agents.agent_types import AgentType
+        from langchain_community.agent_toolkits.sql.base import create_sql_agent
+        from src.sql_toolkit import Txt2SqlToolkit
+        
+        db = self.db
+        prefix = load_system_prompt()
+        if tables:
+            db = restrict_tables(self.db, tables)
+            # The prefix is str.format()ed by create_sql_agent, so escape braces.
+            prefix += RELEVANT_TABLES_PROMPT.format(tables=", ".join(tables)).replace("{", "{{").replace("}", "}}")
+        toolkit = Txt2SqlToolkit(
+            db=db,
             llm=self.model,
-            db=self.db,
+            schema_cache=self.schema_cache,
+            schema_renderer=self.schema_renderer,
+            result_cache=self.result_cache,
+            cost_guard=self.cost_guard,
+            check_sql=self.check_sql if self.schema_validation else None,
+            include_list_tool=not tables,
+            max_rows=self.max_result_rows,
+            max_bytes=self.max_result_bytes,
+            batch_size=self.fetch_batch_size
+        )
+        return create_sql_agent(
+            llm=self._chat_model(streaming),
+            toolkit=toolkit,
             agent_type=AgentType.OPENAI_FUNCTIONS,
-            prefix=SQL_PREFIX,
+            prefix=prefix,
             verbose=self.verbose
         )
     
-    def query(self, text_input: str) -> Dict[str, Any]:
+    def _chat_model(self, streaming: bool = False):
+        """Return the chat model, bound to stream tokens when requested"""
+        return self.model.bind(stream=True) if streaming else self.model
+    
+    def _get_agent(self, tables: List[str], streaming: bool = False):
+        """Return an agent for the tables, reusing the full-schema agents"""
+        if tables:
+            return self._create_agent(tables, streaming)
+        if not streaming:
+            return self.agent
+        if self._streaming_agent is None:
+            with self._lock:
+                if self._streaming_agent is None:
+                    self._streaming_agent = self._create_agent(streaming=True)
+        return self._streaming_agent
+    
+    def _get_table_index(self) -> TableIndex:
+        """Return the table retrieval index, rebuilding it when the schema changes"""
+        if self.schema_cache is None:
+            with self._lock:
+                if self._table_index is None:
+                    self._table_index = TableIndex(get_db_info(self.db))
+                return self._table_index
+        # The fingerprint may refresh the schema from the database, so read it
+        # (and build the index) without holding the agent-wide lock.
+        fingerprint = self.schema_cache.fingerprint
+        with self._lock:
+            if self._table_index is not None and fingerprint == self._table_index_fingerprint:
+                return self._table_index
+        index = TableIndex(self.schema_cache.get_db_info())
+        with self._lock:
+            self._table_index, self._table_index_fingerprint = index, fingerprint
+        return index
+    
+    def _get_schema_validator(self) -> SchemaValidator:
+        """Return the schema validator, rebuilding it when the schema changes"""
+        if self.schema_cache is None:
+            with self._lock:
+                if self._schema_validator is None:
+                    self._schema_validator = SchemaValidator(get_db_info(self.db), self.db.dialect)
+                return self._schema_validator
+        # As in _get_table_index, only the swap happens under the lock.
+        fingerprint = self.schema_cache.fingerprint
+        with self._lock:
+            if self._schema_validator is not None and fingerprint == self._schema_validator_fingerprint:
+                return self._schema_validator
+        validator = SchemaValidator(self.schema_cache.get_db_info(), self.db.dialect)
+        with self._lock:
+            self._schema_validator, self._schema_validator_fingerprint = validator, fingerprint
+        return validator
+    
+    def check_sql(self, sql: str) -> Optional[str]:
+        """
+        Check a statement locally, without the database, before it runs.
+        
+        Args:
+            sql: SQL statement
+            
+        Returns:
+            Optional[str]: An error message for the model, or None if the query is
+            acceptable. With schema validation enabled unknown columns of known
+            tables are reported; otherwise only read-only single statements are
+            checked.
+        """
+        if not self.schema_validation:
+            return validate_sql(sql)
+        return self._get_schema_validator().validate(sql)
+    
+    def relevant_tables(self, text_input: str) -> List[str]:
+        """
+        Find the tables most relevant to a question using the local retrieval index.
+        
+        Args:
+            text_input: Natural language query
+            
+        Returns:
+            List[str]: Top-k tables and their foreign-key neighbours; empty if
+            retrieval is disabled or nothing matched
+        """
+        if self.table_retrieval_k <= 0:
+            return []
+        index = self._get_table_index()
+        usable = set(self.db.get_usable_table_names())
+        return [t for t in index.relevant_tables(text_input, self.table_retrieval_k) if t in usable]
+    
+    def similar_examples(self, text_input: str) -> List[Example]:
+        """
+        Find verified examples similar to a question for the few-shot prompt.
+        
+        Args:
+            text_input: Natural language query
+            
+        Returns:
+            List[Example]: Up to few_shot_k examples, most similar first, whose
+            SQL still passes check_sql; empty without an example store
+        """
+        if self.example_store is None or self.few_shot_k <= 0:
+            return []
+        matches = self.example_store.search(text_input, self.few_shot_k)
+        return [example for example, _ in matches if self.check_sql(example.sql) is None]
+    
+    def matching_values(self, text_input: str, tables: Optional[List[str]] = None) -> List[ValueMatch]:
+        """
+        Find stored column values a question mentions, for the prompt.
+        
+        Args:
+            text_input: Natural language query
+            tables: Only report columns of these tables; all tables if empty
+            
+        Returns:
+            List[ValueMatch]: Matching values, best first; empty without a value index
+        """
+        if self.value_index is None:
+            return []
+        return self.value_index.search(text_input, tables=tables or None)
+    
+    def _prompt_context(self, text_input: str, tables: Optional[List[str]] = None) -> str:
+        """Similar examples and matching values to show before a question; empty if there are none"""
+        blocks = [format_examples(self.similar_examples(text_input)),
+                  format_value_matches(self.matching_values(text_input, tables))]
+        return "\n".join(block for block in blocks if block)
+    
+    def _agent_input(self, text_input: str, tables: Optional[List[str]] = None) -> str:
+        """The agent's input: the question, after the prompt context when there is any"""
+        context = self._prompt_context(text_input, tables)
+        return f"{context}\nQuestion: {text_input}" if context else text_input
+    
+    def _learn_example(self, text_input: str, sql: Optional[str]):
+        """Add the SQL that answered a question to the example store"""
+        if sql and self.example_store is not None and self.learn_examples:
+            self.example_store.add(text_input, sql)
+    
+    def query(self,
+              text_input: str,
+              mode: Optional[str] = None,
+              config: Optional[RunnableConfig] = None,
+              cancel_token: Optional[CancelToken] = None) -> Dict[str, Any]:
         """
         Process a natural language query to SQL and return results.
         
         Args:
             text_input: Natural language query
+            mode: "agent" runs the multi-step tool-calling agent. "direct" makes one
+                LLM call with the relevant schema, validates and executes the SQL
+                locally, and falls back to the agent on a validation or execution
+                error. Defaults to the mode the agent was created with.
+            config: Optional RunnableConfig (e.g. callbacks) passed to every LLM call
+            cancel_token: Optional CancelToken to cancel the query from another
+                thread or give it a deadline. Defaults to one with query_timeout.
             
         Returns:
-            Dict containing the generated SQL, results, and execution information
+            Dict containing the generated SQL, results, and execution information.
+            "path" reports what ran: "cache" when cached SQL answered, "agent",
+            "direct", or "direct_fallback" when the direct attempt failed and the
+            agent answered instead. "cost_guard" holds the last cost guard
+            decision (action, sql, cost, rows, message), or None. "timings"
+            breaks the time down into LLM calls (with token counts), tool calls
+            and database queries, see QueryTracer.timings; None when tracing
+            is off. "coalesced" is True when the answer came from an identical
+            question another caller asked at the same time. "cancelled" is True
+            when the query stopped because its token was cancelled or its
+            deadline passed, and "budget" reports its timeout, elapsed and
+            remaining seconds (see CancelToken.budget).
+            
+            On success "sql" is the statement the answer is based on, as it
+            ran (the agent's last successful query, with any cost guard
+            LIMIT), and "data" its rows as a Polars DataFrame from that same
+            execution, cut to result_data_rows. "row_count" is the number of
+            rows fetched and "truncated" is True when fetching stopped at
+            max_result_rows or max_result_bytes. "data" is None when no
+            statement ran or result_data_rows is 0.
+        """
+        token = cancel_token if cancel_token is not None else self._cancel_token()
+        if config is not None or self._flights is None:
+            return self._query(text_input, mode, config, cancel_token=token)
+        start_time = time.time()
+        try:
+            result, shared = self._flights.do(
+                self._flight_key(text_input, mode),
+                lambda flight: self._query(text_input, mode, cancel_token=flight.cancel_token),
+                cancel_token=token
+            )
+        except QueryCancelled as e:
+            # This caller stopped waiting; the run goes on for the others.
+            return self._cancelled_result(e, start_time, mode, token)
+        return dict(result, coalesced=shared)
+    
+    def _cancel_token(self) -> CancelToken:
+        """A token with the default deadline, for calls without their own"""
+        return CancelToken(self.query_timeout)
+    
+    def _flight_key(self, text_input: str, mode: Optional[str], streaming: bool = False) -> tuple:
+        """Key under which identical concurrent queries are coalesced"""
+        return " ".join(text_input.split()), mode or self.mode, streaming
+    
+    def stream_query(self,
+                     text_input: str,
+                     mode: Optional[str] = None,
+                     cancel_token: Optional[CancelToken] = None) -> Iterator[Dict[str, Any]]:
+        """
+        Process a natural language query, yielding progress events as they happen.
+        
+        The query runs in a background thread. Every event is a dict with a
+        "type" and the seconds "elapsed" since the call:
+        
+            step     - the agent started a tool call ("tool", "input")
+            sql      - a SQL query is about to run ("sql")
+            rows     - the database returned rows ("rows", formatted like SQLDatabase.run)
+            fallback - the direct attempt failed and the agent takes over ("reason")
+            token    - a chunk of the final answer ("text"), when the model streams
+            result   - always last; "result" is the query() result dict
+        
+        The result additionally reports "time_to_first_event" in seconds (None if
+        nothing was emitted before the result). Closing the generator before
+        the result, or an exception such as KeyboardInterrupt while it waits
+        for the next event, cancels the query.
+        
+        Args:
+            text_input: Natural language query
+            mode: "agent" or "direct", see query
+            cancel_token: Optional CancelToken, see query
+            
+        Yields:
+            Dict: Events in the order they occurred
+        """
+        mode = mode or self.mode
+        if mode not in QUERY_MODES:
+            raise ValueError(f"Unknown query mode {mode!r}; expected one of {QUERY_MODES}")
+        
+        token = cancel_token if cancel_token is not None else self._cancel_token()
+        events = queue.Queue()
+        start_time = time.time()
+        first_event = []
+        
+        def emit(event_type: str, **data):
+            elapsed = time.time() - start_time
+            if not first_event:
+                first_event.append(elapsed)
+            events.put(dict(type=event_type, elapsed=elapsed, **data))
+        
+        def answer(publish: Callable[..., None], run_token: CancelToken) -> Dict[str, Any]:
+            return self._query(text_input, mode, {"callbacks": [QueryEventHandler(publish)]}, publish, run_token)
+        
+        def run():
+            try:
+                if self._flights is None:
+                    result = answer(emit, token)
+                else:
+                    # Followers get the leader's events replayed, then live.
+                    result, shared = self._flights.do(self._flight_key(text_input, mode, streaming=True),
+                                                      lambda flight: answer(flight.publish, flight.cancel_token),
+                                                      emit, cancel_token=token)
+                    result = dict(result, coalesced=shared)
+            except QueryCancelled as e:
+                result = self._cancelled_result(e, start_time, mode, token)
+            except Exception as e:
+                result = self._query_result(False, None, start_time, None, mode, None, error=str(e))
+            result["time_to_first_event"] = first_event[0] if first_event else None
+            events.put({"type": "result", "elapsed": time.time() - start_time, "result": result})
+        
+        threading.Thread(target=run, daemon=True).start()
+        finished = False
+        try:
+            while True:
+                event = events.get()
+                yield event
+                if event["type"] == "result":
+                    finished = True
+                    return
+        finally:
+            if not finished:
+                # Nobody reads the answer any more (closed stream, Ctrl+C, Streamlit rerun).
+                token.cancel()
+    
+    def _query(self,
+               text_input: str,
+               mode: Optional[str],
+               config: Optional[RunnableConfig] = None,
+               emit: Optional[Callable[..., None]] = None,
+               cancel_token: Optional[CancelToken] = None) -> Dict[str, Any]:
+        """
+        Run query(), reporting progress through emit when given.
+        
+        With emit set the answer is generated with token streaming, so callbacks
+        in config receive it token by token.
         """
+        token = cancel_token if cancel_token is not None else self._cancel_token()
+        tracer = QueryTracer() if self.trace else None
+        if tracer is not None:
+            config = add_callback(config, tracer)
+        config = add_callback(config, CancellationCallbackHandler(token))
+        with collect_guard_decisions() as decisions, collect_executed_queries() as executed, \
+                activate_tracer(tracer), activate_cancel_token(token):
+            result = self._run_query(text_input, mode, config, emit)
+        return self._finish_result(result, decisions, tracer, token, executed)
+    
+    def _run_query(self,
+                   text_input: str,
+                   mode: Optional[str],
+                   config: Optional[RunnableConfig] = None,
+                   emit: Optional[Callable[..., None]] = None) -> Dict[str, Any]:
+        """Answer a query along the cache, direct and agent paths"""
+        mode = mode or self.mode
+        if mode not in QUERY_MODES:
+            raise ValueError(f"Unknown query mode {mode!r}; expected one of {QUERY_MODES}")
+        
         start_time = time.time()
+        tables = None
+        path = mode
+        sql = None
+        fallback_reason = None
         
         try:
-            # Run the agent to process the query
-            result = self.agent.invoke({"input": text_input})
+            # Reuse SQL from the translation cache; a stale entry is dropped and
+            # the question is answered normally.
+            cached = self._cache_get(text_input)
+            if cached is not None:
+                output, error = self._execute_and_answer(text_input, cached.sql, config, emit)
+                if error is None:
+                    return self._query_result(True, output, start_time, None, "cache", cached.sql)
+                self.translation_cache.discard(cached)
+            
+            # Narrow the agent to the relevant tables when retrieval is enabled
+            tables = self.relevant_tables(text_input)
+            
+            if mode == "direct":
+                sql, output, fallback_reason = self._query_direct(text_input, tables, config, emit)
+                if fallback_reason is None:
+                    return self._query_result(True, output, start_time, tables, path, sql)
+                check_cancelled()
+                if emit is not None:
+                    emit("fallback", reason=fallback_reason)
+                path = "direct_fallback"
+                sql = None
             
-            execution_time = time.time() - start_time
+            agent = self._get_agent(tables, streaming=emit is not None)
+            
+            # Run the agent to process the query, recording the SQL it answers with
+            recorder = ExecutedQueryRecorder()
+            result = agent.invoke({"input": self._agent_input(text_input, tables)}, add_callback(config, recorder))
+            self._learn_example(text_input, recorder.last_sql)
             
             # Return structured result
-            return {
-                "success": True,
-                "output": result["output"],
-                "execution_time": execution_time,
-                "error": None
-            }
+            return self._query_result(True, result["output"], start_time, tables, path, sql, fallback_reason)
         except Exception as e:
-            execution_time = time.time() - start_time
-            return {
-                "success": False,
-                "output": None,
-                "execution_time": execution_time,
-                "error": str(e)
-            }
+            return self._query_result(False, None, start_time, tables, path, sql, fallback_reason, error=str(e))
+    
+    async def aquery(self,
+                     text_input: str,
+                     mode: Optional[str] = None,
+                     config: Optional[RunnableConfig] = None,
+                     cancel_token: Optional[CancelToken] = None) -> Dict[str, Any]:
+        """
+        Async version of query.
+        
+        LLM calls are awaited; database and cache work runs in worker threads so
+        the event loop is never blocked. Cancelling the token also cancels the
+        LLM request in flight.
+        
+        Args:
+            text_input: Natural language query
+            mode: "agent" or "direct", see query
+            config: Optional RunnableConfig (e.g. callbacks) passed to every LLM call
+            cancel_token: Optional CancelToken, see query
+            
+        Returns:
+            Dict in the same format as query
+        """
+        token = cancel_token if cancel_token is not None else self._cancel_token()
+        if config is not None or self._flights is None:
+            return await self._aquery(text_input, mode, config, cancel_token=token)
+        start_time = time.time()
+        try:
+            result, shared = await self._until_cancelled(token, self._flights.ado(
+                self._flight_key(text_input, mode),
+                lambda run_token: self._aquery(text_input, mode, cancel_token=run_token),
+                cancel_token=token
+            ))
+        except QueryCancelled as e:
+            return self._cancelled_result(e, start_time, mode, token)
+        return dict(result, coalesced=shared)
+    
+    async def _aquery(self,
+                      text_input: str,
+                      mode: Optional[str],
+                      config: Optional[RunnableConfig] = None,
+                      cancel_token: Optional[CancelToken] = None) -> Dict[str, Any]:
+        """Async version of _query"""
+        token = cancel_token if cancel_token is not None else self._cancel_token()
+        start_time = time.time()
+        tracer = QueryTracer() if self.trace else None
+        if tracer is not None:
+            config = add_callback(config, tracer)
+        config = add_callback(config, CancellationCallbackHandler(token))
+        with collect_guard_decisions() as decisions, collect_executed_queries() as executed, \
+                activate_tracer(tracer), activate_cancel_token(token):
+            try:
+                result = await self._until_cancelled(token, self._arun_query(text_input, mode, config))
+            except QueryCancelled as e:
+                result = self._query_result(False, None, start_time, None, mode or self.mode, None, error=str(e))
+        return self._finish_result(result, decisions, tracer, token, executed)
+    
+    @staticmethod
+    async def _until_cancelled(token: CancelToken, awaitable):
+        """
+        Await awaitable, cancelling it as soon as the token is cancelled or its deadline passes.
+        
+        Raises:
+            QueryCancelled: If the token stopped it
+        """
+        task = asyncio.ensure_future(awaitable)
+        loop = asyncio.get_running_loop()
+        unregister = token.on_cancel(lambda: loop.call_soon_threadsafe(task.cancel))
+        try:
+            return await asyncio.wait_for(task, token.remaining())
+        except asyncio.TimeoutError:
+            token.cancel("deadline")
+            raise QueryCancelled(token.message) from None
+        except asyncio.CancelledError:
+            if not token.cancelled:
+                raise
+            raise QueryCancelled(token.message) from None
+        finally:
+            unregister()
+    
+    async def _arun_query(self,
+                          text_input: str,
+                          mode: Optional[str],
+                          config: Optional[RunnableConfig] = None) -> Dict[str, Any]:
+        """Async version of _run_query"""
+        mode = mode or self.mode
+        if mode not in QUERY_MODES:
+            raise ValueError(f"Unknown query mode {mode!r}; expected one of {QUERY_MODES}")
+        
+        start_time = time.time()
+        tables = None
+        path = mode
+        sql = None
+        fallback_reason = None
+        
+        try:
+            cached = await asyncio.to_thread(self._cache_get, text_input)
+            if cached is not None:
+                output, error = await self._aexecute_and_answer(text_input, cached.sql, config)
+                if error is None:
+                    return self._query_result(True, output, start_time, None, "cache", cached.sql)
+                await asyncio.to_thread(self.translation_cache.discard, cached)
+            
+            tables = await asyncio.to_thread(self.relevant_tables, text_input)
+            
+            if mode == "direct":
+                sql, output, fallback_reason = await self._aquery_direct(text_input, tables, config)
+                if fallback_reason is None:
+                    return self._query_result(True, output, start_time, tables, path, sql)
+                check_cancelled()
+                path = "direct_fallback"
+                sql = None
+            
+            agent = await asyncio.to_thread(self._get_agent, tables)
+            recorder = ExecutedQueryRecorder()
+            agent_input = await asyncio.to_thread(self._agent_input, text_input, tables)
+            result = await agent.ainvoke({"input": agent_input}, add_callback(config, recorder))
+            await asyncio.to_thread(self._learn_example, text_input, recorder.last_sql)
+            return self._query_result(True, result["output"], start_time, tables, path, sql, fallback_reason)
+        except Exception as e:
+            return self._query_result(False, None, start_time, tables, path, sql, fallback_reason, error=str(e))
+    
+    async def abatch(self,
+                     questions: List[str],
+                     max_concurrency: int = 8,
+                     rate_limiter: Optional[RateLimiter] = None,
+                     mode: Optional[str] = None) -> List[Dict[str, Any]]:
+        """
+        Answer many questions concurrently.
+        
+        Args:
+            questions: Natural language queries
+            max_concurrency: Maximum questions in flight at once
+            rate_limiter: Optional RateLimiter applied to every LLM call of the batch,
+                including the agent's intermediate steps
+            mode: "agent" or "direct", see query
+            
+        Returns:
+            List[Dict]: One result per question, in input order, in the same format
+            as query. A failing question yields success False with its error and
+            does not affect the others.
+        """
+        if max_concurrency < 1:
+            raise ValueError("max_concurrency must be at least 1")
+        semaphore = asyncio.Semaphore(max_concurrency)
+        config = {"callbacks": [RateLimitCallbackHandler(rate_limiter)]} if rate_limiter is not None else None
+        
+        async def run(question: str) -> Dict[str, Any]:
+            async with semaphore:
+                start_time = time.time()
+                try:
+                    return await self.aquery(question, mode=mode, config=config)
+                except Exception as e:
+                    return self._query_result(False, None, start_time, None, mode or self.mode, None, error=str(e))
+        
+        return await asyncio.gather(*(run(question) for question in questions))
+    
+    def _query_result(self,
+                      success: bool,
+                      output: Optional[str],
+                      start_time: float,
+                      tables: Optional[List[str]],
+                      path: str,
+                      sql: Optional[str],
+                      fallback_reason: Optional[str] = None,
+                      error: Optional[str] = None) -> Dict[str, Any]:
+        """Build the result dict returned by query()"""
+        return {
+            "success": success,
+            "output": output,
+            "execution_time": time.time() - start_time,
+            "tables": tables or None,
+            "path": path,
+            "sql": sql,
+            "fallback_reason": fallback_reason,
+            "error": error,
+            "time_to_first_event": None,
+            "cost_guard": None,
+            "timings": None,
+            "coalesced": False,
+            "cancelled": False,
+            "budget": None,
+            "data": None,
+            "row_count": None,
+            "truncated": False
+        }
+    
+    def _cancelled_result(self,
+                          error: QueryCancelled,
+                          start_time: float,
+                          mode: Optional[str],
+                          token: CancelToken) -> Dict[str, Any]:
+        """Result of a caller that stopped waiting for a query"""
+        result = self._query_result(False, None, start_time, None, mode or self.mode, None, error=str(error))
+        result.update(cancelled=True, budget=token.budget())
+        return result
+    
+    def _finish_result(self,
+                       result: Dict[str, Any],
+                       decisions: List[GuardDecision],
+                       tracer: Optional[QueryTracer],
+                       token: CancelToken,
+                       executed: List[ExecutedQuery]) -> Dict[str, Any]:
+        """Add the executed rows, cost guard decision, time budget and timings to a query result and record its metrics"""
+        if result["success"] and executed:
+            # The last successful statement is the one the answer is based on.
+            last = executed[-1]
+            result["sql"] = last.sql
+            result["row_count"] = last.data.height
+            result["truncated"] = last.truncated
+            if self.result_data_rows is None:
+                result["data"] = last.data
+            elif self.result_data_rows > 0:
+                result["data"] = last.data.head(self.result_data_rows)
+        result["cost_guard"] = decisions[-1].to_dict() if decisions else None
+        result["cancelled"] = not result["success"] and token.reason is not None
+        result["budget"] = token.budget()
+        if tracer is not None:
+            result["timings"] = tracer.timings()
+            if self.metrics is not None:
+                self.metrics.observe(result)
+        return result
+    
+    def _query_direct(self,
+                      text_input: str,
+                      tables: List[str],
+                      config: Optional[RunnableConfig] = None,
+                      emit: Optional[Callable[..., None]] = None):
+        """
+        Answer a question with a single SQL generation call instead of the agent loop.
+        
+        Args:
+            text_input: Natural language query
+            tables: Relevant tables, or an empty list for the whole schema
+            
+        Returns:
+            Tuple of (sql, output, fallback_reason). fallback_reason is None on
+            success, otherwise the validation or database error.
+        """
+        if self.sql_candidates > 1:
+            return self._query_candidates(text_input, tables, config, emit)
+        sql, error = self._generate_checked_sql(text_input, tables, config)
+        if error is not None:
+            return sql, None, error
+        output, error = self._execute_and_answer(text_input, sql, config, emit)
+        if error is None:
+            self._cache_put(text_input, sql)
+            self._learn_example(text_input, sql)
+        return sql, output, error
+    
+    async def _aquery_direct(self, text_input: str, tables: List[str], config: Optional[RunnableConfig] = None):
+        """Async version of _query_direct"""
+        if self.sql_candidates > 1:
+            return await self._aquery_candidates(text_input, tables, config)
+        sql, error = await self._agenerate_checked_sql(text_input, tables, config)
+        if error is not None:
+            return sql, None, error
+        output, error = await self._aexecute_and_answer(text_input, sql, config)
+        if error is None:
+            await asyncio.to_thread(self._cache_put, text_input, sql)
+            await asyncio.to_thread(self._learn_example, text_input, sql)
+        return sql, output, error
+    
+    def _query_candidates(self,
+                          text_input: str,
+                          tables: List[str],
+                          config: Optional[RunnableConfig] = None,
+                          emit: Optional[Callable[..., None]] = None):
+        """
+        Answer a question with the first candidate that executes, cheapest plan first.
+        
+        Returns:
+            Tuple of (sql, output, fallback_reason) like _query_direct. When no
+            candidate answers, fallback_reason is the last execution error, or
+            the first candidate's validation error if none was valid.
+        """
+        candidates = self._generate_candidates(text_input, tables, config)
+        failed = []
+        error = None
+        for candidate in rank_candidates(candidates):
+            output, error = self._execute_and_answer(text_input, candidate.sql, config, emit)
+            if error is None:
+                self.candidate_stats.observe(candidates, candidate, failed)
+                self._cache_put(text_input, candidate.sql)
+                self._learn_example(text_input, candidate.sql)
+                return candidate.sql, output, None
+            failed.append(candidate.rank)
+        self.candidate_stats.observe(candidates, None, failed)
+        return candidates[0].sql, None, error or candidates[0].error
+    
+    async def _aquery_candidates(self, text_input: str, tables: List[str], config: Optional[RunnableConfig] = None):
+        """Async version of _query_candidates"""
+        candidates = await self._agenerate_candidates(text_input, tables, config)
+        failed = []
+        error = None
+        for candidate in rank_candidates(candidates):
+            output, error = await self._aexecute_and_answer(text_input, candidate.sql, config)
+            if error is None:
+                self.candidate_stats.observe(candidates, candidate, failed)
+                await asyncio.to_thread(self._cache_put, text_input, candidate.sql)
+                await asyncio.to_thread(self._learn_example, text_input, candidate.sql)
+                return candidate.sql, output, None
+            failed.append(candidate.rank)
+        self.candidate_stats.observe(candidates, None, failed)
+        return candidates[0].sql, None, error or candidates[0].error
+    
+    def _execute_and_answer(self,
+                            text_input: str,
+                            sql: str,
+                            config: Optional[RunnableConfig] = None,
+                            emit: Optional[Callable[..., None]] = None):
+        """
+        Validate and run a SQL statement, then summarize its rows if enabled.
+        
+        When emit is given, "sql" and "rows" events are reported and the summary
+        is streamed.
+        
+        Returns:
+            Tuple of (output, error). error is None on success, otherwise the
+            validation or database error message.
+        """
+        error = self.check_sql(sql)
+        if error:
+            return None, error
+        
+        if self.cost_guard is not None:
+            sql, error = self._apply_cost_guard(self.cost_guard.check(sql))
+            if error:
+                return None, error
+        
+        if emit is not None:
+            emit("sql", sql=sql)
+        try:
+            rows = self._run_sql(sql)
+        except SQLAlchemyError as e:
+            return None, f"Error: {e}"
+        if emit is not None:
+            emit("rows", rows=rows)
+        
+        if not self.summarize:
+            return rows, None
+        return self._summarize(text_input, sql, rows, config, streaming=emit is not None), None
     
-    def generate_sql_only(self, text_input: str) -> str:
+    async def _aexecute_and_answer(self, text_input: str, sql: str, config: Optional[RunnableConfig] = None):
+        """Async version of _execute_and_answer"""
+        error = await asyncio.to_thread(self.check_sql, sql)
+        if error:
+            return None, error
+        
+        if self.cost_guard is not None:
+            sql, error = self._apply_cost_guard(await asyncio.to_thread(self.cost_guard.check, sql))
+            if error:
+                return None, error
+        
+        try:
+            rows = await asyncio.to_thread(self._run_sql, sql)
+        except SQLAlchemyError as e:
+            return None, f"Error: {e}"
+        
+        if not self.summarize:
+            return rows, None
+        return await self._summary_chain().ainvoke(
+            {"question": text_input, "query": sql, "result": rows or "(no rows)"}, config
+        ), None
+    
+    def _apply_cost_guard(self, decision: GuardDecision):
+        """
+        Act on a cost guard decision for a directly executed statement.
+        
+        Returns:
+            Tuple of (sql to run, error). A "rewrite" decision is returned as an
+            error, so direct mode falls back to the agent to rewrite the query.
+            
+        Raises:
+            QueryRejected: If the statement was rejected outright
+        """
+        if decision.action == "reject":
+            raise QueryRejected(decision.message)
+        if decision.blocked:
+            return decision.sql, decision.message
+        return decision.sql, None
+    
+    def _run_sql(self, sql: str) -> str:
+        """
+        Run a query through the result cache when available, formatted like SQLDatabase.run.
+        
+        The frame is recorded for the query's "data" (see collect_executed_queries).
+        """
+        df, truncated = self._fetch_capped(sql)
+        record_executed_query(sql, df, truncated)
+        return format_rows(df, self.db._max_string_length)
+    
+    def fetch_result(self, sql: str) -> "pl.DataFrame":
+        """
+        Run a query and return its rows as a Polars DataFrame.
+        
+        Rows are read in batches with a server-side cursor up to the agent's
+        row/byte caps, through the result cache when available.
+        
+        Args:
+            sql: SQL query
+            
+        Returns:
+            pl.DataFrame: Query result, truncated to max_result_rows/max_result_bytes
+        """
+        return self._fetch_capped(sql)[0]
+    
+    def _fetch_capped(self, sql: str):
+        """
+        fetch_result, also reporting whether the row or byte cap cut the result.
+        
+        Returns:
+            Tuple of (frame, truncated), see fetch_capped
+        """
+        if self.result_cache is not None:
+            return self.result_cache.execute_capped(sql, self.max_result_rows, self.max_result_bytes,
+                                                    self.fetch_batch_size)
+        return fetch_capped(self.db, sql, self.max_result_rows, self.max_result_bytes, self.fetch_batch_size)
+    
+    def _summarize(self,
+                   text_input: str,
+                   sql_query: str,
+                   rows: str,
+                   config: Optional[RunnableConfig] = None,
+                   streaming: bool = False) -> str:
+        """Turn a query result into a natural language answer"""
+        chain = self._summary_chain(streaming)
+        return chain.invoke({"question": text_input, "query": sql_query, "result": rows or "(no rows)"}, config)
+    
+    def _summary_chain(self, streaming: bool = False):
+        """Build the result summarization chain"""
+        prompt = PromptTemplate.from_template(
+            """Answer the user question using the SQL query that was run and its result.
+            Only use the information in the result.
+            
+            User question: {question}
+            
+            SQL query:
+            ```sql
+            {query}
+            ```
+            
+            Result: {result}
+            
+            Answer:"""
+        )
+        
+        return prompt | self._chat_model(streaming) | StrOutputParser()
+    
+    def _get_schema_text(self, tables: Optional[List[str]] = None, question: Optional[str] = None) -> str:
+        """
+        Return table DDL for the prompt.
+        
+        Rendered within the token budget by the schema renderer when there is
+        one (columns matching the question are kept longest), otherwise served
+        from the schema cache when available. Without tables the whole schema
+        is rendered within a default token budget, as SQLDatabase's table info
+        of every table can be arbitrarily long.
+        """
+        if self.schema_renderer is not None:
+            return self.schema_renderer.render(tables or None, question)
+        if not tables:
+            if self._full_schema_renderer is None:
+                with self._lock:
+                    if self._full_schema_renderer is None:
+                        self._full_schema_renderer = SchemaRenderer(self.db, schema_cache=self.schema_cache)
+            return self._full_schema_renderer.render(None, question)
+        if self.schema_cache is not None:
+            return self.schema_cache.get_table_info(tables)
+        return self.db.get_table_info(tables)
+    
+    @property
+    def model_name(self) -> str:
+        """Name of the underlying chat model, used in cache keys"""
+        return getattr(self.model, "model_name", None) or getattr(self.model, "model", None) or type(self.model).__name__
+    
+    def schema_fingerprint(self) -> str:
+        """Fingerprint of the current schema, from the schema cache when available"""
+        if self.schema_cache is not None:
+            return self.schema_cache.fingerprint
+        if self._schema_fingerprint is None:
+            with self._lock:
+                if self._schema_fingerprint is None:
+                    self._schema_fingerprint = schema_fingerprint(get_schema_fingerprints(self.db))
+        return self._schema_fingerprint
+    
+    def _cache_get(self, text_input: str) -> Optional[CachedTranslation]:
+        if self.translation_cache is None:
+            return None
+        return self.translation_cache.get(text_input, self.model_name, self.schema_fingerprint())
+    
+    def _cache_put(self, text_input: str, sql: str):
+        if self.translation_cache is not None:
+            self.translation_cache.put(text_input, self.model_name, self.schema_fingerprint(), sql)
+    
+    def generate_sql_only(self, text_input: str, tables: Optional[List[str]] = None) -> str:
         """
         Generate SQL from natural language without executing the query.
         
         Args:
             text_input: Natural language query
+            tables: Tables whose schema is included in the prompt. Defaults to the
+                relevant tables when retrieval is enabled, otherwise all tables.
+            
+        Returns:
+            str: The generated SQL query, from the translation cache when possible
+        """
+        cached = self._cache_get(text_input)
+        if cached is not None:
+            return cached.sql
+        
+        if tables is None:
+            tables = self.relevant_tables(text_input)
+        if self.sql_candidates > 1:
+            sql, error = self._generate_best_sql(text_input, tables)
+        else:
+            sql, error = self._generate_checked_sql(text_input, tables)
+        if error is None:
+            self._cache_put(text_input, sql)
+        return sql
+    
+    async def agenerate_sql_only(self,
+                                 text_input: str,
+                                 tables: Optional[List[str]] = None,
+                                 config: Optional[RunnableConfig] = None) -> str:
+        """
+        Async version of generate_sql_only.
+        
+        Args:
+            text_input: Natural language query
+            tables: Tables whose schema is included in the prompt, see generate_sql_only
+            config: Optional RunnableConfig passed to the LLM call
             
         Returns:
-            str: The generated SQL query
+            str: The generated SQL query, from the translation cache when possible
+        """
+        cached = await asyncio.to_thread(self._cache_get, text_input)
+        if cached is not None:
+            return cached.sql
+        
+        if tables is None:
+            tables = await asyncio.to_thread(self.relevant_tables, text_input)
+        if self.sql_candidates > 1:
+            sql, error = await self._agenerate_best_sql(text_input, tables, config)
+        else:
+            sql, error = await self._agenerate_checked_sql(text_input, tables, config)
+        if error is None:
+            await asyncio.to_thread(self._cache_put, text_input, sql)
+        return sql
+    
+    def _generate_sql(self, text_input: str, tables: List[str], config: Optional[RunnableConfig] = None) -> str:
+        """Generate SQL with one LLM call, bypassing the translation cache"""
+        chain = self._generate_sql_chain()
+        return extract_sql(chain.invoke({
+            "question": text_input,
+            "schema": self._get_schema_text(tables, text_input),
+            "context": self._prompt_context(text_input, tables)
+        }, config))
+    
+    async def _agenerate_sql(self, text_input: str, tables: List[str], config: Optional[RunnableConfig] = None) -> str:
+        """Async version of _generate_sql"""
+        schema = await asyncio.to_thread(self._get_schema_text, tables, text_input)
+        context = await asyncio.to_thread(self._prompt_context, text_input, tables)
+        return extract_sql(await self._generate_sql_chain().ainvoke(
+            {"question": text_input, "schema": schema, "context": context}, config
+        ))
+    
+    def _generate_checked_sql(self,
+                              text_input: str,
+                              tables: List[str],
+                              config: Optional[RunnableConfig] = None):
+        """
+        Generate SQL and check it locally, giving the model one chance to fix an error.
+        
+        Returns:
+            Tuple of (sql, error). error is None if the SQL passed check_sql,
+            otherwise the error of the last attempt.
+        """
+        sql = self._generate_sql(text_input, tables, config)
+        error = self.check_sql(sql)
+        if error is not None and self.schema_validation:
+            schema = self._get_schema_text(tables, text_input)
+            sql = extract_sql(self._repair_sql_chain().invoke(
+                {"question": text_input, "schema": schema, "query": sql, "error": error}, config
+            ))
+            error = self.check_sql(sql)
+        return sql, error
+    
+    async def _agenerate_checked_sql(self,
+                                     text_input: str,
+                                     tables: List[str],
+                                     config: Optional[RunnableConfig] = None):
+        """Async version of _generate_checked_sql"""
+        sql = await self._agenerate_sql(text_input, tables, config)
+        error = await asyncio.to_thread(self.check_sql, sql)
+        if error is not None and self.schema_validation:
+            schema = await asyncio.to_thread(self._get_schema_text, tables, text_input)
+            sql = extract_sql(await self._repair_sql_chain().ainvoke(
+                {"question": text_input, "schema": schema, "query": sql, "error": error}, config
+            ))
+            error = await asyncio.to_thread(self.check_sql, sql)
+        return sql, error
+    
+    def _generate_best_sql(self,
+                           text_input: str,
+                           tables: List[str],
+                           config: Optional[RunnableConfig] = None):
+        """
+        Generate candidates and pick the cheapest valid one, without running it.
+        
+        Returns:
+            Tuple of (sql, error) like _generate_checked_sql; without a valid
+            candidate, the first candidate and its error
+        """
+        candidates = self._generate_candidates(text_input, tables, config)
+        return self._pick_candidate(candidates)
+    
+    async def _agenerate_best_sql(self,
+                                  text_input: str,
+                                  tables: List[str],
+                                  config: Optional[RunnableConfig] = None):
+        """Async version of _generate_best_sql"""
+        candidates = await self._agenerate_candidates(text_input, tables, config)
+        return self._pick_candidate(candidates)
+    
+    def _pick_candidate(self, candidates: List[SqlCandidate]):
+        """Return the best candidate as (sql, None), or the first one and its error"""
+        ranked = rank_candidates(candidates)
+        self.candidate_stats.observe(candidates, ranked[0] if ranked else None)
+        if ranked:
+            return ranked[0].sql, None
+        return candidates[0].sql, candidates[0].error
+    
+    def _generate_candidates(self,
+                             text_input: str,
+                             tables: List[str],
+                             config: Optional[RunnableConfig] = None) -> List[SqlCandidate]:
+        """
+        Request sql_candidates statements at once, validating each as soon as it arrives.
+        
+        Every candidate is generated and validated in its own thread, so the
+        whole takes as long as the slowest candidate.
+        
+        Returns:
+            List[SqlCandidate]: Candidates in rank order
+        """
+        inputs = {
+            "question": text_input,
+            "schema": self._get_schema_text(tables, text_input),
+            "context": self._prompt_context(text_input, tables)
+        }
+        
+        def candidate(rank: int) -> SqlCandidate:
+            start = time.perf_counter()
+            try:
+                sql = extract_sql(self._generate_sql_chain(self._candidate_model(rank)).invoke(inputs, config))
+            except QueryCancelled:
+                raise
+            except Exception as e:
+                return SqlCandidate("", rank, error=f"Error: {e}", seconds=time.perf_counter() - start)
+            return self._validate_candidate(sql, rank, start)
+        
+        pool = ThreadPoolExecutor(max_workers=self.sql_candidates, thread_name_prefix="txt2sql-candidate")
+        try:
+            # Each candidate runs in a copy of the caller's context, so its
+            # database work is traced, cost guard decisions are collected and
+            # cancelling the query stops it.
+            futures = [pool.submit(contextvars.copy_context().run, candidate, rank)
+                       for rank in range(self.sql_candidates)]
+            return [future.result() for future in futures]
+        finally:
+            # After a cancellation, candidates still waiting for the model stop on their own.
+            pool.shutdown(wait=False)
+    
+    async def _agenerate_candidates(self,
+                                    text_input: str,
+                                    tables: List[str],
+                                    config: Optional[RunnableConfig] = None) -> List[SqlCandidate]:
+        """Async version of _generate_candidates"""
+        schema = await asyncio.to_thread(self._get_schema_text, tables, text_input)
+        context = await asyncio.to_thread(self._prompt_context, text_input, tables)
+        inputs = {"question": text_input, "schema": schema, "context": context}
+        
+        async def candidate(rank: int) -> SqlCandidate:
+            start = time.perf_counter()
+            try:
+                sql = extract_sql(await self._generate_sql_chain(self._candidate_model(rank)).ainvoke(inputs, config))
+            except QueryCancelled:
+                raise
+            except Exception as e:
+                return SqlCandidate("", rank, error=f"Error: {e}", seconds=time.perf_counter() - start)
+            return await asyncio.to_thread(self._validate_candidate, sql, rank, start)
+        
+        return list(await asyncio.gather(*(candidate(rank) for rank in range(self.sql_candidates))))
+    
+    def _candidate_model(self, rank: int):
+        """
+        The model for a candidate: the model itself for rank 0, otherwise sampled.
+        
+        The seed makes each rank's sample reproducible where the provider
+        supports seeds.
         """
+        if rank == 0:
+            return self.model
+        return self.model.bind(temperature=self.candidate_temperature, seed=rank)
+    
+    def _validate_candidate(self, sql: str, rank: int, start: float) -> SqlCandidate:
+        """Check a candidate locally, then plan it with EXPLAIN for its validity and cost"""
+        candidate = SqlCandidate(sql, rank, error=self.check_sql(sql))
+        if candidate.valid:
+            try:
+                # Through the cost guard, the plan is cached for its check before execution.
+                if self.cost_guard is not None:
+                    estimate = self.cost_guard.plan(sql)
+                else:
+                    estimate = explain_sql(self.db, sql)
+            except SQLAlchemyError as e:
+                candidate.error = f"Error: {e}"
+            else:
+                if estimate is not None:
+                    candidate.cost, candidate.rows = estimate["cost"], estimate["rows"]
+        candidate.seconds = time.perf_counter() - start
+        return candidate
+    
+    def _generate_sql_chain(self, model=None):
+        """Build the single-call SQL generation chain, optionally with another model"""
         prompt = PromptTemplate.from_template(
-            """Given the following user question, generate a syntactically correct PostgreSQL query.
-            Do not execute the query, just return it.
+            """Given the following database schema and user question, generate a syntactically correct PostgreSQL query.
+            Unless the user asks for a specific number of rows, limit the query to at most 10 results.
+            Never write DML statements (INSERT, UPDATE, DELETE, DROP, etc.).
+            Do not execute the query, just return it without any explanation.
+            
+            Schema:
+            {schema}
             
+            {context}
             User question: {question}
             
             PostgreSQL query:"""
         )
         
-        chain = prompt | self.model | StrOutputParser()
-        return chain.invoke({"question": text_input})
+        return prompt | (model or self.model) | StrOutputParser()
+    
+    def _repair_sql_chain(self):
+        """Build the chain that rewrites a query rejected by check_sql"""
+        prompt = PromptTemplate.from_template(
+            """Given the following database schema and user question, this query was rejected before it ran.
+            Fix the problem described by the error. Never write DML statements (INSERT, UPDATE, DELETE, DROP, etc.).
+            Return the corrected query without any explanation.
+            
+            Schema:
+            {schema}
+            
+            User question: {question}
+            
+            Rejected query:
+            ```sql
+            {query}
+            ```
+            
+            Error: {error}
+            
+            PostgreSQL query:"""
+        )
+        
+        return prompt | self.model | StrOutputParser()
     
     def explain_query(self, sql_query: str) -> str:
         """
@@ -109,6 +1399,23 @@ class Txt2SqlAgent:
         Returns:
             str: Natural language explanation of the query
         """
+        return self._explain_chain().invoke({"query": sql_query})
+    
+    async def aexplain_query(self, sql_query: str, config: Optional[RunnableConfig] = None) -> str:
+        """
+        Async version of explain_query.
+        
+        Args:
+            sql_query: SQL query to explain
+            config: Optional RunnableConfig passed to the LLM call
+            
+        Returns:
+            str: Natural language explanation of the query
+        """
+        return await self._explain_chain().ainvoke({"query": sql_query}, config)
+    
+    def _explain_chain(self):
+        """Build the query explanation chain"""
         prompt = PromptTemplate.from_template(
             """Explain what the following PostgreSQL query does in simple terms:
             
@@ -119,8 +1426,7 @@ class Txt2SqlAgent:
             Explanation:"""
         )
         
-        chain = prompt | self.model | StrOutputParser()
-        return chain.invoke({"query": sql_query})
+        return prompt | self.model | StrOutputParser()
     
     def suggest_improvements(self, text_input: str, sql_query: str) -> List[str]:
         """
@@ -133,6 +1439,14 @@ class Txt2SqlAgent:
         Returns:
             List[str]: List of suggested improvements
         """
+        result = self._suggest_chain().invoke({"question": text_input, "query": sql_query})
+        
+        # Process into a list of suggestions
+        suggestions = [line.strip() for line in result.split("\n") if line.strip()]
+        return suggestions
+    
+    def _suggest_chain(self):
+        """Build the improvement suggestion chain"""
         prompt = PromptTemplate.from_template(
             """
             Given the user question and the SQL query generated for it, suggest possible improvements to the query
@@ -148,9 +1462,4 @@ class Txt2SqlAgent:
             List each suggestion separately, numbered 1, 2, 3, etc."""
         )
         
-        chain = prompt | self.model | StrOutputParser()
-        result = chain.invoke({"question": text_input, "query": sql_query})
-        
-        # Process into a list of suggestions
-        suggestions = [line.strip() for line in result.split("\n") if line.strip()]
-        return suggestions
\ No newline at end of file
+        return prompt | self.model | StrOutputParser()
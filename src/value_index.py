@@ -0,0 +1,322 @@
+import difflib
+import re
+import threading
+import time
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional, Set, Tuple
+from langchain_community.utilities import SQLDatabase
+from src.db_utils import get_column_values, get_db_info, get_schema_fingerprints, get_table_versions
+from src.similarity import char_ngrams, normalize_question
+from src.table_index import STOPWORDS
+
+VALUES_PROMPT = """Values stored in the database that match words of the question (filter on these exact spellings):
+{values}
+"""
+
+# Phrases shorter than this are only matched exactly: fuzzy matches of short
+# words are mostly noise.
+_MIN_FUZZY_LENGTH = 4
+
+# Longest phrase of the question compared with the values, in words.
+_MAX_PHRASE_WORDS = 5
+
+# Columns listed per value in the prompt block.
+_MAX_LISTED_COLUMNS = 5
+
+# Values are names and codes; numbers are literals the question already spells out.
+_LETTER_RE = re.compile(r"[^\W\d_]")
+
+
+def _normalize(text: str) -> str:
+    """Normalize a value or question, treating underscores as word separators"""
+    return normalize_question(text.replace("_", " "))
+
+
+@dataclass
+class ValueMatch:
+    """
+    A value stored in the database that matches words of a question.
+
+    columns are "table.column" names of the columns holding the value, and
+    phrase is the normalized part of the question it matched.
+    """
+    value: str
+    columns: List[str]
+    score: float
+    phrase: str = ""
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {"value": self.value, "columns": self.columns, "score": self.score, "phrase": self.phrase}
+
+
+def format_value_matches(matches: List[ValueMatch]) -> str:
+    """
+    Render value matches as the block added to a prompt.
+
+    Args:
+        matches: Matches, best first
+
+    Returns:
+        str: The prompt block, or "" when there are no matches
+    """
+    if not matches:
+        return ""
+    lines = []
+    for match in matches:
+        columns = ", ".join(match.columns[:_MAX_LISTED_COLUMNS])
+        if len(match.columns) > _MAX_LISTED_COLUMNS:
+            columns += ", ..."
+        value = match.value.replace("'", "''")
+        lines.append(f"- '{value}' in {columns}")
+    return VALUES_PROMPT.format(values="\n".join(lines))
+
+
+@dataclass
+class _Entry:
+    """Every spelling of one normalized value, with the columns holding each"""
+    spellings: Dict[str, List[str]] = field(default_factory=dict)
+    grams: Set[str] = field(default_factory=set)
+
+
+class ColumnValueIndex:
+    """
+    In-memory index of the values of low-cardinality text columns.
+
+    Lets the prompt name the exact literal a question refers to ("shipped",
+    "Ontario") so the model does not have to find its spelling with SELECT
+    DISTINCT queries. Values are collected with get_column_values (PostgreSQL
+    statistics, or sampled rows), in a background thread started by start(),
+    and kept per table: a refresh re-collects only the tables whose schema
+    fingerprint or data version changed. Dialects without data versions
+    re-collect every table once max_staleness has passed.
+
+    A lookup compares every phrase of up to five words of the question with
+    the normalized values: exact matches first, then fuzzy ones (a typo, a
+    missing letter) found through character trigrams and scored with difflib.
+    search() never waits for the database; before the first refresh finishes
+    it finds nothing.
+    """
+
+    def __init__(self,
+                 db: SQLDatabase,
+                 schema_cache=None,
+                 max_values: int = 100,
+                 sample_rows: int = 10000,
+                 max_staleness: float = 300.0,
+                 min_score: float = 0.85,
+                 schemas: Optional[List[str]] = None):
+        """
+        Args:
+            db: SQLDatabase instance
+            schema_cache: Optional SchemaCache the table list is read from
+            max_values: Most distinct values a column may have to be indexed
+            sample_rows: Rows read per table when a column has no statistics
+            max_staleness: Seconds before a search triggers a background refresh
+            min_score: Minimum similarity (0-1) of a fuzzy match
+            schemas: Schemas to index. Defaults to the database's current schema.
+        """
+        self.db = db
+        self.schema_cache = schema_cache
+        self.max_values = max_values
+        self.sample_rows = sample_rows
+        self.max_staleness = max_staleness
+        self.min_score = min_score
+        self.schemas = list(schemas) if schemas else (schema_cache.schemas if schema_cache else None)
+        self._lock = threading.Lock()
+        # Serializes refreshes; a background refresh is skipped while one runs.
+        self._refresh_lock = threading.Lock()
+        self._tables: Dict[str, Dict[str, List[str]]] = {}
+        self._versions: Dict[str, str] = {}
+        # Normalized value -> its spellings and trigrams; trigram -> values
+        self._entries: Dict[str, _Entry] = {}
+        self._grams: Dict[str, Set[str]] = {}
+        self._max_words = 0
+        self._refreshed_at: Optional[float] = None
+        self._counters = {"searches": 0, "hits": 0, "refreshes": 0, "tables_collected": 0}
+        self._last_refresh_seconds: Optional[float] = None
+        self._last_error: Optional[str] = None
+
+    def start(self) -> "ColumnValueIndex":
+        """
+        Collect the values in a background thread.
+
+        Returns:
+            ColumnValueIndex: self, for chaining
+        """
+        self._refresh_in_background()
+        return self
+
+    def refresh(self) -> List[str]:
+        """
+        Re-collect the values of the tables that changed since the last refresh.
+
+        Returns:
+            List[str]: Tables that were collected or dropped
+        """
+        with self._refresh_lock:
+            return self._refresh()
+
+    def search(self, question: str, k: int = 10, tables: Optional[List[str]] = None) -> List[ValueMatch]:
+        """
+        Find the stored values a question mentions.
+
+        Args:
+            question: Natural language question
+            k: Maximum number of values
+            tables: Only report columns of these tables
+
+        Returns:
+            List[ValueMatch]: Matches, best first
+        """
+        if self._refreshed_at is not None and time.time() - self._refreshed_at >= self.max_staleness:
+            self._refresh_in_background()
+        words = _normalize(question).split()
+        allowed = set(tables) if tables else None
+        with self._lock:
+            self._counters["searches"] += 1
+            found: Dict[str, Tuple[float, str]] = {}
+            for n in range(min(self._max_words, len(words)), 0, -1):
+                for i in range(len(words) - n + 1):
+                    phrase_words = words[i:i + n]
+                    phrase = " ".join(phrase_words)
+                    if phrase in self._entries:
+                        found[phrase] = (1.0, phrase)
+                    elif len(phrase) >= _MIN_FUZZY_LENGTH and not all(w in STOPWORDS for w in phrase_words):
+                        for value, score in self._fuzzy(phrase):
+                            if score > found.get(value, (0.0, ""))[0]:
+                                found[value] = (score, phrase)
+
+            matches = []
+            for value, (score, phrase) in found.items():
+                for spelling, columns in self._entries[value].spellings.items():
+                    columns = [c for c in columns if allowed is None or c.rsplit(".", 1)[0] in allowed]
+                    if columns:
+                        matches.append(ValueMatch(spelling, sorted(columns), round(score, 3), phrase))
+            matches.sort(key=lambda m: (-m.score, -len(m.phrase), m.value))
+            matches = matches[:k]
+            if matches:
+                self._counters["hits"] += 1
+            return matches
+
+    def values(self, table: str) -> Dict[str, List[str]]:
+        """Indexed values per column of a table"""
+        with self._lock:
+            return dict(self._tables.get(table, {}))
+
+    def stats(self) -> Dict[str, Any]:
+        """
+        Return the index size and counters for this process.
+
+        Returns:
+            Dict with ready, tables, columns, values, searches, hits, refreshes,
+            tables_collected, last_refresh_seconds and last_error
+        """
+        with self._lock:
+            return dict(
+                self._counters,
+                ready=self._refreshed_at is not None,
+                tables=len(self._tables),
+                columns=sum(len(columns) for columns in self._tables.values()),
+                values=len(self._entries),
+                last_refresh_seconds=self._last_refresh_seconds,
+                last_error=self._last_error,
+            )
+
+    def _refresh_in_background(self):
+        if not self._refresh_lock.acquire(blocking=False):
+            return
+
+        def run():
+            try:
+                self._refresh()
+            except Exception as e:
+                self._last_error = str(e)
+            finally:
+                self._refresh_lock.release()
+
+        threading.Thread(target=run, daemon=True).start()
+
+    def _refresh(self) -> List[str]:
+        start = time.perf_counter()
+        db_info = self.schema_cache.get_db_info() if self.schema_cache else get_db_info(self.db, self.schemas)
+        tables = list(db_info["tables"])
+        fingerprints = get_schema_fingerprints(self.db, self.schemas)
+        data_versions = get_table_versions(self.db, tables) or {}
+        versions = {table: f"{fingerprints.get(table)}:{data_versions.get(table)}" for table in tables}
+        # Without a data version a table's values may have changed at any time.
+        changed = [table for table in tables
+                   if table not in data_versions or self._versions.get(table) != versions[table]]
+        dropped = [table for table in self._versions if table not in versions]
+        collected = get_column_values(self.db, db_info, changed, self.max_values, self.sample_rows,
+                                      self.schemas) if changed else {}
+
+        with self._lock:
+            for table in dropped + changed:
+                self._remove_table(table)
+            for table in changed:
+                self._add_table(table, collected.get(table, {}))
+            self._versions = versions
+            self._max_words = min(max((len(value.split()) for value in self._entries), default=0),
+                                  _MAX_PHRASE_WORDS)
+            self._refreshed_at = time.time()
+            self._counters["refreshes"] += 1
+            self._counters["tables_collected"] += len(changed)
+            self._last_refresh_seconds = time.perf_counter() - start
+            self._last_error = None
+        return sorted(dropped + changed)
+
+    def _fuzzy(self, phrase: str) -> List[Tuple[str, float]]:
+        grams = char_ngrams(phrase)
+        # A value sharing half of the phrase's trigrams shares at least one of
+        # its rarest len(grams) - needed + 1, so only those postings are read.
+        needed = (len(grams) + 1) // 2
+        rarest = sorted(grams, key=lambda gram: len(self._grams.get(gram, ())))[:len(grams) - needed + 1]
+        candidates = set().union(*(self._grams.get(gram, ()) for gram in rarest))
+        results = []
+        for value in candidates:
+            if len(grams & self._entries[value].grams) < needed:
+                continue
+            matcher = difflib.SequenceMatcher(None, phrase, value)
+            if matcher.real_quick_ratio() >= self.min_score and matcher.quick_ratio() >= self.min_score:
+                score = matcher.ratio()
+                if score >= self.min_score:
+                    results.append((value, score))
+        return results
+
+    def _add_table(self, table: str, columns: Dict[str, List[str]]):
+        if columns:
+            self._tables[table] = columns
+        for column, values in columns.items():
+            for value in values:
+                key = _normalize(value)
+                if not _LETTER_RE.search(key):
+                    continue
+                entry = self._entries.get(key)
+                if entry is None:
+                    entry = self._entries[key] = _Entry(grams=char_ngrams(key))
+                    for gram in entry.grams:
+                        self._grams.setdefault(gram, set()).add(key)
+                entry.spellings.setdefault(value, []).append(f"{table}.{column}")
+
+    def _remove_table(self, table: str):
+        columns = self._tables.pop(table, None)
+        if not columns:
+            return
+        for column, values in columns.items():
+            name = f"{table}.{column}"
+            for value in values:
+                key = _normalize(value)
+                entry = self._entries.get(key)
+                if entry is None or value not in entry.spellings:
+                    continue
+                holders = entry.spellings[value]
+                if name in holders:
+                    holders.remove(name)
+                if not holders:
+                    del entry.spellings[value]
+                if not entry.spellings:
+                    del self._entries[key]
+                    for gram in entry.grams:
+                        self._grams[gram].discard(key)
+                        if not self._grams[gram]:
+                            del self._grams[gram]
@@ -0,0 +1,93 @@
+"""
+Txt2SqlAgent.abatch with a scripted model on a local SQLite database.
+"""
+
+import asyncio
+import os
+import tempfile
+import threading
+import unittest
+from typing import Any, List, Optional
+from langchain_core.messages import BaseMessage
+from langchain_core.outputs import ChatResult
+from pydantic import PrivateAttr
+from benchmarks.local_db import seed_database
+from benchmarks.replay_model import ScriptedChatModel
+from src.rate_limiter import RateLimiter
+from src.txt2sql_agent import Txt2SqlAgent
+
+
+class InFlightScriptedModel(ScriptedChatModel):
+    """ScriptedChatModel that records the most calls it had running at once"""
+
+    _lock: Any = PrivateAttr(default_factory=threading.Lock)
+    _running: int = PrivateAttr(default=0)
+    _peak: int = PrivateAttr(default=0)
+
+    def _generate(self, messages: List[BaseMessage], stop: Optional[List[str]] = None,
+                  run_manager: Any = None, **kwargs: Any) -> ChatResult:
+        with self._lock:
+            self._running += 1
+            self._peak = max(self._peak, self._running)
+        try:
+            return super()._generate(messages, stop, run_manager, **kwargs)
+        finally:
+            with self._lock:
+                self._running -= 1
+
+    @property
+    def peak(self) -> int:
+        return self._peak
+
+
+class BatchTest(unittest.TestCase):
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.db, db_info = seed_database(f"sqlite:///{os.path.join(directory.name, 'batch.db')}", 4, 50)
+        self.addCleanup(self.db._engine.dispose)
+        self.cases = {
+            f"How many rows does {table} have?": {"sql": f"SELECT COUNT(*) FROM {table}", "tables": [table]}
+            for table in db_info["tables"]
+        }
+
+    def test_results_in_order_with_per_question_errors(self):
+        model = InFlightScriptedModel(queries=self.cases, latency=0.05)
+        agent = Txt2SqlAgent(self.db, model, mode="direct", coalesce=False)
+        # The scripted model raises on a question it has no script for.
+        questions = list(self.cases) * 3 + ["What is the meaning of life?"]
+        limiter = RateLimiter(requests_per_minute=60000)
+
+        results = asyncio.run(agent.abatch(questions, max_concurrency=4, rate_limiter=limiter))
+
+        self.assertEqual(len(results), len(questions))
+        for question, result in zip(questions[:-1], results):
+            self.assertTrue(result["success"], result["error"])
+            self.assertEqual(result["sql"].strip(), self.cases[question]["sql"])
+            self.assertEqual(result["data"].height, 1)
+        self.assertFalse(results[-1]["success"])
+        self.assertTrue(results[-1]["error"])
+        self.assertGreater(model.peak, 1)
+        self.assertLessEqual(model.peak, 4)
+
+    def test_agent_mode(self):
+        model = ScriptedChatModel(queries=self.cases)
+        agent = Txt2SqlAgent(self.db, model, mode="agent")
+        questions = list(self.cases)
+
+        results = asyncio.run(agent.abatch(questions, max_concurrency=2))
+
+        for question, result in zip(questions, results):
+            self.assertTrue(result["success"], result["error"])
+            self.assertEqual(result["output"], model.answer)
+            self.assertEqual(result["sql"].strip(), self.cases[question]["sql"])
+
+    def test_rejects_zero_concurrency(self):
+        agent = Txt2SqlAgent(self.db, ScriptedChatModel(queries=self.cases), mode="direct")
+        with self.assertRaises(ValueError):
+            asyncio.run(agent.abatch(list(self.cases), max_concurrency=0))
+
+
+if __name__ == "__main__":
+    unittest.main()
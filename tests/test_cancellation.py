@@ -0,0 +1,158 @@
+"""
+CancelToken deadlines and callbacks, shared tokens, and cancelling queries.
+"""
+
+import os
+import tempfile
+import threading
+import time
+import unittest
+from benchmarks.bench_concurrency import CountingScriptedModel
+from benchmarks.local_db import seed_database
+from src.cancellation import (
+    CancelToken,
+    QueryCancelled,
+    SharedCancelToken,
+    activate_cancel_token,
+    check_cancelled,
+)
+from src.db_utils import fetch_dataframe
+from src.txt2sql_agent import Txt2SqlAgent
+
+ENDLESS_SQL = "WITH RECURSIVE n(x) AS (SELECT 1 UNION ALL SELECT x + 1 FROM n) SELECT COUNT(*) FROM n"
+
+
+class CancelTokenTest(unittest.TestCase):
+
+    def test_cancel_keeps_the_first_reason(self):
+        token = CancelToken()
+        self.assertIsNone(token.message)
+        token.check()
+        token.cancel()
+        token.cancel("deadline")
+        self.assertEqual((token.cancelled, token.reason), (True, "cancelled"))
+        with self.assertRaisesRegex(QueryCancelled, "was cancelled"):
+            token.check()
+
+    def test_deadline(self):
+        token = CancelToken(timeout=0)
+        self.assertEqual((token.cancelled, token.reason), (True, "deadline"))
+        self.assertIn("deadline", token.message)
+        self.assertEqual(token.remaining(), 0.0)
+
+        now = time.monotonic()
+        self.assertAlmostEqual(CancelToken(timeout=100, deadline=now + 10).deadline, now + 10)
+        self.assertLess(CancelToken(timeout=10, deadline=now + 100).deadline, now + 11)
+        budget = CancelToken(timeout=10).budget()
+        self.assertEqual(budget["timeout"], 10)
+        self.assertGreater(budget["remaining"], 9)
+        self.assertEqual(CancelToken().budget()["remaining"], None)
+
+    def test_callbacks(self):
+        token = CancelToken()
+        calls = []
+        unregister = token.on_cancel(lambda: calls.append("removed"))
+        unregister()
+        token.on_cancel(lambda: 1 / 0)
+        token.on_cancel(lambda: calls.append("registered"))
+        token.cancel()
+        token.cancel()
+        token.on_cancel(lambda: calls.append("late"))
+        self.assertEqual(calls, ["registered", "late"])
+
+    def test_watch_interrupts_at_the_deadline(self):
+        interrupted = threading.Event()
+        with CancelToken(timeout=0.05).watch(interrupted.set):
+            self.assertTrue(interrupted.wait(5))
+        with self.assertRaises(QueryCancelled):
+            with CancelToken(timeout=0).watch(interrupted.set):
+                pass
+
+    def test_current_token(self):
+        check_cancelled()
+        token = CancelToken()
+        with activate_cancel_token(token):
+            check_cancelled()
+            token.cancel()
+            with self.assertRaises(QueryCancelled):
+                check_cancelled()
+        check_cancelled()
+
+
+class SharedCancelTokenTest(unittest.TestCase):
+
+    def test_cancelled_once_every_caller_is(self):
+        first, second = CancelToken(), CancelToken()
+        shared = SharedCancelToken()
+        shared.join(first)
+        shared.join(second)
+        first.cancel()
+        self.assertFalse(shared.cancelled)
+        second.cancel()
+        self.assertTrue(shared.cancelled)
+
+    def test_caller_without_a_token_keeps_it_running(self):
+        token = CancelToken()
+        shared = SharedCancelToken()
+        shared.join(token)
+        shared.join(None)
+        token.cancel()
+        self.assertFalse(shared.cancelled)
+        self.assertIsNone(shared.deadline)
+
+    def test_latest_deadline_applies(self):
+        shared = SharedCancelToken()
+        early, late = CancelToken(timeout=10), CancelToken(timeout=20)
+        shared.join(early)
+        shared.join(late)
+        self.assertEqual(shared.deadline, late.deadline)
+        shared.join(CancelToken())
+        self.assertIsNone(shared.deadline)
+
+
+class CancelQueryTest(unittest.TestCase):
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.db, db_info = seed_database(f"sqlite:///{os.path.join(directory.name, 'cancel.db')}", 2, 20)
+        self.addCleanup(self.db._engine.dispose)
+        table = next(iter(db_info["tables"]))
+        self.question = f"How many rows does {table} have?"
+        self.cases = {self.question: {"sql": f"SELECT COUNT(*) FROM {table}", "tables": [table]}}
+
+    def test_running_statement_is_interrupted(self):
+        token = CancelToken()
+        threading.Timer(0.1, token.cancel).start()
+        start = time.monotonic()
+        with activate_cancel_token(token), self.assertRaisesRegex(QueryCancelled, "was cancelled"):
+            fetch_dataframe(self.db, ENDLESS_SQL)
+        self.assertLess(time.monotonic() - start, 5)
+        # The connection goes back to the pool usable.
+        self.assertEqual(fetch_dataframe(self.db, "SELECT 1 AS one").item(), 1)
+
+    def test_statement_stops_at_the_deadline(self):
+        with activate_cancel_token(CancelToken(timeout=0.1)), self.assertRaisesRegex(QueryCancelled, "deadline"):
+            fetch_dataframe(self.db, ENDLESS_SQL)
+
+    def test_agent_query_stops_at_the_deadline(self):
+        model = CountingScriptedModel(queries=self.cases, latency=0.2)
+        agent = Txt2SqlAgent(self.db, model, mode="direct", query_timeout=0.1)
+        result = agent.query(self.question)
+        self.assertEqual((result["success"], result["cancelled"]), (False, True))
+        self.assertIn("deadline", result["error"])
+        self.assertEqual(model.take_calls(), 1)
+        self.assertTrue(agent.query(self.question, cancel_token=CancelToken(timeout=30))["success"])
+
+    def test_cancelled_token_stops_before_the_model_runs(self):
+        model = CountingScriptedModel(queries=self.cases, latency=0)
+        agent = Txt2SqlAgent(self.db, model, mode="agent")
+        token = CancelToken()
+        token.cancel()
+        result = agent.query(self.question, cancel_token=token)
+        self.assertEqual((result["success"], result["cancelled"]), (False, True))
+        self.assertEqual(model.take_calls(), 0)
+
+
+if __name__ == "__main__":
+    unittest.main()
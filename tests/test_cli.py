@@ -0,0 +1,94 @@
+"""
+The interactive CLI loop of main.py, end to end with a scripted model.
+
+main() runs against a seeded SQLite database; ChatOpenAI is replaced by the
+scripted model so the real create_agent builds the agent, and input() is fed
+a fixed session.
+"""
+
+import contextlib
+import io
+import os
+import tempfile
+import unittest
+from unittest import mock
+from benchmarks.local_db import seed_database
+from benchmarks.replay_model import ScriptedChatModel
+import main
+
+
+class CliLoopTest(unittest.TestCase):
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.directory = directory.name
+        self.uri = f"sqlite:///{os.path.join(self.directory, 'cli.db')}"
+        db, db_info = seed_database(self.uri, 3, 50)
+        db._engine.dispose()
+        self.table = next(iter(db_info["tables"]))
+        self.question = f"How many rows does {self.table} have?"
+        self.sql = f"SELECT COUNT(*) FROM {self.table}"
+        self.model = ScriptedChatModel(queries={self.question: {"sql": self.sql, "tables": [self.table]}})
+
+    def run_session(self, commands, **env):
+        """Run main() on the commands (then /exit) and return what it printed"""
+        environment = {
+            "OPENAI_API_KEY": "test", "OPENAI_MODEL": "test",
+            "DB_HOST": "localhost", "DB_PORT": "5432", "DB_NAME": "test", "DB_USER": "test", "DB_PASSWORD": "test",
+            "SCHEMA_CACHE_PATH": "",
+            "TRANSLATION_CACHE_PATH": os.path.join(self.directory, "translations.sqlite3"),
+            "EXAMPLE_STORE_PATH": ":memory:",
+            "METRICS_FILE": "",
+            "COST_GUARD_ACTION": "off",
+        }
+        environment.update(env)
+        output = io.StringIO()
+        with mock.patch.dict(os.environ, environment), \
+                mock.patch("sys.argv", ["main.py"]), \
+                mock.patch("main.get_db_connection_string", return_value=self.uri), \
+                mock.patch("langchain_openai.ChatOpenAI", return_value=self.model), \
+                mock.patch("builtins.input", side_effect=list(commands) + ["/exit"]), \
+                contextlib.redirect_stdout(output):
+            main.main()
+        return output.getvalue()
+
+    def test_commands_and_questions(self):
+        export_path = os.path.join(self.directory, "export.csv")
+        output = self.run_session([
+            "/help",
+            "/tables",
+            "/pool",
+            self.question,
+            "/metrics",
+            f"/direct {self.question}",
+            f"/sql {self.question}",
+            f"/sample {self.table}",
+            f"/export {export_path}",
+            "/cache",
+            "/cache clear",
+            "/refresh",
+        ])
+
+        self.assertNotIn("Error", output)
+        self.assertIn("Database connected successfully.", output)
+        self.assertIn(f"- {self.table}", output)
+        self.assertIn("Connection pool:", output)
+        self.assertIn(self.model.answer, output)
+        self.assertIn("txt2sql_queries_total", output)
+        self.assertIn(f"Generated SQL:\n{self.sql}", output)
+        self.assertIn("Caches cleared.", output)
+        self.assertIn("Exiting...", output)
+        with open(export_path, encoding="utf-8") as f:
+            self.assertEqual(len(f.read().splitlines()), 2)
+
+    def test_without_tracing(self):
+        output = self.run_session(["/pool", self.question, "/metrics"], QUERY_TRACING="0")
+
+        self.assertNotIn("Error", output)
+        self.assertIn(self.model.answer, output)
+        self.assertIn("Query tracing is disabled.", output)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,105 @@
+"""
+One shared Txt2SqlAgent answering from many threads at once.
+
+Uses the scripted model and the answer checks of benchmarks.bench_concurrency
+on a small seeded SQLite database, so it runs offline in a few seconds.
+"""
+
+import os
+import random
+import tempfile
+import threading
+import unittest
+from unittest import mock
+from benchmarks.bench_concurrency import CountingScriptedModel, ask, run_scenario
+from benchmarks.local_db import seed_database
+from src.schema_cache import SchemaCache
+from src.txt2sql_agent import Txt2SqlAgent
+
+THREADS = 16
+
+
+class ConcurrentQueryTest(unittest.TestCase):
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.db, db_info = seed_database(f"sqlite:///{os.path.join(directory.name, 'concurrency.db')}", 4, 50)
+        self.addCleanup(self.db._engine.dispose)
+        self.cases = {
+            f"How many rows does {table} have?": {"sql": f"SELECT COUNT(*) FROM {table}", "tables": [table]}
+            for table in db_info["tables"]
+        }
+        self.questions = list(self.cases)
+
+    def _agent(self, mode: str, coalesce: bool):
+        model = CountingScriptedModel(queries=self.cases, latency=0.02)
+        return Txt2SqlAgent(self.db, model, mode=mode, coalesce=coalesce), model
+
+    def _single_run_calls(self, agent: Txt2SqlAgent, model: CountingScriptedModel, mode: str) -> int:
+        """LLM calls of one query() plus one stream_query(), which also builds the shared agents"""
+        question = self.questions[0]
+        model.take_calls()
+        for stream in (False, True):
+            self.assertIsNone(ask(agent, question, self.cases[question]["sql"], stream, mode))
+        return model.take_calls()
+
+    def test_mixed_questions_get_their_own_answers(self):
+        rng = random.Random(0)
+        work = [[rng.choice(self.questions) for _ in range(3)] for _ in range(THREADS)]
+        for mode in ("agent", "direct"):
+            for coalesce in (True, False):
+                with self.subTest(mode=mode, coalesce=coalesce):
+                    agent, model = self._agent(mode, coalesce)
+                    self._single_run_calls(agent, model, mode)
+                    stats = run_scenario(agent, model, work, self.cases, mode)
+                    self.assertEqual(stats["problems"], [])
+
+    def test_identical_questions_are_coalesced(self):
+        work = [[self.questions[0]] for _ in range(THREADS)]
+        for mode in ("agent", "direct"):
+            with self.subTest(mode=mode):
+                agent, model = self._agent(mode, coalesce=True)
+                single = self._single_run_calls(agent, model, mode)
+                stats = run_scenario(agent, model, work, self.cases, mode)
+                self.assertEqual(stats["problems"], [])
+                # Half the threads stream and half do not; each API runs the model once.
+                self.assertEqual(stats["llm_calls"], single)
+
+    def test_without_coalescing_every_call_runs_the_model(self):
+        work = [[self.questions[0]] for _ in range(THREADS)]
+        agent, model = self._agent("direct", coalesce=False)
+        single = self._single_run_calls(agent, model, "direct")
+        stats = run_scenario(agent, model, work, self.cases, "direct")
+        self.assertEqual(stats["problems"], [])
+        self.assertEqual(stats["llm_calls"], single * THREADS // 2)
+
+    def test_schema_refresh_does_not_hold_the_agent_lock(self):
+        cache = SchemaCache(self.db, path="")
+        agent = Txt2SqlAgent(self.db, CountingScriptedModel(queries=self.cases), mode="direct",
+                             schema_cache=cache, table_retrieval_k=2)
+        entered, release = threading.Event(), threading.Event()
+        fingerprint = SchemaCache.fingerprint.fget
+
+        def slow_fingerprint(self):
+            # Stands in for a refresh waiting on the database.
+            entered.set()
+            release.wait(5)
+            return fingerprint(self)
+
+        with mock.patch.object(SchemaCache, "fingerprint", property(slow_fingerprint)):
+            checker = threading.Thread(target=agent.check_sql, args=(self.cases[self.questions[0]]["sql"],))
+            checker.start()
+            try:
+                self.assertTrue(entered.wait(5))
+                self.assertTrue(agent._lock.acquire(timeout=1))
+                agent._lock.release()
+            finally:
+                release.set()
+                checker.join()
+        self.assertIsNone(agent.check_sql(self.cases[self.questions[0]]["sql"]))
+        self.assertTrue(agent.relevant_tables(self.questions[0]))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,138 @@
+"""
+CostGuard decisions on planner estimates, and how Txt2SqlAgent acts on them.
+
+SQLite has no planner costs, so the PostgreSQL EXPLAIN estimates are simulated
+by patching explain_sql.
+"""
+
+import os
+import tempfile
+import unittest
+from unittest import mock
+from sqlalchemy.exc import OperationalError
+from benchmarks.bench_concurrency import CountingScriptedModel
+from benchmarks.local_db import seed_database
+from src.cost_guard import CostGuard, collect_guard_decisions
+from src.txt2sql_agent import Txt2SqlAgent
+
+CHEAP = "SELECT id FROM customer WHERE id = 1"
+EXPENSIVE = "SELECT * FROM customer c CROSS JOIN orders o"
+
+
+def fake_explain(db, sql: str) -> dict:
+    """Planner estimates: the cross join is expensive unless capped by a LIMIT"""
+    if "CROSS JOIN" in sql and "LIMIT" not in sql:
+        return {"cost": 5e6, "rows": 1e7}
+    return {"cost": 10.0, "rows": 1.0}
+
+
+class CostGuardTest(unittest.TestCase):
+
+    def setUp(self):
+        patcher = mock.patch("src.cost_guard.explain_sql", side_effect=fake_explain)
+        self.explain_sql = patcher.start()
+        self.addCleanup(patcher.stop)
+        self.db = mock.Mock(dialect="postgresql")
+
+    def test_cheap_statement_is_allowed(self):
+        decision = CostGuard(self.db).check(CHEAP)
+        self.assertEqual((decision.action, decision.sql, decision.blocked), ("allow", CHEAP, False))
+        self.assertEqual((decision.cost, decision.rows), (10.0, 1.0))
+
+    def test_actions_over_the_limit(self):
+        reject = CostGuard(self.db, action="reject").check(EXPENSIVE)
+        self.assertEqual((reject.action, reject.blocked), ("reject", True))
+        self.assertIn("rejected as too expensive", reject.message)
+
+        rewrite = CostGuard(self.db, action="rewrite").check(EXPENSIVE)
+        self.assertEqual((rewrite.action, rewrite.sql, rewrite.blocked), ("rewrite", EXPENSIVE, True))
+        self.assertIn("Rewrite it", rewrite.message)
+
+        limit = CostGuard(self.db, action="limit", limit=50).check(EXPENSIVE)
+        self.assertEqual((limit.action, limit.blocked), ("limit", False))
+        self.assertTrue(limit.sql.endswith("LIMIT 50"))
+        self.assertIn(EXPENSIVE, limit.sql)
+
+    def test_limit_falls_back_to_rewrite_when_still_expensive(self):
+        self.explain_sql.side_effect = lambda db, sql: {"cost": 5e6, "rows": 1e7}
+        decision = CostGuard(self.db, action="limit").check(EXPENSIVE)
+        self.assertEqual((decision.action, decision.sql), ("rewrite", EXPENSIVE))
+
+    def test_each_limit_can_be_disabled(self):
+        self.assertEqual(CostGuard(self.db, max_cost=None, max_rows=2e7).check(EXPENSIVE).action, "allow")
+        self.assertEqual(CostGuard(self.db, max_cost=1e7, max_rows=None).check(EXPENSIVE).action, "allow")
+        self.assertEqual(CostGuard(self.db, max_cost=None, max_rows=10).check(EXPENSIVE).action, "rewrite")
+
+    def test_unplannable_statements_are_unchecked(self):
+        guard = CostGuard(self.db)
+        self.assertEqual(guard.check("DELETE FROM customer").action, "unchecked")
+        self.explain_sql.side_effect = OperationalError("EXPLAIN", {}, Exception("no such column"))
+        self.assertEqual(guard.check(CHEAP).action, "unchecked")
+        with self.assertRaises(OperationalError):
+            guard.plan(CHEAP)
+        self.assertEqual(CostGuard(mock.Mock(dialect="sqlite")).check(EXPENSIVE).action, "unchecked")
+
+    def test_plans_are_cached_per_normalized_statement(self):
+        guard = CostGuard(self.db, cache_size=1)
+        guard.check(CHEAP)
+        guard.check("select id  from customer where id = 1;")
+        self.assertEqual(self.explain_sql.call_count, 1)
+        guard.check(EXPENSIVE)
+        guard.check(CHEAP)
+        stats = guard.stats()
+        self.assertEqual((stats["plan_hits"], stats["plan_misses"], stats["plans"]), (1, 3, 1))
+        self.assertEqual((stats["checks"], stats["blocked"]), (4, 1))
+
+    def test_cached_plans_expire(self):
+        guard = CostGuard(self.db, cache_ttl=60)
+        with mock.patch("src.cost_guard.time.time", side_effect=[0.0, 30.0, 61.0]):
+            for _ in range(3):
+                guard.check(CHEAP)
+        self.assertEqual(self.explain_sql.call_count, 2)
+
+    def test_decisions_are_collected(self):
+        guard = CostGuard(self.db)
+        with collect_guard_decisions() as decisions:
+            guard.check(CHEAP)
+            guard.check(EXPENSIVE)
+        guard.check(CHEAP)
+        self.assertEqual([d.action for d in decisions], ["allow", "rewrite"])
+
+
+class AgentCostGuardTest(unittest.TestCase):
+
+    def setUp(self):
+        patcher = mock.patch("src.cost_guard.explain_sql", side_effect=fake_explain)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.db, db_info = seed_database(f"sqlite:///{os.path.join(directory.name, 'guard.db')}", 2, 30)
+        self.addCleanup(self.db._engine.dispose)
+        first, second = list(db_info["tables"])[:2]
+        self.sql = f"SELECT * FROM {first} CROSS JOIN {second}"
+        self.question = "List every pair of rows"
+        self.model = CountingScriptedModel(queries={self.question: {"sql": self.sql, "tables": [first, second]}},
+                                           latency=0)
+
+    def agent(self, action: str) -> Txt2SqlAgent:
+        # The guard sees a PostgreSQL database; the statements still run on SQLite.
+        guard = CostGuard(mock.Mock(dialect="postgresql"), action=action, limit=7)
+        return Txt2SqlAgent(self.db, self.model, mode="direct", cost_guard=guard, summarize=False)
+
+    def test_limit_caps_the_statement_that_runs(self):
+        result = self.agent("limit").query(self.question)
+        self.assertTrue(result["success"])
+        self.assertEqual(result["cost_guard"]["action"], "limit")
+        self.assertEqual(result["row_count"], 7)
+
+    def test_reject_fails_without_running_the_statement(self):
+        result = self.agent("reject").query(self.question)
+        self.assertFalse(result["success"])
+        self.assertEqual(result["cost_guard"]["action"], "reject")
+        self.assertIn("too expensive", result["error"])
+        self.assertIsNone(result["data"])
+
+
+if __name__ == "__main__":
+    unittest.main()
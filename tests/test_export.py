@@ -0,0 +1,94 @@
+"""
+export_query on SQLite, and the Parquet conversion of PostgreSQL COPY output.
+"""
+
+import os
+import tempfile
+import unittest
+from decimal import Decimal
+import polars as pl
+from langchain_community.utilities import SQLDatabase
+from sqlalchemy import create_engine, text
+from src.export import _csv_to_parquet, _pg_dtype, export_query
+
+
+def pg_column(name: str, oid: int, precision=None, scale=None) -> tuple:
+    """A psycopg2 cursor.description entry"""
+    return (name, oid, None, None, precision, scale, None)
+
+
+class ExportTest(unittest.TestCase):
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.directory = directory.name
+        uri = f"sqlite:///{os.path.join(self.directory, 'export.db')}"
+        engine = create_engine(uri)
+        with engine.begin() as conn:
+            conn.execute(text("CREATE TABLE item (id INTEGER PRIMARY KEY, name TEXT, price REAL)"))
+            conn.execute(text("INSERT INTO item VALUES (1, 'pen', 1.5), (2, 'ink, blue', 2.25), (3, NULL, NULL)"))
+        engine.dispose()
+        self.db = SQLDatabase.from_uri(uri)
+        self.addCleanup(self.db._engine.dispose)
+
+    def path(self, name: str) -> str:
+        return os.path.join(self.directory, name)
+
+    def test_csv_and_parquet_hold_the_same_rows(self):
+        sql = "SELECT id, name, price FROM item ORDER BY id;"
+        csv = export_query(self.db, sql, self.path("items.csv"), batch_size=2)
+        parquet = export_query(self.db, sql, self.path("items.parquet"), batch_size=2)
+        self.assertEqual((csv["rows"], csv["format"], parquet["format"]), (3, "csv", "parquet"))
+        expected = pl.DataFrame({"id": [1, 2, 3], "name": ["pen", "ink, blue", None], "price": [1.5, 2.25, None]})
+        self.assertTrue(pl.read_csv(self.path("items.csv")).equals(expected))
+        self.assertTrue(pl.read_parquet(self.path("items.parquet")).equals(expected))
+        self.assertFalse(os.path.exists(self.path("items.parquet.csv.tmp")))
+
+    def test_rejects_writes_and_unknown_formats(self):
+        with self.assertRaises(ValueError):
+            export_query(self.db, "DELETE FROM item", self.path("items.csv"))
+        with self.assertRaises(ValueError):
+            export_query(self.db, "SELECT * FROM item", self.path("items.xlsx"))
+        self.assertFalse(os.path.exists(self.path("items.csv")))
+
+    def test_postgresql_types(self):
+        self.assertEqual(_pg_dtype(pg_column("n", 1700, 22, 2)), pl.Decimal(22, 2))
+        self.assertEqual(_pg_dtype(pg_column("n", 1700)), pl.String)
+        self.assertEqual(_pg_dtype(pg_column("n", 1700, 60, 10)), pl.String)
+        self.assertEqual(_pg_dtype(pg_column("n", 20)), pl.Int64)
+        self.assertEqual(_pg_dtype(pg_column("n", 25)), pl.String)
+
+    def test_copy_output_converts_exactly(self):
+        csv_path = self.path("copy.csv")
+        with open(csv_path, "w") as f:
+            f.write("id,amount,ok,at,day,raw\n"
+                    "1,12345678901234567890.12,t,2024-01-01 10:00:00+00,2024-01-01,1.000000000000000000001\n"
+                    "2,,f,2024-01-01 10:00:00.5+00,,\n")
+        dtypes = {
+            "id": _pg_dtype(pg_column("id", 20)),
+            "amount": _pg_dtype(pg_column("amount", 1700, 22, 2)),
+            "ok": _pg_dtype(pg_column("ok", 16)),
+            "at": _pg_dtype(pg_column("at", 1184)),
+            "day": _pg_dtype(pg_column("day", 1082)),
+            "raw": _pg_dtype(pg_column("raw", 1700)),
+        }
+        _csv_to_parquet(csv_path, self.path("copy.parquet"), dtypes)
+        frame = pl.read_parquet(self.path("copy.parquet"))
+        self.assertEqual(frame["amount"].to_list(), [Decimal("12345678901234567890.12"), None])
+        self.assertEqual(frame["ok"].to_list(), [True, False])
+        self.assertEqual(frame["at"].dt.microsecond().to_list(), [0, 500000])
+        self.assertEqual(frame["day"].null_count(), 1)
+        self.assertEqual(frame["raw"].to_list(), ["1.000000000000000000001", None])
+
+    def test_unconvertible_value_fails_instead_of_becoming_null(self):
+        csv_path = self.path("copy.csv")
+        with open(csv_path, "w") as f:
+            f.write("at\n2024-01-01 10:00:00+00\ninfinity\n")
+        with self.assertRaises(ValueError):
+            _csv_to_parquet(csv_path, self.path("copy.parquet"), {"at": pl.Datetime})
+        self.assertFalse(os.path.exists(self.path("copy.parquet")))
+
+
+if __name__ == "__main__":
+    unittest.main()
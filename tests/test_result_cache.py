@@ -0,0 +1,131 @@
+"""
+ResultCache hits, invalidation and what it refuses to cache.
+
+SQLite has no table versions, so the PostgreSQL version tokens are simulated
+by patching get_table_versions.
+"""
+
+import os
+import tempfile
+import unittest
+from unittest import mock
+from langchain_community.utilities import SQLDatabase
+from sqlalchemy import create_engine, text
+from src.result_cache import ResultCache
+
+
+class ResultCacheTest(unittest.TestCase):
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        uri = f"sqlite:///{os.path.join(directory.name, 'cache.db')}"
+        engine = create_engine(uri)
+        with engine.begin() as conn:
+            conn.execute(text("CREATE TABLE customer (id INTEGER PRIMARY KEY, name TEXT)"))
+            conn.execute(text("CREATE TABLE orders (id INTEGER PRIMARY KEY, customer_id INTEGER)"))
+            conn.execute(text("INSERT INTO customer VALUES (1, 'Ann'), (2, 'Bob'), (3, 'Cy')"))
+            conn.execute(text("CREATE VIEW customer_view AS SELECT id, name FROM customer"))
+        engine.dispose()
+        self.db = SQLDatabase.from_uri(uri)
+        self.addCleanup(self.db._engine.dispose)
+        self.versions = {"customer": "1", "orders": "1"}
+
+    def versioned(self, **kwargs):
+        """Cache whose tables have the versions in self.versions"""
+        patcher = mock.patch("src.result_cache.get_table_versions",
+                             side_effect=lambda db, tables: {t: self.versions[t] for t in tables if t in self.versions})
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        return ResultCache(self.db, version_check_interval=0, **kwargs)
+
+    def insert(self, name: str):
+        with self.db._engine.begin() as conn:
+            conn.execute(text("INSERT INTO customer (name) VALUES (:name)"), {"name": name})
+
+    def test_hit_until_a_referenced_table_changes(self):
+        cache = self.versioned()
+        sql = "SELECT COUNT(*) AS n FROM customer"
+        self.assertEqual(cache.execute(sql).item(), 3)
+        self.insert("Dee")
+        # Same version: the stale result is served from the cache.
+        self.assertEqual(cache.execute(sql).item(), 3)
+        self.versions["customer"] = "2"
+        self.assertEqual(cache.execute(sql).item(), 4)
+        stats = cache.stats()
+        self.assertEqual((stats["hits"], stats["misses"], stats["invalidations"]), (1, 2, 1))
+
+    def test_change_to_another_table_keeps_the_entry(self):
+        cache = self.versioned()
+        cache.execute("SELECT name FROM customer")
+        self.versions["orders"] = "2"
+        cache.execute("SELECT name FROM customer")
+        self.assertEqual(cache.stats()["hits"], 1)
+
+    def test_statements_without_versioned_tables_are_not_cached(self):
+        cache = self.versioned()
+        self.assertNotEqual(cache.execute("SELECT random() AS r").item(), cache.execute("SELECT random() AS r").item())
+        self.assertEqual(cache.execute("SELECT COUNT(*) AS n FROM customer_view").item(), 3)
+        self.insert("Dee")
+        self.assertEqual(cache.execute("SELECT COUNT(*) AS n FROM customer_view").item(), 4)
+        self.assertEqual(cache.stats()["entries"], 0)
+
+    def test_table_without_a_version_is_not_cached(self):
+        cache = self.versioned()
+        del self.versions["customer"]
+        cache.execute("SELECT name FROM customer")
+        cache.execute("SELECT name FROM customer")
+        self.assertEqual(cache.stats()["hits"], 0)
+        self.assertEqual(cache.stats()["entries"], 0)
+
+    def test_without_table_versions_only_a_ttl_caches(self):
+        cache = ResultCache(self.db)
+        self.assertNotEqual(cache.execute("SELECT random() AS r").item(), cache.execute("SELECT random() AS r").item())
+        cache.execute("SELECT name FROM customer")
+        self.assertEqual(cache.stats()["entries"], 0)
+
+        cache = ResultCache(self.db, ttl=60)
+        self.assertEqual(cache.execute("SELECT random() AS r").item(), cache.execute("SELECT random() AS r").item())
+        with mock.patch("src.result_cache.time.time", return_value=cache._entries[next(iter(cache._entries))].created_at + 61):
+            cache.execute("SELECT random() AS r")
+        self.assertEqual(cache.stats()["invalidations"], 1)
+
+    def test_invalidate_tables(self):
+        cache = self.versioned()
+        cache.execute("SELECT name FROM customer")
+        cache.execute("SELECT customer_id FROM orders")
+        cache.invalidate(["orders"])
+        self.assertEqual(cache.stats()["entries"], 1)
+        cache.invalidate()
+        self.assertEqual(cache.stats()["entries"], 0)
+
+    def test_caps_are_part_of_the_key_and_keep_truncated(self):
+        cache = self.versioned()
+        sql = "SELECT name FROM customer ORDER BY id"
+        frame, truncated = cache.execute_capped(sql, max_rows=2)
+        self.assertEqual((frame.height, truncated), (2, True))
+        frame, truncated = cache.execute_capped(sql, max_rows=2)
+        self.assertEqual((frame.height, truncated, cache.stats()["hits"]), (2, True, 1))
+        frame, truncated = cache.execute_capped(sql, max_rows=3)
+        self.assertEqual((frame.height, truncated, cache.stats()["misses"]), (3, False, 2))
+
+    def test_writes_are_not_cached(self):
+        cache = self.versioned()
+        cache.execute("INSERT INTO customer (name) VALUES ('Eve')")
+        self.assertEqual(cache.stats()["entries"], 0)
+
+    def test_least_recently_used_entries_are_evicted(self):
+        # Frames of 3, 2 and 1 int64 ids: 24, 16 and 8 bytes.
+        cache = self.versioned(max_bytes=40, max_entry_bytes=40)
+        queries = [f"SELECT id FROM customer WHERE id > {i}" for i in range(3)]
+        for sql in queries:
+            cache.execute(sql)
+        stats = cache.stats()
+        self.assertEqual((stats["entries"], stats["bytes"], stats["evictions"]), (2, 24, 1))
+        cache.execute(queries[2])
+        cache.execute(queries[0])
+        self.assertEqual(cache.stats()["hits"], 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,132 @@
+"""
+SchemaCache refreshes, persistence and table info on a SQLite database.
+"""
+
+import os
+import tempfile
+import unittest
+from unittest import mock
+from langchain_community.utilities import SQLDatabase
+from sqlalchemy import create_engine, text
+from benchmarks.local_db import seed_database
+from benchmarks.replay_model import ScriptedChatModel
+from src.schema_cache import SchemaCache
+from src.schema_renderer import estimate_tokens
+from src.txt2sql_agent import Txt2SqlAgent
+
+
+class SchemaCacheTest(unittest.TestCase):
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.directory = directory.name
+        self.uri = f"sqlite:///{os.path.join(self.directory, 'schema.db')}"
+        self.execute("CREATE TABLE customer (id INTEGER PRIMARY KEY, name TEXT)",
+                     "CREATE TABLE orders (id INTEGER PRIMARY KEY, customer_id INTEGER REFERENCES customer(id))",
+                     "INSERT INTO customer VALUES (1, 'Ann')")
+        self.db = self.database()
+        self.path = os.path.join(self.directory, "schema.json")
+
+    def database(self) -> SQLDatabase:
+        db = SQLDatabase.from_uri(self.uri, lazy_table_reflection=True)
+        self.addCleanup(db._engine.dispose)
+        return db
+
+    def execute(self, *statements: str):
+        engine = create_engine(self.uri)
+        with engine.begin() as conn:
+            for statement in statements:
+                conn.execute(text(statement))
+        engine.dispose()
+
+    def test_refresh_reports_and_applies_changes(self):
+        cache = SchemaCache(self.db, path="")
+        before = cache.get_db_info()
+        self.assertEqual(set(before["tables"]), {"customer", "orders"})
+        self.assertEqual(cache.refresh(), [])
+
+        self.execute("ALTER TABLE customer ADD COLUMN region TEXT", "CREATE TABLE product (id INTEGER)")
+        self.assertEqual(cache.refresh(), ["customer", "product"])
+        after = cache.get_db_info()
+        self.assertIn("region", [c["name"] for c in after["tables"]["customer"]["columns"]])
+        self.assertIn("product", after["tables"])
+        self.assertEqual([r["table"] for r in after["relationships"]], ["orders"])
+
+        self.execute("DROP TABLE product")
+        self.assertEqual(cache.refresh(), ["product"])
+        self.assertNotIn("product", cache.get_db_info()["tables"])
+
+    def test_refresh_replaces_rather_than_changes_the_structure(self):
+        cache = SchemaCache(self.db, path="")
+        before = cache.get_db_info()
+        self.execute("ALTER TABLE customer ADD COLUMN region TEXT")
+        cache.refresh()
+        self.assertIsNot(cache.get_db_info(), before)
+        self.assertNotIn("region", [c["name"] for c in before["tables"]["customer"]["columns"]])
+
+    def test_staleness_check_uses_max_staleness(self):
+        cache = SchemaCache(self.db, path="", max_staleness=3600)
+        cache.get_db_info()
+        self.execute("CREATE TABLE product (id INTEGER)")
+        self.assertNotIn("product", cache.get_db_info()["tables"])
+        cache.max_staleness = 0
+        self.assertIn("product", cache.get_db_info()["tables"])
+
+    def test_persisted_snapshot_is_reused(self):
+        SchemaCache(self.db, path=self.path).get_table_info(["customer"])
+        with mock.patch("src.schema_cache.get_db_info") as get_db_info:
+            cache = SchemaCache(self.database(), path=self.path)
+            self.assertEqual(set(cache.get_db_info()["tables"]), {"customer", "orders"})
+            self.assertIn("CREATE TABLE customer", cache.get_table_info(["customer"]))
+        get_db_info.assert_not_called()
+
+    def test_unchanged_refresh_does_not_rewrite_the_file(self):
+        cache = SchemaCache(self.db, path=self.path)
+        cache.get_db_info()
+        with mock.patch.object(cache, "_save") as save:
+            self.assertEqual(cache.refresh(), [])
+            save.assert_not_called()
+            self.execute("CREATE TABLE product (id INTEGER)")
+            cache.refresh()
+            save.assert_called_once()
+
+    def test_table_info_matches_sqldatabase_and_reflects_once(self):
+        cache = SchemaCache(self.db, path="")
+        expected = self.database().get_table_info(["customer", "orders"])
+        with mock.patch.object(self.db._metadata, "reflect", wraps=self.db._metadata.reflect) as reflect:
+            self.assertEqual(cache.get_table_info(["customer", "orders"]), expected)
+            self.assertEqual(cache.get_table_info(["orders", "customer"]), expected)
+        reflect.assert_called_once()
+        with self.assertRaises(ValueError):
+            cache.get_table_info(["missing"])
+
+    def test_changed_table_is_described_again(self):
+        cache = SchemaCache(self.db, path="", max_staleness=0)
+        self.assertNotIn("region", cache.get_table_info(["customer"]))
+        self.execute("ALTER TABLE customer ADD COLUMN region TEXT")
+        self.assertIn("region", cache.get_table_info(["customer"]))
+
+    def test_invalidate_tables(self):
+        cache = SchemaCache(self.db, path="")
+        cache.get_table_info(["customer"])
+        cache.invalidate(["customer"])
+        self.assertEqual(cache.refresh(), ["customer"])
+        self.assertIn("customer", cache.get_db_info()["tables"])
+
+
+class FullSchemaPromptTest(unittest.TestCase):
+
+    def test_schema_without_tables_stays_within_a_budget(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        db, _ = seed_database(f"sqlite:///{os.path.join(directory.name, 'wide.db')}", 120, 5)
+        self.addCleanup(db._engine.dispose)
+        agent = Txt2SqlAgent(db, ScriptedChatModel(), mode="direct", schema_cache=SchemaCache(db, path=""))
+        with mock.patch.object(db, "get_table_info", side_effect=AssertionError("table info of every table")):
+            schema = agent._get_schema_text([], "how many orders")
+        self.assertLessEqual(estimate_tokens(schema), 4000)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,73 @@
+"""
+SchemaValidator verdicts on hand-written statements.
+"""
+
+import unittest
+from src.schema_validator import SchemaValidator
+
+DB_INFO = {
+    "tables": {
+        "customer": {"columns": [{"name": "id"}, {"name": "name"}, {"name": "region"}]},
+        "orders": {"columns": [{"name": "id"}, {"name": "customer_id"}, {"name": "total"}]},
+        "Mixed Case": {"columns": [{"name": "Value"}]},
+    }
+}
+
+
+class SchemaValidatorTest(unittest.TestCase):
+
+    def setUp(self):
+        self.validator = SchemaValidator(DB_INFO)
+
+    def assertAccepted(self, sql: str):
+        self.assertIsNone(self.validator.validate(sql), sql)
+
+    def assertRejected(self, sql: str, *fragments: str):
+        error = self.validator.validate(sql)
+        self.assertIsNotNone(error, sql)
+        for fragment in fragments:
+            self.assertIn(fragment, error)
+
+    def test_valid_queries(self):
+        for sql in (
+            "SELECT name, region FROM customer",
+            "SELECT c.name, SUM(o.total) AS spent FROM customer c JOIN orders o ON o.customer_id = c.id "
+            "GROUP BY c.name ORDER BY spent DESC",
+            "WITH big AS (SELECT customer_id, total FROM orders WHERE total > 100) "
+            "SELECT b.total FROM big b",
+            "SELECT name FROM customer WHERE id IN (SELECT customer_id FROM orders)",
+            "SELECT name FROM customer c WHERE EXISTS (SELECT 1 FROM orders o WHERE o.customer_id = c.id)",
+            'SELECT "Value" FROM "Mixed Case"',
+            "SELECT * FROM (SELECT * FROM orders) t WHERE t.anything > 1",
+        ):
+            with self.subTest(sql=sql):
+                self.assertAccepted(sql)
+
+    def test_unknown_column_lists_the_real_ones(self):
+        self.assertRejected("SELECT c.nmae FROM customer c", 'column "c.nmae"', "Did you mean: name",
+                            'Columns of table "customer": id, name, region')
+        self.assertRejected("SELECT amount FROM orders", 'column "amount"', 'table "orders"')
+
+    def test_relations_outside_the_schema_are_left_to_the_database(self):
+        for sql in (
+            "SELECT * FROM sales_view",
+            "SELECT v.anything, c.name FROM customer_summary v JOIN customer c ON c.id = v.id",
+            "SELECT relname FROM pg_catalog.pg_class",
+        ):
+            with self.subTest(sql=sql):
+                self.assertAccepted(sql)
+        # A known table is still checked next to an unknown relation.
+        self.assertRejected("SELECT c.nope FROM customer c JOIN sales_view v ON v.id = c.id", 'column "c.nope"')
+
+    def test_writes_and_multiple_statements_are_rejected(self):
+        self.assertRejected("DELETE FROM customer")
+        self.assertRejected("UPDATE customer SET name = 'x'")
+        self.assertRejected("SELECT 1; SELECT 2")
+        self.assertRejected("SELECT * INTO copy FROM customer")
+
+    def test_unparsable_sql_is_left_to_the_database(self):
+        self.assertAccepted("SELECT name FROM customer WHERE name ~~~ 'x' ((")
+
+
+if __name__ == "__main__":
+    unittest.main()
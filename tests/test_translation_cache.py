@@ -0,0 +1,132 @@
+"""
+TranslationCache lookups, keys and eviction, and its use by Txt2SqlAgent.
+"""
+
+import os
+import tempfile
+import unittest
+from unittest import mock
+from benchmarks.bench_concurrency import CountingScriptedModel
+from benchmarks.local_db import seed_database
+from src.translation_cache import TranslationCache
+from src.txt2sql_agent import Txt2SqlAgent
+
+QUESTION = "How many customers are in each region?"
+SQL = "SELECT region, COUNT(*) FROM customer GROUP BY region"
+
+
+class TranslationCacheTest(unittest.TestCase):
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.path = os.path.join(directory.name, "translations.sqlite3")
+
+    def cache(self, **kwargs) -> TranslationCache:
+        cache = TranslationCache(self.path, **kwargs)
+        self.addCleanup(cache._conn.close)
+        return cache
+
+    def test_normalized_question_hits(self):
+        cache = self.cache()
+        cache.put(QUESTION, "m", "f", SQL)
+        hit = cache.get("  how many customers are in each REGION ", "m", "f")
+        self.assertEqual((hit.sql, hit.question), (SQL, "how many customers are in each region"))
+        self.assertIsNone(cache.get("How many orders are in each region?", "m", "f"))
+        stats = cache.stats()
+        self.assertEqual((stats["hits"], stats["misses"], stats["hit_rate"]), (1, 1, 0.5))
+
+    def test_model_and_schema_are_part_of_the_key(self):
+        cache = self.cache()
+        cache.put(QUESTION, "m", "f", SQL)
+        self.assertIsNone(cache.get(QUESTION, "other-model", "f"))
+        self.assertIsNone(cache.get(QUESTION, "m", "changed-schema"))
+
+    def test_entries_survive_a_reopen(self):
+        self.cache().put(QUESTION, "m", "f", SQL)
+        self.assertEqual(self.cache().get(QUESTION, "m", "f").sql, SQL)
+
+    def test_fuzzy_hit_returns_the_matched_entry(self):
+        cache = self.cache(fuzzy_threshold=0.6)
+        cache.put(QUESTION, "m", "f", SQL)
+        hit = cache.get("How many customers are there in each region", "m", "f")
+        self.assertEqual((hit.sql, hit.question), (SQL, "how many customers are in each region"))
+        self.assertIsNone(cache.get("Which products sold best last month?", "m", "f"))
+        self.assertEqual(cache.stats()["fuzzy_hits"], 1)
+        self.assertIsNone(self.cache().get("How many customers are there in each region", "m", "f"))
+
+    def test_discard_removes_only_the_matched_entry(self):
+        cache = self.cache(fuzzy_threshold=0.6)
+        cache.put(QUESTION, "m", "f", SQL)
+        cache.put(QUESTION, "other-model", "f", SQL)
+        cache.discard(cache.get("How many customers are there in each region", "m", "f"))
+        self.assertIsNone(cache.get(QUESTION, "m", "f"))
+        self.assertIsNotNone(cache.get(QUESTION, "other-model", "f"))
+
+    def test_ttl_expires_entries(self):
+        cache = self.cache(ttl=60)
+        cache.put(QUESTION, "m", "f", SQL)
+        self.assertIsNotNone(cache.get(QUESTION, "m", "f"))
+        later = cache._conn.execute("SELECT created_at FROM translations").fetchone()[0] + 61
+        with mock.patch("src.translation_cache.time.time", return_value=later):
+            self.assertIsNone(cache.get(QUESTION, "m", "f"))
+        self.assertEqual(cache.stats()["entries"], 0)
+
+    def test_least_recently_used_entries_are_evicted(self):
+        cache = self.cache(max_entries=2)
+        with mock.patch("src.translation_cache.time.time", side_effect=[1.0, 2.0, 3.0, 4.0]):
+            cache.put("first", "m", "f", "SELECT 1")
+            cache.put("second", "m", "f", "SELECT 2")
+            cache.get("first", "m", "f")
+            cache.put("third", "m", "f", "SELECT 3")
+        self.assertIsNone(cache.get("second", "m", "f"))
+        self.assertIsNotNone(cache.get("first", "m", "f"))
+        self.assertEqual(cache.stats()["evictions"], 1)
+
+    def test_invalidate(self):
+        cache = self.cache()
+        cache.put(QUESTION, "m", "f", SQL)
+        cache.put("second", "m", "f", "SELECT 2")
+        cache.invalidate(QUESTION.upper())
+        self.assertEqual(cache.stats()["entries"], 1)
+        cache.invalidate()
+        self.assertEqual(cache.stats()["entries"], 0)
+
+
+class AgentTranslationCacheTest(unittest.TestCase):
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.db, db_info = seed_database(f"sqlite:///{os.path.join(directory.name, 'cache.db')}", 2, 20)
+        self.addCleanup(self.db._engine.dispose)
+        self.table = next(iter(db_info["tables"]))
+        self.question = f"How many rows does {self.table} have?"
+        self.model = CountingScriptedModel(
+            queries={self.question: {"sql": f"SELECT COUNT(*) FROM {self.table}", "tables": [self.table]}},
+            latency=0
+        )
+        self.cache = TranslationCache(":memory:")
+        self.addCleanup(self.cache._conn.close)
+        self.agent = Txt2SqlAgent(self.db, self.model, mode="direct", translation_cache=self.cache)
+
+    def test_repeated_question_skips_sql_generation(self):
+        first = self.agent.query(self.question)
+        generated = self.model.take_calls()
+        second = self.agent.query(self.question)
+        self.assertEqual((first["path"], second["path"]), ("direct", "cache"))
+        self.assertEqual(second["sql"], first["sql"])
+        # Only the answer is written; the SQL comes from the cache.
+        self.assertLess(self.model.take_calls(), generated)
+
+    def test_failing_cached_sql_is_discarded(self):
+        self.cache.put(self.question, self.agent.model_name, self.agent.schema_fingerprint(), "SELECT * FROM missing")
+        result = self.agent.query(self.question)
+        self.assertTrue(result["success"])
+        self.assertEqual(result["path"], "direct")
+        self.assertEqual(self.cache.get(self.question, self.agent.model_name, self.agent.schema_fingerprint()).sql,
+                         result["sql"])
+
+
+if __name__ == "__main__":
+    unittest.main()